@@ -54,6 +54,20 @@ function setupQueueEvents(queue, app, queueName) {
     }
   });
   
+  // Evento: progreso reportado por el worker con job.progress()
+  queue.on('progress', (job, progress) => {
+    const { jobId, userId } = job.data;
+    
+    if (jobId && userId) {
+      const notifyUser = getNotifyUser();
+      if (notifyUser) {
+        // Acepta un número o un objeto con detalle (ej: progreso de exportaciones)
+        const detalle = typeof progress === 'object' ? progress : { progress };
+        notifyUser(userId, 'job:progress', { jobId, ...detalle });
+      }
+    }
+  });
+  
   // Evento: trabajo falló
   queue.on('failed', (job, error) => {
     console.error(`[${queueName}] Job ${job.id} failed:`, error);
@@ -5,6 +5,18 @@ const fs = require("fs").promises;
 const fs_export = require("fs");
 const os = require("os");
 
+// Formatos soportados por exportDataXLSX.py y su tipo de contenido
+const FORMATOS_EXPORTACION = {
+  xlsx: "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+  csv: "text/csv; charset=utf-8",
+  parquet: "application/vnd.apache.parquet",
+  arrow: "application/vnd.apache.arrow.file",
+  ods: "application/vnd.oasis.opendocument.spreadsheet",
+};
+
+// Las exportaciones que superan el presupuesto de filas/bytes llegan en un zip
+const CONTENT_TYPE_ZIP = "application/zip";
+
 /**
  * Controlador genérico para exportar cualquier tipo de datos a Excel
  */
@@ -17,9 +29,14 @@ class GenericExportController {
    * @returns {Promise<Object>} - Objeto con información del archivo generado
    */
   async exportToExcel(req, res) {
-    const { data, options } = req.body;
+    const { data, options = {} } = req.body;
 
     try {
+      const formato = (options.format || "xlsx").toLowerCase();
+      if (!FORMATOS_EXPORTACION[formato]) {
+        throw new Error(`Formato de exportación no soportado: ${formato}`);
+      }
+
       if (!data || (Array.isArray(data) && data.length === 0)) {
         throw new Error("No hay datos para exportar");
       }
@@ -70,7 +87,7 @@ class GenericExportController {
             prefix = keys[0].toLowerCase().replace(/[^a-z0-9]/g, "_");
           }
         }
-        filename = `${prefix}_${timestamp}.xlsx`;
+        filename = `${prefix}_${timestamp}.${formato}`;
       }
 
       const outputPath = path.join(outputDir, filename);
@@ -92,11 +109,53 @@ class GenericExportController {
         throw new Error("Script de exportación no encontrado");
       }
 
+      // Si el cliente envía un jobId, retransmitir el progreso por Socket.IO
+      const notifyUser = req.app && req.app.get("notifyUser");
+      const onProgress =
+        options.jobId && req.user && notifyUser
+          ? (progreso) =>
+              notifyUser(req.user.id, "job:progress", {
+                jobId: options.jobId,
+                progress: progreso.porcentaje,
+                ...progreso,
+              })
+          : null;
+
+      // Opciones de fragmentación para exportaciones grandes
+      const argsFragmentos = [
+        ...(options.particion ? ["--particion", options.particion] : []),
+        ...(options.maxFilas ? ["--max-filas", String(options.maxFilas)] : []),
+        ...(options.maxMb ? ["--max-mb", String(options.maxMb)] : []),
+      ];
+
+      // Con options.zip el zip se envía al cliente mientras se generan los
+      // fragmentos, en lugar de esperar a que el script termine. Los headers
+      // solo salen con el primer byte del zip: si el script falla antes, la
+      // respuesta todavía puede ser un error
+      let salidaZip = null;
+      if (options.zip) {
+        const nombreZip = `${path.basename(filename, path.extname(filename))}.zip`;
+        res.setHeader("Content-Type", CONTENT_TYPE_ZIP);
+        res.setHeader(
+          "Content-Disposition",
+          `attachment; filename="${nombreZip}"`
+        );
+        salidaZip = res;
+        argsFragmentos.push("--zip");
+      }
+
       // Ejecutar el script Python con los datos
       const result = await GenericExportController._executeScript(scriptPath, [
         tempFilePath,
         outputPath,
-      ]);
+        "--format",
+        formato,
+        "--tipo",
+        options.tipo || "auto",
+        ...(options.titulo ? ["--titulo", options.titulo] : []),
+        ...(options.detalles ? ["--detalles"] : []),
+        ...argsFragmentos,
+      ], { onProgress, salidaZip });
 
       if (!result.success) {
         throw new Error(
@@ -109,25 +168,58 @@ class GenericExportController {
         console.warn("El script completó con advertencias:", result.output);
       }
 
+      // El zip ya se envió por el pipe; solo queda cerrar la respuesta
+      if (salidaZip) {
+        res.end();
+        return;
+      }
+
+      // El script ajusta la extensión al formato (o genera un zip si dividió
+      // la exportación o incluyó tablas de detalle en CSV/Parquet/Arrow), usar
+      // la ruta que reporta: es el único archivo que deja en el directorio
+      const generatedPath = result.outputPath || outputPath;
+      const esZip = path.extname(generatedPath).toLowerCase() === ".zip";
+
       res.setHeader(
         "Content-Type",
-        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        esZip ? CONTENT_TYPE_ZIP : FORMATOS_EXPORTACION[formato]
       );
       res.setHeader(
         "Content-Disposition",
-        'attachment; filename="liquidacion.xlsx"'
+        `attachment; filename="${path.basename(generatedPath)}"`
       );
   
       // Usar fs_regular en lugar de fs para createReadStream
-      const fileStream = fs_export.createReadStream(outputPath);  // Cambia tempFilePath por outputPath
+      const fileStream = fs_export.createReadStream(generatedPath);
       fileStream.pipe(res);
-  
-      // Eliminar el archivo Excel una vez enviado
-      fileStream.on("end", () => {
-        fs_export.unlinkSync(outputPath);  // Cambiar a outputPath y usar fs_regular
+
+      // Eliminar el archivo exportado una vez enviado, también si la lectura
+      // falla o el cliente cierra la conexión antes de terminar
+      const eliminarExportado = () =>
+        GenericExportController._eliminarArchivo(generatedPath);
+      fileStream.on("close", eliminarExportado);
+      fileStream.on("error", (error) => {
+        console.error("Error al enviar la exportación:", error);
+        res.destroy(error);
       });
+      res.on("close", () => fileStream.destroy());
     } catch (error) {
       console.error("Error en exportación a Excel:", error);
+
+      if (!res.headersSent) {
+        // Quitar los headers del zip que se prepararon para options.zip
+        res.removeHeader("Content-Type");
+        res.removeHeader("Content-Disposition");
+        res.status(500).json({
+          success: false,
+          message: error.message || "Error desconocido al exportar datos",
+        });
+      } else {
+        // Parte del zip ya salió con un 200: cortar la conexión para que el
+        // cliente vea la descarga incompleta en lugar de un zip truncado
+        res.destroy(error);
+      }
+
       return {
         success: false,
         message: error.message || "Error desconocido al exportar datos",
@@ -136,22 +228,82 @@ class GenericExportController {
     }
   }
 
+  /**
+   * Elimina un archivo generado por la exportación si todavía existe
+   *
+   * @param {string} ruta - Archivo a eliminar
+   * @private
+   */
+  static _eliminarArchivo(ruta) {
+    fs_export.unlink(ruta, (error) => {
+      if (error && error.code !== "ENOENT") {
+        console.warn(`No se pudo eliminar ${ruta}:`, error.message);
+      }
+    });
+  }
+
   /**
    * Ejecuta el script Python con los argumentos especificados
    *
    * @param {string} scriptPath - Ruta al script Python
    * @param {Array} args - Argumentos para el script
+   * @param {Object} [canales] - Canales adicionales del script
+   * @param {Function} [canales.onProgress] - Recibe cada registro de progreso
+   *   ({ etapa, filas, total, porcentaje, hoja, bytes }). El progreso viaja por
+   *   el descriptor 3, así stdout sigue terminando con la ruta del archivo.
+   * @param {stream.Writable} [canales.salidaZip] - Destino del zip, que el
+   *   script escribe por el descriptor 4 a medida que termina cada fragmento
    * @returns {Promise<Object>} - Resultado de la ejecución
    * @private
    */
-  static _executeScript(scriptPath, args) {
+  static _executeScript(scriptPath, args, { onProgress = null, salidaZip = null } = {}) {
     return new Promise((resolve) => {
-      // Crear proceso Python
-      const pythonProcess = spawn("python", [scriptPath, ...args]);
+      // Crear proceso Python con pipes extra para progreso (fd 3) y zip (fd 4)
+      const argsCanales = [
+        ...(onProgress ? ["--progress-fd", "3"] : []),
+        ...(salidaZip ? ["--zip-fd", "4"] : []),
+      ];
+      const pythonProcess = spawn("python", [scriptPath, ...args, ...argsCanales], {
+        stdio: ["pipe", "pipe", "pipe", onProgress ? "pipe" : "ignore", salidaZip ? "pipe" : "ignore"],
+      });
+
+      if (salidaZip) {
+        // Sin end: la respuesta se cierra solo si el script termina bien
+        const canalZip = pythonProcess.stdio[4];
+        canalZip.pipe(salidaZip, { end: false });
+        canalZip.on("error", (error) => {
+          console.error("Error en el canal del zip:", error);
+        });
+
+        // Si el cliente se desconecta, no seguir generando fragmentos
+        const detenerScript = () => {
+          if (pythonProcess.exitCode === null && pythonProcess.signalCode === null) {
+            pythonProcess.kill();
+          }
+        };
+        salidaZip.on("close", detenerScript);
+        salidaZip.on("error", detenerScript);
+      }
 
       let stdoutData = "";
       let stderrData = "";
 
+      if (onProgress) {
+        let pendiente = "";
+        pythonProcess.stdio[3].on("data", (data) => {
+          const lineas = (pendiente + data.toString()).split("\n");
+          pendiente = lineas.pop();
+          for (const linea of lineas) {
+            if (!linea.trim()) continue;
+            try {
+              onProgress(JSON.parse(linea));
+            } catch (error) {
+              console.warn("Registro de progreso inválido:", linea);
+            }
+          }
+        });
+      }
+
       // Capturar la salida estándar
       pythonProcess.stdout.on("data", (data) => {
         stdoutData += data.toString();
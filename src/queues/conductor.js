@@ -9,6 +9,7 @@ const { uploadProcessedDocumentsConductor, saveTemporaryDocument } = require('..
 const fs = require('fs').promises;
 const { redisClient } = require('../config/redisClient');
 const axios = require('axios');
+const { spawn } = require('child_process');
 const FormData = require('form-data');
 const { notificarGlobal, notifyUser } = require('../utils/notificar');
 const { procesarDatosOCRConMinistral } = require('../services/ministralConductor');
@@ -151,6 +152,80 @@ async function ejecutarOCR(archivo) {
   }
 }
 
+// Categorías que los procesadores por reglas pueden resolver sin la IA
+const CATEGORIAS_CON_REGLAS = ['CEDULA', 'LICENCIA', 'CONTRATO'];
+
+// ✅ FUNCIÓN PARA EXTRAER CON REGLAS Y EVALUAR COMPLETITUD (GLOBAL)
+async function evaluarCompletitudConReglas(ocrData, categoria, parametros = {}) {
+  return new Promise((resolve, reject) => {
+    const args = ['./src/scripts/ocrCompleteness.py', `--categoria=${categoria}`, '--stdin'];
+    if (parametros.numero_identificacion) {
+      args.push(`--numero_identificacion=${parametros.numero_identificacion}`);
+    }
+    if (parametros.fecha_nacimiento) {
+      args.push(`--fecha_nacimiento=${parametros.fecha_nacimiento}`);
+    }
+
+    const pythonProcess = spawn('python', args);
+    let stdoutData = '';
+    let stderrData = '';
+
+    pythonProcess.stdout.on('data', (data) => {
+      stdoutData += data.toString();
+    });
+
+    pythonProcess.stderr.on('data', (data) => {
+      stderrData += data.toString();
+    });
+
+    pythonProcess.on('close', (code) => {
+      try {
+        const resultado = JSON.parse(stdoutData);
+        if (code !== 0 || resultado.error) {
+          reject(new Error(resultado.error || `Script falló con código ${code}: ${stderrData}`));
+        } else {
+          resolve(resultado);
+        }
+      } catch (error) {
+        reject(new Error(`Error al parsear resultado de ocrCompleteness.py (${categoria}): ${error.message}`));
+      }
+    });
+
+    pythonProcess.on('error', (error) => {
+      reject(new Error(`Error al iniciar script: ${error.message}`));
+    });
+
+    pythonProcess.stdin.on('error', (error) => {
+      logger.warn(`No se pudieron enviar los datos OCR a ocrCompleteness.py: ${error.message}`);
+    });
+    pythonProcess.stdin.end(JSON.stringify(ocrData), 'utf8');
+  });
+}
+
+// ✅ FUNCIÓN PARA EXTRAER DATOS: REGLAS PRIMERO, IA SOLO PARA LO QUE FALTE (GLOBAL)
+async function extraerDatosDocumento(ocrData, categoria, parametros = {}) {
+  if (CATEGORIAS_CON_REGLAS.includes(categoria)) {
+    try {
+      const evaluacion = await evaluarCompletitudConReglas(ocrData, categoria, parametros);
+
+      if (evaluacion.suficiente) {
+        logger.info(`⚡ ${categoria} resuelto con reglas en ${evaluacion.ms} ms, sin llamar a la IA`);
+        return evaluacion.datos;
+      }
+
+      logger.info(`🤖 ${categoria}: las reglas no resolvieron ${evaluacion.faltantes.join(', ')}; se piden a la IA`);
+      const datosMinistral = await procesarDatosOCRConMinistral(ocrData, categoria, null, evaluacion.faltantes);
+
+      // Los campos aceptados por las reglas se conservan; la IA completa el resto
+      return { ...datosMinistral, ...evaluacion.datos };
+    } catch (error) {
+      logger.warn(`Extracción por reglas falló para ${categoria}: ${error.message}. Se usa la IA completa`);
+    }
+  }
+
+  return procesarDatosOCRConMinistral(ocrData, categoria);
+}
+
 // ✅ FUNCIÓN PARA MANEJO DE ERRORES (GLOBAL)
 async function handleProcessingError(userId, sessionId, socketId, errorMessage, errorType, tipoOperacion = 'creacion', conductor = null) {
   try {
@@ -329,8 +404,9 @@ function inicializarProcesadoresConductorMinistral() {
 
       const datosEstructurados = {};
 
-      // Procesar cada documento con Ministral
-      for (const categoria of categorias) {
+      // Procesar cada documento (la cédula primero: licencia y contrato se validan con sus datos)
+      const categoriasOrdenadas = [...categorias].sort((a, b) => (b === 'CEDULA') - (a === 'CEDULA'));
+      for (const categoria of categoriasOrdenadas) {
         if (datosDocumentos[categoria]) {
           try {
             if (categoria === 'FOTO_PERFIL') {
@@ -338,9 +414,14 @@ function inicializarProcesadoresConductorMinistral() {
               continue;
             }
 
-            const datosMinistral = await procesarDatosOCRConMinistral(
+            // La licencia y el contrato se validan contra la cédula ya extraída
+            const datosMinistral = await extraerDatosDocumento(
               datosDocumentos[categoria],
-              categoria
+              categoria,
+              {
+                numero_identificacion: datosEstructurados.CEDULA?.numero_identificacion,
+                fecha_nacimiento: datosEstructurados.CEDULA?.fecha_nacimiento
+              }
             );
 
             datosEstructurados[categoria] = datosMinistral;
@@ -1113,9 +1194,13 @@ conductorActualizacionQueueMinistral.process('actualizar-conductor-ministral', a
 
           // ✅ PROCESAR OTROS DOCUMENTOS CON MINISTRAL NORMALMENTE
           logger.info(`🤖 Procesando ${categoria} con IA para extraer datos...`);
-          const datosMinistral = await procesarDatosOCRConMinistral(
+          const datosMinistral = await extraerDatosDocumento(
             datosDocumentos[categoria],
-            categoria
+            categoria,
+            {
+              numero_identificacion: conductorExistente.numero_identificacion,
+              fecha_nacimiento: conductorExistente.fecha_nacimiento
+            }
           );
 
           datosEstructurados[categoria] = datosMinistral;
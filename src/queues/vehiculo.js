@@ -88,24 +88,31 @@ async function waitForOcrResult(operationLocation, subscriptionKey) {
 
 /**
  * Ejecuta un script Python para procesar datos OCR
-
+ * El JSON se escribe compacto por stdin (--stdin), sin pasar por un archivo temporal
+ * @param {object} ocrData - Datos del OCR
  * @param {string|null} placa - Placa del vehículo (opcional)
+ * @param {string[]|null} campos - Campos a extraer (opcional, por defecto todos)
  * @returns {Promise<object>} - Resultado del procesamiento
  */
-async function runOcrScript(filePath, placa = null) {
+async function runOcrScript(ocrData, placa = null, campos = null) {
   return new Promise((resolve, reject) => {
     // Registrar inicio de ejecución
     logger.info(`Ejecutando script ${"ocrTARJETA_DE_PROPIEDAD.py"} para categoría ${"TARJETA_DE_PROPIEDAD"}${placa ? ` con placa ${placa}` : ''}`);
 
     // Configurar argumentos del script
-    // Pasamos el path del archivo como argumento explícito
-    const args = [`./src/scripts/ocrTARJETA_DE_PROPIEDAD.py`, `--file=${filePath}`];
+    // Los datos OCR llegan por stdin en lugar de un archivo
+    const args = [`./src/scripts/ocrTARJETA_DE_PROPIEDAD.py`, '--stdin'];
 
     // Si hay placa, la añadimos como argumento adicional
     if (placa) {
       args.push(`--placa=${placa}`);
     }
 
+    // Si solo se necesitan algunos campos, el script ejecuta únicamente sus extractores
+    if (campos && campos.length) {
+      args.push(`--fields=${campos.join(',')}`);
+    }
+
     logger.debug(`Ejecutando script con argumentos: ${args.join(' ')}`);
 
     const pythonProcess = spawn('python', args);
@@ -143,54 +150,29 @@ async function runOcrScript(filePath, placa = null) {
       logger.error(`Error al iniciar script ${"ocrTARJETA_DE_PROPIEDAD.py"}: ${error.message}`);
       reject(new Error(`Error al iniciar script: ${error.message}`));
     });
+
+    // Si el script termina antes de leer todo (EPIPE), el error llega por 'close'
+    pythonProcess.stdin.on('error', (error) => {
+      logger.warn(`No se pudieron enviar los datos OCR al script: ${error.message}`);
+    });
+
+    // JSON compacto: sin la indentación que inflaba el archivo temporal
+    pythonProcess.stdin.end(JSON.stringify(ocrData), 'utf8');
   });
 }
 
 /**
- * Procesa datos OCR con archivo temporal
+ * Procesa datos OCR enviándolos al script por stdin
  * @param {object} ocrData - Datos del OCR
  * @param {string|null} placa - Placa del vehículo (opcional)
+ * @param {string[]|null} campos - Campos a extraer (opcional, por defecto todos)
  * @returns {Promise<object>} - Resultado del procesamiento
  */
-async function procesarConArchivoTemporal(ocrData, placa = null) {
-  const uniqueId = uuidv4().substring(0, 8); // Identificador único para evitar colisiones
-  const dirPath = path.join(__dirname, '..', '..', 'temp');
-  const filePath = path.join(dirPath, `tempOcrData_${"TARJETA_DE_PROPIEDAD"}_${uniqueId}.json`);
-
+async function procesarDatosOcr(ocrData, placa = null, campos = null) {
   try {
-    // Crear directorio si no existe
-    await fs.mkdir(dirPath, { recursive: true });
-
-    // Guardar datos OCR en formato JSON
-    await fs.writeFile(filePath, JSON.stringify(ocrData, null, 2), 'utf8');
-    logger.debug(`Archivo temporal creado: ${filePath}`);
-
-    // Ejecutar script Python
-    const resultado = await runOcrScript(filePath, placa);
-
-    // Eliminar archivo temporal después de usarlo
-    try {
-      await fs.unlink(filePath);
-      logger.debug(`Archivo temporal eliminado: ${filePath}`);
-    } catch (unlinkError) {
-      logger.warn(`No se pudo eliminar el archivo temporal ${filePath}: ${unlinkError.message}`);
-    }
-
-    return resultado;
-
+    return await runOcrScript(ocrData, placa, campos);
   } catch (error) {
-    // Intentar eliminar el archivo temporal incluso si ocurrió un error
-    try {
-      const fileExists = await fs.access(filePath).then(() => true).catch(() => false);
-      if (fileExists) {
-        await fs.unlink(filePath);
-        logger.debug(`Archivo temporal eliminado después de error: ${filePath}`);
-      }
-    } catch (unlinkError) {
-      logger.warn(`No se pudo eliminar el archivo temporal en manejo de error: ${unlinkError.message}`);
-    }
-
-    logger.error(`Error al procesar archivo temporal para TARJETA_DE_PROPIEDAD: ${error.message}`);
+    logger.error(`Error al procesar datos OCR para TARJETA_DE_PROPIEDAD: ${error.message}`);
     throw error;
   }
 }
@@ -613,7 +595,7 @@ function inicializarProcesadoresVehiculo() {
       const ocrData = await waitForOcrResult(operationLocation, subscriptionKey);
 
       // Procesar datos OCR
-      const datosExtraidos = await procesarConArchivoTemporal(ocrData);
+      const datosExtraidos = await procesarDatosOcr(ocrData);
 
       return datosExtraidos;
 
@@ -1,129 +1,615 @@
 #!/usr/bin/env python
+import numpy as np
 import pandas as pd
 import json
 import sys
 import os
+import csv
+import argparse
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, numbers
 from openpyxl.utils import get_column_letter
 
-def flatten_json(nested_json, prefix=''):
-    """
-    Aplana un objeto JSON anidado.
-    
-    Args:
-        nested_json (dict): Objeto JSON anidado
-        prefix (str): Prefijo para las claves anidadas
-        
-    Returns:
-        dict: Objeto JSON aplanado donde las claves anidadas se unen con '_'
-    """
-    flat_json = {}
-    
-    for key, value in nested_json.items():
-        new_key = f"{prefix}_{key}" if prefix else key
-        
-        if isinstance(value, dict):
-            # Recursivamente aplanar diccionarios anidados
-            flat_json.update(flatten_json(value, new_key))
-        elif isinstance(value, list):
-            # Convertir listas a formato string JSON
-            if value and isinstance(value[0], dict):
-                # Si es una lista de diccionarios, intentar extraer información clave
-                try:
-                    # Extraer campos importantes si existen en los diccionarios
-                    summary = []
-                    for item in value:
-                        if 'nombre' in item or 'name' in item:
-                            name = item.get('nombre', item.get('name', ''))
-                            value_field = item.get('valor', item.get('value', ''))
-                            summary.append(f"{name}: {value_field}")
-                        elif 'fecha' in item and 'valor' in item:
-                            summary.append(f"{item['fecha']}: {item['valor']}")
-                    
-                    if summary:
-                        flat_json[new_key] = "; ".join(summary)
-                    else:
-                        flat_json[new_key] = json.dumps(value, ensure_ascii=False)
-                except:
-                    # Si algo falla, simplemente convertir a JSON
-                    flat_json[new_key] = json.dumps(value, ensure_ascii=False)
-            else:
-                # Para listas simples, unir elementos
-                flat_json[new_key] = ", ".join(str(x) for x in value)
-        else:
-            # Valores simples
-            flat_json[new_key] = value
+class ReportadorProgreso:
+    """
+    Emite registros de progreso como líneas JSON en un descriptor dedicado
+    (--progress-fd), separado de stdout para que la última línea de la salida
+    estándar siga siendo únicamente la ruta del archivo generado.
+    
+    Los avances se limitan a uno cada `intervalo` segundos; los cambios de
+    etapa y el cierre se emiten siempre. Sin descriptor no hace nada.
+    """
+    
+    def __init__(self, fd=None, intervalo=0.5):
+        self.salida = os.fdopen(fd, 'w', buffering=1, encoding='utf-8') if fd is not None else None
+        self.intervalo = intervalo
+        self.total = 0
+        self.filas = 0
+        self.etapa = None
+        self.hoja = None
+        self._ultimo = 0.0
+    
+    def iniciar(self, total, etapa='procesando'):
+        """Reinicia el conteo para una nueva exportación de `total` filas"""
+        self.total = total
+        self.filas = 0
+        self.etapa = etapa
+        self.hoja = None
+        self._emitir()
+    
+    def cambiar_etapa(self, etapa, hoja=None, archivo=None):
+        """Registra el paso a otra etapa (ej: escribiendo, guardando)"""
+        self.etapa = etapa
+        self.hoja = hoja
+        self._emitir(archivo)
+    
+    def avance(self, filas=1, hoja=None, archivo=None):
+        """
+        Suma filas procesadas. `archivo` puede ser un archivo abierto o una ruta
+        y solo se consulta cuando efectivamente se emite un registro.
+        """
+        self.filas += filas
+        if hoja is not None:
+            self.hoja = hoja
+        if self.salida is None:
+            return
+        if time.monotonic() - self._ultimo >= self.intervalo:
+            self._emitir(archivo)
+    
+    def finalizar(self, output_path):
+        """Emite el registro final con el tamaño del archivo generado"""
+        self.etapa = 'completado'
+        self.filas = max(self.filas, self.total)
+        self._emitir(output_path)
+    
+    def _emitir(self, archivo=None):
+        if self.salida is None:
+            return
+        
+        registro = {
+            'etapa': self.etapa,
+            'filas': self.filas,
+            'total': self.total,
+            'porcentaje': round(min(self.filas, self.total) * 100 / self.total, 1) if self.total else 0,
+        }
+        if self.hoja is not None:
+            registro['hoja'] = self.hoja
+        
+        bytes_escritos = None
+        try:
+            if isinstance(archivo, str):
+                bytes_escritos = os.path.getsize(archivo)
+            elif archivo is not None:
+                bytes_escritos = archivo.tell()
+        except (OSError, ValueError):
+            pass
+        if bytes_escritos is not None:
+            registro['bytes'] = bytes_escritos
+        
+        try:
+            self.salida.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        except (BrokenPipeError, OSError):
+            # Si el proceso padre dejó de leer, la exportación continúa sin progreso
+            self.salida = None
+        self._ultimo = time.monotonic()
+
+# Reportador global: inactivo salvo que main() lo configure con --progress-fd
+progreso = ReportadorProgreso()
+
+# Los bucles por fila avisan el avance cada tantas filas y no en cada una:
+# aunque el reportador solo emite cada `intervalo`, la llamada por fila ya se
+# nota en exportaciones grandes
+FILAS_POR_AVANCE = 500
+
+def resumir_lista(value):
+    """
+    Convierte una lista en texto para una celda. Las listas de diccionarios se
+    resumen como "nombre: valor" o "fecha: valor"; si no, se serializan a JSON.
+    """
+    if not value:
+        return ""
+    
+    if isinstance(value[0], dict):
+        # Si es una lista de diccionarios, intentar extraer información clave
+        try:
+            summary = []
+            for item in value:
+                if 'nombre' in item or 'name' in item:
+                    name = item.get('nombre', item.get('name', ''))
+                    value_field = item.get('valor', item.get('value', ''))
+                    summary.append(f"{name}: {value_field}")
+                elif 'fecha' in item and 'valor' in item:
+                    summary.append(f"{item['fecha']}: {item['valor']}")
             
-    return flat_json
+            if summary:
+                return "; ".join(summary)
+        except (AttributeError, TypeError):
+            pass
+        return json.dumps(value, ensure_ascii=False, default=str)
+    
+    # Para listas simples, unir elementos
+    return ", ".join(str(x) for x in value)
 
-def custom_export_to_excel(json_array, output_path=None, company_name="Transmeralda"):
+class PlanAplanado:
     """
-    Exporta un array de liquidaciones a un archivo Excel con columnas personalizadas,
-    agrupando por periodo_end y creando una hoja diferente para cada mes
+    Plan compilado para aplanar registros JSON anidados.
+    
+    El esquema (rutas de claves -> índice de columna) se infiere una sola vez a
+    partir de una muestra de registros y se guarda como un árbol de claves.
+    Aplicar el plan recorre ese árbol de forma iterativa y llena una lista
+    preasignada, sin recursión ni diccionarios intermedios por registro.
+    Las claves que no aparecen en la muestra se ignoran y los diccionarios
+    vacíos no generan columna. Si dos rutas dan el mismo nombre ("a_b" y
+    a → b) la segunda se exporta como "a_b_2" en lugar de pisar a la primera.
     """
-    # Si no hay datos, retornamos None
-    if not json_array:
-        print("No hay datos para exportar")
-        return None
     
-    print(f"Procesando {len(json_array)} liquidaciones...")
+    def __init__(self, rutas):
+        self.rutas = [tuple(ruta) for ruta in rutas]
+        self.columnas = []
+        for ruta in self.rutas:
+            nombre = base = "_".join(str(k) for k in ruta)
+            sufijo = 2
+            while nombre in self.columnas:
+                nombre = f"{base}_{sufijo}"
+                sufijo += 1
+            self.columnas.append(nombre)
+        
+        # Árbol de claves: {clave: (indice_columna | None, subarbol | None)}
+        self.arbol = {}
+        for idx, ruta in enumerate(self.rutas):
+            nodo = self.arbol
+            for nivel, clave in enumerate(ruta):
+                col, hijos = nodo.get(clave, (None, None))
+                if nivel == len(ruta) - 1:
+                    nodo[clave] = (idx, hijos)
+                else:
+                    if hijos is None:
+                        hijos = {}
+                    nodo[clave] = (col, hijos)
+                    nodo = hijos
     
-    # Agrupar las liquidaciones por periodo_end
-    liquidaciones_por_periodo = {}
+    @classmethod
+    def inferir(cls, registros, muestra=500):
+        """Infiere las rutas de columnas a partir de los primeros `muestra` registros"""
+        rutas = {}
+        
+        for n, registro in enumerate(registros):
+            if n >= muestra:
+                break
+            if not isinstance(registro, dict):
+                continue
+            
+            # Recorrido en preorden con una pila de iteradores (sin recursión)
+            pila = [((), iter(registro.items()))]
+            while pila:
+                prefijo, items = pila[-1]
+                for clave, valor in items:
+                    ruta = prefijo + (clave,)
+                    if isinstance(valor, dict):
+                        if valor:
+                            pila.append((ruta, iter(valor.items())))
+                            break
+                        continue
+                    rutas.setdefault(ruta, None)
+                else:
+                    pila.pop()
+        
+        # Conservar el orden de aparición agrupando por la primera clave
+        orden_raiz = {}
+        for ruta in rutas:
+            orden_raiz.setdefault(ruta[0], len(orden_raiz))
+        ordenadas = sorted(rutas, key=lambda r: orden_raiz[r[0]])
+        
+        return cls(ordenadas)
     
-    # Mapeo de números de mes a nombres en español
-    meses_espanol = {
-        1: "ENERO", 2: "FEBRERO", 3: "MARZO", 4: "ABRIL", 5: "MAYO", 6: "JUNIO",
-        7: "JULIO", 8: "AGOSTO", 9: "SEPTIEMBRE", 10: "OCTUBRE", 11: "NOVIEMBRE", 12: "DICIEMBRE"
-    }
+    def aplicar(self, registro):
+        """Aplana un registro y devuelve la fila con el orden de `columnas`"""
+        fila = [None] * len(self.columnas)
+        if not isinstance(registro, dict):
+            return fila
+        
+        pila = [(self.arbol, registro)]
+        while pila:
+            arbol, nodo = pila.pop()
+            for clave, (col, hijos) in arbol.items():
+                valor = nodo.get(clave)
+                if valor is None:
+                    continue
+                if isinstance(valor, dict):
+                    if hijos is not None:
+                        pila.append((hijos, valor))
+                    if col is not None and valor:
+                        fila[col] = json.dumps(valor, ensure_ascii=False, default=str)
+                elif col is not None:
+                    fila[col] = resumir_lista(valor) if isinstance(valor, list) else valor
+        
+        return fila
+
+# Mapeo de números de mes a nombres en español
+MESES_ESPANOL = {
+    1: "ENERO", 2: "FEBRERO", 3: "MARZO", 4: "ABRIL", 5: "MAYO", 6: "JUNIO",
+    7: "JULIO", 8: "AGOSTO", 9: "SEPTIEMBRE", 10: "OCTUBRE", 11: "NOVIEMBRE", 12: "DICIEMBRE"
+}
+
+# Columnas de la liquidación en el orden en que se exportan
+COLUMNAS_LIQUIDACION = [
+    'Indice', 'Conductor', 'Identificación', 'Cargo', 'Lugar de Trabajo', 'Novedad',
+    'Salario Base', 'Fecha Ingreso', 'Fecha Retiro', 'Días Laborados', 'Salario Devengado',
+    'Auxilio Transporte', 'Valor a Liquidar', 'Salud', 'Pensión', 'Total Deducciones',
+    'Anticipos', 'Total a Pagar Básico'
+]
+
+COLUMNAS_MONETARIAS = [
+    'Salario Base', 'Salario Devengado', 'Auxilio Transporte', 'Valor a Liquidar', 'Salud',
+    'Pensión', 'Total Deducciones', 'Anticipos', 'Total a Pagar Básico'
+]
+
+# Filas máximas de una hoja de Excel, dejando espacio para título, encabezados y totales
+LIMITE_FILAS_HOJA = 1048576 - 16
+
+# Formatos de salida soportados y su extensión
+FORMATOS_EXPORTACION = {
+    'xlsx': '.xlsx',
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+    'ods': '.ods',
+}
+
+def periodo_de(item):
+    """
+    Devuelve el periodo de una liquidación a partir de periodo_end
+    (ej: "SEPTIEMBRE 2025") o "SIN FECHA" si no tiene una fecha válida
+    """
+    periodo_end = item.get('periodo_end', '')
+    
+    if periodo_end:
+        try:
+            # Convertir la fecha a objeto datetime para extraer mes y año
+            fecha_obj = datetime.strptime(periodo_end, "%Y-%m-%d")
+            return f"{MESES_ESPANOL[fecha_obj.month]} {fecha_obj.year}"
+        except ValueError:
+            # Si hay problemas con el formato de fecha, usar "SIN FECHA"
+            pass
+    
+    return "SIN FECHA"
+
+def agrupar_por_periodo(json_array):
+    """
+    Agrupa las liquidaciones por mes de periodo_end (ej: "SEPTIEMBRE 2025").
+    Las liquidaciones sin fecha o con fecha inválida quedan en "SIN FECHA".
+    """
+    liquidaciones_por_periodo = {}
     
     for item in json_array:
-        # Extraer y formatear la fecha de periodo_end
-        periodo_end = item.get('periodo_end', '')
-        
-        print(item)
-        
-        if periodo_end:
-            try:
-                # Convertir la fecha a objeto datetime para extraer mes y año
-                fecha_obj = datetime.strptime(periodo_end, "%Y-%m-%d")
-                mes = fecha_obj.month
-                anio = fecha_obj.year
-                # Crear clave para agrupar (ej: "SEPTIEMBRE 2025")
-                periodo_key = f"{meses_espanol[mes]} {anio}"
-                
-                print(periodo_key)
-                
-                # Añadir a la lista correspondiente
-                if periodo_key not in liquidaciones_por_periodo:
-                    liquidaciones_por_periodo[periodo_key] = []
-                
-                liquidaciones_por_periodo[periodo_key].append(item)
-            except ValueError:
-                # Si hay problemas con el formato de fecha, usar "SIN FECHA"
-                if "SIN FECHA" not in liquidaciones_por_periodo:
-                    liquidaciones_por_periodo["SIN FECHA"] = []
-                liquidaciones_por_periodo["SIN FECHA"].append(item)
+        liquidaciones_por_periodo.setdefault(periodo_de(item), []).append(item)
+    
+    return liquidaciones_por_periodo
+
+def construir_fila(item, idx):
+    """
+    Construye la fila exportada de una liquidación con sus valores derivados.
+    Es la única proyección usada por todos los formatos de salida.
+    """
+    # Extraer datos del conductor
+    conductor = item.get('conductor', {})
+    nombre_completo = f"{conductor.get('nombre', '')} {conductor.get('apellido', '')}"
+    
+    # Calcular valores derivados
+    salario_devengado = float(item.get('salario_devengado', 0))
+    auxilio_transporte = float(item.get('auxilio_transporte', 0))
+    salud = float(item.get('salud', 0))
+    pension = float(item.get('pension', 0))
+    total_anticipos = float(item.get('total_anticipos', 0))
+    
+    valor_a_liquidar = salario_devengado + auxilio_transporte
+    total_deducciones = salud + pension
+    total_a_pagar = valor_a_liquidar - total_deducciones
+    
+    novedad = item.get('observaciones', 'No especificada')
+        
+    # Verificar si el conductor es recién ingresado
+    if conductor.get('fecha_ingreso'):
+        try:
+            fecha_ingreso = datetime.strptime(conductor.get('fecha_ingreso'), '%Y-%m-%d')
+            fecha_inicio_liquidacion = datetime.strptime(item.get('periodo_start', '1900-01-01'), '%Y-%m-%d')
+            fecha_fin_liquidacion = datetime.strptime(item.get('periodo_end', '2999-12-31'), '%Y-%m-%d')
+            
+            # Verificar si la fecha de ingreso cae dentro del período de liquidación
+            if fecha_inicio_liquidacion <= fecha_ingreso <= fecha_fin_liquidacion:
+                novedad = "Recién ingresado"
+        except (ValueError, TypeError) as e:
+            print(f"Error al procesar fecha de ingreso: {e}")
+    
+    # Verificar si el conductor tuvo vacaciones en este período
+    if item.get('periodo_start_vacaciones') and item.get('periodo_end_vacaciones'):
+        # Si ya tenía una novedad, añadimos "Vacaciones", de lo contrario, asignamos "Vacaciones"
+        if novedad != 'No especificada' and novedad:
+            novedad += "; Vacaciones"
         else:
-            # Para liquidaciones sin periodo_end
-            if "SIN FECHA" not in liquidaciones_por_periodo:
-                liquidaciones_por_periodo["SIN FECHA"] = []
-            liquidaciones_por_periodo["SIN FECHA"].append(item)
+            novedad = "Vacaciones"
+    
+    # Crear fila con los datos requeridos
+    return {
+        'Indice': idx + 1,
+        'Conductor': nombre_completo,
+        'Identificación': conductor.get('numero_identificacion', ''),
+        'Cargo': "Conductor",
+        'Lugar de Trabajo': conductor.get('sede_trabajo', 'No especificado'),
+        'Novedad': novedad,
+        'Salario Base': conductor.get('salario_base', 0),
+        'Fecha Ingreso': conductor.get('fecha_ingreso', ''),
+        'Fecha Retiro': conductor.get('fecha_retiro', ''),
+        'Días Laborados': item.get('dias_laborados', 0),
+        'Salario Devengado': salario_devengado,
+        'Auxilio Transporte': auxilio_transporte,
+        'Valor a Liquidar': valor_a_liquidar,
+        'Salud': salud,
+        'Pensión': pension,
+        'Total Deducciones': total_deducciones,
+        'Anticipos': total_anticipos,
+        'Total a Pagar Básico': total_a_pagar
+    }
+
+def iterar_filas(liquidaciones_por_periodo):
+    """
+    Genera (periodo, fila) en el mismo orden que las hojas del Excel:
+    periodos en orden alfabético y liquidaciones en su orden original.
+    """
+    for periodo in sorted(liquidaciones_por_periodo):
+        for idx, item in enumerate(liquidaciones_por_periodo[periodo]):
+            yield periodo, construir_fila(item, idx)
+
+def preparar_ruta_salida(output_path, formato, prefijo="liquidaciones_nomina"):
+    """
+    Genera la ruta de salida si no se especificó, ajusta la extensión al formato
+    y asegura que el directorio exista
+    """
+    extension = '.zip' if formato == 'zip' else FORMATOS_EXPORTACION[formato]
     
     # Si no se especifica ruta, generamos una con timestamp
     if not output_path:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_path = f"liquidaciones_nomina_{timestamp}.xlsx"
-    
-    print(f"Generando archivo Excel en: {output_path}")
+        output_path = f"{prefijo}_{timestamp}{extension}"
+    else:
+        base, ext_actual = os.path.splitext(output_path)
+        if ext_actual.lower() != extension:
+            output_path = f"{base}{extension}"
     
     # Asegurar que el directorio existe
     dir_path = os.path.dirname(os.path.abspath(output_path))
     if dir_path:
         os.makedirs(dir_path, exist_ok=True)
     
+    return output_path
+
+def _valor_ruta(item, *claves):
+    """Obtiene un valor anidado (ej: recargo.empresa.nombre) o None"""
+    valor = item
+    for clave in claves:
+        if not isinstance(valor, dict):
+            return None
+        valor = valor.get(clave)
+    return valor
+
+def _cantidad_total(item):
+    """Suma las cantidades del campo `values` de bonificaciones y mantenimientos"""
+    values = item.get('values') or []
+    if isinstance(values, str):
+        try:
+            values = json.loads(values)
+        except ValueError:
+            return 0
+    return sum(_a_float(v.get('quantity')) or 0 for v in values if isinstance(v, dict))
+
+def _valor_total(item):
+    """Cantidad total por valor unitario"""
+    return _cantidad_total(item) * (_a_float(item.get('value')) or 0)
+
+# Tablas de detalle: lista anidada -> (nombre de hoja, [(columna, extractor)])
+DETALLES_LIQUIDACION = {
+    'anticipos': ("DETALLE ANTICIPOS", [
+        ('Fecha', lambda d: d.get('fecha')),
+        ('Concepto', lambda d: d.get('concepto')),
+        ('Valor', lambda d: _a_float(d.get('valor'))),
+    ]),
+    'bonificaciones': ("DETALLE BONIFICACIONES", [
+        ('Bonificación', lambda d: d.get('name')),
+        ('Placa', lambda d: _valor_ruta(d, 'vehiculo', 'placa')),
+        ('Cantidad', _cantidad_total),
+        ('Valor Unitario', lambda d: _a_float(d.get('value'))),
+        ('Valor Total', _valor_total),
+    ]),
+    'recargos': ("DETALLE RECARGOS", [
+        ('Empresa', lambda d: _valor_ruta(d, 'empresa', 'nombre')),
+        ('Placa', lambda d: _valor_ruta(d, 'vehiculo', 'placa')),
+        ('Mes', lambda d: d.get('mes')),
+        ('Pagado por Cliente', lambda d: d.get('pag_cliente')),
+        ('Valor', lambda d: _a_float(d.get('valor'))),
+    ]),
+    'mantenimientos': ("DETALLE MANTENIMIENTOS", [
+        ('Placa', lambda d: _valor_ruta(d, 'vehiculo', 'placa')),
+        ('Cantidad', _cantidad_total),
+        ('Valor Unitario', lambda d: _a_float(d.get('value'))),
+        ('Valor Total', _valor_total),
+    ]),
+}
+
+COLUMNAS_CLAVE_DETALLE = ['Liquidación', 'Periodo', 'Conductor', 'Identificación']
+
+COLUMNAS_MONETARIAS_DETALLE = ['Valor', 'Valor Unitario', 'Valor Total']
+
+def explotar_detalles(json_array, tablas=None):
+    """
+    Explota las listas anidadas de cada liquidación en tablas de detalle
+    normalizadas, en una sola pasada sobre los datos.
+    
+    Devuelve {tabla: {columna: [valores]}} en formato columnar. Cada fila lleva
+    el id de la liquidación, su periodo y el conductor como clave.
+    """
+    tablas = list(tablas or DETALLES_LIQUIDACION)
+    resultado = {}
+    extractores = {}
+    
+    for tabla in tablas:
+        _, columnas = DETALLES_LIQUIDACION[tabla]
+        resultado[tabla] = {col: [] for col in COLUMNAS_CLAVE_DETALLE + [c for c, _ in columnas]}
+        extractores[tabla] = [(resultado[tabla][c], f) for c, f in columnas]
+    
+    for item in json_array:
+        hijos_por_tabla = [(tabla, item.get(tabla)) for tabla in tablas]
+        if not any(hijos for _, hijos in hijos_por_tabla):
+            continue
+        
+        # La clave se calcula una vez por liquidación y se replica por cada hijo
+        conductor = item.get('conductor') or {}
+        clave = (
+            item.get('id'),
+            periodo_de(item),
+            f"{conductor.get('nombre', '')} {conductor.get('apellido', '')}".strip(),
+            conductor.get('numero_identificacion', ''),
+        )
+        
+        for tabla, hijos in hijos_por_tabla:
+            if not hijos:
+                continue
+            columnas = resultado[tabla]
+            for col, valor in zip(COLUMNAS_CLAVE_DETALLE, clave):
+                columnas[col].extend([valor] * len(hijos))
+            for destino, extractor in extractores[tabla]:
+                destino.extend(extractor(hijo) if isinstance(hijo, dict) else None for hijo in hijos)
+    
+    return resultado
+
+def _escribir_hoja_detalle(wb, titulo, columnas):
+    """Agrega al libro una hoja con una tabla de detalle en formato columnar"""
+    ws = wb.create_sheet(title=titulo[:31])
+    encabezados = list(columnas)
+    total_filas = len(columnas[encabezados[0]]) if encabezados else 0
+    
+    header_font = Font(size=12, bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="006B3C", end_color="006B3C", fill_type="solid")
+    header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+    
+    for col_idx, header in enumerate(encabezados, 1):
+        cell = ws.cell(row=1, column=col_idx, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        ws.column_dimensions[get_column_letter(col_idx)].width = 40 if header == 'Conductor' else 20
+    
+    for col_idx, header in enumerate(encabezados, 1):
+        es_moneda = header in COLUMNAS_MONETARIAS_DETALLE
+        for row_idx, value in enumerate(columnas[header], 2):
+            cell = ws.cell(row=row_idx, column=col_idx, value=value)
+            if es_moneda:
+                cell.number_format = '"$"#,##0'
+    
+    ws.freeze_panes = "A2"
+    if total_filas:
+        ws.auto_filter.ref = f"A1:{get_column_letter(len(encabezados))}{total_filas + 1}"
+    
+    return ws
+
+def exportar_detalles_archivos(json_array, output_path, formato, tablas=None):
+    """
+    Para formatos de una sola tabla (CSV, Parquet, Arrow) escribe cada tabla de
+    detalle en un archivo hermano: <base>_<tabla>.<ext>. Devuelve las rutas.
+    """
+    detalles = explotar_detalles(json_array, tablas)
+    base, extension = os.path.splitext(output_path)
+    rutas = []
+    
+    try:
+        for tabla, columnas in detalles.items():
+            ruta = f"{base}_{tabla}{extension}"
+            rutas.append(ruta)
+            if formato == 'csv':
+                with open(ruta, 'w', newline='', encoding='utf-8-sig') as file:
+                    writer = csv.writer(file)
+                    writer.writerow(list(columnas))
+                    writer.writerows(zip(*columnas.values()))
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                
+                # Las columnas ya están en formato columnar: se pasan directo a Arrow
+                table = pa.table({
+                    col: pa.array([_a_texto(v) for v in valores]) if col in COLUMNAS_CLAVE_DETALLE else pa.array(valores)
+                    for col, valores in columnas.items()
+                })
+                if formato == 'parquet':
+                    pq.write_table(table, ruta, compression='snappy')
+                else:
+                    with pa.ipc.new_file(ruta, table.schema) as writer:
+                        writer.write_table(table)
+            
+            print(f"Detalle exportado: {ruta}")
+    except Exception:
+        # No dejar tablas sueltas de una exportación que falló
+        _eliminar_archivos(rutas)
+        raise
+    
+    return rutas
+
+def _eliminar_archivos(rutas):
+    for ruta in rutas:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+def empaquetar_archivos(rutas, output_path, formato):
+    """
+    Reúne en un zip (misma base que `output_path`) el archivo principal y sus
+    tablas de detalle, y elimina los archivos sueltos: el cliente recibe una
+    sola descarga y en exports/ no queda nada más que el zip. Devuelve su ruta.
+    """
+    zip_path = preparar_ruta_salida(output_path, 'zip')
+    # Los formatos ya comprimidos se guardan sin volver a comprimir
+    compresion = zipfile.ZIP_DEFLATED if formato == 'csv' else zipfile.ZIP_STORED
+    try:
+        with zipfile.ZipFile(zip_path, 'w', compression=compresion) as archivo_zip:
+            for ruta in rutas:
+                archivo_zip.write(ruta, arcname=os.path.basename(ruta))
+    except Exception:
+        _eliminar_archivos([zip_path])
+        raise
+    finally:
+        _eliminar_archivos(rutas)
+    
+    print(f"Exportación con detalles empaquetada en: {zip_path}")
+    return zip_path
+
+def custom_export_to_excel(json_array, output_path=None, company_name="Transmeralda", detalles=False):
+    """
+    Exporta un array de liquidaciones a un archivo Excel con columnas personalizadas,
+    agrupando por periodo_end y creando una hoja diferente para cada mes.
+    Con `detalles` agrega hojas con anticipos, bonificaciones, recargos y
+    mantenimientos de todas las liquidaciones.
+    """
+    # Si no hay datos, retornamos None
+    if not json_array:
+        print("No hay datos para exportar")
+        return None
+    
+    print(f"Procesando {len(json_array)} liquidaciones...")
+    
+    # Agrupar las liquidaciones por periodo_end
+    liquidaciones_por_periodo = agrupar_por_periodo(json_array)
+    
+    output_path = preparar_ruta_salida(output_path, 'xlsx')
+    
+    print(f"Generando archivo Excel en: {output_path}")
+    progreso.iniciar(len(json_array))
+    
     # Crear un nuevo libro de Excel
     wb = Workbook()
     
@@ -139,71 +625,7 @@ def custom_export_to_excel(json_array, output_path=None, company_name="Transmera
         ws = wb.create_sheet(title=sheet_name)
         
         # Preparar los datos para esta hoja
-        data = []
-        for idx, item in enumerate(liquidaciones):
-            # Extraer datos del conductor
-            conductor = item.get('conductor', {})
-            nombre_completo = f"{conductor.get('nombre', '')} {conductor.get('apellido', '')}"
-            
-            # Calcular valores derivados
-            salario_devengado = float(item.get('salario_devengado', 0))
-            auxilio_transporte = float(item.get('auxilio_transporte', 0))
-            salud = float(item.get('salud', 0))
-            pension = float(item.get('pension', 0))
-            total_anticipos = float(item.get('total_anticipos', 0))
-            
-            valor_a_liquidar = salario_devengado + auxilio_transporte
-            total_deducciones = salud + pension
-            total_a_pagar = valor_a_liquidar - total_deducciones
-            total_a_pagar = valor_a_liquidar - total_deducciones
-            
-            novedad = item.get('observaciones', 'No especificada')
-                
-            # Verificar si el conductor es recién ingresado
-            if conductor.get('fecha_ingreso'):
-                try:
-                    fecha_ingreso = datetime.strptime(conductor.get('fecha_ingreso'), '%Y-%m-%d')
-                    fecha_inicio_liquidacion = datetime.strptime(item.get('periodo_start', '1900-01-01'), '%Y-%m-%d')
-                    fecha_fin_liquidacion = datetime.strptime(item.get('periodo_end', '2999-12-31'), '%Y-%m-%d')
-                    
-                    # Verificar si la fecha de ingreso cae dentro del período de liquidación
-                    if fecha_inicio_liquidacion <= fecha_ingreso <= fecha_fin_liquidacion:
-                        novedad = "Recién ingresado"
-                except (ValueError, TypeError) as e:
-                    print(f"Error al procesar fecha de ingreso: {e}")
-            
-            # Verificar si el conductor tuvo vacaciones en este período
-            if item.get('periodo_start_vacaciones') and item.get('periodo_end_vacaciones'):
-                # Si ya tenía una novedad, añadimos "Vacaciones", de lo contrario, asignamos "Vacaciones"
-                if novedad != 'No especificada' and novedad:
-                    novedad += "; Vacaciones"
-                else:
-                    novedad = "Vacaciones"
-                
-
-            
-            # Crear fila con los datos requeridos
-            row = {
-                'Indice': idx + 1,
-                'Conductor': nombre_completo,
-                'Identificación': conductor.get('numero_identificacion', ''),
-                'Cargo': "Conductor",
-                'Lugar de Trabajo': conductor.get('sede_trabajo', 'No especificado'),
-                'Novedad': novedad,
-                'Salario Base': conductor.get('salario_base', 0),
-                'Fecha Ingreso': conductor.get('fecha_ingreso', ''),
-                'Fecha Retiro': conductor.get('fecha_retiro', ''),
-                'Días Laborados': item.get('dias_laborados', 0),
-                'Salario Devengado': salario_devengado,
-                'Auxilio Transporte': auxilio_transporte,
-                'Valor a Liquidar': valor_a_liquidar,
-                'Salud': salud,
-                'Pensión': pension,
-                'Total Deducciones': total_deducciones,
-                'Anticipos': total_anticipos,
-                'Total a Pagar Básico': total_a_pagar
-            }
-            data.append(row)
+        data = [construir_fila(item, idx) for idx, item in enumerate(liquidaciones)]
         
         # Crear DataFrame para esta hoja
         df = pd.DataFrame(data)
@@ -272,9 +694,7 @@ def custom_export_to_excel(json_array, output_path=None, company_name="Transmera
                 cell.border = thin_border
                 
                 # Formato para columnas monetarias
-                if headers[col_idx-1] in ['Salario Base', 'Salario Devengado', 'Auxilio Transporte', 
-                                        'Valor a Liquidar', 'Salud', 'Pensión', 'Total Deducciones', 
-                                        'Anticipos', 'Total a Pagar Básico']:
+                if headers[col_idx-1] in COLUMNAS_MONETARIAS:
                     cell.number_format = '"$"#,##0'
                     cell.font = money_font
                     cell.alignment = money_alignment
@@ -289,6 +709,10 @@ def custom_export_to_excel(json_array, output_path=None, company_name="Transmera
                 # Colorear filas alternadas para mejorar la legibilidad
                 if row_idx % 2 == 0:
                     cell.fill = PatternFill(start_color="F5F5F5", end_color="F5F5F5", fill_type="solid")
+            
+            if row_idx % FILAS_POR_AVANCE == 0:
+                progreso.avance(FILAS_POR_AVANCE, hoja=sheet_name)
+        progreso.avance(len(df) % FILAS_POR_AVANCE, hoja=sheet_name)
         
         # Ajustar el ancho de las columnas
         for col_idx, column in enumerate(headers, 1):
@@ -355,21 +779,651 @@ def custom_export_to_excel(json_array, output_path=None, company_name="Transmera
     # Ordenar las pestañas alfabéticamente
     wb._sheets.sort(key=lambda x: x.title)
     
+    # Las hojas de detalle van después de los periodos
+    if detalles:
+        for tabla, columnas in explotar_detalles(json_array).items():
+            print(f"Creando hoja de detalle: {DETALLES_LIQUIDACION[tabla][0]}")
+            progreso.cambiar_etapa('detalles', hoja=DETALLES_LIQUIDACION[tabla][0])
+            _escribir_hoja_detalle(wb, DETALLES_LIQUIDACION[tabla][0], columnas)
+    
     # Guardar el archivo
+    progreso.cambiar_etapa('guardando')
     wb.save(output_path)
+    progreso.finalizar(output_path)
+    print(f"Archivo exportado exitosamente a: {output_path}")
+    
+    return output_path
+
+def export_to_csv(json_array, output_path=None):
+    """
+    Exporta las liquidaciones a CSV escribiendo fila por fila, sin construir
+    el libro completo en memoria. El periodo se incluye como primera columna.
+    """
+    if not json_array:
+        print("No hay datos para exportar")
+        return None
+    
+    print(f"Procesando {len(json_array)} liquidaciones...")
+    
+    liquidaciones_por_periodo = agrupar_por_periodo(json_array)
+    output_path = preparar_ruta_salida(output_path, 'csv')
+    
+    print(f"Generando archivo CSV en: {output_path}")
+    progreso.iniciar(len(json_array))
+    
+    # utf-8-sig para que Excel reconozca las tildes al abrir el archivo
+    with open(output_path, 'w', newline='', encoding='utf-8-sig') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Periodo'] + COLUMNAS_LIQUIDACION)
+        
+        n = 0
+        for n, (periodo, row) in enumerate(iterar_filas(liquidaciones_por_periodo), 1):
+            writer.writerow([periodo] + [row[col] for col in COLUMNAS_LIQUIDACION])
+            if n % FILAS_POR_AVANCE == 0:
+                progreso.avance(FILAS_POR_AVANCE, hoja=periodo, archivo=file)
+        progreso.avance(n % FILAS_POR_AVANCE, archivo=file)
+    
+    progreso.finalizar(output_path)
+    print(f"Archivo exportado exitosamente a: {output_path}")
+    
+    return output_path
+
+def _a_float(value):
+    """Convierte valores numéricos que pueden venir como string (DECIMAL) a float"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _a_int(value):
+    """Convierte valores enteros que pueden venir como string a int"""
+    value = _a_float(value)
+    return int(value) if value is not None else None
+
+def _a_texto(value):
+    """Convierte valores a texto conservando los nulos"""
+    if value is None:
+        return None
+    return str(value)
+
+def _esquema_columnar():
+    """Esquema Arrow de la liquidación exportada"""
+    import pyarrow as pa
+    
+    tipos = {
+        'Indice': pa.int32(),
+        'Días Laborados': pa.int32(),
+    }
+    for col in COLUMNAS_MONETARIAS:
+        tipos[col] = pa.float64()
+    
+    return pa.schema(
+        [pa.field('Periodo', pa.string())] +
+        [pa.field(col, tipos.get(col, pa.string())) for col in COLUMNAS_LIQUIDACION]
+    )
+
+def _batch_columnar(periodo, liquidaciones, schema):
+    """
+    Construye un RecordBatch para un periodo proyectando cada liquidación
+    directamente en las columnas: las numéricas se llenan en arreglos de NumPy
+    preasignados (con una máscara de nulos) que Arrow envuelve sin copiarlos;
+    solo las de texto pasan por una lista. La columna Periodo es constante.
+    """
+    import pyarrow as pa
+    
+    n = len(liquidaciones)
+    numericas = {}
+    textos = {}
+    for field in schema:
+        if field.name == 'Periodo':
+            continue
+        if pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            convertir = _a_float if pa.types.is_floating(field.type) else _a_int
+            numericas[field.name] = (np.zeros(n, dtype=field.type.to_pandas_dtype()), np.zeros(n, dtype=bool), convertir)
+        else:
+            textos[field.name] = [None] * n
+    
+    for idx, item in enumerate(liquidaciones):
+        row = construir_fila(item, idx)
+        for col, (datos, nulos, convertir) in numericas.items():
+            valor = convertir(row[col])
+            if valor is None:
+                nulos[idx] = True
+            else:
+                datos[idx] = valor
+        for col, valores in textos.items():
+            valores[idx] = _a_texto(row[col])
+    
+    arrays = []
+    for field in schema:
+        if field.name == 'Periodo':
+            arrays.append(pa.repeat(pa.scalar(periodo, field.type), n))
+        elif field.name in numericas:
+            datos, nulos, _ = numericas[field.name]
+            arrays.append(pa.array(datos, type=field.type, mask=nulos if nulos.any() else None))
+        else:
+            arrays.append(pa.array(textos[field.name], type=field.type))
+    
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def export_to_columnar(json_array, output_path=None, formato='parquet'):
+    """
+    Exporta las liquidaciones a Parquet o Arrow IPC (Feather v2).
+    Cada periodo se escribe como un RecordBatch independiente, de modo que la
+    memoria usada queda acotada al periodo más grande y los buffers de Arrow
+    se escriben al archivo sin copias adicionales.
+    """
+    if not json_array:
+        print("No hay datos para exportar")
+        return None
+    
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("El formato columnar requiere pyarrow (pip install pyarrow)")
+    
+    print(f"Procesando {len(json_array)} liquidaciones...")
+    
+    liquidaciones_por_periodo = agrupar_por_periodo(json_array)
+    output_path = preparar_ruta_salida(output_path, formato)
+    schema = _esquema_columnar()
+    
+    print(f"Generando archivo {formato.upper()} en: {output_path}")
+    progreso.iniciar(len(json_array))
+    
+    if formato == 'parquet':
+        writer = pq.ParquetWriter(output_path, schema, compression='snappy')
+    else:
+        writer = pa.ipc.new_file(output_path, schema)
+    
+    try:
+        for periodo in sorted(liquidaciones_por_periodo):
+            batch = _batch_columnar(periodo, liquidaciones_por_periodo[periodo], schema)
+            if formato == 'parquet':
+                writer.write_batch(batch)
+            else:
+                writer.write(batch)
+            progreso.avance(batch.num_rows, hoja=periodo, archivo=output_path)
+    finally:
+        writer.close()
+    
+    progreso.finalizar(output_path)
     print(f"Archivo exportado exitosamente a: {output_path}")
     
     return output_path
 
+def _celda_ods(valor):
+    """Celda OpenDocument con el tipo del valor (número o texto)"""
+    from odf.table import TableCell
+    from odf.text import P
+    
+    if valor is None or valor == '':
+        return TableCell()
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        celda = TableCell(valuetype='float', value=valor)
+    else:
+        celda = TableCell(valuetype='string')
+    celda.addElement(P(text=str(valor)))
+    return celda
+
+def escribir_ods(output_path, hojas):
+    """
+    Escribe un libro OpenDocument con odfpy a partir de (nombre, columnas,
+    filas) por hoja; las filas se consumen una a una, sin DataFrame intermedio
+    """
+    try:
+        from odf.opendocument import OpenDocumentSpreadsheet
+        from odf.table import Table, TableRow
+    except ImportError:
+        raise RuntimeError("El formato ODS requiere odfpy (pip install odfpy)")
+    
+    documento = OpenDocumentSpreadsheet()
+    for nombre, columnas, filas in hojas:
+        tabla = Table(name=nombre[:31])
+        encabezado = TableRow()
+        for columna in columnas:
+            encabezado.addElement(_celda_ods(columna))
+        tabla.addElement(encabezado)
+        for fila in filas:
+            row = TableRow()
+            for valor in fila:
+                row.addElement(_celda_ods(valor))
+            tabla.addElement(row)
+        documento.spreadsheet.addElement(tabla)
+    documento.save(output_path)
+
+def export_to_ods(json_array, output_path=None, detalles=False):
+    """
+    Exporta las liquidaciones a OpenDocument (LibreOffice), con una hoja por
+    periodo y sin estilos
+    """
+    if not json_array:
+        print("No hay datos para exportar")
+        return None
+    
+    print(f"Procesando {len(json_array)} liquidaciones...")
+    
+    liquidaciones_por_periodo = agrupar_por_periodo(json_array)
+    output_path = preparar_ruta_salida(output_path, 'ods')
+    
+    print(f"Generando archivo ODS en: {output_path}")
+    progreso.iniciar(len(json_array))
+    
+    def filas_periodo(periodo):
+        liquidaciones = liquidaciones_por_periodo[periodo]
+        for idx, item in enumerate(liquidaciones):
+            row = construir_fila(item, idx)
+            if (idx + 1) % FILAS_POR_AVANCE == 0:
+                progreso.avance(FILAS_POR_AVANCE, hoja=periodo)
+            yield [row[col] for col in COLUMNAS_LIQUIDACION]
+        progreso.avance(len(liquidaciones) % FILAS_POR_AVANCE, hoja=periodo)
+    
+    hojas = [
+        (periodo, COLUMNAS_LIQUIDACION, filas_periodo(periodo)) for periodo in sorted(liquidaciones_por_periodo)
+    ]
+    if detalles:
+        for tabla, columnas in explotar_detalles(json_array).items():
+            nombres = list(columnas)
+            hojas.append((DETALLES_LIQUIDACION[tabla][0], nombres, zip(*(columnas[nombre] for nombre in nombres))))
+    
+    escribir_ods(output_path, hojas)
+    progreso.cambiar_etapa('guardando')
+    
+    progreso.finalizar(output_path)
+    print(f"Archivo exportado exitosamente a: {output_path}")
+    
+    return output_path
+
+def _tipos_columnas_generico(plan, filas_muestra):
+    """Infiere el tipo Arrow de cada columna a partir de las filas de muestra"""
+    import pyarrow as pa
+    
+    tipos = []
+    for col in range(len(plan.columnas)):
+        valores = [fila[col] for fila in filas_muestra if fila[col] is not None]
+        if valores and all(isinstance(v, bool) for v in valores):
+            tipos.append(pa.bool_())
+        elif valores and all(isinstance(v, int) and not isinstance(v, bool) for v in valores):
+            tipos.append(pa.int64())
+        elif valores and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in valores):
+            tipos.append(pa.float64())
+        else:
+            tipos.append(pa.string())
+    
+    return pa.schema([pa.field(nombre, tipo) for nombre, tipo in zip(plan.columnas, tipos)])
+
+def _convertir_columna_generica(valores, tipo):
+    """Ajusta los valores de una columna al tipo inferido (los que no encajan quedan nulos)"""
+    import pyarrow as pa
+    
+    if pa.types.is_boolean(tipo):
+        return [v if isinstance(v, bool) else None for v in valores]
+    if pa.types.is_integer(tipo):
+        return [v if isinstance(v, int) and not isinstance(v, bool) else _a_int(v) for v in valores]
+    if pa.types.is_floating(tipo):
+        return [_a_float(v) for v in valores]
+    return [_a_texto(v) for v in valores]
+
+def export_generico(json_array, output_path=None, formato='xlsx', titulo="Datos", muestra=500, tamano_lote=10000):
+    """
+    Exporta cualquier array de objetos (vehículos, conductores, etc.) aplanando
+    cada registro con un PlanAplanado inferido una sola vez de una muestra.
+    Los registros se procesan en streaming: el costo es lineal y no se
+    construye un DataFrame ni un diccionario aplanado por registro.
+    """
+    if not json_array:
+        print("No hay datos para exportar")
+        return None
+    
+    formato = (formato or 'xlsx').lower()
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato no soportado: {formato}. Use uno de: {', '.join(FORMATOS_EXPORTACION)}")
+    
+    print(f"Procesando {len(json_array)} registros...")
+    
+    plan = PlanAplanado.inferir(json_array, muestra)
+    print(f"Esquema inferido con {len(plan.columnas)} columnas")
+    
+    output_path = preparar_ruta_salida(output_path, formato, prefijo=titulo.lower().replace(' ', '_'))
+    print(f"Generando archivo {formato.upper()} en: {output_path}")
+    
+    progreso.iniciar(len(json_array))
+    
+    def aplanar():
+        for n, registro in enumerate(json_array, 1):
+            fila = plan.aplicar(registro)
+            if n % FILAS_POR_AVANCE == 0:
+                progreso.avance(FILAS_POR_AVANCE, hoja=titulo, archivo=archivo_actual)
+            yield fila
+        progreso.avance(len(json_array) % FILAS_POR_AVANCE, hoja=titulo, archivo=archivo_actual)
+    
+    # Archivo abierto (CSV) o ruta en disco (columnar) para reportar bytes escritos
+    archivo_actual = None
+    filas = aplanar()
+    
+    if formato == 'csv':
+        with open(output_path, 'w', newline='', encoding='utf-8-sig') as file:
+            archivo_actual = file
+            writer = csv.writer(file)
+            writer.writerow(plan.columnas)
+            writer.writerows(filas)
+    
+    elif formato == 'xlsx':
+        from openpyxl.cell import WriteOnlyCell
+        
+        # Libro en modo write_only: las filas se escriben al disco a medida que llegan
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title=titulo[:31])
+        
+        header_font = Font(size=12, bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color="006B3C", end_color="006B3C", fill_type="solid")
+        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        
+        for col_idx, columna in enumerate(plan.columnas, 1):
+            ws.column_dimensions[get_column_letter(col_idx)].width = 20
+        ws.freeze_panes = "A2"
+        
+        encabezados = []
+        for columna in plan.columnas:
+            cell = WriteOnlyCell(ws, value=columna)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = header_alignment
+            encabezados.append(cell)
+        ws.append(encabezados)
+        
+        for fila in filas:
+            ws.append(fila)
+        
+        progreso.cambiar_etapa('guardando')
+        wb.save(output_path)
+    
+    elif formato == 'ods':
+        escribir_ods(output_path, [(titulo, plan.columnas, filas)])
+    
+    else:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("El formato columnar requiere pyarrow (pip install pyarrow)")
+        
+        schema = _tipos_columnas_generico(plan, [plan.aplicar(r) for r in json_array[:muestra]])
+        writer = pq.ParquetWriter(output_path, schema, compression='snappy') if formato == 'parquet' \
+            else pa.ipc.new_file(output_path, schema)
+        archivo_actual = output_path
+        
+        def escribir_lote(lote):
+            arrays = [
+                pa.array(_convertir_columna_generica([fila[i] for fila in lote], field.type), type=field.type)
+                for i, field in enumerate(schema)
+            ]
+            batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+            if formato == 'parquet':
+                writer.write_batch(batch)
+            else:
+                writer.write(batch)
+        
+        try:
+            lote = []
+            for fila in filas:
+                lote.append(fila)
+                if len(lote) >= tamano_lote:
+                    escribir_lote(lote)
+                    lote = []
+            if lote:
+                escribir_lote(lote)
+        finally:
+            writer.close()
+    
+    progreso.finalizar(output_path)
+    print(f"Archivo exportado exitosamente a: {output_path}")
+    
+    return output_path
+
+def es_liquidacion(registro):
+    """Detecta si un registro tiene la estructura de una liquidación de nómina"""
+    return isinstance(registro, dict) and 'conductor' in registro and (
+        'periodo_end' in registro or 'salario_devengado' in registro
+    )
+
+def exportar(json_array, output_path=None, formato='xlsx', company_name="Transmeralda", tipo='auto', titulo="Datos",
+             detalles=False, empaquetar_detalles=True):
+    """
+    Exporta los datos en el formato solicitado. Con tipo 'auto' se usa el
+    layout de liquidaciones si los registros lo tienen y el genérico si no.
+    Con `detalles` se exportan también las tablas de detalle de las
+    liquidaciones: hojas en XLSX/ODS y, en CSV/Parquet/Arrow, archivos
+    hermanos que se entregan junto al principal en un zip (sueltos con
+    `empaquetar_detalles=False`, cuando el zip lo arma quien llama).
+    """
+    formato = (formato or 'xlsx').lower()
+    
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato no soportado: {formato}. Use uno de: {', '.join(FORMATOS_EXPORTACION)}")
+    
+    if tipo == 'auto':
+        tipo = 'liquidaciones' if json_array and es_liquidacion(json_array[0]) else 'generico'
+    
+    if tipo == 'generico':
+        return export_generico(json_array, output_path, formato, titulo)
+    
+    if formato == 'xlsx':
+        return custom_export_to_excel(json_array, output_path, company_name, detalles)
+    if formato == 'ods':
+        return export_to_ods(json_array, output_path, detalles)
+    
+    if formato == 'csv':
+        result_path = export_to_csv(json_array, output_path)
+    else:
+        result_path = export_to_columnar(json_array, output_path, formato)
+    
+    if result_path and detalles:
+        try:
+            rutas = exportar_detalles_archivos(json_array, result_path, formato)
+        except Exception:
+            _eliminar_archivos([result_path])
+            raise
+        if empaquetar_detalles:
+            result_path = empaquetar_archivos([result_path] + rutas, result_path, formato)
+    
+    return result_path
+
+def clave_particion(item, particion):
+    """Clave por la que se agrupan las liquidaciones al fragmentar la exportación"""
+    if particion == 'periodo':
+        return periodo_de(item)
+    if particion == 'sede':
+        return (item.get('conductor') or {}).get('sede_trabajo') or 'SIN SEDE'
+    return 'DATOS'
+
+def _nombre_archivo(texto):
+    """Convierte una clave de partición en un fragmento de nombre de archivo seguro"""
+    return re.sub(r'[^A-Za-z0-9]+', '_', normalizar_nombre(texto)).strip('_') or 'DATOS'
+
+def normalizar_nombre(texto):
+    """Quita tildes para usar el texto en nombres de archivo"""
+    import unicodedata
+    return unicodedata.normalize('NFKD', str(texto)).encode('ASCII', 'ignore').decode('ASCII')
+
+def planear_fragmentos(json_array, particion='periodo', max_filas=LIMITE_FILAS_HOJA, max_bytes=None, muestra=500):
+    """
+    Reparte los registros en fragmentos que respetan el presupuesto de filas
+    y, opcionalmente, de bytes (estimado con el tamaño JSON medio de una muestra).
+    
+    Los grupos de la partición (periodo o sede) se empaquetan en orden sin
+    partirse; solo un grupo que por sí mismo excede el presupuesto se divide
+    en partes. Devuelve una lista de (nombre, registros).
+    """
+    limite = max(1, max_filas)
+    if max_bytes and json_array:
+        ejemplo = json_array[:muestra]
+        bytes_por_registro = max(1, len(json.dumps(ejemplo, ensure_ascii=False)) // len(ejemplo))
+        limite = max(1, min(limite, max_bytes // bytes_por_registro))
+    
+    if not (json_array and es_liquidacion(json_array[0])):
+        particion = 'ninguna'
+    
+    grupos = {}
+    for item in json_array:
+        grupos.setdefault(clave_particion(item, particion), []).append(item)
+    
+    fragmentos = []
+    claves, registros = [], []
+    
+    def cerrar():
+        if registros:
+            nombre = claves[0] if len(claves) == 1 else f"{claves[0]} a {claves[-1]}"
+            fragmentos.append((nombre, list(registros)))
+            claves.clear()
+            registros.clear()
+    
+    for clave in sorted(grupos):
+        grupo = grupos[clave]
+        
+        if len(grupo) > limite:
+            # Grupo más grande que el presupuesto: se parte en piezas propias
+            cerrar()
+            for parte, inicio in enumerate(range(0, len(grupo), limite), 1):
+                fragmentos.append((f"{clave} parte {parte}", grupo[inicio:inicio + limite]))
+            continue
+        
+        if len(registros) + len(grupo) > limite:
+            cerrar()
+        claves.append(clave)
+        registros.extend(grupo)
+    
+    cerrar()
+    return fragmentos
+
+def _inicializar_trabajador():
+    """Los procesos hijos no comparten el canal de progreso del padre"""
+    global progreso
+    progreso = ReportadorProgreso()
+
+def _exportar_fragmento(registros, directorio, nombre, formato, opciones):
+    """Exporta un fragmento en su propio directorio y devuelve los archivos generados"""
+    os.makedirs(directorio, exist_ok=True)
+    # Las tablas de detalle van sueltas: el zip de la exportación ya las reúne
+    exportar(registros, os.path.join(directorio, nombre), formato, empaquetar_detalles=False, **opciones)
+    return sorted(os.path.join(directorio, archivo) for archivo in os.listdir(directorio))
+
+def exportar_fragmentado(json_array, output_path=None, formato='xlsx', particion='periodo',
+                         max_filas=LIMITE_FILAS_HOJA, max_bytes=None, trabajadores=None,
+                         forzar_zip=False, zip_fd=None, **opciones):
+    """
+    Exporta los datos y, si exceden el presupuesto de filas o bytes, los divide
+    en varios archivos que se generan en paralelo (un proceso por fragmento) y
+    se agregan a un zip a medida que terminan.
+    
+    Con `zip_fd` el zip se escribe directamente en ese descriptor heredado, de
+    modo que el proceso padre puede enviar los primeros bytes al cliente sin
+    esperar a que termine el último fragmento.
+    """
+    formato = (formato or 'xlsx').lower()
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato no soportado: {formato}. Use uno de: {', '.join(FORMATOS_EXPORTACION)}")
+    
+    if not json_array:
+        print("No hay datos para exportar")
+        return None
+    
+    fragmentos = planear_fragmentos(json_array, particion, max_filas, max_bytes)
+    
+    if len(fragmentos) <= 1 and not forzar_zip and zip_fd is None:
+        return exportar(json_array, output_path, formato, **opciones)
+    
+    if zip_fd is not None:
+        zip_path = f"fd:{zip_fd}"
+        destino = os.fdopen(zip_fd, 'wb')
+    else:
+        zip_path = preparar_ruta_salida(output_path, 'zip')
+        destino = zip_path
+    
+    base = os.path.splitext(os.path.basename(output_path or 'liquidaciones_nomina'))[0]
+    print(f"Exportando {len(json_array)} registros en {len(fragmentos)} archivos ({formato.upper()}) hacia: {zip_path}")
+    progreso.iniciar(len(json_array), etapa='fragmentando')
+    
+    # Los formatos ya comprimidos se guardan sin volver a comprimir
+    compresion = zipfile.ZIP_DEFLATED if formato == 'csv' else zipfile.ZIP_STORED
+    temporal = tempfile.mkdtemp(prefix='exportacion_')
+    
+    # Vaciar los buffers antes de crear procesos para no duplicar salida
+    sys.stdout.flush()
+    
+    try:
+        with ProcessPoolExecutor(max_workers=trabajadores or os.cpu_count(),
+                                 initializer=_inicializar_trabajador) as pool, \
+                zipfile.ZipFile(destino, 'w', compression=compresion) as archivo_zip:
+            pendientes = {}
+            for numero, (nombre, registros) in enumerate(fragmentos, 1):
+                nombre_archivo = f"{base}_{numero:02d}_{_nombre_archivo(nombre)}"
+                futuro = pool.submit(_exportar_fragmento, registros, os.path.join(temporal, f"{numero:02d}"),
+                                     nombre_archivo, formato, opciones)
+                pendientes[futuro] = (nombre, len(registros))
+            
+            for futuro in as_completed(pendientes):
+                nombre, filas = pendientes[futuro]
+                for ruta in futuro.result():
+                    archivo_zip.write(ruta, arcname=os.path.basename(ruta))
+                    os.remove(ruta)
+                print(f"Fragmento agregado al zip: {nombre} ({filas} filas)")
+                progreso.avance(filas, hoja=nombre)
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+        if zip_fd is not None:
+            destino.close()
+    
+    if zip_fd is None:
+        progreso.finalizar(zip_path)
+    else:
+        progreso.cambiar_etapa('completado')
+    print(f"Archivo exportado exitosamente a: {zip_path}")
+    
+    return zip_path
+
 def main():
     """Función principal que ejecuta el script desde línea de comandos"""
     try:
-        if len(sys.argv) < 2:
-            print("Uso: python liquidaciones_export.py <tempFilePath> [output_path]")
-            sys.exit(1)
+        parser = argparse.ArgumentParser(description='Exportar liquidaciones')
+        parser.add_argument('temp_file_path', help='Ruta al archivo JSON con las liquidaciones')
+        parser.add_argument('output_path', nargs='?', default=None, help='Ruta del archivo de salida (opcional)')
+        parser.add_argument('--format', dest='formato', default='xlsx', choices=list(FORMATOS_EXPORTACION),
+                            help='Formato de salida (por defecto xlsx)')
+        parser.add_argument('--tipo', default='auto', choices=['auto', 'liquidaciones', 'generico'],
+                            help='Layout de exportación (por defecto se detecta a partir de los datos)')
+        parser.add_argument('--detalles', action='store_true',
+                            help='Incluir anticipos, bonificaciones, recargos y mantenimientos de cada liquidación '
+                                 '(en CSV, Parquet y Arrow se entregan en un zip junto al archivo principal)')
+        parser.add_argument('--titulo', default='Datos', help='Nombre de la hoja en la exportación genérica')
+        parser.add_argument('--particion', default='periodo', choices=['periodo', 'sede', 'ninguna'],
+                            help='Agrupación que no se parte al dividir exportaciones grandes (por defecto periodo)')
+        parser.add_argument('--max-filas', type=int, default=LIMITE_FILAS_HOJA,
+                            help='Filas máximas por archivo antes de dividir la exportación en un zip')
+        parser.add_argument('--max-mb', type=float, default=None,
+                            help='Tamaño máximo estimado por archivo en MB antes de dividir la exportación')
+        parser.add_argument('--trabajadores', type=int, default=None,
+                            help='Procesos para generar los fragmentos (por defecto uno por CPU)')
+        parser.add_argument('--zip', dest='forzar_zip', action='store_true',
+                            help='Entregar siempre un zip, aunque la exportación quepa en un solo archivo')
+        parser.add_argument('--zip-fd', type=int, default=None,
+                            help='Descriptor heredado donde escribir el zip a medida que se generan los fragmentos')
+        parser.add_argument('--progress-fd', type=int, default=None,
+                            help='Descriptor heredado donde emitir el progreso como líneas JSON')
+        parser.add_argument('--progress-interval', type=float, default=0.5,
+                            help='Segundos mínimos entre registros de progreso (por defecto 0.5)')
+        
+        args = parser.parse_args()
+        
+        if args.progress_fd is not None:
+            global progreso
+            progreso = ReportadorProgreso(args.progress_fd, args.progress_interval)
         
         # Obtener la ruta del archivo JSON
-        temp_file_path = sys.argv[1]
+        temp_file_path = args.temp_file_path
         print(f"Leyendo archivo JSON: {temp_file_path}")
         
         # Leer el contenido del archivo
@@ -386,11 +1440,17 @@ def main():
             # Si no es un array, lo convertimos en uno
             json_array = [json_array]
         
-        # Ruta opcional de salida (argumento 2)
-        output_path = sys.argv[2] if len(sys.argv) > 2 else None
-        
-        # Exportar datos con formato personalizado
-        result_path = custom_export_to_excel(json_array, output_path)
+        # Exportar datos en el formato solicitado
+        result_path = exportar_fragmentado(
+            json_array, args.output_path, args.formato,
+            particion=args.particion,
+            max_filas=args.max_filas,
+            max_bytes=int(args.max_mb * 1024 * 1024) if args.max_mb else None,
+            trabajadores=args.trabajadores,
+            forzar_zip=args.forzar_zip,
+            zip_fd=args.zip_fd,
+            tipo=args.tipo, titulo=args.titulo, detalles=args.detalles,
+        )
         
         if result_path:
             # Devolvemos la ruta en la salida estándar para que el controlador pueda capturarla
@@ -1,35 +1,43 @@
 import json
 import re
 from datetime import datetime
-import unicodedata
 import sys
 import os
 import argparse
 import traceback
-
-# Función para normalizar texto
-def normalize_text(text):
-    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8').upper()
+from ocrDocument import OcrDocument, PAGINAS_VALIDACION
+from ocrFields import ExtractorGraph, extractor, parse_fields
+from ocrWordStore import WordStore
+from ocrNormalize import normalize_text
+from ocrTrace import traza
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
 
 class CEDULAProcessor:
+    # Extractores y campos que producen (ver ocrFields.ExtractorGraph). Nombre y
+    # apellido se ubican a partir del ancla del número (NUMERO ... APELLIDOS ...
+    # NOMBRES), por eso dependen de la extracción del número
+    EXTRACTORES = ExtractorGraph([
+        extractor('extract_numero_identificacion', ['numero_identificacion']),
+        extractor('extract_nombre_apellido', ['nombre', 'apellido'], depende=['extract_numero_identificacion']),
+        extractor('extract_date_borning', ['fecha_nacimiento']),
+        extractor('extract_gender', ['genero']),
+        extractor('extract_blood_type', ['tipo_sangre']),
+    ])
+
     def __init__(self, ocr_data, numero_identificacion=None):
         self.data = ocr_data
         self.content = ocr_data.get('analyzeResult', {}).get('content', '')
-        self.lines = self.content.split('\n')
+        self.document = OcrDocument(ocr_data.get('analyzeResult', {}))
+        self.lines = self.document.lines
         self.numero_identificacion = numero_identificacion
         self.result = {
             "nombre": None,
             "apellido": None,
         }
     
-    def find_line_index(self, keyword, normalize=True):
+    def find_line_index(self, keyword, normalize=True, paginas=None):
         """Encontrar el índice de la línea que contiene una palabra clave"""
-        keyword_norm = normalize_text(keyword) if normalize else keyword
-        for i, line in enumerate(self.lines):
-            line_norm = normalize_text(line) if normalize else line
-            if keyword_norm in line_norm:
-                return i
-        return -1
+        return self.document.find_line_index(keyword, normalize, paginas)
     
     def is_valid_cedula(self):
         """Verificar si el documento es una cédula de ciudadanía válida"""
@@ -39,11 +47,8 @@ class CEDULAProcessor:
             "CEDULA DE CIUDADANIA",
             "IDENTIFICACION PERSONAL"
         ]
-        normalized_content = normalize_text(self.content)
-        for keyword in keywords:
-            if keyword in normalized_content:
-                return True
-        return False
+        # El encabezado está en la primera página; el resto del documento no se revisa
+        return self.document.contains_any(keywords, PAGINAS_VALIDACION)
     
     # OPCIÓN 1: Método de instancia (recomendado)
     def normalize_numero_identificacion(self, numero):
@@ -187,7 +192,7 @@ class CEDULAProcessor:
             return self._extract_with_alternative_patterns()
             
         except Exception as e:
-            print(f"Error extrayendo nombre y apellido: {e}")
+            traza.registrar('cedula.nombre_error', error=str(e))
             return False
     
     def _clean_and_validate_name(self, text):
@@ -426,7 +431,7 @@ class CEDULAProcessor:
                         self.result["fecha_nacimiento"] = fecha_formateada
                         return True
                     except ValueError:
-                        print(f"Error al parsear la fecha formato /: {match1.group(1)}")
+                        traza.registrar('cedula.fecha_nacimiento_invalida', formato='dd/mm/yyyy', texto=match1.group(1))
                 
                 # Patrón 2: Formato DD-MMM-YYYY (ejemplo: 11-FEB-1995)
                 match2 = re.search(r'(\d{1,2}-[A-Z]{3}-\d{4})', line)
@@ -451,7 +456,7 @@ class CEDULAProcessor:
                         self.result["fecha_nacimiento"] = fecha_formateada
                         return True
                     except ValueError:
-                        print(f"Error al parsear la fecha formato -: {match2.group(1)}")
+                        traza.registrar('cedula.fecha_nacimiento_invalida', formato='dd-mmm-yyyy', texto=match2.group(1))
                 
                 # Patrón 3: Formato DD-MM-YYYY
                 match3 = re.search(r'(\d{1,2}-\d{1,2}-\d{4})', line)
@@ -462,7 +467,7 @@ class CEDULAProcessor:
                         self.result["fecha_nacimiento"] = fecha_formateada
                         return True
                     except ValueError:
-                        print(f"Error al parsear la fecha formato - numérico: {match3.group(1)}")
+                        traza.registrar('cedula.fecha_nacimiento_invalida', formato='dd-mm-yyyy', texto=match3.group(1))
                 
                 # Patrón 4: Formato YYYY/MM/DD o YYYY-MM-DD
                 match4 = re.search(r'(\d{4}[/-]\d{1,2}[/-]\d{1,2})', line)
@@ -475,7 +480,7 @@ class CEDULAProcessor:
                         self.result["fecha_nacimiento"] = fecha_formateada
                         return True
                     except ValueError:
-                        print(f"Error al parsear la fecha formato YYYY: {match4.group(1)}")
+                        traza.registrar('cedula.fecha_nacimiento_invalida', formato='yyyy-mm-dd', texto=match4.group(1))
                 
                 # Patrón 5: Formato DD DE MMMM DE YYYY (español completo)
                 match5 = re.search(r'(\d{1,2})\s+DE\s+([A-ZÁÉÍÓÚ]+)\s+DE\s+(\d{4})', line, re.IGNORECASE)
@@ -499,7 +504,7 @@ class CEDULAProcessor:
                             self.result["fecha_nacimiento"] = fecha_formateada
                             return True
                     except (ValueError, KeyError):
-                        print(f"Error al parsear la fecha formato español: {match5.group(0)}")
+                        traza.registrar('cedula.fecha_nacimiento_invalida', formato='dd de mes de yyyy', texto=match5.group(0))
                 
                 # Patrón 6: Formato DD MMMM YYYY (sin "DE")
                 match6 = re.search(r'(\d{1,2})\s+([A-ZÁÉÍÓÚ]+)\s+(\d{4})', line, re.IGNORECASE)
@@ -523,13 +528,13 @@ class CEDULAProcessor:
                             self.result["fecha_nacimiento"] = fecha_formateada
                             return True
                     except (ValueError, KeyError):
-                        print(f"Error al parsear la fecha formato español sin DE: {match6.group(0)}")
+                        traza.registrar('cedula.fecha_nacimiento_invalida', formato='dd mes yyyy', texto=match6.group(0))
                 
             
-            print("No se encontró fecha de nacimiento en ninguna línea")
+            traza.registrar('cedula.fecha_nacimiento_no_encontrada')
             return False
         else:
-            print("No se encontró la etiqueta 'FECHA DE NACIMIENTO'")
+            traza.registrar('cedula.etiqueta_fecha_nacimiento_ausente')
             return False
         
     def extract_gender(self):
@@ -606,45 +611,40 @@ class CEDULAProcessor:
         """Buscar género directamente en la estructura OCR"""
         
         try:
-            analyze_result = self.data.get('analyzeResult', {})
-            pages = analyze_result.get('pages', [])
+            # Solo interesa la primera página (el anverso de la cédula)
+            words = WordStore.from_analyze_result(self.data.get('analyzeResult', {}), max_pages=1)
             
-            if not pages:
-                return False
-                
-            words = pages[0].get('words', [])
-            if not words:
+            first_page = words.first_page()
+            if first_page is None:
                 return False
             
-            # Buscar palabras que sean exactamente M o F
-            gender_candidates = []
+            # Contenidos únicos que son exactamente M o F
+            gender_ids = {
+                cid: content.strip().upper()
+                for cid, content in enumerate(words.contents)
+                if content.strip().upper() in ("M", "F")
+            }
+            if not gender_ids:
+                return False
             
-            for i, word in enumerate(words):
-                content = word.get("content", "").strip().upper()
-                confidence = word.get("confidence", 0)
-                
+            # Tomar el candidato de mayor confianza (el primero en caso de empate)
+            best_gender = None
+            best_confidence = 0.5
+            for i in words.page_range(first_page):
+                gender = gender_ids.get(words.content_ids[i])
                 # Solo considerar M o F con buena confianza
-                if content in ["M", "F"] and confidence > 0.5:
-                    gender_candidates.append({
-                        'gender': content,
-                        'confidence': confidence,
-                        'index': i,
-                        'word': word
-                    })
-            
-            # Si encontramos candidatos, tomar el de mayor confianza
-            if gender_candidates:
-                # Ordenar por confianza descendente
-                gender_candidates.sort(key=lambda x: x['confidence'], reverse=True)
-                best_candidate = gender_candidates[0]
-                
-                self.result["genero"] = best_candidate['gender']
+                if gender and words.confidences[i] > best_confidence:
+                    best_gender = gender
+                    best_confidence = words.confidences[i]
+            
+            if best_gender:
+                self.result["genero"] = best_gender
                 return True
             
             return False
             
         except Exception as e:
-            print(f"Error en búsqueda OCR de género: {e}")
+            traza.registrar('cedula.genero_error', error=str(e))
             return False
     
     def _extract_gender_regex_fallback(self):
@@ -806,27 +806,23 @@ class CEDULAProcessor:
                                 self.result["tipo_sangre"] = blood_type_upper
                                 return True
         
-        print("No se pudo extraer el tipo de sangre")
+        traza.registrar('cedula.tipo_sangre_no_encontrado')
         return False
 
-    def process(self):
-        """Procesar todos los campos y devolver el resultado"""
+    def process(self, campos=None):
+        """Procesar los campos pedidos (todos por defecto) y devolver el resultado"""
         if not self.is_valid_cedula():
             return {"error": "No es una CEDULA válida"}
         
-        self.extract_numero_identificacion()
-        self.extract_nombre_apellido()
-        self.extract_date_borning()
-        self.extract_gender()
-        self.extract_blood_type()
+        self.EXTRACTORES.ejecutar(self, campos)
         
-        return self.result
+        return self.EXTRACTORES.seleccionar(self.result, campos)
 
 # Función principal para procesar el OCR
-def process_cedula_data(data, numero_identificacion=None):
+def process_cedula_data(data, numero_identificacion=None, campos=None):
     try:
         processor = CEDULAProcessor(data, numero_identificacion)
-        result = processor.process()
+        result = processor.process(campos)
         return result
     except Exception as e:
         import traceback
@@ -837,14 +833,25 @@ if __name__ == "__main__":
     try:
         parser = argparse.ArgumentParser(description='Procesar datos OCR')
         parser.add_argument('--file', type=str, help='Ruta al archivo JSON con datos OCR')
+        agregar_argumentos(parser)
         parser.add_argument('--numero_identificacion', type=str, help='Identificación del conductor (opcional)')
+        parser.add_argument('--fields', type=str, help='Campos a extraer separados por coma (opcional, por defecto todos)')
+        parser.add_argument('--debug', action='store_true', help='Volcar a stderr la traza de decisiones de los extractores')
         
         args = parser.parse_args()
 
         # Determinar qué archivo procesar
         file_path = None
         
-        if args.file:
+        if hay_entrada(args):
+            # JSON compacto por stdin o por un descriptor heredado, sin archivo temporal
+            try:
+                data = leer_entrada(args)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: La entrada no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en la entrada: {str(e)}"}))
+                sys.exit(1)
+        elif args.file:
             # Usar el archivo especificado por argumento
             file_path = args.file
             if not os.path.exists(file_path):
@@ -880,16 +887,21 @@ if __name__ == "__main__":
                 sys.exit(1)
         
         # Procesar los datos
-        result = process_cedula_data(data, args.numero_identificacion)
+        result = process_cedula_data(data, args.numero_identificacion, parse_fields(args.fields))
         
         # Imprimir resultado como JSON (único output a stdout)
         print(json.dumps(result, indent=4, ensure_ascii=False))
+
+        # Traza de decisiones a stderr solo si falló, hubo baja confianza o se pidió --debug
+        traza.volcar_si(result, args.debug)
         
     except Exception as e:
         # Errores a stderr para depuración
         print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
         print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
         
+        traza.volcar_si({"error": str(e)})
+
         # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
         print(json.dumps({"error": str(e)}))
         sys.exit(1)
\ No newline at end of file
@@ -1,43 +1,54 @@
 import json
 import re
-import unicodedata
 import sys
 import os
 import argparse
 import traceback
+from ocrDocument import OcrDocument, PAGINAS_VALIDACION
+from ocrFields import ExtractorGraph, extractor, parse_fields
+from ocrConfidence import ConfidenceMap, Candidato
 from datetime import datetime
-
-# Función para normalizar texto
-def normalize_text(text):
-    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8').upper()
+from ocrNormalize import normalize_text
+from ocrTrace import traza
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
 
 class CONTRATOProcessor:
+    # Extractores y campos que producen (ver ocrFields.ExtractorGraph)
+    EXTRACTORES = ExtractorGraph([
+        extractor('extract_validation', ['validation']),
+        extractor('extract_number_phone', ['telefono']),
+        extractor('extract_email', ['email']),
+        extractor('extract_employer_address', ['direccion']),
+        extractor('extract_sede', ['sede_trabajo']),
+        extractor('extract_fecha_ingreso', ['fecha_ingreso']),
+        extractor('extract_salario_base', ['salario_base']),
+        extractor('extract_termino_contrato', ['termino_contrato', 'fecha_terminacion']),
+    ])
+
     def __init__(self, ocr_data, numero_identificacion=None):
         self.data = ocr_data
         self.content = ocr_data.get('analyzeResult', {}).get('content', '')
-        self.lines = self.content.split('\n')
+        self.document = OcrDocument(ocr_data.get('analyzeResult', {}))
+        self.lines = self.document.lines
         self.numero_identificacion = numero_identificacion
         self.result = {
             "validation": None,
         }
+        self._confianza = None
+
+    @property
+    def confianza(self):
+        """Confianza de las palabras del OCR (se construye solo si se necesita)"""
+        if self._confianza is None:
+            self._confianza = ConfidenceMap.from_analyze_result(self.data.get('analyzeResult', {}))
+        return self._confianza
     
-    def find_line_index(self, keyword, normalize=True):
+    def find_line_index(self, keyword, normalize=True, paginas=None):
         """Encontrar el índice de la línea que contiene una palabra clave"""
-        keyword_norm = normalize_text(keyword) if normalize else keyword
-        for i, line in enumerate(self.lines):
-            line_norm = normalize_text(line) if normalize else line
-            if keyword_norm in line_norm:
-                return i
-        return -1
+        return self.document.find_line_index(keyword, normalize, paginas)
     
     def is_valid_contrato(self):
         """Verificar si el documento es un contrato válido"""
-        normalized_content = normalize_text(self.content)
-        
-        # CONDUCTOR es obligatorio - debe estar presente
-        if "CONDUCTOR" not in normalized_content:
-            return False
-        
         # Al menos uno de estos keywords adicionales debe estar presente
         required_keywords = [
             "CONTRATO",
@@ -45,13 +56,16 @@ class CONTRATOProcessor:
             "DATOS DEL TRABAJADOR"
         ]
         
-        # Verificar que al menos uno de los keywords requeridos esté presente
-        has_required_keyword = any(keyword in normalized_content for keyword in required_keywords)
-        
-        if not has_required_keyword:
-            return False
+        def es_contrato(normalized_content):
+            # CONDUCTOR es obligatorio - debe estar presente
+            if "CONDUCTOR" not in normalized_content:
+                return False
+            # Verificar que al menos uno de los keywords requeridos esté presente
+            return any(keyword in normalized_content for keyword in required_keywords)
         
-        return True
+        # En contratos de muchas páginas los datos están al inicio; el resto no
+        # se revisa
+        return self.document.cumple(es_contrato, PAGINAS_VALIDACION)
     
         # OPCIÓN 1: Método de instancia (recomendado)
     def normalize_numero_identificacion(self, numero):
@@ -336,7 +350,7 @@ class CONTRATOProcessor:
                             return sede
         
         # Si no se encuentra sede específica, devolver None
-        print("No se encontró sede de contratación")
+        traza.registrar('contrato.sede_no_encontrada')
         self.result['sede_trabajo'] = None
         return None
 
@@ -398,13 +412,13 @@ class CONTRATOProcessor:
         # Si contiene contextos inválidos, no es la sede de contratación
         for invalid in invalid_contexts:
             if invalid in line_upper:
-                print(f"Contexto inválido encontrado: {invalid}")
+                traza.registrar('contrato.sede_contexto_invalido', sede=sede, contexto=invalid)
                 return False
         
         # Si contiene contextos válidos, es probable que sea la sede de contratación
         for valid in valid_contexts:
             if valid in line_upper:
-                print(f"Contexto válido encontrado: {valid}")
+                traza.registrar('contrato.sede_contexto_valido', sede=sede, contexto=valid)
                 return True
         
         # Si no hay contexto claro, asumir que es válido
@@ -548,45 +562,38 @@ class CONTRATOProcessor:
             # Remover puntos y convertir a número
             salary_number = int(salary_str.replace('.', ''))
             
-            print(f"      Validando salario: '{salary_str}' -> {salary_number}")
-            
             # Rangos de salario válidos para Colombia (en pesos)
             min_salary = 500000      # 500 mil
             max_salary = 50000000    # 50 millones
             
             # Verificar que esté en el rango válido
             if min_salary <= salary_number <= max_salary:
-                print(f"      ✓ Salario en rango válido ({min_salary:,} - {max_salary:,})")
-                
                 # Verificar longitud del número (al menos 6 dígitos)
                 str_number = str(salary_number)
                 if len(str_number) >= 6:
-                    print(f"      ✓ Longitud válida: {len(str_number)} dígitos")
-                    
                     # Verificar que no sea un número de documento típico
                     # Los números de cédula suelen ser más "irregulares"
                     if not self._looks_like_document_number(salary_number):
-                        print(f"      ✓ No parece número de documento")
-                        print(f"      ✓ SALARIO ACEPTADO: {salary_number:,}")
+                        traza.registrar('contrato.salario_aceptado', texto=salary_str, salario=salary_number)
                         return True
                     else:
-                        print(f"      ✗ Parece número de documento")
+                        traza.registrar('contrato.salario_rechazado', texto=salary_str, motivo='parece_documento')
                         return False
                 else:
-                    print(f"      ✗ Número muy corto: {len(str_number)} dígitos")
+                    traza.registrar('contrato.salario_rechazado', texto=salary_str, motivo='muy_corto', digitos=len(str_number))
                     return False
             else:
-                print(f"      ✗ Fuera de rango: {salary_number:,} (min: {min_salary:,}, max: {max_salary:,})")
+                traza.registrar('contrato.salario_rechazado', texto=salary_str, motivo='fuera_de_rango',
+                                minimo=min_salary, maximo=max_salary)
                 return False
             
         except ValueError as e:
-            print(f"      ✗ Error al convertir: {salary_str} - {e}")
+            traza.registrar('contrato.salario_rechazado', texto=salary_str, motivo='no_numerico', error=str(e))
             return False
 
     def _looks_like_document_number(self, number):
         """Verificar si un número parece ser un documento de identidad"""
 
-        print(f"      Evaluando si {number} parece un documento de identidad")
         # Para 1.423.500 (1423500), claramente NO es un documento
         # Los documentos suelen ser números más irregulares
         
@@ -594,12 +601,12 @@ class CONTRATOProcessor:
         
         # Si termina en 000 o 500, muy probablemente es salario, no documento
         if str_number.endswith('000') or str_number.endswith('500'):
-            print(f"        Termina en 000/500 -> probablemente salario")
+            traza.registrar('contrato.documento_o_salario', numero=number, decision='salario', regla='termina_000_500')
             return False
         
         # Si es múltiplo de 1000, probablemente es salario
         if number % 1000 == 0:
-            print(f"        Múltiplo de 1000 -> probablemente salario")
+            traza.registrar('contrato.documento_o_salario', numero=number, decision='salario', regla='multiplo_1000')
             return False
         
         # Si tiene entre 8-11 dígitos y no cumple las condiciones anteriores,
@@ -607,10 +614,10 @@ class CONTRATOProcessor:
         if 8 <= len(str_number) <= 11:
             # Si está en rango típico de salarios (1M - 10M), aceptarlo como salario
             if 1000000 <= number <= 10000000:
-                print(f"        En rango de salarios profesionales -> aceptar como salario")
+                traza.registrar('contrato.documento_o_salario', numero=number, decision='salario', regla='rango_profesional')
                 return False
             else:
-                print(f"        Podría ser documento por longitud y rango")
+                traza.registrar('contrato.documento_o_salario', numero=number, decision='documento', regla='longitud_y_rango')
                 return True
         
         # Si tiene menos de 8 dígitos, no es documento común
@@ -618,9 +625,21 @@ class CONTRATOProcessor:
 
     def _extract_salary_from_line(self, line):
         """Extraer salario de una línea específica (versión simplificada)"""
+        for _, _, salario in self._salary_matches(line):
+            return salario
+        return None
+    
+    def _salary_candidates(self, i, etiqueta=None):
+        """Salarios válidos de la línea `i` como candidatos con su posición"""
+        for inicio, fin, salario in self._salary_matches(self.lines[i]):
+            yield Candidato(i, inicio, fin, salario, etiqueta)
+    
+    def _salary_matches(self, line):
+        """Genera (inicio, fin, salario) para cada salario válido de la línea, en orden de preferencia"""
         
         # Limpiar la línea de espacios extra
         clean_line = line.strip()
+        desplazamiento = len(line) - len(line.lstrip())
         
         # Caso especial: si la línea es exactamente un número con formato de salario
         salary_exact_match = re.match(r'^\s*\$?\s*(\d{1,3}(?:\.\d{3})+)\s*$', clean_line)
@@ -628,7 +647,7 @@ class CONTRATOProcessor:
             number = salary_exact_match.group(1)
             if self._is_valid_salary(number):
                 salary_number = int(number.replace('.', ''))
-                return salary_number
+                yield (desplazamiento + salary_exact_match.start(1), desplazamiento + salary_exact_match.end(1), salary_number)
         
         # Patrones más simples y directos
         salary_patterns = [
@@ -639,17 +658,11 @@ class CONTRATOProcessor:
         ]
         
         for i, pattern in enumerate(salary_patterns):
-            matches = re.findall(pattern, clean_line)
-            if matches:
-                
-                for match in matches:
-                    if self._is_valid_salary(match):
-                        salary_number = int(match.replace('.', ''))
-                        return salary_number
-                    else:
-                        print(f"      ✗ Salario inválido según validación")
-        
-        return None
+            for match in re.finditer(pattern, clean_line):
+                number = match.group(1)
+                if self._is_valid_salary(number):
+                    salary_number = int(number.replace('.', ''))
+                    yield (desplazamiento + match.start(1), desplazamiento + match.end(1), salary_number)
 
     def extract_salario_base(self):
         """Extraer el salario base del conductor (versión final)"""
@@ -673,43 +686,42 @@ class CONTRATOProcessor:
             'SALARIO'
         ]
         
-        # Buscar en todas las líneas
-        for i, line in enumerate(self.lines):
-            normalized_line = normalize_text(line).upper()
-            
-            # Verificar si la línea contiene algún patrón de salario
-            for patron in patrones_salario:
-                if patron in normalized_line:
-                    
-                    # Buscar salario en la misma línea primero
-                    salario = self._extract_salary_from_line(line)
-                    if salario:
-                        self.result['salario_base'] = salario
-                        return salario
-                    
-                    # Buscar salario en las próximas 5 líneas
-                    for j in range(1, 6):
+        def candidatos_con_etiqueta():
+            # Buscar en todas las líneas
+            for i, line in enumerate(self.lines):
+                normalized_line = normalize_text(line).upper()
+                
+                # Verificar si la línea contiene algún patrón de salario
+                if any(patron in normalized_line for patron in patrones_salario):
+                    # Buscar salario en la misma línea primero y luego en las próximas 5 líneas
+                    for j in range(0, 6):
                         if i + j < len(self.lines):
-                            next_line = self.lines[i + j]
-                            salario = self._extract_salary_from_line(next_line)
-                            if salario:
-                                self.result['salario_base'] = salario
-                                return salario
+                            # La línea de la etiqueta identifica su ventana
+                            yield from self._salary_candidates(i + j, i)
         
-        print("No se encontraron patrones de salario, buscando números que parezcan salarios...")
+        # El primer salario leído con confianza gana; si ninguno lo es, el primero encontrado
+        candidato = self.confianza.primera_confiable(candidatos_con_etiqueta())
+        if candidato and candidato.valor:
+            self.result['salario_base'] = candidato.valor
+            return candidato.valor
+        
+        traza.registrar('contrato.salario_sin_etiqueta')
         
         # Búsqueda general: buscar líneas que contengan solo números con formato de salario
-        for i, line in enumerate(self.lines):
-            clean_line = line.strip()
-            # Solo buscar en líneas que parezcan contener únicamente un número de salario
-            if re.match(r'^\s*\$?\s*\d{1,3}(?:\.\d{3})+\s*$', clean_line):
-                salario = self._extract_salary_from_line(line)
-                if salario:
-                    self.result['salario_base'] = salario
-                    return salario
+        def candidatos_sueltos():
+            for i, line in enumerate(self.lines):
+                clean_line = line.strip()
+                # Solo buscar en líneas que parezcan contener únicamente un número de salario
+                if re.match(r'^\s*\$?\s*\d{1,3}(?:\.\d{3})+\s*$', clean_line):
+                    yield from self._salary_candidates(i)
+        
+        candidato = self.confianza.primera_confiable(candidatos_sueltos())
+        if candidato and candidato.valor:
+            self.result['salario_base'] = candidato.valor
+            return candidato.valor
         
         # Si no se encuentra salario específico, devolver None
-        print("No se encontró salario base")
+        traza.registrar('contrato.salario_no_encontrado')
         self.result['salario_base'] = None
         return None
     def _line_contains_irrelevant_content(self, line):
@@ -893,7 +905,7 @@ class CONTRATOProcessor:
             # No se encontró información
             self.result['termino_contrato'] = None
             self.result['fecha_terminacion'] = None
-            print("No se encontró información de término de contrato")
+            traza.registrar('contrato.termino_no_encontrado')
         
         return {
             'termino_contrato': self.result.get('termino_contrato'),
@@ -1011,27 +1023,24 @@ class CONTRATOProcessor:
         pattern = r'\b' + re.escape(word) + r'\b'
         return bool(re.search(pattern, line))
 
-    def process(self):
-        """Procesar todos los campos y devolver el resultado"""
+    def extract_validation(self):
+        """Validar que el contrato corresponda al conductor"""
+        self.result['validation'] = self.is_same_conductor()
+
+    def process(self, campos=None):
+        """Procesar los campos pedidos (todos por defecto) y devolver el resultado"""
         if not self.is_valid_contrato ():
             return {"error": "No es un CONTRATO válido"}
         
-        self.result['validation'] = self.is_same_conductor()
-        self.extract_number_phone()
-        self.extract_email()
-        self.extract_employer_address()
-        self.extract_sede()
-        self.extract_fecha_ingreso()
-        self.extract_salario_base()
-        self.extract_termino_contrato()
+        self.EXTRACTORES.ejecutar(self, campos)
 
-        return self.result
+        return self.EXTRACTORES.seleccionar(self.result, campos)
 
 # Función principal para procesar el OCR
-def process_contrato_data(data, numero_identificacion=None):
+def process_contrato_data(data, numero_identificacion=None, campos=None):
     try:
         processor = CONTRATOProcessor(data, numero_identificacion)
-        result = processor.process()
+        result = processor.process(campos)
         return result
     except Exception as e:
         import traceback
@@ -1042,14 +1051,25 @@ if __name__ == "__main__":
     try:
         parser = argparse.ArgumentParser(description='Procesar datos OCR')
         parser.add_argument('--file', type=str, help='Ruta al archivo JSON con datos OCR')
+        agregar_argumentos(parser)
         parser.add_argument('--numero_identificacion', type=str, help='Identificación del conductor (opcional)')
+        parser.add_argument('--fields', type=str, help='Campos a extraer separados por coma (opcional, por defecto todos)')
+        parser.add_argument('--debug', action='store_true', help='Volcar a stderr la traza de decisiones de los extractores')
         
         args = parser.parse_args()
 
         # Determinar qué archivo procesar
         file_path = None
         
-        if args.file:
+        if hay_entrada(args):
+            # JSON compacto por stdin o por un descriptor heredado, sin archivo temporal
+            try:
+                data = leer_entrada(args)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: La entrada no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en la entrada: {str(e)}"}))
+                sys.exit(1)
+        elif args.file:
             # Usar el archivo especificado por argumento
             file_path = args.file
             if not os.path.exists(file_path):
@@ -1085,16 +1105,21 @@ if __name__ == "__main__":
                 sys.exit(1)
         
         # Procesar los datos
-        result = process_contrato_data(data, args.numero_identificacion)
+        result = process_contrato_data(data, args.numero_identificacion, parse_fields(args.fields))
         
         # Imprimir resultado como JSON (único output a stdout)
         print(json.dumps(result, indent=4, ensure_ascii=False))
+
+        # Traza de decisiones a stderr solo si falló, hubo baja confianza o se pidió --debug
+        traza.volcar_si(result, args.debug)
         
     except Exception as e:
         # Errores a stderr para depuración
         print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
         print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
         
+        traza.volcar_si({"error": str(e)})
+
         # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
         print(json.dumps({"error": str(e)}))
         sys.exit(1)
\ No newline at end of file
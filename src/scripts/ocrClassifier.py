@@ -0,0 +1,236 @@
+import os
+import re
+import sys
+import json
+import glob
+import argparse
+import traceback
+from ocrDocument import OcrDocument
+from ocrNormalize import normalize_text
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
+
+# Páginas que se leen para clasificar: el tipo de documento se reconoce por
+# el encabezado y los rótulos de las primeras páginas
+PAGINAS_CLASIFICACION = 2
+
+# Puntaje mínimo de la mejor categoría para considerarla reconocida
+PUNTAJE_MINIMO = 4
+
+# Script que procesa cada categoría
+SCRIPTS = {
+    'SOAT': 'ocrSOAT.py',
+    'TECNOMECANICA': 'ocrTECNOMECANICA.py',
+    'POLIZA_CONTRACTUAL': 'ocrPOLIZA_CONTRACTUAL.py',
+    'POLIZA_EXTRACONTRACTUAL': 'ocrPOLIZA_EXTRACONTRACTUAL.py',
+    'POLIZA_TODO_RIESGO': 'ocrPOLIZA_TODO_RIESGO.py',
+    'TARJETA_DE_OPERACION': 'ocrTARJETA_DE_OPERACION.py',
+    'TARJETA_DE_PROPIEDAD': 'ocrTARJETA_DE_PROPIEDAD.py',
+    'CEDULA': 'ocrCEDULA.py',
+    'LICENCIA': 'ocrLICENCIA.py',
+    'CONTRATO': 'ocrCONTRATO.py',
+}
+
+# Firma de cada categoría: palabra clave → peso. Las palabras propias de una
+# categoría pesan más; las que comparten varias (PÓLIZA, MINISTERIO DE
+# TRANSPORTE) apenas desempatan.
+FIRMAS = {
+    'SOAT': {
+        'SOAT': 5, 'SEGURO OBLIGATORIO': 5, 'ACCIDENTES DE TRANSITO': 4,
+        'ASEGURADORA': 1, 'POLIZA': 0.5, 'TOMADOR': 0.5,
+    },
+    'TECNOMECANICA': {
+        'REVISION TECNICO-MECANICA': 5, 'REVISION TECNICOMECANICA': 5, 'TECNICO-MECANICA': 4,
+        'TECNICOMECANICA': 4, 'CERTIFICADO DE REVISION': 3, 'CENTRO DE DIAGNOSTICO AUTOMOTOR': 4,
+        'RTM': 3, 'EMISIONES CONTAMINANTES': 3, 'MINISTERIO DE TRANSPORTE': 0.5,
+    },
+    'POLIZA_CONTRACTUAL': {
+        'RESPONSABILIDAD CIVIL CONTRACTUAL': 5, 'RC CONTRACTUAL': 5, 'CONTRACTUAL': 3,
+        'POLIZA': 1, 'SEGURO': 0.5, 'ASEGURADORA': 0.5,
+    },
+    'POLIZA_EXTRACONTRACTUAL': {
+        'RESPONSABILIDAD CIVIL EXTRACONTRACTUAL': 5, 'RC EXTRACONTRACTUAL': 5, 'EXTRACONTRACTUAL': 3,
+        'POLIZA': 1, 'SEGURO': 0.5, 'ASEGURADORA': 0.5,
+    },
+    'POLIZA_TODO_RIESGO': {
+        'TODO RIESGO': 5, 'PERDIDA TOTAL': 2, 'PERDIDA PARCIAL': 2, 'HURTO': 1, 'AMPARO': 1,
+        'COBERTURA': 1, 'POLIZA': 1, 'SEGURO': 0.5, 'ASEGURADORA': 0.5,
+    },
+    'TARJETA_DE_OPERACION': {
+        'TARJETA DE OPERACION': 6, 'EMPRESA DE TRANSPORTE': 2, 'RADIO DE ACCION': 2,
+        'NIVEL DE SERVICIO': 2, 'SERVICIO PUBLICO': 1, 'MINISTERIO DE TRANSPORTE': 0.5,
+    },
+    'TARJETA_DE_PROPIEDAD': {
+        'LICENCIA DE TRANSITO': 6, 'TARJETA DE PROPIEDAD': 5, 'NUMERO DE MOTOR': 2, 'NUMERO DE CHASIS': 2,
+        'CILINDRADA': 2, 'CARROCERIA': 1, 'LINEA': 0.5, 'REPUBLICA DE COLOMBIA': 0.5,
+        'MINISTERIO DE TRANSPORTE': 0.5,
+    },
+    'CEDULA': {
+        'CEDULA DE CIUDADANIA': 4, 'IDENTIFICACION PERSONAL': 4, 'LUGAR DE NACIMIENTO': 2,
+        'ESTATURA': 2, 'REGISTRADOR': 2, 'FECHA DE NACIMIENTO': 1, 'REPUBLICA DE COLOMBIA': 0.5,
+    },
+    'LICENCIA': {
+        'LICENCIA DE CONDUCCION': 6, 'RESTRICCIONES': 2, 'CATEGORIA': 1,
+        'MINISTERIO DE TRANSPORTE': 0.5, 'REPUBLICA DE COLOMBIA': 0.5,
+    },
+    'CONTRATO': {
+        'CONTRATO INDIVIDUAL DE TRABAJO': 6, 'CONTRATO DE TRABAJO': 5, 'DATOS DEL EMPLEADOR': 4,
+        'DATOS DEL TRABAJADOR': 4, 'TERMINO FIJO': 2, 'TERMINO INDEFINIDO': 2, 'SALARIO': 2,
+        'EMPLEADOR': 1, 'TRABAJADOR': 1, 'CONDUCTOR': 1, 'CONTRATO': 1,
+    },
+}
+
+class DocumentClassifier:
+    """
+    Clasifica un resultado de OCR contra las firmas de todas las categorías
+    en una sola pasada: el texto se normaliza una vez y una alternancia con
+    todas las palabras clave (las más largas primero, como palabras
+    completas) lo recorre una vez. Cada palabra encontrada suma su peso, una
+    sola vez, a cada categoría que la usa.
+
+    Una palabra que contiene a otras como palabras completas ("CONTRATO
+    INDIVIDUAL DE TRABAJO" contiene "CONTRATO") también las acredita, porque
+    la alternancia se queda con la más larga.
+    """
+
+    def __init__(self, firmas=None):
+        self.firmas = {
+            categoria: {normalize_text(palabra): peso for palabra, peso in palabras.items()}
+            for categoria, palabras in (firmas or FIRMAS).items()
+        }
+
+        # Palabra → [(categoría, peso)]
+        self.pesos = {}
+        for categoria, palabras in self.firmas.items():
+            for palabra, peso in palabras.items():
+                self.pesos.setdefault(palabra, []).append((categoria, peso))
+
+        ordenadas = sorted(self.pesos, key=len, reverse=True)
+        self.regex = re.compile(
+            r'(?<![A-Z0-9])(?:' + '|'.join(re.escape(palabra) for palabra in ordenadas) + r')(?![A-Z0-9])'
+        )
+
+        # Palabras contenidas (como palabra completa) en cada palabra clave
+        self.contenidas = {
+            palabra: [
+                otra for otra in ordenadas
+                if otra != palabra and re.search(r'(?<![A-Z0-9])' + re.escape(otra) + r'(?![A-Z0-9])', palabra)
+            ]
+            for palabra in ordenadas
+        }
+
+    def encontradas(self, texto):
+        """Palabras clave presentes en un texto ya normalizado"""
+        presentes = set()
+        for match in self.regex.finditer(texto):
+            palabra = match.group(0)
+            if palabra not in presentes:
+                presentes.add(palabra)
+                presentes.update(self.contenidas[palabra])
+        return presentes
+
+    def puntuar(self, texto):
+        """Ranking [(categoría, puntaje, palabras)] de mayor a menor, sin las categorías en cero"""
+        puntajes = {}
+        for palabra in self.encontradas(texto):
+            for categoria, peso in self.pesos[palabra]:
+                puntaje, palabras = puntajes.get(categoria, (0, []))
+                puntajes[categoria] = (puntaje + peso, palabras + [palabra])
+        ranking = [(categoria, puntaje, sorted(palabras)) for categoria, (puntaje, palabras) in puntajes.items()]
+        # Empates: el orden de declaración de las firmas
+        orden = list(self.firmas)
+        return sorted(ranking, key=lambda item: (-item[1], orden.index(item[0])))
+
+    def clasificar(self, ocr_data, paginas=PAGINAS_CLASIFICACION):
+        """
+        Categoría más probable de un resultado de OCR (None si ninguna llega a
+        PUNTAJE_MINIMO), con su script y el ranking completo
+        """
+        document = OcrDocument(ocr_data)
+        ranking = self.puntuar(document.texto(paginas))
+        total = sum(puntaje for _, puntaje, _ in ranking)
+
+        mejor = ranking[0] if ranking and ranking[0][1] >= PUNTAJE_MINIMO else None
+        return {
+            'categoria': mejor[0] if mejor else None,
+            'script': SCRIPTS.get(mejor[0]) if mejor else None,
+            'ranking': [
+                {
+                    'categoria': categoria,
+                    'puntaje': puntaje,
+                    'proporcion': round(puntaje / total, 3) if total else 0,
+                    'palabras': palabras,
+                }
+                for categoria, puntaje, palabras in ranking
+            ],
+        }
+
+_clasificador = None
+
+# Función principal para clasificar un OCR
+def classify_ocr_data(data, paginas=PAGINAS_CLASIFICACION):
+    global _clasificador
+    try:
+        if _clasificador is None:
+            _clasificador = DocumentClassifier()
+        return _clasificador.clasificar(data, paginas)
+    except Exception as e:
+        return {"error": str(e), "trace": traceback.format_exc()}
+
+# Ejecución principal
+if __name__ == "__main__":
+    try:
+        parser = argparse.ArgumentParser(description='Clasificar resultados de OCR por tipo de documento')
+        parser.add_argument('--file', type=str, help='Ruta al archivo JSON con datos OCR')
+        agregar_argumentos(parser)
+        parser.add_argument('--dir', type=str, help='Directorio con JSON de OCR para clasificar en lote')
+        parser.add_argument('--paginas', type=int, default=PAGINAS_CLASIFICACION,
+                            help=f'Páginas a revisar (por defecto {PAGINAS_CLASIFICACION}, 0 = todas)')
+
+        args = parser.parse_args()
+        paginas = args.paginas or None
+
+        if args.dir:
+            result = {}
+            for ruta in sorted(glob.glob(os.path.join(args.dir, '*.json'))):
+                with open(ruta, 'r', encoding='utf-8') as file:
+                    clasificacion = classify_ocr_data(json.load(file), paginas)
+                # En lote basta la categoría y la mejor alternativa
+                clasificacion['ranking'] = clasificacion.get('ranking', [])[:2]
+                result[os.path.basename(ruta)] = clasificacion
+        elif hay_entrada(args):
+            try:
+                data = leer_entrada(args)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: La entrada no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en la entrada: {str(e)}"}))
+                sys.exit(1)
+            result = classify_ocr_data(data, paginas)
+        elif args.file:
+            if not os.path.exists(args.file):
+                print(f"ERROR: El archivo {args.file} no existe", file=sys.stderr)
+                print(json.dumps({"error": f"Archivo no encontrado: {args.file}"}))
+                sys.exit(1)
+            try:
+                with open(args.file, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: El archivo no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en archivo: {str(e)}"}))
+                sys.exit(1)
+            result = classify_ocr_data(data, paginas)
+        else:
+            print("ERROR: se requiere --file, --stdin, --fd o --dir", file=sys.stderr)
+            print(json.dumps({"error": "Se requiere --file, --stdin, --fd o --dir"}))
+            sys.exit(1)
+
+        # Imprimir resultado como JSON (único output a stdout)
+        print(json.dumps(result, indent=4, ensure_ascii=False))
+
+    except Exception as e:
+        # Errores a stderr para depuración
+        print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
+        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
+
+        # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
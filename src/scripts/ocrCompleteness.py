@@ -0,0 +1,277 @@
+import re
+import sys
+import json
+import time
+import argparse
+import traceback
+from datetime import date
+from collections import namedtuple
+from ocrConfidence import ConfidenceMap, UMBRAL_CONFIANZA
+from ocrConsumer import procesar_ocr
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
+
+# Valores admitidos por el modelo Conductor (src/models/conductor.js)
+SEDES = ('YOPAL', 'VILLANUEVA', 'TAURAMENA')
+TIPOS_SANGRE = ('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-')
+GENEROS = ('M', 'F')
+CATEGORIAS_LICENCIA = ('A1', 'A2', 'B1', 'B2', 'B3', 'C1', 'C2', 'C3')
+
+MESES = {
+    'ENE': 1, 'FEB': 2, 'MAR': 3, 'ABR': 4, 'MAY': 5, 'JUN': 6,
+    'JUL': 7, 'AGO': 8, 'SEP': 9, 'SET': 9, 'OCT': 10, 'NOV': 11, 'DIC': 12,
+}
+
+# Números con separadores de miles ("1188.666.755") y fechas numéricas o con mes abreviado
+PATRON_NUMERO = re.compile(r'\d[\d.,]*\d|\d')
+PATRON_FECHA = re.compile(
+    r'(?<!\d)(\d{1,2})[/\-. ](\d{1,2}|[A-Za-z]{3,})[/\-. ](\d{4})(?!\d)|(?<!\d)(\d{4})-(\d{2})-(\d{2})(?!\d)'
+)
+
+# Campo del esquema que usa ministralConductor: cómo se respalda en el texto
+# (tipo), si sin él hay que llamar a la IA (critico), de dónde sale en el
+# resultado del procesador (clave o función(resultado, parametros)), valores
+# admitidos y campos de los que depende su valor
+Campo = namedtuple('Campo', ['nombre', 'tipo', 'critico', 'origen', 'opciones', 'depende'])
+
+def campo(nombre, tipo='texto', critico=False, origen=None, opciones=None, depende=()):
+    return Campo(nombre, tipo, critico, origen or nombre, opciones, tuple(depende))
+
+def _identificacion_validada(resultado, parametros):
+    """La licencia y el contrato no extraen el número: confirman que aparece el del conductor"""
+    return parametros.get('numero_identificacion') if resultado.get('validation') else None
+
+ESQUEMAS = {
+    'CEDULA': [
+        campo('numero_identificacion', 'numero', critico=True),
+        campo('nombre', critico=True),
+        campo('apellido', critico=True),
+        campo('fecha_nacimiento', 'fecha', critico=True),
+        campo('genero', 'opcion', opciones=GENEROS),
+        campo('tipo_sangre', 'opcion', opciones=TIPOS_SANGRE),
+    ],
+    'LICENCIA': [
+        campo('numero_identificacion', 'numero', critico=True, origen=_identificacion_validada),
+        campo('numero_licencia', 'numero', origen=_identificacion_validada),
+        campo('fecha_expedicion', 'fecha', critico=True, origen='fecha_expedicion_licencia'),
+        # Las vigencias se calculan desde la fecha de expedición: sin ella no valen
+        campo('categorias', 'categorias', critico=True, origen='licencia', depende=('fecha_expedicion',)),
+    ],
+    'CONTRATO': [
+        campo('numero_identificacion', 'numero', critico=True, origen=_identificacion_validada),
+        campo('fecha_ingreso', 'fecha', critico=True),
+        campo('termino_contrato', critico=True),
+        campo('sede_trabajo', 'opcion', critico=True, opciones=SEDES),
+        campo('fecha_terminacion', 'fecha'),
+    ],
+}
+
+def parse_fecha(valor):
+    """date de 'DD/MM/YYYY', 'DD-MM-YYYY', 'YYYY-MM-DD' o 'DD-MES-YYYY', o None"""
+    if isinstance(valor, date):
+        return valor
+    match = PATRON_FECHA.fullmatch(str(valor or '').strip())
+    if not match:
+        return None
+    if match.group(4):
+        anio, mes, dia = match.group(4, 5, 6)
+    else:
+        dia, mes, anio = match.group(1, 2, 3)
+    mes = MESES.get(mes[:3].upper()) if mes.isalpha() else int(mes)
+    try:
+        return date(int(anio), mes, int(dia)) if mes else None
+    except ValueError:
+        return None
+
+def _texto(content, valor):
+    """Span de `valor` como palabras completas en el content (sin distinguir mayúsculas)"""
+    palabras = str(valor).split()
+    if not palabras:
+        return None
+    patron = r'(?<!\w)' + r'\s+'.join(re.escape(palabra) for palabra in palabras) + r'(?![\w+\-])'
+    match = re.search(patron, content, re.IGNORECASE)
+    return (match.start(), match.end()) if match else None
+
+def _numero(content, valor):
+    """Span de un número del content cuyos dígitos son exactamente los del valor"""
+    digitos = re.sub(r'\D', '', str(valor))
+    for match in PATRON_NUMERO.finditer(content):
+        if digitos and re.sub(r'\D', '', match.group()) == digitos:
+            return match.start(), match.end()
+    return None
+
+def _fecha(content, valor):
+    for match in PATRON_FECHA.finditer(content):
+        if parse_fecha(match.group()) == valor:
+            return match.start(), match.end()
+    return None
+
+def _normalizar(especificacion, valor):
+    """Valor en el formato del esquema de la IA, o None si no es válido"""
+    if valor in (None, '', []):
+        return None
+    if especificacion.tipo == 'numero':
+        digitos = re.sub(r'\D', '', str(valor))
+        return digitos or None
+    if especificacion.tipo == 'fecha':
+        fecha = parse_fecha(valor)
+        return fecha.isoformat() if fecha else None
+    if especificacion.tipo == 'opcion':
+        valor = str(valor).strip().upper()
+        if especificacion.opciones == TIPOS_SANGRE:
+            valor = re.sub(r'^0([+-])$', r'O\1', valor)
+        return valor if valor in especificacion.opciones else None
+    if especificacion.tipo == 'categorias':
+        categorias = []
+        for item in valor if isinstance(valor, list) else []:
+            vigencia = parse_fecha(item.get('vigencia_hasta'))
+            if item.get('categoria') not in CATEGORIAS_LICENCIA:
+                return None
+            categorias.append({'categoria': item['categoria'], 'vigencia_hasta': vigencia.isoformat() if vigencia else ''})
+        return categorias or None
+    valor = ' '.join(str(valor).split()).upper()
+    return valor or None
+
+def _respaldos(especificacion, content, valor):
+    """Spans del content que respaldan el valor (vacío si el valor no aparece en el documento)"""
+    if especificacion.tipo == 'numero':
+        spans = [_numero(content, valor)]
+    elif especificacion.tipo == 'fecha':
+        spans = [_fecha(content, parse_fecha(valor))]
+    elif especificacion.tipo == 'categorias':
+        spans = [
+            (match.start(), match.end()) if (match := re.search(rf'(?<![A-Z0-9]){item["categoria"]}(?!\d)', content)) else None
+            for item in valor
+        ]
+    elif especificacion.tipo == 'opcion' and valor in TIPOS_SANGRE:
+        spans = [_texto(content, valor) or _texto(content, valor.replace('O', '0', 1))]
+    else:
+        spans = [_texto(content, valor)]
+    return [] if None in spans else spans
+
+def _confianza(mapa, spans):
+    """Menor confianza (promedio de sus palabras) entre los spans; None si no hay palabras"""
+    if not spans:
+        return None
+    puntajes = [
+        float(puntaje) for puntaje in mapa.score([inicio for inicio, _ in spans], [fin for _, fin in spans])
+        if puntaje is not None and puntaje == puntaje
+    ]
+    return round(min(puntajes), 3) if puntajes else None
+
+def evaluar(categoria, resultado, ocr_data, parametros=None, umbral=UMBRAL_CONFIANZA):
+    """
+    Completitud del resultado de un procesador frente al esquema que pide la
+    IA. Cada campo queda:
+
+    - completo: el procesador dio un valor con formato válido
+    - respaldado: ese valor aparece en el texto del OCR (un valor calculado
+      o por defecto del procesador no cuenta)
+    - confianza: la de las palabras del OCR que lo respaldan (None sin palabras)
+
+    Un campo se acepta si es completo, respaldado, con confianza None o sobre
+    el umbral, y sus dependencias también se aceptan. `suficiente` es True
+    cuando se aceptan todos los críticos: entonces `datos` reemplaza a la
+    llamada a la IA; si no, `faltantes` dice qué campos pedirle.
+    """
+    parametros = parametros or {}
+    esquema = ESQUEMAS[categoria]
+    analyze_result = ocr_data.get('analyzeResult', ocr_data) if isinstance(ocr_data, dict) else {}
+    content = analyze_result.get('content', '') or ''
+    mapa = ConfidenceMap(analyze_result)
+    valido = isinstance(resultado, dict) and 'error' not in resultado
+
+    campos = {}
+    for especificacion in esquema:
+        origen = especificacion.origen
+        bruto = None
+        if valido:
+            bruto = origen(resultado, parametros) if callable(origen) else resultado.get(origen)
+        valor = _normalizar(especificacion, bruto)
+        spans = _respaldos(especificacion, content, valor) if valor is not None else []
+        confianza = _confianza(mapa, spans)
+        campos[especificacion.nombre] = {
+            'valor': valor,
+            'critico': especificacion.critico,
+            'completo': valor is not None,
+            'respaldado': bool(spans),
+            'confianza': confianza,
+            'aceptado': valor is not None and bool(spans) and (confianza is None or confianza >= umbral),
+        }
+    for especificacion in esquema:
+        if not all(campos[dependencia]['aceptado'] for dependencia in especificacion.depende):
+            campos[especificacion.nombre]['aceptado'] = False
+
+    faltantes = [nombre for nombre, info in campos.items() if not info['aceptado']]
+    return {
+        'categoria': categoria,
+        'suficiente': valido and all(info['aceptado'] for info in campos.values() if info['critico']),
+        'datos': {nombre: info['valor'] for nombre, info in campos.items() if info['aceptado']},
+        'faltantes': faltantes,
+        'criticosFaltantes': [nombre for nombre in faltantes if campos[nombre]['critico']],
+        'campos': campos,
+    }
+
+# Función principal: ejecutar el procesador y evaluar su completitud
+def process_completeness_data(data, categoria, parametros=None, umbral=UMBRAL_CONFIANZA):
+    try:
+        if categoria not in ESQUEMAS:
+            return {"error": f"Categoría sin esquema de completitud: {categoria}"}
+        inicio = time.perf_counter()
+        resultado = procesar_ocr(data, categoria, parametros)
+        evaluacion = evaluar(categoria, resultado, data, parametros, umbral)
+        evaluacion['procesador'] = resultado
+        evaluacion['ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+        return evaluacion
+    except Exception as e:
+        return {"error": str(e), "trace": traceback.format_exc()}
+
+# Ejecución principal
+if __name__ == "__main__":
+    try:
+        parser = argparse.ArgumentParser(description='Extraer con reglas y decidir si hace falta la IA')
+        parser.add_argument('--categoria', type=str, required=True, choices=sorted(ESQUEMAS), help='Categoría del documento')
+        parser.add_argument('--file', type=str, help='Ruta al archivo JSON con datos OCR')
+        agregar_argumentos(parser)
+        parser.add_argument('--numero_identificacion', type=str, help='Identificación del conductor (opcional)')
+        parser.add_argument('--fecha_nacimiento', type=str, help='Fecha de nacimiento del conductor (opcional)')
+        parser.add_argument('--umbral', type=float, default=UMBRAL_CONFIANZA, help='Confianza mínima de un campo')
+
+        args = parser.parse_args()
+
+        if hay_entrada(args):
+            try:
+                data = leer_entrada(args)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: La entrada no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en la entrada: {str(e)}"}))
+                sys.exit(1)
+        elif args.file:
+            try:
+                with open(args.file, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+            except FileNotFoundError:
+                print(f"ERROR: El archivo {args.file} no existe", file=sys.stderr)
+                print(json.dumps({"error": f"Archivo no encontrado: {args.file}"}))
+                sys.exit(1)
+        else:
+            print("ERROR: se requiere --file, --stdin o --fd", file=sys.stderr)
+            print(json.dumps({"error": "Se requiere --file, --stdin o --fd"}))
+            sys.exit(1)
+
+        parametros = {
+            'numero_identificacion': args.numero_identificacion,
+            'fecha_nacimiento': args.fecha_nacimiento,
+        }
+        result = process_completeness_data(data, args.categoria, parametros, args.umbral)
+
+        # Imprimir resultado como JSON (único output a stdout)
+        print(json.dumps(result, indent=4, ensure_ascii=False, default=str))
+
+    except Exception as e:
+        # Errores a stderr para depuración
+        print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
+        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
+
+        # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
@@ -0,0 +1,269 @@
+import re
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from ocrTrace import traza
+
+
+try:
+    import numpy as np
+except ImportError:  # Sin NumPy se usa la versión en Python puro (más lenta)
+    np = None
+
+# Confianza mínima para aceptar un candidato y estadística usada por defecto
+UMBRAL_CONFIANZA = 0.5
+ESTADISTICA_CONFIANZA = 'mean'
+ESTADISTICAS = ('min', 'mean', 'median')
+
+# Coincidencia de un extractor: línea, posición dentro de la línea, valor extraído
+# y etiqueta junto a la que se buscó (None en búsquedas por todo el documento)
+Candidato = namedtuple('Candidato', ['linea', 'inicio', 'fin', 'valor', 'etiqueta'], defaults=(None,))
+
+def buscar_en_lineas(lines, pattern, indices=None, flags=0, etiqueta=None):
+    """
+    Genera un Candidato por cada coincidencia de `pattern` en las líneas
+    indicadas (todas por defecto), en orden de documento. El valor es el
+    objeto Match, así el primer candidato es el mismo que daría re.search.
+    """
+    regex = re.compile(pattern, flags)
+    for i in (indices if indices is not None else range(len(lines))):
+        for match in regex.finditer(lines[i]):
+            yield Candidato(i, match.start(), match.end(), match, etiqueta)
+
+class ConfidenceMap:
+    """
+    Confianza de las palabras del OCR proyectada sobre los offsets del
+    content. Permite calificar cualquier candidato de un extractor (un rango
+    de texto) con el mínimo, promedio o mediana de la confianza de las
+    palabras que cubre, para muchos candidatos en una sola llamada.
+
+    Los arreglos se construyen por página y solo para las páginas donde caen
+    candidatos: en un contrato de 30 páginas cuyos datos están en la primera,
+    las demás páginas nunca se recorren.
+    """
+
+    def __init__(self, analyze_result):
+        if 'analyzeResult' in analyze_result:
+            analyze_result = analyze_result.get('analyzeResult') or {}
+        self.content = analyze_result.get('content', '')
+        self._pages = analyze_result.get('pages', []) or []
+        # Offset inicial de cada página según pages[].spans (las páginas sin spans
+        # se ubican con el offset de su primera palabra al construir sus arreglos)
+        self._page_starts = [self._page_start(page) for page in self._pages]
+        self._arrays = {}
+        self._line_offsets = None
+
+    @classmethod
+    def from_analyze_result(cls, analyze_result):
+        return cls(analyze_result)
+
+    @staticmethod
+    def _page_start(page):
+        spans = page.get('spans') or []
+        if spans:
+            return min(span.get('offset', 0) for span in spans)
+        words = page.get('words') or []
+        if words:
+            span = words[0].get('span') or (words[0].get('spans') or [{}])[0]
+            return span.get('offset', 0)
+        return None
+
+    def __len__(self):
+        return sum(len(page.get('words') or []) for page in self._pages)
+
+    @property
+    def line_offsets(self):
+        """Offset en el content del inicio de cada línea de content.split('\\n')"""
+        if self._line_offsets is None:
+            offsets = [0]
+            for line in self.content.split('\n')[:-1]:
+                offsets.append(offsets[-1] + len(line) + 1)
+            self._line_offsets = offsets
+        return self._line_offsets
+
+    def _page_index(self, offset):
+        """Índice de la página que contiene un offset del content"""
+        indice = 0
+        for i, inicio in enumerate(self._page_starts):
+            if inicio is not None and inicio <= offset:
+                indice = i
+        return indice
+
+    def _arrays_page(self, indice):
+        """(starts, ends, confidences, acumulada) de una página, ordenados por offset"""
+        if indice not in self._arrays:
+            words = self._pages[indice].get('words') or [] if indice < len(self._pages) else []
+            spans = [word.get('span') or (word.get('spans') or [{}])[0] for word in words]
+            starts = [span.get('offset', 0) for span in spans]
+            ends = [start + span.get('length', 0) for start, span in zip(starts, spans)]
+            confidences = [float(word.get('confidence', 0) or 0) for word in words]
+            if np is not None:
+                starts = np.asarray(starts, dtype=np.int64)
+                orden = np.argsort(starts, kind='stable')
+                starts = starts[orden]
+                ends = np.asarray(ends, dtype=np.int64)[orden]
+                confidences = np.asarray(confidences, dtype=np.float64)[orden]
+                # Suma acumulada para calcular promedios de cualquier rango en O(1)
+                acumulada = np.concatenate(([0.0], np.cumsum(confidences)))
+            else:
+                orden = sorted(range(len(starts)), key=starts.__getitem__)
+                starts = [starts[i] for i in orden]
+                ends = [ends[i] for i in orden]
+                confidences = [confidences[i] for i in orden]
+                acumulada = None
+            self._arrays[indice] = (starts, ends, confidences, acumulada)
+        return self._arrays[indice]
+
+    def page_arrays(self, page_number):
+        """(starts, ends, confidences) de las palabras de una página (numeración desde 1)"""
+        for indice, page in enumerate(self._pages):
+            if page.get('pageNumber', indice + 1) == page_number:
+                return self._arrays_page(indice)[:3]
+        return self._arrays_page(len(self._pages))[:3]
+
+    def spans(self, candidatos):
+        """Convierte candidatos (línea, inicio, fin) a offsets absolutos del content"""
+        line_offsets = self.line_offsets
+        inicios = [line_offsets[c.linea] + c.inicio for c in candidatos]
+        fines = [line_offsets[c.linea] + c.fin for c in candidatos]
+        return inicios, fines
+
+    def score(self, inicios, fines, estadistica=ESTADISTICA_CONFIANZA):
+        """
+        Confianza de cada rango [inicio, fin) del content según la estadística
+        ('min', 'mean' o 'median') de las palabras que lo cubren. Los rangos
+        sin palabras quedan en NaN (None sin NumPy).
+        """
+        if estadistica not in ESTADISTICAS:
+            raise ValueError(f"Estadística no soportada: {estadistica}")
+
+        # Agrupar los rangos por página para calificar cada grupo en una sola llamada
+        grupos = {}
+        for k, inicio in enumerate(inicios):
+            grupos.setdefault(self._page_index(inicio), []).append(k)
+
+        if np is None:
+            resultado = [None] * len(inicios)
+            for indice, posiciones in grupos.items():
+                arreglos = self._arrays_page(indice)
+                for k in posiciones:
+                    resultado[k] = self._score_python(arreglos, inicios[k], fines[k], estadistica)
+            return resultado
+
+        inicios = np.asarray(inicios, dtype=np.int64)
+        fines = np.asarray(fines, dtype=np.int64)
+        resultado = np.full(len(inicios), np.nan)
+        for indice, posiciones in grupos.items():
+            posiciones = np.asarray(posiciones, dtype=np.int64)
+            resultado[posiciones] = self._score_numpy(
+                self._arrays_page(indice), inicios[posiciones], fines[posiciones], estadistica
+            )
+        return resultado
+
+    @staticmethod
+    def _score_numpy(arreglos, inicios, fines, estadistica):
+        starts, ends, confidences, acumulada = arreglos
+        resultado = np.full(len(inicios), np.nan)
+        if not len(starts):
+            return resultado
+
+        # Palabras cubiertas: terminan después del inicio y empiezan antes del fin
+        lo = np.searchsorted(ends, inicios, side='right')
+        hi = np.maximum(np.searchsorted(starts, fines, side='left'), lo)
+        cantidad = hi - lo
+        con_palabras = cantidad > 0
+        if not con_palabras.any():
+            return resultado
+
+        if estadistica == 'mean':
+            sumas = acumulada[hi] - acumulada[lo]
+            resultado[con_palabras] = sumas[con_palabras] / cantidad[con_palabras]
+        elif estadistica == 'min':
+            # reduceat sobre pares [lo, hi); el centinela evita índices fuera de rango
+            extendida = np.append(confidences, np.inf)
+            pares = np.empty(2 * len(lo), dtype=np.int64)
+            pares[0::2] = lo
+            pares[1::2] = hi
+            minimos = np.minimum.reduceat(extendida, pares)[0::2]
+            resultado[con_palabras] = minimos[con_palabras]
+        else:
+            for k in np.flatnonzero(con_palabras):
+                resultado[k] = np.median(confidences[lo[k]:hi[k]])
+        return resultado
+
+    @staticmethod
+    def _score_python(arreglos, inicio, fin, estadistica):
+        starts, ends, confidences, _ = arreglos
+        lo = bisect_right(ends, inicio)
+        hi = max(lo, bisect_left(starts, fin))
+        valores = confidences[lo:hi]
+        if not valores:
+            return None
+        if estadistica == 'min':
+            return min(valores)
+        if estadistica == 'mean':
+            return sum(valores) / len(valores)
+        valores = sorted(valores)
+        medio = len(valores) // 2
+        return valores[medio] if len(valores) % 2 else (valores[medio - 1] + valores[medio]) / 2
+
+    def aceptados(self, candidatos, umbral=UMBRAL_CONFIANZA, estadistica=ESTADISTICA_CONFIANZA):
+        """
+        Lista de booleanos: True si el candidato alcanza el umbral. Un candidato
+        sin palabras asociadas se acepta (no hay evidencia para descartarlo).
+        """
+        if not candidatos or not self._pages:
+            return [True] * len(candidatos)
+        puntajes = self.score(*self.spans(candidatos), estadistica)
+        if np is not None:
+            return list(np.isnan(puntajes) | (puntajes >= umbral))
+        return [p is None or p >= umbral for p in puntajes]
+
+    def es_confiable(self, candidato, umbral=UMBRAL_CONFIANZA, estadistica=ESTADISTICA_CONFIANZA):
+        return self.aceptados([candidato], umbral, estadistica)[0]
+
+    def filtrar(self, candidatos, umbral=UMBRAL_CONFIANZA, estadistica=ESTADISTICA_CONFIANZA):
+        """
+        Descarta en una sola llamada los candidatos de baja confianza. Si
+        ninguno alcanza el umbral se devuelven todos, para no perder el
+        resultado que el extractor habría dado sin confianzas.
+
+        Los candidatos con etiqueta nunca se descartan: el extractor elige
+        entre ellos por su valor (la fecha más lejana de la vigencia) y
+        quitar uno de baja confianza cambia la respuesta por otra fecha de
+        la misma ventana, típicamente la de expedición.
+        """
+        candidatos = list(candidatos)
+        aceptados = self.aceptados(candidatos, umbral, estadistica)
+        confiables = [c for c, ok in zip(candidatos, aceptados) if ok or c.etiqueta is not None]
+        if candidatos and not confiables:
+            traza.marcar_baja_confianza('confianza.ninguno_confiable', candidatos=len(candidatos), umbral=umbral)
+        elif len(confiables) < len(candidatos):
+            traza.registrar('confianza.descartados', descartados=len(candidatos) - len(confiables), umbral=umbral)
+        return confiables or candidatos
+
+    def primera_confiable(self, candidatos, umbral=UMBRAL_CONFIANZA, estadistica=ESTADISTICA_CONFIANZA):
+        """
+        Primer candidato confiable de un iterable (se consume de forma perezosa
+        y se detiene en el primero que cumple). Si ninguno cumple, devuelve el
+        primer candidato, como haría el extractor sin confianzas, o None.
+
+        La posición manda sobre la confianza en los candidatos con etiqueta:
+        de cada etiqueta solo compite la primera línea de su ventana con
+        candidatos, y si ninguno de esa línea es confiable se pasa a la
+        etiqueta siguiente, nunca a una línea posterior de la misma ventana
+        (donde suele estar otra fecha, como la de expedición).
+        """
+        primero = None
+        lineas = {}
+        for candidato in candidatos:
+            if primero is None:
+                primero = candidato
+            if candidato.etiqueta is not None:
+                if lineas.setdefault(candidato.etiqueta, candidato.linea) != candidato.linea:
+                    continue
+            if self.es_confiable(candidato, umbral, estadistica):
+                return candidato
+            traza.registrar('confianza.descartado', linea=candidato.linea, valor=candidato.valor, umbral=umbral)
+        if primero is not None:
+            traza.marcar_baja_confianza('confianza.primero_sin_confianza', linea=primero.linea, valor=primero.valor)
+        return primero
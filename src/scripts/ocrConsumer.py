@@ -0,0 +1,510 @@
+import os
+import sys
+import json
+import time
+import glob
+import signal
+import argparse
+import importlib
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from ocrSegments import PROCESADORES
+from ocrTrace import traza
+
+try:
+    import redis
+except ImportError:  # redis-py es opcional: sin él solo funciona el cliente en memoria
+    redis = None
+
+# Cola de trabajos (lista o stream) y grupo de consumidores del stream
+COLA_TRABAJOS = os.environ.get('OCR_QUEUE_KEY', 'ocr:trabajos')
+GRUPO_STREAM = os.environ.get('OCR_QUEUE_GROUP', 'ocr-consumidores')
+
+# Vigencia de los resultados: la misma que usan las colas de Node para el OCR
+TTL_RESULTADO = 3600
+
+# Trabajos que se toman de una vez y espera máxima cuando la cola está vacía
+LOTE = 16
+BLOQUEO_MS = 5000
+
+# Un trabajo del stream sin confirmar por más de este tiempo se da por
+# abandonado (su consumidor murió) y otro consumidor lo reclama
+RECLAMO_MS = 60000
+
+def clave_ocr(trabajo):
+    """Clave del blob de OCR que guardan las colas de Node ({prefijo}:{sessionId}:ocr:{categoria})"""
+    return trabajo.get('claveOcr') or f"{trabajo.get('prefijo', 'conductor')}:{trabajo['sessionId']}:ocr:{trabajo['categoria']}"
+
+def clave_resultado(trabajo):
+    return f"{trabajo.get('prefijo', 'conductor')}:{trabajo['sessionId']}:resultado:{trabajo['categoria']}"
+
+def clave_respuesta(trabajo):
+    """Lista donde quien encoló el trabajo espera (BLPOP) la respuesta"""
+    return f"ocr:respuestas:{trabajo.get('id') or trabajo['sessionId']}"
+
+def procesar_ocr(data, categoria, parametros=None, campos=None, motor='script'):
+    """Ejecuta el procesador de la categoría (o el motor de reglas) sobre un OCR ya decodificado"""
+    parametros = parametros or {}
+    if motor == 'reglas':
+        import ocrRules
+        return ocrRules.process_rules_data(data, categoria, parametros, campos)
+    if categoria not in PROCESADORES:
+        return {"error": f"Categoría sin procesador: {categoria}"}
+    modulo, funcion, nombres = PROCESADORES[categoria]
+    procesar = getattr(importlib.import_module(modulo), funcion)
+    return procesar(data, *[parametros.get(nombre) for nombre in nombres], campos=campos)
+
+def procesar_trabajo(trabajo, blob):
+    """
+    Ejecuta el procesador de la categoría sobre el OCR guardado en Redis. El
+    blob llega como texto y se decodifica aquí, dentro del trabajador.
+    """
+    try:
+        if blob is None:
+            return {"error": f"OCR no encontrado en Redis: {clave_ocr(trabajo)}"}
+        return procesar_ocr(
+            json.loads(blob), trabajo['categoria'], trabajo.get('parametros'),
+            trabajo.get('campos') or None, trabajo.get('motor', 'script'),
+        )
+    except Exception as e:
+        return {"error": str(e), "trace": traceback.format_exc()}
+    finally:
+        traza.reiniciar()
+
+def _procesar_tarea(tarea):
+    return procesar_trabajo(*tarea)
+
+def _inicializar_trabajador():
+    """Los procesos del pool cargan los procesadores una vez y no atienden SIGINT (lo maneja el padre)"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for modulo, _, _ in PROCESADORES.values():
+        importlib.import_module(modulo)
+
+class ColaLista:
+    """
+    Trabajos en una lista: Node hace LPUSH y aquí se toman en orden con LMOVE
+    hacia una lista de trabajos en curso propia del consumidor
+    ({clave}:procesando:{consumidor}), de donde salen al confirmar. Si el
+    consumidor muere a mitad de un lote, al arrancar con el mismo nombre
+    devuelve esos trabajos a la cola: la entrega es al menos una vez.
+    Dos consumidores no deben compartir nombre.
+    """
+
+    def __init__(self, cliente, clave=COLA_TRABAJOS, consumidor=None):
+        self.cliente = cliente
+        self.clave = clave
+        self.consumidor = consumidor or os.uname().nodename
+        self.procesando = f"{clave}:procesando:{self.consumidor}"
+        self._recuperada = False
+
+    def recuperar(self):
+        """Devuelve a la cola los trabajos que quedaron en curso; devuelve cuántos"""
+        recuperados = 0
+        while self.cliente.lmove(self.procesando, self.clave, 'LEFT', 'RIGHT') is not None:
+            recuperados += 1
+        if recuperados:
+            print(f"Trabajos en curso devueltos a la cola: {recuperados}", file=sys.stderr)
+        return recuperados
+
+    def _mover(self, cantidad):
+        pipeline = self.cliente.pipeline(transaction=False)
+        for _ in range(cantidad):
+            pipeline.lmove(self.clave, self.procesando, 'RIGHT', 'LEFT')
+        return [mensaje for mensaje in pipeline.execute() if mensaje is not None]
+
+    def tomar(self, lote=LOTE, bloqueo_ms=BLOQUEO_MS):
+        """[(id, trabajo_json)] de hasta `lote` trabajos; espera hasta `bloqueo_ms` si no hay ninguno"""
+        if not self._recuperada:
+            self.recuperar()
+            self._recuperada = True
+        mensajes = self._mover(lote)
+        if not mensajes and bloqueo_ms:
+            primero = self.cliente.blmove(self.clave, self.procesando, max(1, bloqueo_ms // 1000), 'RIGHT', 'LEFT')
+            if primero is not None:
+                mensajes = [primero] + (self._mover(lote - 1) if lote > 1 else [])
+        # El id es el mensaje mismo: con él se quita de la lista en curso
+        return [(mensaje, mensaje) for mensaje in mensajes]
+
+    def confirmar(self, pipeline, ids):
+        for mensaje in ids:
+            pipeline.lrem(self.procesando, 1, mensaje)
+
+class ColaStream:
+    """
+    Trabajos en un stream con grupo de consumidores: un trabajo tomado y no
+    confirmado (el consumidor murió a mitad) queda pendiente, y cualquier
+    consumidor lo reclama con XAUTOCLAIM al arrancar y luego cada
+    `reclamo_ms` si sigue sin confirmar ese tiempo. Cada entrada lleva el
+    trabajo en el campo `trabajo`.
+    """
+
+    def __init__(self, cliente, clave=COLA_TRABAJOS, grupo=GRUPO_STREAM, consumidor=None, reclamo_ms=RECLAMO_MS):
+        self.cliente = cliente
+        self.clave = clave
+        self.grupo = grupo
+        self.consumidor = consumidor or f"{os.uname().nodename}-{os.getpid()}"
+        self.reclamo_ms = reclamo_ms
+        self._ultimo_reclamo = None
+        try:
+            self.cliente.xgroup_create(self.clave, self.grupo, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def reclamar(self, lote=LOTE):
+        """Toma para este consumidor hasta `lote` trabajos pendientes abandonados"""
+        respuesta = self.cliente.xautoclaim(
+            self.clave, self.grupo, self.consumidor, self.reclamo_ms, start_id='0-0', count=lote
+        )
+        # Entradas borradas del stream llegan sin campos: se confirman como inválidas
+        mensajes = [(id_mensaje, (campos or {}).get('trabajo')) for id_mensaje, campos in respuesta[1]]
+        if mensajes:
+            print(f"Trabajos abandonados reclamados: {len(mensajes)}", file=sys.stderr)
+        return mensajes
+
+    def tomar(self, lote=LOTE, bloqueo_ms=BLOQUEO_MS):
+        ahora = time.monotonic()
+        if self._ultimo_reclamo is None or (ahora - self._ultimo_reclamo) * 1000 >= self.reclamo_ms:
+            self._ultimo_reclamo = ahora
+            reclamados = self.reclamar(lote)
+            if reclamados:
+                return reclamados
+        respuesta = self.cliente.xreadgroup(
+            self.grupo, self.consumidor, {self.clave: '>'}, count=lote, block=bloqueo_ms or None
+        ) or []
+        return [
+            (id_mensaje, campos.get('trabajo'))
+            for _, mensajes in respuesta for id_mensaje, campos in mensajes
+        ]
+
+    def confirmar(self, pipeline, ids):
+        ids = [id_mensaje for id_mensaje in ids if id_mensaje is not None]
+        if ids:
+            pipeline.xack(self.clave, self.grupo, *ids)
+
+class OcrConsumer:
+    """
+    Consumidor de trabajos de OCR: toma un lote de la cola, trae todos los
+    blobs con un solo MGET, los procesa (en un pool de `concurrencia`
+    procesos que cargan los procesadores una sola vez) y escribe resultados,
+    estado y respuestas en un solo pipeline. Así desaparecen el archivo
+    temporal y el proceso de Python por documento.
+
+    Por trabajo escribe:
+      {prefijo}:{sessionId}:resultado:{categoria}  el resultado (JSON, EX TTL_RESULTADO)
+      {prefijo}:{sessionId}                        documento_{categoria}_procesado / _error
+      ocr:respuestas:{id}                          {id, categoria, resultado} para BLPOP
+    """
+
+    def __init__(self, cliente, cola, concurrencia=1, lote=LOTE, bloqueo_ms=BLOQUEO_MS):
+        self.cliente = cliente
+        self.cola = cola
+        self.concurrencia = max(1, concurrencia)
+        self.lote = lote
+        self.bloqueo_ms = bloqueo_ms
+        self.detenido = False
+        self.estadisticas = {'lotes': 0, 'trabajos': 0, 'errores': 0, 'invalidos': 0}
+        self._pool = None
+
+    def __enter__(self):
+        if self.concurrencia > 1:
+            self._pool = ProcessPoolExecutor(max_workers=self.concurrencia, initializer=_inicializar_trabajador)
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def detener(self, *_):
+        """Termina después del lote en curso (SIGTERM/SIGINT)"""
+        self.detenido = True
+
+    def _procesar(self, tareas):
+        if self._pool is None or len(tareas) <= 1:
+            return [_procesar_tarea(tarea) for tarea in tareas]
+        return list(self._pool.map(_procesar_tarea, tareas))
+
+    def ejecutar_lote(self):
+        """Procesa un lote; devuelve cuántos mensajes tomó de la cola"""
+        mensajes = self.cola.tomar(self.lote, self.bloqueo_ms)
+        if not mensajes:
+            return 0
+
+        trabajos, ids, invalidos = [], [], []
+        for id_mensaje, mensaje in mensajes:
+            try:
+                trabajo = json.loads(mensaje)
+                clave_ocr(trabajo)
+                trabajos.append(trabajo)
+                ids.append(id_mensaje)
+            except (TypeError, ValueError, KeyError, AttributeError) as e:
+                invalidos.append(id_mensaje)
+                print(f"Trabajo inválido descartado: {str(e)}: {str(mensaje)[:200]}", file=sys.stderr)
+
+        blobs = self.cliente.mget([clave_ocr(trabajo) for trabajo in trabajos]) if trabajos else []
+        resultados = self._procesar(list(zip(trabajos, blobs)))
+
+        pipeline = self.cliente.pipeline(transaction=False)
+        for trabajo, resultado in zip(trabajos, resultados):
+            categoria = trabajo['categoria']
+            estado = f"{trabajo.get('prefijo', 'conductor')}:{trabajo['sessionId']}"
+            serializado = json.dumps(resultado, ensure_ascii=False)
+            pipeline.set(clave_resultado(trabajo), serializado, ex=TTL_RESULTADO)
+            if 'error' in resultado:
+                self.estadisticas['errores'] += 1
+                pipeline.hset(estado, f"documento_{categoria}_error", resultado['error'])
+            else:
+                pipeline.hset(estado, f"documento_{categoria}_procesado", 'true')
+            respuesta = clave_respuesta(trabajo)
+            pipeline.rpush(respuesta, json.dumps(
+                {'id': trabajo.get('id'), 'categoria': categoria, 'resultado': resultado}, ensure_ascii=False
+            ))
+            pipeline.expire(respuesta, TTL_RESULTADO)
+        self.cola.confirmar(pipeline, ids + invalidos)
+        pipeline.execute()
+
+        self.estadisticas['lotes'] += 1
+        self.estadisticas['trabajos'] += len(trabajos)
+        self.estadisticas['invalidos'] += len(invalidos)
+        return len(mensajes)
+
+    def ejecutar(self, hasta_vaciar=False, max_lotes=None):
+        """Atiende la cola hasta que se detenga (o, con `hasta_vaciar`, hasta que quede vacía)"""
+        while not self.detenido and (max_lotes is None or self.estadisticas['lotes'] < max_lotes):
+            tomados = self.ejecutar_lote()
+            if not tomados and hasta_vaciar:
+                break
+        return self.estadisticas
+
+class _PipelineMemoria:
+    """Pipeline del cliente en memoria: acumula las llamadas y las aplica en execute()"""
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.llamadas = []
+
+    def __getattr__(self, nombre):
+        metodo = getattr(self.cliente, nombre)
+        def encolar(*args, **kwargs):
+            self.llamadas.append((metodo, args, kwargs))
+            return self
+        return encolar
+
+    def execute(self):
+        resultados = [metodo(*args, **kwargs) for metodo, args, kwargs in self.llamadas]
+        self.llamadas = []
+        return resultados
+
+class MemoriaRedis:
+    """
+    Sustituto en memoria del subconjunto de redis-py (decode_responses=True)
+    que usa el consumidor: cadenas, hashes, listas, streams con grupo y
+    pipelines. Sirve para probar el consumidor sin un servidor Redis; los
+    TTL se registran pero no expiran.
+    """
+
+    def __init__(self):
+        self.cadenas, self.hashes, self.listas, self.streams = {}, {}, {}, {}
+        self.ttl = {}
+        self._grupos = {}
+        self._secuencia = 0
+
+    def pipeline(self, transaction=True):
+        return _PipelineMemoria(self)
+
+    def get(self, clave):
+        return self.cadenas.get(clave)
+
+    def mget(self, claves):
+        return [self.cadenas.get(clave) for clave in claves]
+
+    def set(self, clave, valor, ex=None):
+        self.cadenas[clave] = valor
+        if ex:
+            self.ttl[clave] = ex
+        return True
+
+    def hset(self, clave, campo=None, valor=None, mapping=None):
+        destino = self.hashes.setdefault(clave, {})
+        nuevos = dict(mapping or {})
+        if campo is not None:
+            nuevos[campo] = valor
+        destino.update({k: str(v) for k, v in nuevos.items()})
+        return len(nuevos)
+
+    def hgetall(self, clave):
+        return dict(self.hashes.get(clave, {}))
+
+    def expire(self, clave, segundos):
+        self.ttl[clave] = segundos
+        return True
+
+    def lpush(self, clave, *valores):
+        lista = self.listas.setdefault(clave, deque())
+        for valor in valores:
+            lista.appendleft(valor)
+        return len(lista)
+
+    def rpush(self, clave, *valores):
+        lista = self.listas.setdefault(clave, deque())
+        lista.extend(valores)
+        return len(lista)
+
+    def lmove(self, origen, destino, src='LEFT', dest='RIGHT'):
+        lista = self.listas.get(origen)
+        if not lista:
+            return None
+        valor = lista.popleft() if src == 'LEFT' else lista.pop()
+        otra = self.listas.setdefault(destino, deque())
+        if dest == 'LEFT':
+            otra.appendleft(valor)
+        else:
+            otra.append(valor)
+        return valor
+
+    def blmove(self, origen, destino, timeout, src='LEFT', dest='RIGHT'):
+        return self.lmove(origen, destino, src, dest)
+
+    def lrem(self, clave, count, valor):
+        lista = self.listas.get(clave)
+        if not lista:
+            return 0
+        quitados = 0
+        while valor in lista and (not count or quitados < count):
+            lista.remove(valor)
+            quitados += 1
+        return quitados
+
+    def lrange(self, clave, inicio, fin):
+        lista = list(self.listas.get(clave, ()))
+        return lista[inicio:None if fin == -1 else fin + 1]
+
+    def xadd(self, clave, campos):
+        self._secuencia += 1
+        id_mensaje = f"{int(time.time() * 1000)}-{self._secuencia}"
+        self.streams.setdefault(clave, []).append((id_mensaje, dict(campos)))
+        return id_mensaje
+
+    def xgroup_create(self, clave, grupo, id='$', mkstream=False):
+        if clave not in self.streams:
+            if not mkstream:
+                raise ValueError("ERR The XGROUP subcommand requires the key to exist")
+            self.streams[clave] = []
+        if (clave, grupo) in self._grupos:
+            raise ValueError("BUSYGROUP Consumer Group name already exists")
+        # pendientes: id -> (consumidor, momento de la entrega)
+        self._grupos[(clave, grupo)] = {'entregados': 0 if id == '0' else len(self.streams[clave]), 'pendientes': {}}
+        return True
+
+    def xreadgroup(self, grupo, consumidor, streams, count=None, block=None):
+        respuesta = []
+        for clave in streams:
+            estado = self._grupos[(clave, grupo)]
+            entradas = self.streams.get(clave, [])
+            nuevas = entradas[estado['entregados']:estado['entregados'] + (count or len(entradas))]
+            if nuevas:
+                estado['entregados'] += len(nuevas)
+                estado['pendientes'].update((id_mensaje, (consumidor, time.monotonic())) for id_mensaje, _ in nuevas)
+                respuesta.append([clave, nuevas])
+        return respuesta
+
+    def xack(self, clave, grupo, *ids):
+        pendientes = self._grupos[(clave, grupo)]['pendientes']
+        confirmados = [id_mensaje for id_mensaje in ids if pendientes.pop(id_mensaje, None) is not None]
+        return len(confirmados)
+
+    def xautoclaim(self, clave, grupo, consumidor, min_idle_time, start_id='0-0', count=None):
+        pendientes = self._grupos[(clave, grupo)]['pendientes']
+        entradas = dict(self.streams.get(clave, []))
+        ahora = time.monotonic()
+        reclamados = [
+            id_mensaje for id_mensaje, (_, entregado) in pendientes.items()
+            if (ahora - entregado) * 1000 >= min_idle_time
+        ][:count]
+        for id_mensaje in reclamados:
+            pendientes[id_mensaje] = (consumidor, ahora)
+        return ['0-0', [(id_mensaje, entradas.get(id_mensaje)) for id_mensaje in reclamados], []]
+
+    def xpending_count(self, clave, grupo):
+        return len(self._grupos[(clave, grupo)]['pendientes'])
+
+def crear_cliente(url=None):
+    """Cliente de redis-py con la misma configuración que src/config/redisClient.js (REDIS_HOST/PORT/PASSWORD)"""
+    if redis is None:
+        raise ValueError("redis-py no está instalado (pip install redis); use --memoria para probar sin servidor")
+    if url:
+        return redis.Redis.from_url(url, decode_responses=True)
+    return redis.Redis(
+        host=os.environ.get('REDIS_HOST', 'localhost'),
+        port=int(os.environ.get('REDIS_PORT', '6379')),
+        password=os.environ.get('REDIS_PASSWORD') or None,
+        decode_responses=True,
+    )
+
+def _sembrar_memoria(cliente, directorio, cola, stream):
+    """Carga en el cliente en memoria los OCR de un directorio y un trabajo por cada uno, como lo haría Node"""
+    from ocrClassifier import classify_ocr_data
+    for numero, ruta in enumerate(sorted(glob.glob(os.path.join(directorio, '*.json')))):
+        with open(ruta, 'r', encoding='utf-8') as file:
+            contenido = file.read()
+        categoria = classify_ocr_data(json.loads(contenido)).get('categoria')
+        if not categoria:
+            continue
+        trabajo = {'id': os.path.splitext(os.path.basename(ruta))[0], 'prefijo': 'conductor',
+                   'sessionId': f"memoria-{numero}", 'categoria': categoria}
+        cliente.set(clave_ocr(trabajo), contenido, ex=TTL_RESULTADO)
+        if stream:
+            cliente.xadd(cola, {'trabajo': json.dumps(trabajo)})
+        else:
+            cliente.lpush(cola, json.dumps(trabajo))
+
+# Ejecución principal
+if __name__ == "__main__":
+    try:
+        parser = argparse.ArgumentParser(description='Consumir trabajos de OCR desde Redis y escribir los resultados')
+        parser.add_argument('--url', type=str, help='URL de Redis (por defecto REDIS_HOST/REDIS_PORT/REDIS_PASSWORD)')
+        parser.add_argument('--cola', type=str, default=COLA_TRABAJOS, help=f'Clave de la cola (por defecto {COLA_TRABAJOS})')
+        parser.add_argument('--stream', action='store_true', help='La cola es un stream con grupo de consumidores')
+        parser.add_argument('--consumidor', type=str,
+                            help='Nombre estable del consumidor (por defecto el host; único por proceso en una lista)')
+        parser.add_argument('--reclamo-ms', type=int, default=RECLAMO_MS,
+                            help=f'Con --stream, reclamar trabajos sin confirmar por este tiempo (por defecto {RECLAMO_MS})')
+        parser.add_argument('--concurrencia', type=int, default=1, help='Procesos que ejecutan los procesadores')
+        parser.add_argument('--lote', type=int, default=LOTE, help=f'Trabajos por lectura (por defecto {LOTE})')
+        parser.add_argument('--bloqueo-ms', type=int, default=BLOQUEO_MS, help='Espera con la cola vacía')
+        parser.add_argument('--hasta-vaciar', action='store_true', help='Terminar cuando la cola quede vacía')
+        parser.add_argument('--memoria', type=str,
+                            help='Probar con el cliente en memoria y un trabajo por cada JSON de este directorio')
+
+        args = parser.parse_args()
+
+        if args.memoria:
+            cliente = MemoriaRedis()
+            _sembrar_memoria(cliente, args.memoria, args.cola, args.stream)
+        else:
+            cliente = crear_cliente(args.url)
+        if args.stream:
+            cola = ColaStream(cliente, args.cola, consumidor=args.consumidor, reclamo_ms=args.reclamo_ms)
+        else:
+            cola = ColaLista(cliente, args.cola, consumidor=args.consumidor)
+
+        inicio = time.perf_counter()
+        with OcrConsumer(cliente, cola, args.concurrencia, args.lote, args.bloqueo_ms) as consumidor:
+            signal.signal(signal.SIGTERM, consumidor.detener)
+            signal.signal(signal.SIGINT, consumidor.detener)
+            result = consumidor.ejecutar(hasta_vaciar=args.hasta_vaciar or bool(args.memoria))
+        result['segundos'] = round(time.perf_counter() - inicio, 3)
+
+        # Imprimir resultado como JSON (único output a stdout)
+        print(json.dumps(result, indent=4, ensure_ascii=False))
+
+    except Exception as e:
+        # Errores a stderr para depuración
+        print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
+        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
+
+        # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
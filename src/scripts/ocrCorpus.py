@@ -0,0 +1,283 @@
+import os
+import re
+import sys
+import glob
+import json
+import mmap
+import time
+import zlib
+import struct
+import hashlib
+import argparse
+import traceback
+
+# Formato del corpus empaquetado:
+#
+#   [cabecera]  MAGIA (8 bytes) + offset y longitud del índice (2 x uint64 LE)
+#   [registros] por documento: el content en UTF-8 tal cual (se puede cortar
+#               directo del mmap) y el resto del analyzeResult en JSON
+#               compacto, comprimido con zlib salvo que se pida nivel 0
+#   [índice]    JSON: id → categoría, páginas, hash y offsets de cada parte
+#
+# La cabecera apunta al índice, así el archivo se escribe en una sola pasada
+# y abrirlo solo lee la cabecera y el índice.
+MAGIA = b'OCRPACK1'
+CABECERA = struct.Struct('<8sQQ')
+VERSION_CORPUS = 1
+
+# Separador de las referencias "corpus.pack::id" que aceptan ocrFleet y compañía
+SEPARADOR = '::'
+
+# Archivos temporales que deja el backend: la categoría va en el nombre
+PATRON_TEMPORAL = re.compile(r'^tempOcrData_(.+)\.json$')
+
+def _analyze_result(ocr_data):
+    return ocr_data.get('analyzeResult', ocr_data) if isinstance(ocr_data, dict) else {}
+
+def huella_documento(ocr_data):
+    """sha1 del JSON compacto del documento (independiente de la indentación del archivo original)"""
+    compacto = json.dumps(ocr_data, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    return hashlib.sha1(compacto.encode('utf-8')).hexdigest()
+
+class PackedCorpus:
+    """
+    Corpus de resultados de OCR empaquetado en un solo archivo y leído con
+    mmap: abrir solo decodifica el índice, `content(id)` corta el texto de
+    un documento sin decodificar nada más y `ocr_data(id)` descomprime solo
+    ese documento. Los procesos que abren el mismo archivo comparten las
+    páginas en el caché del sistema operativo, y entre procesos basta pasar
+    (ruta, id) en lugar del JSON.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._file = open(ruta, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Archivo vacío: mmap no acepta longitud cero
+            self._file.close()
+            raise ValueError(f"{ruta} no es un corpus empaquetado")
+        magia, offset, longitud = CABECERA.unpack_from(self._mmap, 0)
+        if magia != MAGIA:
+            self.close()
+            raise ValueError(f"{ruta} no es un corpus empaquetado")
+        indice = json.loads(self._mmap[offset:offset + longitud].decode('utf-8'))
+        if indice.get('version') != VERSION_CORPUS:
+            self.close()
+            raise ValueError(f"Versión de corpus no soportada: {indice.get('version')}")
+        self.documentos = indice['documentos']
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.documentos)
+
+    def __contains__(self, documento):
+        return documento in self.documentos
+
+    def ids(self, categoria=None):
+        return [
+            documento for documento, info in self.documentos.items()
+            if categoria is None or info.get('categoria') == categoria
+        ]
+
+    def info(self, documento):
+        """Entrada del índice: categoria, paginas, hash, offsets y longitudes"""
+        return self.documentos[documento]
+
+    def content(self, documento, inicio=0, fin=None):
+        """
+        Content del documento (o un tramo en bytes UTF-8 desde el inicio del
+        content) decodificando solo esos bytes del mmap
+        """
+        info = self.documentos[documento]
+        base, longitud = info['content']
+        fin = longitud if fin is None else min(fin, longitud)
+        return self._mmap[base + inicio:base + fin].decode('utf-8', errors='ignore')
+
+    def analyze_result(self, documento):
+        info = self.documentos[documento]
+        base, longitud = info['resto']
+        resto = self._mmap[base:base + longitud]
+        if info.get('zlib'):
+            resto = zlib.decompress(resto)
+        analyze_result = json.loads(resto.decode('utf-8'))
+        analyze_result['content'] = self.content(documento)
+        return analyze_result
+
+    def ocr_data(self, documento):
+        """El documento con la forma que esperan los procesadores"""
+        return {'analyzeResult': self.analyze_result(documento)}
+
+def empaquetar(fuentes, destino, nivel=6):
+    """
+    Escribe un corpus a partir de (id, ocr_data, categoria). Devuelve el
+    número de documentos. Con `nivel` 0 el resto del analyzeResult queda
+    sin comprimir (más grande, pero sin el costo de zlib al leer). Se
+    escribe a un temporal y se renombra, así los lectores nunca ven un
+    archivo a medias.
+    """
+    documentos = {}
+    temporal = f"{destino}.tmp"
+    with open(temporal, 'wb') as file:
+        file.write(CABECERA.pack(MAGIA, 0, 0))
+        for documento, ocr_data, categoria in fuentes:
+            analyze_result = dict(_analyze_result(ocr_data))
+            content = (analyze_result.pop('content', '') or '').encode('utf-8')
+            resto = json.dumps(analyze_result, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            if nivel:
+                resto = zlib.compress(resto, nivel)
+            inicio = file.tell()
+            file.write(content)
+            file.write(resto)
+            documentos[documento] = {
+                'categoria': categoria,
+                'paginas': len(analyze_result.get('pages') or []),
+                'hash': huella_documento(ocr_data),
+                'content': [inicio, len(content)],
+                'resto': [inicio + len(content), len(resto)],
+                'zlib': bool(nivel),
+            }
+        indice = json.dumps({'version': VERSION_CORPUS, 'documentos': documentos}, ensure_ascii=False).encode('utf-8')
+        offset = file.tell()
+        file.write(indice)
+        file.seek(0)
+        file.write(CABECERA.pack(MAGIA, offset, len(indice)))
+    os.replace(temporal, destino)
+    return len(documentos)
+
+def fuentes_directorio(directorio, clasificar=False):
+    """(id, ocr_data, categoria) de los JSON de un directorio; id = nombre sin .json"""
+    clasificador = None
+    if clasificar:
+        from ocrClassifier import classify_ocr_data as clasificador
+    for ruta in sorted(glob.glob(os.path.join(directorio, '*.json'))):
+        nombre = os.path.basename(ruta)
+        with open(ruta, 'r', encoding='utf-8') as file:
+            ocr_data = json.load(file)
+        temporal = PATRON_TEMPORAL.match(nombre)
+        categoria = temporal.group(1) if temporal else None
+        if categoria is None and clasificador:
+            categoria = clasificador(ocr_data).get('categoria')
+        yield os.path.splitext(nombre)[0], ocr_data, categoria
+
+# Corpus abiertos por este proceso: cada trabajador abre el archivo una vez
+_abiertos = {}
+
+def abrir(ruta):
+    corpus = _abiertos.get(ruta)
+    if corpus is None:
+        corpus = _abiertos[ruta] = PackedCorpus(ruta)
+    return corpus
+
+def es_referencia(fuente):
+    return isinstance(fuente, str) and SEPARADOR in fuente
+
+def referencia(ruta, documento):
+    return f"{ruta}{SEPARADOR}{documento}"
+
+def cargar(fuente):
+    """OCR de una ruta a JSON o de una referencia "corpus.pack::id" """
+    if es_referencia(fuente):
+        ruta, documento = fuente.split(SEPARADOR, 1)
+        return abrir(ruta).ocr_data(documento)
+    with open(fuente, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def _benchmark(directorio, ruta, repeticiones=3):
+    """Tiempos de leer todos los documentos desde los JSON y desde el corpus empaquetado"""
+    rutas = sorted(glob.glob(os.path.join(directorio, '*.json')))
+    tiempos = {}
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for archivo in rutas:
+            with open(archivo, 'r', encoding='utf-8') as file:
+                json.load(file)['analyzeResult']['content']
+    tiempos['json_content'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        with PackedCorpus(ruta) as corpus:
+            for documento in corpus.ids():
+                corpus.content(documento)
+    tiempos['pack_content'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        with PackedCorpus(ruta) as corpus:
+            for documento in corpus.ids():
+                corpus.ocr_data(documento)
+    tiempos['pack_documento'] = time.perf_counter() - inicio
+
+    tamanio_json = sum(os.path.getsize(archivo) for archivo in rutas)
+    return {
+        'documentos': len(rutas),
+        'repeticiones': repeticiones,
+        'ms': {clave: round(valor * 1000, 1) for clave, valor in tiempos.items()},
+        'bytes_json': tamanio_json,
+        'bytes_pack': os.path.getsize(ruta),
+    }
+
+# Ejecución principal
+if __name__ == "__main__":
+    try:
+        parser = argparse.ArgumentParser(description='Empaquetar y leer corpus de resultados de OCR')
+        parser.add_argument('--corpus', type=str, required=True, help='Archivo del corpus empaquetado')
+        parser.add_argument('--empaquetar', type=str, help='Directorio con JSON de OCR a empaquetar en --corpus')
+        parser.add_argument('--nivel', type=int, default=6, help='Nivel de zlib al empaquetar (0 = sin comprimir)')
+        parser.add_argument('--clasificar', action='store_true',
+                            help='Al empaquetar, clasificar los documentos cuya categoría no va en el nombre')
+        parser.add_argument('--documento', type=str, help='Imprimir el OCR de este documento')
+        parser.add_argument('--solo-content', action='store_true', help='Con --documento, solo el content')
+        parser.add_argument('--benchmark', type=str, help='Directorio con los JSON originales para comparar tiempos')
+
+        args = parser.parse_args()
+
+        if args.empaquetar:
+            if not os.path.isdir(args.empaquetar):
+                print(f"ERROR: El directorio {args.empaquetar} no existe", file=sys.stderr)
+                print(json.dumps({"error": f"Directorio no encontrado: {args.empaquetar}"}))
+                sys.exit(1)
+            total = empaquetar(fuentes_directorio(args.empaquetar, args.clasificar), args.corpus, args.nivel)
+            result = {'corpus': args.corpus, 'documentos': total, 'bytes': os.path.getsize(args.corpus)}
+        elif not os.path.exists(args.corpus):
+            print(f"ERROR: El archivo {args.corpus} no existe", file=sys.stderr)
+            print(json.dumps({"error": f"Archivo no encontrado: {args.corpus}"}))
+            sys.exit(1)
+        elif args.benchmark:
+            result = _benchmark(args.benchmark, args.corpus)
+        elif args.documento:
+            with PackedCorpus(args.corpus) as corpus:
+                if args.documento not in corpus:
+                    raise ValueError(f"El corpus no tiene el documento {args.documento}")
+                result = {'content': corpus.content(args.documento)} if args.solo_content else corpus.ocr_data(args.documento)
+        else:
+            with PackedCorpus(args.corpus) as corpus:
+                result = {
+                    documento: {clave: info[clave] for clave in ('categoria', 'paginas', 'hash')}
+                    for documento, info in corpus.documentos.items()
+                }
+
+        # Imprimir resultado como JSON (único output a stdout)
+        print(json.dumps(result, indent=4, ensure_ascii=False))
+
+    except Exception as e:
+        # Errores a stderr para depuración
+        print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
+        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
+
+        # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
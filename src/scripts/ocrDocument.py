@@ -0,0 +1,141 @@
+from collections import namedtuple
+from ocrNormalize import normalize_text
+
+# Páginas que se revisan, salvo que se pida `continuar`: el encabezado que
+# identifica el documento está en la primera página y las anclas (PLACA,
+# VENCIMIENTO...) en las primeras dos
+PAGINAS_VALIDACION = 1
+PAGINAS_ANCLA = 2
+
+# Página del analyzeResult: número, rango [inicio, fin) en el content y rango
+# [linea_inicio, linea_fin) de índices en content.split('\n')
+Pagina = namedtuple('Pagina', ['numero', 'inicio', 'fin', 'linea_inicio', 'linea_fin'])
+
+class OcrDocument:
+    """
+    Vista por páginas del content de un analyzeResult. Las páginas salen de
+    analyzeResult.pages[].spans y se traducen a rangos de líneas, así los
+    validadores y extractores pueden limitarse a las primeras páginas (un
+    presupuesto) y recorrer el resto solo si lo piden con `continuar`.
+
+    Las líneas normalizadas se calculan una sola vez, cuando se piden.
+    """
+
+    def __init__(self, analyze_result):
+        if 'analyzeResult' in analyze_result:
+            analyze_result = analyze_result.get('analyzeResult') or {}
+        self.content = analyze_result.get('content', '')
+        self.lines = self.content.split('\n')
+        self._normalized = [None] * len(self.lines)
+        self._textos = {}
+        self.pages = self._paginas(analyze_result.get('pages', []) or [])
+
+    def _paginas(self, pages):
+        """Páginas con spans, en orden de content; sin spans no hay presupuesto posible"""
+        rangos = []
+        for idx, page in enumerate(pages):
+            spans = page.get('spans') or []
+            if not spans:
+                return []
+            inicio = min(span.get('offset', 0) for span in spans)
+            fin = max(span.get('offset', 0) + span.get('length', 0) for span in spans)
+            rangos.append((inicio, fin, page.get('pageNumber', idx + 1)))
+
+        # Las líneas se cuentan con str.count de un límite al siguiente, así el
+        # content se recorre una sola vez y sin construir tablas de offsets
+        paginas = []
+        posicion, linea = 0, 0
+        for inicio, fin, numero in sorted(rangos):
+            inicio = max(inicio, posicion)
+            fin = max(fin, inicio)
+            linea_inicio = linea + self.content.count('\n', posicion, inicio)
+            # Líneas que empiezan antes de `fin`: la que contiene `inicio` y una más por cada salto
+            linea_fin = linea_inicio + 1 + self.content.count('\n', inicio, max(fin - 1, inicio))
+            paginas.append(Pagina(numero, inicio, fin, linea_inicio, min(linea_fin, len(self.lines))))
+            posicion, linea = inicio, linea_inicio
+        return paginas
+
+    def normalized_line(self, index):
+        """Línea normalizada (se calcula la primera vez que se pide)"""
+        normalizada = self._normalized[index]
+        if normalizada is None:
+            normalizada = self._normalized[index] = normalize_text(self.lines[index])
+        return normalizada
+
+    def fin_presupuesto(self, paginas):
+        """
+        Índice de la primera línea fuera de las primeras `paginas` páginas, o
+        None si el presupuesto cubre todo el documento (o no hay páginas)
+        """
+        if paginas is None or paginas >= len(self.pages):
+            return None
+        return self.pages[paginas - 1].linea_fin if paginas > 0 else 0
+
+    def find_line_index(self, keyword, normalize=True, paginas=None, continuar=False):
+        """
+        Índice de la primera línea que contiene `keyword` o -1. Con `paginas`
+        solo se revisan las primeras `paginas` páginas; con `continuar` se
+        sigue con el resto si ahí no aparece. Cada línea se normaliza una sola
+        vez por documento.
+        """
+        keywords = [normalize_text(keyword) if normalize else keyword]
+        return self.find_line_index_any(keywords, normalize, paginas, continuar)
+
+    def texto(self, paginas=None, normalize=True):
+        """Texto (normalizado por defecto) de las primeras `paginas` páginas o de todo el documento"""
+        fin = self.fin_presupuesto(paginas)
+        clave = (fin, normalize)
+        if clave not in self._textos:
+            lineas = range(len(self.lines) if fin is None else fin)
+            if normalize:
+                self._textos[clave] = '\n'.join(self.normalized_line(i) for i in lineas)
+            else:
+                self._textos[clave] = self.content if fin is None else '\n'.join(self.lines[:fin])
+        return self._textos[clave]
+
+    def cumple(self, condicion, paginas=PAGINAS_VALIDACION, normalize=True, continuar=False):
+        """
+        Evalúa `condicion(texto)` sobre las primeras `paginas` páginas; con
+        `continuar`, si no se cumple ahí se evalúa sobre todo el documento
+        """
+        if condicion(self.texto(paginas, normalize)):
+            return True
+        if continuar and self.fin_presupuesto(paginas) is not None:
+            return bool(condicion(self.texto(None, normalize)))
+        return False
+
+    def contains_any(self, keywords, paginas=PAGINAS_VALIDACION, normalize=True, continuar=False):
+        """
+        True si alguna palabra clave aparece en alguna línea de las primeras
+        `paginas` páginas (o del resto, con `continuar`); se corta en la
+        primera coincidencia
+        """
+        if normalize:
+            keywords = [normalize_text(keyword) for keyword in keywords]
+        return self.find_line_index_any(keywords, normalize, paginas, continuar) >= 0
+
+    def find_line_index_any(self, keywords, normalize=True, paginas=None, continuar=False):
+        """
+        Índice de la primera línea que contiene alguna de las palabras clave
+        (ya normalizadas) o -1, con el mismo presupuesto que find_line_index
+        """
+        fin = self.fin_presupuesto(paginas)
+        if fin is None:
+            regiones = [range(len(self.lines))]
+        elif continuar:
+            regiones = [range(fin), range(fin, len(self.lines))]
+        else:
+            regiones = [range(fin)]
+        for region in regiones:
+            for i in region:
+                line = self.normalized_line(i) if normalize else self.lines[i]
+                if any(keyword in line for keyword in keywords):
+                    return i
+        return -1
+
+    def pagina_de_linea(self, index):
+        """Número de la página que contiene la línea `index` o None"""
+        for pagina in self.pages:
+            if pagina.linea_inicio <= index < pagina.linea_fin:
+                return pagina.numero
+        return None
@@ -0,0 +1,104 @@
+from collections import namedtuple
+from ocrWatchdog import ejecutar_con_presupuesto, CAMPO_INTERRUMPIDOS
+
+# Nodo del grafo: método del procesador, campos del resultado que llena y
+# métodos de los que depende (se ejecutan antes y una sola vez)
+Extractor = namedtuple('Extractor', ['metodo', 'campos', 'depende'])
+
+def extractor(metodo, campos, depende=()):
+    return Extractor(metodo, tuple(campos), tuple(depende))
+
+def parse_fields(valor):
+    """
+    Convierte el valor de --fields ("placa,soatVencimiento") en lista de
+    campos. None o vacío significa todos los campos.
+    """
+    if not valor:
+        return None
+    campos = [campo.strip() for campo in valor.split(',') if campo.strip()]
+    return campos or None
+
+class ExtractorGraph:
+    """
+    Extractores de un procesador declarados como grafo de dependencias. Con
+    una lista de campos solo se ejecutan los extractores que los producen y
+    sus dependencias; cada extractor corre una sola vez por procesador, así
+    pedir más campos después reutiliza lo ya calculado.
+
+    El orden de ejecución es siempre el de declaración, que es el orden en
+    que `process()` llamaba a los extractores.
+    """
+
+    def __init__(self, extractores):
+        self.extractores = {}
+        self.por_campo = {}
+        for nodo in extractores:
+            for dependencia in nodo.depende:
+                if dependencia not in self.extractores:
+                    raise ValueError(f"{nodo.metodo} depende de {dependencia}, que debe declararse antes")
+            self.extractores[nodo.metodo] = nodo
+            for campo in nodo.campos:
+                self.por_campo[campo] = nodo.metodo
+
+    @property
+    def campos(self):
+        return list(self.por_campo)
+
+    def plan(self, campos=None):
+        """Métodos a ejecutar, en orden, para producir `campos` (todos si es None)"""
+        if campos is None:
+            return list(self.extractores)
+
+        desconocidos = [campo for campo in campos if campo not in self.por_campo]
+        if desconocidos:
+            raise ValueError(
+                f"Campos desconocidos: {', '.join(desconocidos)}. Disponibles: {', '.join(self.campos)}"
+            )
+
+        necesarios = set()
+        pendientes = [self.por_campo[campo] for campo in campos]
+        while pendientes:
+            metodo = pendientes.pop()
+            if metodo not in necesarios:
+                necesarios.add(metodo)
+                pendientes.extend(self.extractores[metodo].depende)
+        # Las dependencias siempre se declaran antes, así el orden de declaración es topológico
+        return [metodo for metodo in self.extractores if metodo in necesarios]
+
+    def ejecutar(self, processor, campos=None):
+        """
+        Ejecuta sobre `processor` los extractores necesarios que aún no hayan
+        corrido. Devuelve el valor de retorno de cada extractor ejecutado.
+
+        Cada extractor corre con el presupuesto de ocrWatchdog: si lo agota se
+        interrumpe, queda anotado en result[CAMPO_INTERRUMPIDOS] y su valor es
+        None, y se sigue con los demás.
+        """
+        memo = processor.__dict__.setdefault('_extractores', {})
+        for metodo in self.plan(campos):
+            if metodo not in memo:
+                memo[metodo] = ejecutar_con_presupuesto(processor, metodo, getattr(processor, metodo))
+        return memo
+
+    def marcar_resueltos(self, processor, campos):
+        """
+        Da por ejecutados los extractores cuyos campos están todos en
+        `campos` (resueltos por otra vía, ver ocrStructured): `ejecutar` ya
+        no los corre. Los que son dependencia de otro siempre corren, porque
+        pueden dejar estado en el procesador que el otro necesita.
+        """
+        memo = processor.__dict__.setdefault('_extractores', {})
+        dependencias = {dependencia for nodo in self.extractores.values() for dependencia in nodo.depende}
+        for metodo, nodo in self.extractores.items():
+            if metodo in memo or metodo in dependencias or not nodo.campos:
+                continue
+            if all(campo in campos for campo in nodo.campos):
+                memo[metodo] = True
+
+    @staticmethod
+    def seleccionar(result, campos=None):
+        """Resultado limitado a los campos pedidos (completo si es None)"""
+        if campos is None:
+            return result
+        campos = set(campos) | {CAMPO_INTERRUMPIDOS}
+        return {clave: valor for clave, valor in result.items() if clave in campos}
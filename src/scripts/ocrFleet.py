@@ -0,0 +1,319 @@
+import os
+import io
+import csv
+import sys
+import json
+import glob
+import argparse
+import importlib
+import traceback
+from datetime import datetime, date
+from concurrent.futures import ProcessPoolExecutor
+from ocrClassifier import classify_ocr_data
+from ocrSegments import PROCESADORES
+from ocrManifest import huella_modulos
+from ocrCorpus import abrir, cargar, es_referencia, referencia, SEPARADOR
+from ocrTrace import traza
+
+# Campo de vencimiento de cada categoría: el escáner solo pide ese campo (y
+# la placa), así cada procesador ejecuta únicamente esos extractores
+VENCIMIENTOS = {
+    'SOAT': 'soatVencimiento',
+    'TECNOMECANICA': 'tecnomecanicaVencimiento',
+    'POLIZA_CONTRACTUAL': 'polizaContractualVencimiento',
+    'POLIZA_EXTRACONTRACTUAL': 'poliza_extra_contractual_vencimiento',
+    'POLIZA_TODO_RIESGO': 'polizaTodoRiesgoVencimiento',
+    'TARJETA_DE_OPERACION': 'tarjetaDeOperacionVencimiento',
+}
+
+# Días de anticipación por defecto para marcar un documento como por vencer
+DIAS_AVISO = 30
+
+# Cambia cuando cambia el formato del caché. Los cambios de código se
+# detectan solos: cada entrada guarda la huella del escáner (con el
+# clasificador) y del procesador de su categoría (ver ocrManifest)
+VERSION_ESCANER = 1
+
+SIN_PLACA = 'SIN_PLACA'
+
+def parse_vencimiento(valor):
+    """Fecha de un campo de vencimiento (YYYY-MM-DD, DD/MM/YYYY...) o None"""
+    if not isinstance(valor, str):
+        return None
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d'):
+        try:
+            return datetime.strptime(valor.strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def _firma(fuente):
+    """
+    Tamaño y fecha de modificación (o el hash del índice, en un corpus
+    empaquetado): si no cambian, el documento no se vuelve a procesar
+    """
+    if es_referencia(fuente):
+        ruta, documento = fuente.split(SEPARADOR, 1)
+        return abrir(ruta).info(documento)['hash']
+    estado = os.stat(fuente)
+    return [estado.st_size, estado.st_mtime_ns]
+
+def _nombre(fuente):
+    """Nombre con que el documento aparece en el manifiesto y en la tabla"""
+    return fuente.split(SEPARADOR, 1)[1] if es_referencia(fuente) else os.path.basename(fuente)
+
+def escanear_documento(ruta, categoria=None, placa=None):
+    """
+    Categoría, placa y fecha de vencimiento de un OCR guardado (ruta a JSON
+    o referencia a un corpus empaquetado, ver ocrCorpus). Sin categoría se
+    clasifica; sin placa se toma la que extraiga el procesador.
+    """
+    entrada = {'archivo': _nombre(ruta), 'categoria': categoria, 'placa': placa, 'campo': None, 'vencimiento': None}
+    try:
+        data = cargar(ruta)
+        if not categoria:
+            categoria = entrada['categoria'] = classify_ocr_data(data).get('categoria')
+        if categoria not in VENCIMIENTOS:
+            entrada['omitido'] = 'Categoría sin vencimiento'
+            return entrada
+
+        campo = entrada['campo'] = VENCIMIENTOS[categoria]
+        modulo, funcion, _ = PROCESADORES[categoria]
+        procesar = getattr(importlib.import_module(modulo), funcion)
+        result = procesar(data, placa, ['placa', campo])
+        traza.reiniciar()
+
+        if 'error' in result:
+            entrada['error'] = result['error']
+            return entrada
+        if not placa and isinstance(result.get('placa'), str):
+            entrada['placa'] = result['placa']
+        fecha = parse_vencimiento(result.get(campo))
+        entrada['vencimiento'] = fecha.isoformat() if fecha else None
+    except Exception as e:
+        entrada['error'] = str(e)
+    return entrada
+
+def _clave(fuente):
+    return fuente if es_referencia(fuente) else os.path.abspath(fuente)
+
+def _version(entrada):
+    """Huella del código que produjo la entrada"""
+    categoria = entrada.get('categoria') if entrada else None
+    modulos = ['ocrFleet'] + ([PROCESADORES[categoria][0]] if categoria in VENCIMIENTOS else [])
+    return huella_modulos(*modulos)
+
+def _escanear_tarea(tarea):
+    return escanear_documento(*tarea)
+
+def _inicializar_trabajador():
+    """Los procesos hijos cargan los procesadores una vez, no por documento"""
+    for categoria in VENCIMIENTOS:
+        importlib.import_module(PROCESADORES[categoria][0])
+
+class FleetScanner:
+    """
+    Recorre un corpus de OCR guardados y arma la tabla de vencimientos por
+    vehículo. Solo se procesan los documentos nuevos o modificados desde la
+    última corrida (caché por tamaño y fecha de modificación) o cuyo
+    procesador cambió; el resto se toma del caché. Los documentos
+    pendientes se reparten en un pool de procesos, igual que la exportación
+    fragmentada de exportDataXLSX.
+    """
+
+    def __init__(self, cache=None, trabajadores=None):
+        self.cache_ruta = cache
+        self.trabajadores = trabajadores
+        self.cache = self._cargar_cache()
+        self.reutilizados = 0
+        self.procesados = 0
+
+    def _cargar_cache(self):
+        if not self.cache_ruta or not os.path.exists(self.cache_ruta):
+            return {}
+        try:
+            with open(self.cache_ruta, 'r', encoding='utf-8') as file:
+                datos = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        return datos.get('documentos', {}) if datos.get('version') == VERSION_ESCANER else {}
+
+    def _guardar_cache(self, documentos):
+        if not self.cache_ruta:
+            return
+        temporal = f"{self.cache_ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as file:
+            json.dump({'version': VERSION_ESCANER, 'documentos': documentos}, file, ensure_ascii=False)
+        os.replace(temporal, self.cache_ruta)
+
+    def escanear(self, rutas, manifiesto=None):
+        """
+        Entrada de cada ruta. `manifiesto` ({archivo: {categoria, placa}})
+        evita clasificar y fija el vehículo al que pertenece cada documento.
+        """
+        manifiesto = manifiesto or {}
+        documentos, pendientes = {}, []
+        for ruta in rutas:
+            clave = _clave(ruta)
+            conocido = manifiesto.get(_nombre(ruta), {})
+            parametros = [conocido.get('categoria'), conocido.get('placa')]
+            firma = _firma(ruta)
+            previo = self.cache.get(clave)
+            if (previo and previo['firma'] == firma and previo['parametros'] == parametros
+                    and previo.get('version') == _version(previo['entrada'])):
+                documentos[clave] = previo
+                self.reutilizados += 1
+            else:
+                documentos[clave] = {'firma': firma, 'parametros': parametros, 'entrada': None, 'version': None}
+                pendientes.append((ruta, *parametros))
+
+        for tarea, entrada in zip(pendientes, self._ejecutar(pendientes)):
+            documentos[_clave(tarea[0])].update(entrada=entrada, version=_version(entrada))
+        self.procesados += len(pendientes)
+
+        self._guardar_cache(documentos)
+        return [documentos[_clave(ruta)]['entrada'] for ruta in rutas]
+
+    def _ejecutar(self, tareas):
+        trabajadores = self.trabajadores or os.cpu_count() or 1
+        if trabajadores <= 1 or len(tareas) <= 1:
+            return [_escanear_tarea(tarea) for tarea in tareas]
+        lote = max(1, len(tareas) // (trabajadores * 4))
+        with ProcessPoolExecutor(max_workers=trabajadores, initializer=_inicializar_trabajador) as pool:
+            return list(pool.map(_escanear_tarea, tareas, chunksize=lote))
+
+def tabla_vencimientos(entradas, hoy=None, dias_aviso=DIAS_AVISO):
+    """
+    Una fila por vehículo con el vencimiento vigente de cada documento (el
+    más lejano si hay varios, es decir, la última renovación), el próximo a
+    vencer y los días que faltan, ordenada del más urgente al menos urgente.
+    También devuelve los documentos vencidos o que vencen dentro de
+    `dias_aviso` días.
+    """
+    hoy = hoy or date.today()
+    vehiculos = {}
+    for entrada in entradas:
+        if not entrada or not entrada.get('vencimiento'):
+            continue
+        fila = vehiculos.setdefault(entrada.get('placa') or SIN_PLACA, {})
+        campo = entrada['campo']
+        if campo not in fila or entrada['vencimiento'] > fila[campo][0]:
+            fila[campo] = (entrada['vencimiento'], entrada['archivo'])
+
+    filas, por_vencer = [], []
+    for placa, campos in vehiculos.items():
+        fila = {'placa': placa}
+        proximo = None
+        for campo in VENCIMIENTOS.values():
+            vencimiento, archivo = campos.get(campo, (None, None))
+            fila[campo] = vencimiento
+            if vencimiento is None:
+                continue
+            dias = (date.fromisoformat(vencimiento) - hoy).days
+            if proximo is None or dias < proximo[1]:
+                proximo = (campo, dias)
+            if dias <= dias_aviso:
+                por_vencer.append({
+                    'placa': placa, 'campo': campo, 'vencimiento': vencimiento,
+                    'dias': dias, 'vencido': dias < 0, 'archivo': archivo,
+                })
+        fila['proximoVencimiento'] = proximo[0] if proximo else None
+        fila['diasRestantes'] = proximo[1] if proximo else None
+        filas.append(fila)
+
+    filas.sort(key=lambda fila: (fila['diasRestantes'] is None, fila['diasRestantes'] or 0, fila['placa']))
+    por_vencer.sort(key=lambda item: (item['dias'], item['placa'], item['campo']))
+    return filas, por_vencer
+
+def escribir_tabla(filas, ruta, formato):
+    columnas = ['placa', *VENCIMIENTOS.values(), 'proximoVencimiento', 'diasRestantes']
+    with open(ruta, 'w', encoding='utf-8', newline='') as file:
+        if formato == 'csv':
+            escritor = csv.DictWriter(file, fieldnames=columnas)
+            escritor.writeheader()
+            escritor.writerows(filas)
+        else:
+            for fila in filas:
+                file.write(json.dumps(fila, ensure_ascii=False) + '\n')
+
+# Función principal para escanear la flota
+def scan_fleet(rutas, manifiesto=None, cache=None, trabajadores=None, dias_aviso=DIAS_AVISO,
+               salida=None, formato='csv', hoy=None):
+    try:
+        scanner = FleetScanner(cache, trabajadores)
+        entradas = scanner.escanear(rutas, manifiesto)
+        filas, por_vencer = tabla_vencimientos(entradas, hoy, dias_aviso)
+        result = {
+            'documentos': len(entradas),
+            'procesados': scanner.procesados,
+            'reutilizados': scanner.reutilizados,
+            'vehiculos': len(filas),
+            'errores': [
+                {'archivo': entrada['archivo'], 'error': entrada['error']}
+                for entrada in entradas if entrada and entrada.get('error')
+            ],
+            'porVencer': por_vencer,
+        }
+        if salida:
+            escribir_tabla(filas, salida, formato)
+            result['salida'] = salida
+        else:
+            result['tabla'] = filas
+        return result
+    except Exception as e:
+        return {"error": str(e), "trace": traceback.format_exc()}
+
+# Ejecución principal
+if __name__ == "__main__":
+    try:
+        parser = argparse.ArgumentParser(description='Tabla de vencimientos de la flota a partir de OCR guardados')
+        parser.add_argument('--dir', type=str, help='Directorio con los JSON de OCR guardados')
+        parser.add_argument('--corpus', type=str, help='Corpus empaquetado con ocrCorpus (en lugar de --dir)')
+        parser.add_argument('--manifiesto', type=str,
+                            help='JSON {archivo: {"categoria": ..., "placa": ...}} (opcional, sin él se clasifica)')
+        parser.add_argument('--cache', type=str, help='Caché de resultados para procesar solo documentos nuevos o modificados')
+        parser.add_argument('--salida', type=str, help='Archivo de la tabla por vehículo (sin él va en el JSON de stdout)')
+        parser.add_argument('--formato', default='csv', choices=['csv', 'jsonl'], help='Formato de --salida')
+        parser.add_argument('--dias', type=int, default=DIAS_AVISO, help=f'Días de aviso (por defecto {DIAS_AVISO})')
+        parser.add_argument('--hoy', type=str, help='Fecha de referencia YYYY-MM-DD (por defecto hoy)')
+        parser.add_argument('--trabajadores', type=int, default=None,
+                            help='Procesos para los documentos pendientes (por defecto, uno por CPU)')
+
+        args = parser.parse_args()
+
+        manifiesto = None
+        if args.manifiesto:
+            with open(args.manifiesto, 'r', encoding='utf-8') as file:
+                manifiesto = json.load(file)
+
+        if args.corpus and os.path.exists(args.corpus):
+            # Corpus empaquetado: los trabajadores reciben referencias, no el JSON,
+            # y la categoría del índice evita clasificar
+            corpus = abrir(os.path.abspath(args.corpus))
+            rutas = [referencia(corpus.ruta, documento) for documento in sorted(corpus.ids())]
+            manifiesto = manifiesto or {}
+            for documento in corpus.ids():
+                conocido = manifiesto.setdefault(documento, {})
+                conocido.setdefault('categoria', corpus.info(documento).get('categoria'))
+        elif args.dir and os.path.isdir(args.dir):
+            rutas = sorted(glob.glob(os.path.join(args.dir, '*.json')))
+        else:
+            print("ERROR: se requiere --dir o --corpus existente", file=sys.stderr)
+            print(json.dumps({"error": "Se requiere --dir o --corpus"}))
+            sys.exit(1)
+
+        hoy = date.fromisoformat(args.hoy) if args.hoy else None
+        result = scan_fleet(rutas, manifiesto, args.cache, args.trabajadores, args.dias,
+                            args.salida, args.formato, hoy)
+
+        # Imprimir resultado como JSON (único output a stdout)
+        print(json.dumps(result, indent=4, ensure_ascii=False))
+
+    except Exception as e:
+        # Errores a stderr para depuración
+        print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
+        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
+
+        # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
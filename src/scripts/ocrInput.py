@@ -0,0 +1,34 @@
+import os
+import sys
+import json
+
+# Entrada de los scripts de OCR sin archivo temporal: el proceso que los
+# lanza escribe el JSON compacto por stdin (--stdin) o por un descriptor que
+# el hijo hereda (--fd N, por ejemplo el 3 con stdio ['pipe', 'pipe', 'pipe',
+# 'pipe'] en Node). Así un documento grande no pasa por temp/ ni choca con el
+# límite de longitud de los argumentos como el JSON en sys.argv[1].
+
+def agregar_argumentos(parser):
+    parser.add_argument('--stdin', action='store_true', help='Leer el JSON de OCR desde stdin en lugar de --file')
+    parser.add_argument('--fd', type=int, help='Leer el JSON de OCR desde este descriptor heredado del proceso padre')
+
+def hay_entrada(args):
+    """True si se pidió leer el OCR por stdin o por un descriptor"""
+    return bool(getattr(args, 'stdin', False)) or getattr(args, 'fd', None) is not None
+
+def leer_entrada(args):
+    """
+    JSON de OCR desde stdin o desde el descriptor heredado. Se leen los bytes
+    tal cual y json los decodifica, sin pasar por el wrapper de texto de
+    sys.stdin (que depende de la codificación de la consola).
+    """
+    if getattr(args, 'fd', None) is not None:
+        with os.fdopen(args.fd, 'rb') as file:
+            contenido = file.read()
+        origen = f"el descriptor {args.fd}"
+    else:
+        contenido = sys.stdin.buffer.read()
+        origen = "stdin"
+    if not contenido.strip():
+        raise json.JSONDecodeError(f"No se recibió JSON por {origen}", '', 0)
+    return json.loads(contenido)
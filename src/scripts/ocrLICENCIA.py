@@ -1,15 +1,15 @@
 import json
 import re
-import unicodedata
 import sys
 import os
 import argparse
 import traceback
+from ocrDocument import OcrDocument, PAGINAS_VALIDACION
+from ocrFields import ExtractorGraph, extractor, parse_fields
 from datetime import datetime
-
-# Función para normalizar texto
-def normalize_text(text):
-    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8').upper()
+from ocrNormalize import normalize_text
+from ocrTrace import traza
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
 
 def parse_fecha(fecha_str):
     """Intenta convertir la fecha desde distintos formatos conocidos"""
@@ -21,24 +21,27 @@ def parse_fecha(fecha_str):
     raise ValueError(f"Formato de fecha no reconocido: {fecha_str}")
 
 class LICENCIAProcessor:
+    # Extractores y campos que producen (ver ocrFields.ExtractorGraph)
+    EXTRACTORES = ExtractorGraph([
+        extractor('extract_validation', ['validation']),
+        extractor('extract_fecha_expedicion', ['fecha_expedicion_licencia']),
+        extractor('extract_categorys', ['licencia']),
+    ])
+
     def __init__(self, ocr_data, numero_identificacion=None, fecha_nacimiento=None):
         self.data = ocr_data
         self.content = ocr_data.get('analyzeResult', {}).get('content', '')
-        self.lines = self.content.split('\n')
+        self.document = OcrDocument(ocr_data.get('analyzeResult', {}))
+        self.lines = self.document.lines
         self.numero_identificacion = numero_identificacion
         self.fecha_nacimiento = fecha_nacimiento
         self.result = {
             "validation": None,
         }
     
-    def find_line_index(self, keyword, normalize=True):
+    def find_line_index(self, keyword, normalize=True, paginas=None):
         """Encontrar el índice de la línea que contiene una palabra clave"""
-        keyword_norm = normalize_text(keyword) if normalize else keyword
-        for i, line in enumerate(self.lines):
-            line_norm = normalize_text(line) if normalize else line
-            if keyword_norm in line_norm:
-                return i
-        return -1
+        return self.document.find_line_index(keyword, normalize, paginas)
     
     def is_valid_licencia(self):
         """Verificar si el documento es una cédula de ciudadanía válida"""
@@ -48,11 +51,8 @@ class LICENCIAProcessor:
             "CEDULA DE CIUDADANIA",
             "IDENTIFICACION PERSONAL"
         ]
-        normalized_content = normalize_text(self.content)
-        for keyword in keywords:
-            if keyword in normalized_content:
-                return True
-        return False
+        # El encabezado está en la primera página; el resto del documento no se revisa
+        return self.document.contains_any(keywords, PAGINAS_VALIDACION)
     
         # OPCIÓN 1: Método de instancia (recomendado)
     def normalize_numero_identificacion(self, numero):
@@ -95,7 +95,7 @@ class LICENCIAProcessor:
             else:
                 fecha_expedicion_date = fecha_expedicion_licencia
         except ValueError as e:
-            print(f"Error al convertir fechas: {e}")
+            traza.registrar('licencia.fechas_invalidas', error=str(e))
             self.result['licencia'] = []
             return
         
@@ -151,26 +151,31 @@ class LICENCIAProcessor:
                     if fecha_nacimiento <= fecha_expedicion <= hoy:
                         return fecha_expedicion
                     else:
-                        print(f"⚠️ Fecha de expedición fuera de rango lógico: {fecha_expedicion}")
+                        traza.registrar('licencia.expedicion_fuera_de_rango', fecha=fecha_expedicion)
         return None
 
-    def process(self):
-        """Procesar todos los campos y devolver el resultado"""
-        if not self.is_valid_licencia():
-            return {"error": "No es una CEDULA válida"}
-        
+    def extract_validation(self):
+        """Validar que la licencia corresponda al conductor"""
         self.result['validation'] = self.is_same_conductor()
+
+    def extract_fecha_expedicion(self):
+        """Fecha de expedición de la licencia en formato dd/mm/aaaa"""
         self.result["fecha_expedicion_licencia"] = self.extraer_fecha_expedicion().strftime("%d/%m/%Y")
 
-        self.extract_categorys()
+    def process(self, campos=None):
+        """Procesar los campos pedidos (todos por defecto) y devolver el resultado"""
+        if not self.is_valid_licencia():
+            return {"error": "No es una CEDULA válida"}
+        
+        self.EXTRACTORES.ejecutar(self, campos)
         
-        return self.result
+        return self.EXTRACTORES.seleccionar(self.result, campos)
 
 # Función principal para procesar el OCR
-def process_licencia_data(data, numero_identificacion=None, fecha_nacimiento=None):
+def process_licencia_data(data, numero_identificacion=None, fecha_nacimiento=None, campos=None):
     try:
         processor = LICENCIAProcessor(data, numero_identificacion, fecha_nacimiento)
-        result = processor.process()
+        result = processor.process(campos)
         return result
     except Exception as e:
         import traceback
@@ -181,15 +186,26 @@ if __name__ == "__main__":
     try:
         parser = argparse.ArgumentParser(description='Procesar datos OCR')
         parser.add_argument('--file', type=str, help='Ruta al archivo JSON con datos OCR')
+        agregar_argumentos(parser)
         parser.add_argument('--numero_identificacion', type=str, help='Identificación del conductor (opcional)')
         parser.add_argument('--fecha_nacimiento', type=str, help='Fecha de nacimiento del conductor (opcional)')
+        parser.add_argument('--fields', type=str, help='Campos a extraer separados por coma (opcional, por defecto todos)')
+        parser.add_argument('--debug', action='store_true', help='Volcar a stderr la traza de decisiones de los extractores')
         
         args = parser.parse_args()
 
         # Determinar qué archivo procesar
         file_path = None
         
-        if args.file:
+        if hay_entrada(args):
+            # JSON compacto por stdin o por un descriptor heredado, sin archivo temporal
+            try:
+                data = leer_entrada(args)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: La entrada no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en la entrada: {str(e)}"}))
+                sys.exit(1)
+        elif args.file:
             # Usar el archivo especificado por argumento
             file_path = args.file
             if not os.path.exists(file_path):
@@ -225,16 +241,21 @@ if __name__ == "__main__":
                 sys.exit(1)
         
         # Procesar los datos
-        result = process_licencia_data(data, args.numero_identificacion, args.fecha_nacimiento)
+        result = process_licencia_data(data, args.numero_identificacion, args.fecha_nacimiento, parse_fields(args.fields))
         
         # Imprimir resultado como JSON (único output a stdout)
         print(json.dumps(result, indent=4, ensure_ascii=False))
+
+        # Traza de decisiones a stderr solo si falló, hubo baja confianza o se pidió --debug
+        traza.volcar_si(result, args.debug)
         
     except Exception as e:
         # Errores a stderr para depuración
         print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
         print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
         
+        traza.volcar_si({"error": str(e)})
+
         # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
         print(json.dumps({"error": str(e)}))
         sys.exit(1)
\ No newline at end of file
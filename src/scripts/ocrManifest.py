@@ -0,0 +1,296 @@
+import os
+import ast
+import sys
+import json
+import glob
+import time
+import hashlib
+import argparse
+import importlib
+import traceback
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from ocrClassifier import classify_ocr_data
+from ocrSegments import PROCESADORES
+from ocrTrace import traza
+
+DIRECTORIO_SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+
+# Formato del archivo de manifiesto
+VERSION_MANIFIESTO = 1
+
+# Motores: el procesador escrito a mano de la categoría o sus reglas (ocrRules)
+MOTORES = ('script', 'reglas')
+
+@lru_cache(maxsize=None)
+def _fuente(modulo):
+    """Contenido del módulo local `modulo` o None si no es un script de este directorio"""
+    ruta = os.path.join(DIRECTORIO_SCRIPTS, modulo + '.py')
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, 'rb') as file:
+        return file.read()
+
+def dependencias_locales(modulo):
+    """`modulo` y los módulos de este directorio que importa, directa o indirectamente, ordenados"""
+    vistos, pendientes = set(), [modulo]
+    while pendientes:
+        actual = pendientes.pop()
+        fuente = _fuente(actual)
+        if actual in vistos or fuente is None:
+            continue
+        vistos.add(actual)
+        for nodo in ast.walk(ast.parse(fuente)):
+            if isinstance(nodo, ast.Import):
+                pendientes.extend(alias.name for alias in nodo.names)
+            elif isinstance(nodo, ast.ImportFrom) and nodo.module and not nodo.level:
+                pendientes.append(nodo.module)
+    return sorted(vistos)
+
+@lru_cache(maxsize=None)
+def huella_procesador(categoria, motor='script'):
+    """
+    Versión de lo que produce el resultado de una categoría: hash del código
+    del procesador y de todos los módulos locales que usa (ocrDocument,
+    ocrFields...) y, con el motor de reglas, del archivo de reglas. Cambiar
+    ocrPOLIZA_CONTRACTUAL.py cambia solo la huella de POLIZA_CONTRACTUAL;
+    cambiar ocrDocument.py cambia la de todas.
+    """
+    if motor == 'reglas':
+        import ocrRules
+        with open(ocrRules.ruta_reglas(categoria), 'rb') as file:
+            return huella_modulos('ocrRules', extra=file.read())
+    return huella_modulos(PROCESADORES[categoria][0])
+
+@lru_cache(maxsize=None)
+def huella_modulos(*modulos, extra=b''):
+    """Hash del código de los módulos locales y de todo lo que importan (más `extra`)"""
+    sha = hashlib.sha1()
+    for dependencia in sorted({d for modulo in modulos for d in dependencias_locales(modulo)}):
+        sha.update(dependencia.encode() + b'\0' + hashlib.sha1(_fuente(dependencia)).digest())
+    sha.update(extra)
+    return sha.hexdigest()[:16]
+
+def huella_archivo(ruta):
+    with open(ruta, 'rb') as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+def _firma(ruta):
+    estado = os.stat(ruta)
+    return [estado.st_size, estado.st_mtime_ns]
+
+def parametros_de(categoria, parametros):
+    """Solo los parámetros que recibe el procesador de la categoría (los demás no cambian el resultado)"""
+    nombres = PROCESADORES[categoria][2] if categoria in PROCESADORES else ()
+    return {nombre: (parametros or {}).get(nombre) for nombre in nombres}
+
+def procesar_archivo(ruta, categoria, parametros, motor='script'):
+    """Resultado del procesador de la categoría sobre un OCR guardado"""
+    with open(ruta, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    try:
+        if motor == 'reglas':
+            import ocrRules
+            return ocrRules.process_rules_data(data, categoria, parametros)
+        modulo, funcion, nombres = PROCESADORES[categoria]
+        procesar = getattr(importlib.import_module(modulo), funcion)
+        return procesar(data, *[parametros.get(nombre) for nombre in nombres])
+    finally:
+        traza.reiniciar()
+
+def _procesar_tarea(tarea):
+    try:
+        return procesar_archivo(*tarea)
+    except Exception as e:
+        return {"error": str(e), "trace": traceback.format_exc()}
+
+class ReprocessManifest:
+    """
+    Registro de resultados de OCR guardados: por entrada, el hash del JSON
+    de entrada, la categoría, los parámetros, la huella del procesador con
+    que se calculó y el resultado. `reprocesar` recalcula solo las entradas
+    cuya entrada o procesador cambió, en un pool de procesos; lo demás se
+    conserva tal cual.
+
+    El hash de la entrada solo se recalcula si cambió el tamaño o la fecha
+    de modificación del archivo.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.entradas = {}
+        if ruta and os.path.exists(ruta):
+            with open(ruta, 'r', encoding='utf-8') as file:
+                datos = json.load(file)
+            if datos.get('version') == VERSION_MANIFIESTO:
+                self.entradas = datos.get('entradas', {})
+
+    def guardar(self):
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as file:
+            json.dump({'version': VERSION_MANIFIESTO, 'entradas': self.entradas}, file, ensure_ascii=False)
+        os.replace(temporal, self.ruta)
+
+    @staticmethod
+    def clave(ruta, categoria, parametros, motor='script'):
+        return '|'.join([os.path.abspath(ruta), categoria, motor, json.dumps(parametros, sort_keys=True)])
+
+    def registrar(self, ruta, categoria=None, parametros=None, motor='script'):
+        """Agrega un documento (sin resultado todavía); sin categoría se clasifica"""
+        if not categoria:
+            with open(ruta, 'r', encoding='utf-8') as file:
+                categoria = classify_ocr_data(json.load(file)).get('categoria')
+            if not categoria:
+                return None
+        parametros = parametros_de(categoria, parametros)
+        clave = self.clave(ruta, categoria, parametros, motor)
+        self.entradas.setdefault(clave, {
+            'archivo': os.path.abspath(ruta), 'categoria': categoria, 'motor': motor, 'parametros': parametros,
+            'firma': None, 'hash': None, 'version': None, 'resultado': None, 'procesado': None,
+        })
+        return clave
+
+    def motivo(self, entrada):
+        """Por qué hay que recalcular la entrada ('entrada', 'procesador', 'nueva', 'eliminada') o None"""
+        if not os.path.exists(entrada['archivo']):
+            return 'eliminada'
+        if entrada['version'] is None:
+            return 'nueva'
+        firma = _firma(entrada['archivo'])
+        if firma != entrada['firma']:
+            entrada['firma'] = firma
+            hash_actual = huella_archivo(entrada['archivo'])
+            if hash_actual != entrada['hash']:
+                return 'entrada'
+        if huella_procesador(entrada['categoria'], entrada['motor']) != entrada['version']:
+            return 'procesador'
+        return None
+
+    def pendientes(self, categorias=None):
+        """{clave: motivo} de las entradas desactualizadas"""
+        pendientes = {}
+        for clave, entrada in self.entradas.items():
+            if categorias and entrada['categoria'] not in categorias:
+                continue
+            motivo = self.motivo(entrada)
+            if motivo:
+                pendientes[clave] = motivo
+        return pendientes
+
+    def reprocesar(self, categorias=None, trabajadores=None, simular=False):
+        """Recalcula las entradas desactualizadas; devuelve el resumen de la corrida"""
+        pendientes = self.pendientes(categorias)
+        claves = [clave for clave, motivo in pendientes.items() if motivo != 'eliminada']
+        resumen = {
+            'entradas': len(self.entradas),
+            'vigentes': len(self.entradas) - len(pendientes),
+            'pendientes': {motivo: sum(1 for m in pendientes.values() if m == motivo) for motivo in set(pendientes.values())},
+            'eliminadas': [self.entradas[clave]['archivo'] for clave, motivo in pendientes.items() if motivo == 'eliminada'],
+        }
+        if simular:
+            resumen['recalcular'] = [self.entradas[clave]['archivo'] for clave in claves]
+            return resumen
+
+        tareas = [
+            (self.entradas[clave]['archivo'], self.entradas[clave]['categoria'],
+             self.entradas[clave]['parametros'], self.entradas[clave]['motor'])
+            for clave in claves
+        ]
+        cambiados = []
+        for clave, resultado in zip(claves, self._ejecutar(tareas, trabajadores)):
+            entrada = self.entradas[clave]
+            if entrada['resultado'] is not None and resultado != entrada['resultado']:
+                cambiados.append(entrada['archivo'])
+            entrada.update({
+                'firma': _firma(entrada['archivo']),
+                'hash': huella_archivo(entrada['archivo']),
+                'version': huella_procesador(entrada['categoria'], entrada['motor']),
+                'resultado': resultado,
+                'procesado': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            })
+        for clave, motivo in pendientes.items():
+            if motivo == 'eliminada':
+                del self.entradas[clave]
+
+        resumen['recalculadas'] = len(claves)
+        resumen['cambiados'] = cambiados
+        resumen['errores'] = [
+            self.entradas[clave]['archivo'] for clave in claves
+            if isinstance(self.entradas[clave]['resultado'], dict) and 'error' in self.entradas[clave]['resultado']
+        ]
+        return resumen
+
+    @staticmethod
+    def _ejecutar(tareas, trabajadores=None):
+        trabajadores = trabajadores or os.cpu_count() or 1
+        if trabajadores <= 1 or len(tareas) <= 1:
+            return [_procesar_tarea(tarea) for tarea in tareas]
+        lote = max(1, len(tareas) // (trabajadores * 4))
+        with ProcessPoolExecutor(max_workers=trabajadores) as pool:
+            return list(pool.map(_procesar_tarea, tareas, chunksize=lote))
+
+# Función principal para registrar documentos y reprocesar lo desactualizado
+def process_manifest(ruta_manifiesto, archivos=(), categoria=None, parametros=None, motor='script',
+                     categorias=None, trabajadores=None, simular=False):
+    try:
+        manifiesto = ReprocessManifest(ruta_manifiesto)
+        sin_categoria = [archivo for archivo in archivos if not manifiesto.registrar(archivo, categoria, parametros, motor)]
+        result = manifiesto.reprocesar(categorias, trabajadores, simular)
+        result['sinCategoria'] = sin_categoria
+        result['huellas'] = {
+            cat: huella_procesador(cat, mot)
+            for cat, mot in sorted({(e['categoria'], e['motor']) for e in manifiesto.entradas.values()})
+        }
+        if not simular:
+            manifiesto.guardar()
+        return result
+    except Exception as e:
+        return {"error": str(e), "trace": traceback.format_exc()}
+
+# Ejecución principal
+if __name__ == "__main__":
+    try:
+        parser = argparse.ArgumentParser(description='Reprocesar solo los resultados de OCR desactualizados')
+        parser.add_argument('--manifiesto', type=str, required=True, help='Archivo JSON del manifiesto')
+        parser.add_argument('--file', type=str, action='append', default=[], help='OCR a registrar (se puede repetir)')
+        parser.add_argument('--dir', type=str, help='Directorio con JSON de OCR a registrar')
+        parser.add_argument('--categoria', type=str, help='Categoría de los documentos registrados (sin ella se clasifican)')
+        parser.add_argument('--placa', type=str, help='Placa del vehículo (opcional)')
+        parser.add_argument('--numero_identificacion', type=str, help='Identificación del conductor (opcional)')
+        parser.add_argument('--fecha_nacimiento', type=str, help='Fecha de nacimiento del conductor (opcional)')
+        parser.add_argument('--motor', default='script', choices=MOTORES, help='Procesador escrito a mano o reglas')
+        parser.add_argument('--solo', type=str, help='Reprocesar solo estas categorías (separadas por coma)')
+        parser.add_argument('--trabajadores', type=int, default=None, help='Procesos (por defecto, uno por CPU)')
+        parser.add_argument('--simular', action='store_true', help='Solo listar lo desactualizado, sin procesar')
+
+        args = parser.parse_args()
+
+        archivos = list(args.file)
+        if args.dir:
+            archivos += sorted(glob.glob(os.path.join(args.dir, '*.json')))
+        faltantes = [archivo for archivo in archivos if not os.path.exists(archivo)]
+        if faltantes:
+            print(f"ERROR: El archivo {faltantes[0]} no existe", file=sys.stderr)
+            print(json.dumps({"error": f"Archivo no encontrado: {faltantes[0]}"}))
+            sys.exit(1)
+
+        parametros = {
+            'placa': args.placa,
+            'numero_identificacion': args.numero_identificacion,
+            'fecha_nacimiento': args.fecha_nacimiento,
+        }
+        categorias = [categoria.strip() for categoria in args.solo.split(',')] if args.solo else None
+        result = process_manifest(args.manifiesto, archivos, args.categoria, parametros, args.motor,
+                                  categorias, args.trabajadores, args.simular)
+
+        # Imprimir resultado como JSON (único output a stdout)
+        print(json.dumps(result, indent=4, ensure_ascii=False))
+
+    except Exception as e:
+        # Errores a stderr para depuración
+        print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
+        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
+
+        # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import unicodedata
+from functools import lru_cache
+
+# Rangos cubiertos por la tabla de traducción: Latin-1, Latin extendido A/B,
+# diacríticos combinables y puntuación general (comillas, guiones, espacios)
+RANGOS_TABLA = ((0x80, 0x250), (0x300, 0x370), (0x2000, 0x2070))
+
+# Textos no ASCII distintos que se recuerdan (etiquetas que se repiten en cada documento)
+MAX_MEMORIA = 8192
+
+def normalize_text_unicode(text):
+    """Normalización original: NFKD, quitar lo que no es ASCII y pasar a mayúsculas"""
+    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8').upper()
+
+def _tabla_traduccion():
+    """
+    Tabla carácter → equivalente ASCII calculada con la misma normalización
+    original, así el resultado es idéntico por construcción. NFKD descompone
+    carácter por carácter y el reordenamiento canónico solo mueve marcas
+    combinables (que se descartan), por eso traducir carácter por carácter
+    da lo mismo que normalizar la cadena completa.
+    """
+    tabla = {}
+    for inicio, fin in RANGOS_TABLA:
+        for codigo in range(inicio, fin):
+            caracter = chr(codigo)
+            tabla[codigo] = unicodedata.normalize('NFKD', caracter).encode('ASCII', 'ignore').decode('utf-8')
+    return str.maketrans(tabla)
+
+_TRADUCCION = _tabla_traduccion()
+
+@lru_cache(maxsize=MAX_MEMORIA)
+def _normalize_no_ascii(text):
+    traducido = text.translate(_TRADUCCION)
+    if traducido.isascii():
+        return traducido.upper()
+    # Quedó algún carácter fuera de la tabla (otro alfabeto, símbolos): camino original
+    return normalize_text_unicode(text)
+
+# Función para normalizar texto
+def normalize_text(text):
+    """
+    Igual a normalize_text_unicode pero sin las tres cadenas intermedias por
+    llamada: las líneas ASCII (la mayoría del OCR) solo pasan a mayúsculas,
+    las demás se traducen con una tabla precalculada y se recuerdan.
+    """
+    if text.isascii():
+        return text.upper()
+    return _normalize_no_ascii(text)
+
+def _lineas_corpus(directorio):
+    """Líneas del content de todos los JSON de OCR de un directorio"""
+    lineas = []
+    for ruta in sorted(glob.glob(os.path.join(directorio, '*.json'))):
+        with open(ruta, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        lineas.extend((data.get('analyzeResult') or {}).get('content', '').split('\n'))
+    return lineas
+
+def _lineas_sinteticas(cantidad=20000):
+    """Corpus de prueba: líneas con las etiquetas y valores típicos de los documentos"""
+    etiquetas = [
+        'PLACA', 'Vigencia Desde', 'Fecha de Expedición', 'NÚMERO DE PÓLIZA', 'Año Modelo', 'Categoría',
+        'Cédula de Ciudadanía', 'Señor(a)', 'Dirección', 'Hasta las 24:00 horas', 'Teléfono', 'Línea',
+        'Responsabilidad Civil Extracontractual', 'Tomador', 'Asegurado', 'Vehículo', 'Código', 'Página',
+    ]
+    valores = ['ABC123', '2024-05-31', '31/05/2025', '1.234.567', 'Bogotá D.C.', 'Medellín', 'CAMIONETA', '—']
+    return [
+        f"{etiquetas[i % len(etiquetas)]}: {valores[(i * 7) % len(valores)]}" if i % 3 else valores[i % len(valores)]
+        for i in range(cantidad)
+    ]
+
+def _caracteres_tabla():
+    """Cada carácter de la tabla como línea, para comprobar la equivalencia uno por uno"""
+    return [chr(codigo) for inicio, fin in RANGOS_TABLA for codigo in range(inicio, fin)]
+
+def benchmark(lineas, repeticiones=5):
+    """
+    Compara resultados y tiempos de la normalización original y la rápida.
+    La equivalencia se comprueba además con cada carácter de la tabla. El
+    tiempo "frío" es la primera pasada con la memoria vacía; el "tibio", la
+    mejor de las siguientes (un proceso que ya vio esas etiquetas).
+    """
+    diferentes = [
+        linea for linea in lineas + _caracteres_tabla()
+        if normalize_text(linea) != normalize_text_unicode(linea)
+    ]
+
+    def pasada(funcion):
+        inicio = time.perf_counter()
+        for linea in lineas:
+            funcion(linea)
+        return time.perf_counter() - inicio
+
+    original = min(pasada(normalize_text_unicode) for _ in range(repeticiones))
+    _normalize_no_ascii.cache_clear()
+    fria = pasada(normalize_text)
+    tibia = min(pasada(normalize_text) for _ in range(repeticiones))
+    return {
+        'lineas': len(lineas),
+        'no_ascii': sum(1 for linea in lineas if not linea.isascii()),
+        'diferencias': len(diferentes),
+        'ejemplos': diferentes[:10],
+        'original_ms': round(original * 1000, 3),
+        'rapida_fria_ms': round(fria * 1000, 3),
+        'rapida_tibia_ms': round(tibia * 1000, 3),
+        'aceleracion_fria': round(original / fria, 2) if fria else None,
+        'aceleracion_tibia': round(original / tibia, 2) if tibia else None,
+    }
+
+# Ejecución principal: microbenchmark de equivalencia y velocidad
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Comparar normalize_text con la normalización NFKD original')
+    parser.add_argument('--corpus', type=str, help='Directorio con JSON de OCR (por defecto un corpus sintético)')
+    parser.add_argument('--repeticiones', type=int, default=5, help='Repeticiones por medición (se toma la mejor)')
+    args = parser.parse_args()
+
+    lineas = _lineas_corpus(args.corpus) if args.corpus else _lineas_sinteticas()
+    result = benchmark(lineas, args.repeticiones)
+    print(json.dumps(result, indent=4, ensure_ascii=False))
+    sys.exit(1 if result['diferencias'] else 0)
@@ -0,0 +1,482 @@
+import os
+import sys
+import json
+import glob
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import mimetypes
+import threading
+import traceback
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ocrFields import parse_fields
+from ocrSupervisor import OcrSupervisor
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp es opcional: sin él las peticiones van por urllib en hilos
+    aiohttp = None
+
+# Servicio de OCR (las mismas variables que usan las colas de Node)
+ENDPOINT = os.environ.get('DOC_INTELLIGENCE')
+CLAVE = os.environ.get('DOC_INTELLIGENCE_KEY')
+
+# Documentos en análisis a la vez (enviados y aún sin resultado)
+EN_VUELO = 4
+
+# Tiempo máximo por documento: el mismo presupuesto que los 60 intentos de un segundo de Node
+TIEMPO_MAXIMO = 60.0
+TIMEOUT_PETICION = 30.0
+
+# Errores seguidos (red, 5xx) que se toleran al consultar una operación
+MAX_ERRORES = 5
+
+# Procesos que ejecutan los procesadores y plazo de cada documento en ellos
+TRABAJADORES = 1
+PLAZO_PROCESO = 30.0
+
+ESTADOS_EN_CURSO = ('notStarted', 'running')
+
+class SondeoAdaptativo:
+    """
+    Esperas entre consultas de las operaciones de OCR. En lugar de consultar
+    cada segundo desde el envío, la primera consulta se hace un poco antes de
+    lo que vienen tardando los análisis (promedio móvil de las duraciones
+    observadas); si la operación sigue en curso, las esperas siguientes
+    empiezan cortas y crecen geométricamente hasta `maximo`, porque para
+    entonces el resultado debería estar por salir.
+    """
+
+    def __init__(self, inicial=2.0, minimo=0.25, maximo=4.0, factor=1.6, peso=0.3):
+        self.estimado = inicial
+        self.minimo = minimo
+        self.maximo = maximo
+        self.factor = factor
+        self.peso = peso
+        self.observadas = 0
+
+    def espera(self, intento):
+        """Segundos a esperar antes de la consulta número `intento` (desde 0)"""
+        if intento == 0:
+            return max(self.minimo, 0.8 * self.estimado)
+        return min(self.maximo, self.minimo * self.factor ** (intento - 1))
+
+    def registrar(self, duracion):
+        """Duración de un análisis completado (desde el envío hasta el resultado)"""
+        if self.observadas == 0:
+            self.estimado = duracion
+        else:
+            self.estimado = (1 - self.peso) * self.estimado + self.peso * duracion
+        self.observadas += 1
+
+def _peticion(metodo, url, cabeceras, cuerpo=None, timeout=TIMEOUT_PETICION):
+    request = urllib.request.Request(url, data=cuerpo, headers=cabeceras, method=metodo)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as respuesta:
+            return respuesta.status, {k.lower(): v for k, v in respuesta.headers.items()}, respuesta.read()
+    except urllib.error.HTTPError as e:
+        return e.code, {k.lower(): v for k, v in e.headers.items()}, e.read()
+
+class TransporteUrllib:
+    """Peticiones con urllib en un pool de hilos propio, del tamaño de los documentos en vuelo"""
+
+    def __init__(self, en_vuelo=EN_VUELO):
+        self._executor = ThreadPoolExecutor(max_workers=en_vuelo, thread_name_prefix='ocr-http')
+
+    async def pedir(self, metodo, url, cabeceras, cuerpo=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, _peticion, metodo, url, cabeceras, cuerpo)
+
+    async def cerrar(self):
+        self._executor.shutdown(wait=False)
+
+class TransporteAiohttp:
+    """Peticiones con una sesión de aiohttp (conexiones reutilizadas, sin hilos)"""
+
+    def __init__(self, en_vuelo=EN_VUELO):
+        self._sesion = None
+
+    async def pedir(self, metodo, url, cabeceras, cuerpo=None):
+        if self._sesion is None:
+            self._sesion = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=TIMEOUT_PETICION))
+        async with self._sesion.request(metodo, url, headers=cabeceras, data=cuerpo) as respuesta:
+            return respuesta.status, {k.lower(): v for k, v in respuesta.headers.items()}, await respuesta.read()
+
+    async def cerrar(self):
+        if self._sesion is not None:
+            await self._sesion.close()
+
+def _retry_after(cabeceras, por_defecto):
+    try:
+        return float(cabeceras.get('retry-after'))
+    except (TypeError, ValueError):
+        return por_defecto
+
+class OcrOrchestrator:
+    """
+    Envía documentos al servicio de OCR y espera sus resultados de forma
+    concurrente. A lo sumo `en_vuelo` documentos están en el servicio a la
+    vez (un semáforo cubre envío y consultas); cada uno se consulta con
+    SondeoAdaptativo y, al terminar, su analyzeResult pasa directo al
+    procesador de la categoría, sin Redis ni archivo temporal. Los
+    procesadores corren en los trabajadores de un OcrSupervisor (procesos
+    calientes): no bloquean las consultas de los demás documentos, el
+    watchdog corta cada extractor en el hilo principal del trabajador y,
+    si aun así un documento supera `plazo_proceso`, el trabajador se mata y
+    se reemplaza en lugar de frenar a los que vienen detrás.
+
+    Con cinco documentos y en_vuelo >= 5 el total queda cerca del más lento,
+    no de la suma.
+    """
+
+    def __init__(self, endpoint=ENDPOINT, clave=CLAVE, en_vuelo=EN_VUELO, transporte=None, sondeo=None,
+                 tiempo_maximo=TIEMPO_MAXIMO, supervisor=None, trabajadores=TRABAJADORES,
+                 plazo_proceso=PLAZO_PROCESO):
+        if not endpoint:
+            raise ValueError("Falta el endpoint del servicio de OCR (DOC_INTELLIGENCE)")
+        self.endpoint = endpoint
+        self.clave = clave or ''
+        self.en_vuelo = en_vuelo
+        self.transporte = transporte or (TransporteAiohttp if aiohttp else TransporteUrllib)(en_vuelo)
+        self.sondeo = sondeo or SondeoAdaptativo()
+        self.tiempo_maximo = tiempo_maximo
+        self.plazo_proceso = plazo_proceso
+        # Un supervisor recibido se comparte con quien lo creó: no se detiene al cerrar
+        self._propio = supervisor is None
+        self.supervisor = supervisor or OcrSupervisor(trabajadores, plazo=plazo_proceso).iniciar()
+        self._semaforo = None
+
+    async def cerrar(self):
+        await self.transporte.cerrar()
+        if self._propio:
+            await asyncio.get_running_loop().run_in_executor(None, self.supervisor.detener)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.cerrar()
+
+    def _cabeceras(self, extra=None):
+        cabeceras = {'Ocp-Apim-Subscription-Key': self.clave}
+        cabeceras.update(extra or {})
+        return cabeceras
+
+    async def enviar(self, contenido, tipo):
+        """Envía un documento y devuelve la URL de la operación (operation-location)"""
+        for intento in range(MAX_ERRORES):
+            estado, cabeceras, cuerpo = await self.transporte.pedir(
+                'POST', self.endpoint, self._cabeceras({'Content-Type': tipo}), contenido
+            )
+            if estado == 429 or estado >= 500:
+                # Servicio saturado: esperar lo que pida (o un backoff) y reintentar
+                await asyncio.sleep(_retry_after(cabeceras, self.sondeo.espera(intento + 1)))
+                continue
+            if estado >= 400:
+                raise RuntimeError(f"El servicio de OCR rechazó el documento ({estado}): {cuerpo[:200]!r}")
+            operacion = cabeceras.get('operation-location')
+            if not operacion:
+                raise RuntimeError('No se recibió operation-location en la respuesta de OCR')
+            return operacion
+        raise RuntimeError(f"El servicio de OCR no aceptó el documento después de {MAX_ERRORES} intentos")
+
+    async def esperar(self, operacion, inicio):
+        """Consulta la operación hasta que termine; devuelve (resultado, consultas)"""
+        intento = errores = 0
+        while True:
+            espera = self.sondeo.espera(intento)
+            if time.monotonic() + espera - inicio > self.tiempo_maximo:
+                raise TimeoutError(f"Tiempo de espera agotado para OCR ({self.tiempo_maximo:.0f}s)")
+            await asyncio.sleep(espera)
+            intento += 1
+            try:
+                estado, cabeceras, cuerpo = await self.transporte.pedir('GET', operacion, self._cabeceras())
+            except (OSError, asyncio.TimeoutError) as e:
+                estado, cabeceras, cuerpo = None, {}, str(e).encode()
+            if estado != 200:
+                errores += 1
+                if errores >= MAX_ERRORES:
+                    raise RuntimeError(f"Error al consultar estado OCR ({estado}): {cuerpo[:200]!r}")
+                continue
+            errores = 0
+            data = json.loads(cuerpo)
+            status = data.get('status')
+            if status == 'succeeded':
+                return data, intento
+            if status not in ESTADOS_EN_CURSO:
+                raise RuntimeError(f"OCR no completado exitosamente. Estado final: {status}")
+
+    async def _procesar(self, data, documento):
+        categoria = documento.get('categoria')
+        if not categoria:
+            from ocrClassifier import classify_ocr_data
+            categoria = (await asyncio.to_thread(classify_ocr_data, data)).get('categoria')
+        try:
+            futuro = self.supervisor.enviar(
+                categoria, data, documento.get('parametros'), documento.get('campos'),
+                documento.get('motor', 'script'), self.plazo_proceso,
+            )
+            resultado = await asyncio.wrap_future(futuro)
+        except Exception as e:
+            # Plazo vencido, trabajador caído o cola llena: el documento falla, los demás siguen
+            resultado = {"error": str(e) or type(e).__name__}
+        return categoria, resultado
+
+    async def analizar(self, documento):
+        """
+        OCR y procesamiento de un documento: dict con `nombre`, `contenido`
+        (bytes) o `ruta`, y opcionales `tipo`, `categoria` (si falta se
+        clasifica), `parametros`, `campos` y `motor`
+        """
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.en_vuelo)
+        nombre = documento.get('nombre') or documento.get('ruta')
+        salida = {'nombre': nombre}
+        try:
+            contenido = documento.get('contenido')
+            if contenido is None:
+                with open(documento['ruta'], 'rb') as file:
+                    contenido = file.read()
+            tipo = documento.get('tipo') or mimetypes.guess_type(nombre or '')[0] or 'application/octet-stream'
+
+            async with self._semaforo:
+                inicio = time.monotonic()
+                operacion = await self.enviar(contenido, tipo)
+                data, consultas = await self.esperar(operacion, inicio)
+                duracion = time.monotonic() - inicio
+            self.sondeo.registrar(duracion)
+
+            inicio_proceso = time.monotonic()
+            categoria, resultado = await self._procesar(data, documento)
+            salida.update({
+                'categoria': categoria,
+                'resultado': resultado,
+                'tiempos': {
+                    'ocr': round(duracion, 3),
+                    'consultas': consultas,
+                    'proceso': round(time.monotonic() - inicio_proceso, 3),
+                },
+            })
+        except Exception as e:
+            salida['error'] = str(e)
+        return salida
+
+    async def ejecutar(self, documentos):
+        """Analiza todos los documentos concurrentemente; resultados en el mismo orden"""
+        return await asyncio.gather(*(self.analizar(documento) for documento in documentos))
+
+class _ManejadorSimulado(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, estado, cuerpo=None, cabeceras=None):
+        datos = json.dumps(cuerpo).encode('utf-8') if cuerpo is not None else b''
+        self.send_response(estado)
+        for clave, valor in (cabeceras or {}).items():
+            self.send_header(clave, valor)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_POST(self):
+        servidor = self.server.simulado
+        contenido = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if servidor.rechazar():
+            self._responder(429, {'error': {'code': '429'}}, {'Retry-After': servidor.retry_after})
+            return
+        operacion = servidor.crear(contenido)
+        self._responder(202, cabeceras={
+            'Operation-Location': f"{servidor.url}/operaciones/{operacion}",
+            'Retry-After': '1',
+        })
+
+    def do_GET(self):
+        respuesta = self.server.simulado.consultar(self.path.rsplit('/', 1)[-1])
+        if respuesta is None:
+            self._responder(404, {'error': {'code': 'NotFound'}})
+        else:
+            self._responder(200, respuesta)
+
+class ServidorSimulado:
+    """
+    Servidor local que imita los endpoints de análisis del servicio de OCR
+    para pruebas: POST al endpoint devuelve 202 con operation-location y la
+    operación queda "running" durante su latencia, después "succeeded" con
+    el analyzeResult. Si el cuerpo enviado ya es un JSON de OCR (como los de
+    temp/), ese es el resultado; si no, un analyzeResult con el texto.
+
+    Para probar los caminos de error, los primeros `rechazos` envíos reciben
+    429 con `Retry-After` y `estado_final` puede ser, por ejemplo, "failed".
+    """
+
+    def __init__(self, latencia=2.0, variacion=1.0, semilla=None, host='127.0.0.1', puerto=0,
+                 rechazos=0, retry_after='1', estado_final='succeeded'):
+        self.latencia = latencia
+        self.variacion = variacion
+        self.rechazos = rechazos
+        self.retry_after = retry_after
+        self.estado_final = estado_final
+        self.envios = 0
+        self._azar = random.Random(semilla)
+        self._operaciones = {}
+        self._lock = threading.Lock()
+        self.consultas = 0
+        self._http = ThreadingHTTPServer((host, puerto), _ManejadorSimulado)
+        self._http.daemon_threads = True
+        self._http.simulado = self
+        self._hilo = threading.Thread(target=self._http.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, puerto = self._http.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    @property
+    def endpoint(self):
+        return f"{self.url}/documentintelligence/documentModels/prebuilt-layout:analyze"
+
+    def rechazar(self):
+        """True si este envío se responde con 429 (cuenta todos los envíos)"""
+        with self._lock:
+            self.envios += 1
+            return self.envios <= self.rechazos
+
+    def crear(self, contenido):
+        try:
+            data = json.loads(contenido)
+            resultado = data if isinstance(data, dict) and 'analyzeResult' in data else None
+        except ValueError:
+            resultado = None
+        if resultado is None:
+            resultado = {'analyzeResult': {'content': contenido.decode('utf-8', errors='ignore'), 'pages': []}}
+        operacion = uuid.uuid4().hex
+        with self._lock:
+            latencia = max(0.0, self.latencia + self._azar.uniform(-self.variacion, self.variacion))
+            self._operaciones[operacion] = (time.monotonic() + latencia, resultado)
+        return operacion
+
+    def consultar(self, operacion):
+        with self._lock:
+            self.consultas += 1
+            entrada = self._operaciones.get(operacion)
+        if entrada is None:
+            return None
+        listo, resultado = entrada
+        if time.monotonic() < listo:
+            return {'status': 'running'}
+        if self.estado_final != 'succeeded':
+            return {'status': self.estado_final, 'error': {'code': 'InternalServerError'}}
+        return dict(resultado, status='succeeded')
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._http.shutdown()
+        self._http.server_close()
+
+def documentos_de(rutas, categoria=None, parametros=None, campos=None, motor='script'):
+    return [
+        {
+            'nombre': os.path.basename(ruta), 'ruta': ruta, 'categoria': categoria,
+            'parametros': parametros, 'campos': campos, 'motor': motor,
+        }
+        for ruta in rutas
+    ]
+
+# Función principal para orquestar el OCR de varios documentos
+def process_orchestration(documentos, endpoint=ENDPOINT, clave=CLAVE, en_vuelo=EN_VUELO, tiempo_maximo=TIEMPO_MAXIMO,
+                          trabajadores=TRABAJADORES):
+    async def _ejecutar():
+        async with OcrOrchestrator(endpoint, clave, en_vuelo, tiempo_maximo=tiempo_maximo,
+                                   trabajadores=trabajadores) as orquestador:
+            inicio = time.monotonic()
+            salidas = await orquestador.ejecutar(documentos)
+            return salidas, time.monotonic() - inicio, orquestador.sondeo.estimado
+
+    try:
+        salidas, total, estimado = asyncio.run(_ejecutar())
+        return {
+            'documentos': {salida.pop('nombre'): salida for salida in salidas},
+            'segundos': round(total, 3),
+            'ocrEstimado': round(estimado, 3),
+            # Falla del servicio de OCR o del procesador (categoría sin procesador, plazo vencido...)
+            'errores': sum(1 for salida in salidas if 'error' in salida or 'error' in (salida.get('resultado') or {})),
+        }
+    except Exception as e:
+        return {"error": str(e), "trace": traceback.format_exc()}
+
+# Ejecución principal
+if __name__ == "__main__":
+    try:
+        parser = argparse.ArgumentParser(description='Enviar documentos al OCR concurrentemente y procesar cada resultado')
+        parser.add_argument('--file', type=str, action='append', default=[], help='Documento a analizar (se puede repetir)')
+        parser.add_argument('--dir', type=str, help='Directorio con documentos a analizar')
+        parser.add_argument('--categoria', type=str, help='Categoría de todos los documentos (por defecto se clasifica cada uno)')
+        parser.add_argument('--placa', type=str, help='Placa del vehículo (opcional)')
+        parser.add_argument('--numero_identificacion', type=str, help='Identificación del conductor (opcional)')
+        parser.add_argument('--fecha_nacimiento', type=str, help='Fecha de nacimiento del conductor (opcional)')
+        parser.add_argument('--fields', type=str, help='Campos a extraer separados por coma (opcional, por defecto todos)')
+        parser.add_argument('--motor', choices=('script', 'reglas'), default='script', help='Procesador a usar')
+        parser.add_argument('--en-vuelo', type=int, default=EN_VUELO, help='Documentos en análisis a la vez')
+        parser.add_argument('--tiempo-maximo', type=float, default=TIEMPO_MAXIMO, help='Segundos máximos por documento')
+        parser.add_argument('--trabajadores', type=int, default=TRABAJADORES, help='Procesos que ejecutan los procesadores')
+        parser.add_argument('--endpoint', type=str, default=ENDPOINT, help='Endpoint de análisis (por defecto DOC_INTELLIGENCE)')
+        parser.add_argument('--simular', action='store_true',
+                            help='Usar un servidor local simulado; los documentos deben ser JSON de OCR')
+        parser.add_argument('--latencia', type=float, default=2.0, help='Con --simular, latencia media del análisis')
+        parser.add_argument('--variacion', type=float, default=1.0, help='Con --simular, variación de la latencia (±)')
+
+        args = parser.parse_args()
+
+        rutas = list(args.file)
+        if args.dir:
+            rutas += sorted(ruta for ruta in glob.glob(os.path.join(args.dir, '*')) if os.path.isfile(ruta))
+        faltantes = [ruta for ruta in rutas if not os.path.exists(ruta)]
+        if not rutas or faltantes:
+            print(f"ERROR: archivos no encontrados: {faltantes or 'ninguno indicado'}", file=sys.stderr)
+            print(json.dumps({"error": f"Archivos no encontrados: {faltantes or 'se requiere --file o --dir'}"}))
+            sys.exit(1)
+        if not args.simular and not args.endpoint:
+            print("ERROR: falta el endpoint de OCR (--endpoint o DOC_INTELLIGENCE)", file=sys.stderr)
+            print(json.dumps({"error": "Falta el endpoint de OCR (--endpoint o DOC_INTELLIGENCE)"}))
+            sys.exit(1)
+
+        parametros = {
+            'placa': args.placa,
+            'numero_identificacion': args.numero_identificacion,
+            'fecha_nacimiento': args.fecha_nacimiento,
+        }
+        documentos = documentos_de(rutas, args.categoria, parametros, parse_fields(args.fields), args.motor)
+
+        if args.simular:
+            with ServidorSimulado(args.latencia, args.variacion) as servidor:
+                for documento in documentos:
+                    documento['tipo'] = 'application/json'
+                result = process_orchestration(
+                    documentos, servidor.endpoint, 'simulada', args.en_vuelo, args.tiempo_maximo, args.trabajadores
+                )
+                result['consultasServidor'] = servidor.consultas
+        else:
+            result = process_orchestration(
+                documentos, args.endpoint, CLAVE, args.en_vuelo, args.tiempo_maximo, args.trabajadores
+            )
+
+        # Imprimir resultado como JSON (único output a stdout)
+        print(json.dumps(result, indent=4, ensure_ascii=False))
+
+    except Exception as e:
+        # Errores a stderr para depuración
+        print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
+        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
+
+        # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
@@ -2,10 +2,15 @@ import json
 import re
 from datetime import datetime
 import sys
-import unicodedata
 import traceback
+from ocrDocument import OcrDocument
+from ocrFields import ExtractorGraph, extractor, parse_fields
+from ocrConfidence import ConfidenceMap, Candidato, buscar_en_lineas
 import os
 import argparse
+from ocrNormalize import normalize_text
+from ocrTrace import traza
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
 
 # Diccionario para traducir meses en español a números
 MESES = {
@@ -13,20 +18,24 @@ MESES = {
     "julio": "07", "agosto": "08", "septiembre": "09", "octubre": "10", "noviembre": "11", "diciembre": "12"
 }
 
-# Función para normalizar texto
-def normalize_text(text):
-    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8').upper()
-
 class PolizaExtraContractualProcessor:
+    # Extractores y campos que producen (ver ocrFields.ExtractorGraph)
+    EXTRACTORES = ExtractorGraph([
+        extractor('extract_placa', ['placa']),
+        extractor('extract_fecha_vencimiento', ['poliza_extra_contractual_vencimiento']),
+    ])
+
     def __init__(self, ocr_data, placa_param=None):
         self.data = ocr_data
         self.content = ocr_data.get('analyzeResult', {}).get('content', '')
-        self.lines = self.content.split('\n')
+        self.document = OcrDocument(ocr_data.get('analyzeResult', {}))
+        self.lines = self.document.lines
         self.placa_param = placa_param.upper() if placa_param else None
         self.result = {
             "placa": None,
             "poliza_extra_contractual_vencimiento": None,
         }
+        self._confianza = None
         
         # Palabras clave para identificar contextos relevantes
         self.palabras_clave_vigencia = [
@@ -34,14 +43,16 @@ class PolizaExtraContractualProcessor:
             "RESPONSABILIDAD CIVIL CONTRACTUAL", "SEGURO RC CONTRACTUAL", "RESPONSABILIDAD CIVIL EXTRACONTRACTUAL", "SEGURO EXTRACONTRACTUAL",
         ]
     
-    def find_line_index(self, keyword, normalize=True):
+    @property
+    def confianza(self):
+        """Confianza de las palabras del OCR (se construye solo si se necesita)"""
+        if self._confianza is None:
+            self._confianza = ConfidenceMap.from_analyze_result(self.data.get('analyzeResult', {}))
+        return self._confianza
+    
+    def find_line_index(self, keyword, normalize=True, paginas=None):
         """Encontrar el índice de la línea que contiene una palabra clave"""
-        keyword_norm = normalize_text(keyword) if normalize else keyword
-        for i, line in enumerate(self.lines):
-            line_norm = normalize_text(line) if normalize else line
-            if keyword_norm in line_norm:
-                return i
-        return -1
+        return self.document.find_line_index(keyword, normalize, paginas)
     
     def extract_placa(self):
         """Extraer la placa del vehículo"""
@@ -64,18 +75,17 @@ class PolizaExtraContractualProcessor:
             return self.buscar_cualquier_placa()
     
     def buscar_cualquier_placa(self):
-        """Buscar cualquier patrón de placa en el documento"""
-        for line in self.lines:
-            match = re.search(r'[A-Z]{3}\d{3}', line)
-            if match:
-                self.result["placa"] = match.group(0)
-                return True
+        """Buscar cualquier patrón de placa en el documento, prefiriendo lecturas confiables"""
+        candidato = self.confianza.primera_confiable(buscar_en_lineas(self.lines, r'[A-Z]{3}\d{3}'))
+        if candidato:
+            self.result["placa"] = candidato.valor.group(0)
+            return True
         return False
     
     def extract_fecha_vencimiento(self):
         """Extraer fecha de vencimiento de la póliza extracontractual"""
         # Recolectar todas las fechas encontradas
-        fechas_encontradas = []
+        candidatos = []
         
         # 1. Buscar fechas cerca de palabras clave de vigencia
         for keyword in self.palabras_clave_vigencia:
@@ -83,12 +93,15 @@ class PolizaExtraContractualProcessor:
             if venc_idx >= 0:
                 # Analizar esta línea y las siguientes
                 for i in range(venc_idx, min(venc_idx + 5, len(self.lines))):
-                    fechas_encontradas.extend(self.extract_dates_from_text(self.lines[i]))
+                    candidatos.extend(self.fechas_en_linea(i, keyword))
         
         # 2. Si no encontramos fechas con contexto, buscar todas las fechas
-        if not fechas_encontradas:
-            for line in self.lines:
-                fechas_encontradas.extend(self.extract_dates_from_text(line))
+        if not candidatos:
+            for i in range(len(self.lines)):
+                candidatos.extend(self.fechas_en_linea(i))
+        
+        # Descartar en bloque las fechas de baja confianza
+        fechas_encontradas = [c.valor for c in self.confianza.filtrar(candidatos)]
         
         # 3. Seleccionar la fecha más apropiada
         if fechas_encontradas:
@@ -113,6 +126,14 @@ class PolizaExtraContractualProcessor:
     
     def extract_dates_from_text(self, text):
         """Extraer todas las fechas de un texto dado"""
+        return [fecha for _, _, fecha in self._buscar_fechas(text)]
+    
+    def fechas_en_linea(self, i, etiqueta=None):
+        """Fechas de la línea `i` como candidatos con su posición, para calificarlas por confianza"""
+        return [Candidato(i, inicio, fin, fecha, etiqueta) for inicio, fin, fecha in self._buscar_fechas(self.lines[i])]
+    
+    def _buscar_fechas(self, text):
+        """Fechas de un texto como (inicio, fin, "YYYY-MM-DD") en el orden de los patrones"""
         fechas = []
         
         # Formatos estándar de fecha
@@ -133,7 +154,7 @@ class PolizaExtraContractualProcessor:
                     else:  # YYYY-MM-DD or YYYY/MM/DD
                         year, month, day = match.groups()
                         fecha = datetime(int(year), int(month), int(day))
-                    fechas.append(fecha.strftime("%Y-%m-%d"))
+                    fechas.append((match.start(), match.end(), fecha.strftime("%Y-%m-%d")))
                 except ValueError:
                     continue
         
@@ -145,24 +166,23 @@ class PolizaExtraContractualProcessor:
                 try:
                     dia, anio = match.groups()
                     fecha = datetime(int(anio), int(num), int(dia))
-                    fechas.append(fecha.strftime("%Y-%m-%d"))
+                    fechas.append((match.start(), match.end(), fecha.strftime("%Y-%m-%d")))
                 except ValueError:
                     continue
         
         return fechas
     
-    def process(self):
-        """Procesar todos los campos y devolver el resultado"""
-        self.extract_placa()
-        self.extract_fecha_vencimiento()
+    def process(self, campos=None):
+        """Procesar los campos pedidos (todos por defecto) y devolver el resultado"""
+        self.EXTRACTORES.ejecutar(self, campos)
         
-        return self.result
+        return self.EXTRACTORES.seleccionar(self.result, campos)
 
 # Función principal para procesar el OCR
-def process_poliza_extra_contractual(data, placa_param=None):
+def process_poliza_extra_contractual(data, placa_param=None, campos=None):
     try:
         processor = PolizaExtraContractualProcessor(data, placa_param)
-        result = processor.process()
+        result = processor.process(campos)
         return result
     except Exception as e:
         return {"error": str(e), "trace": traceback.format_exc()}
@@ -172,14 +192,25 @@ if __name__ == "__main__":
     try:
         parser = argparse.ArgumentParser(description='Procesar datos OCR')
         parser.add_argument('--file', type=str, help='Ruta al archivo JSON con datos OCR')
+        agregar_argumentos(parser)
         parser.add_argument('--placa', type=str, help='Placa del vehículo (opcional)')
+        parser.add_argument('--fields', type=str, help='Campos a extraer separados por coma (opcional, por defecto todos)')
+        parser.add_argument('--debug', action='store_true', help='Volcar a stderr la traza de decisiones de los extractores')
         
         args = parser.parse_args()
         
         # Determinar qué archivo procesar
         file_path = None
         
-        if args.file:
+        if hay_entrada(args):
+            # JSON compacto por stdin o por un descriptor heredado, sin archivo temporal
+            try:
+                data = leer_entrada(args)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: La entrada no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en la entrada: {str(e)}"}))
+                sys.exit(1)
+        elif args.file:
             # Usar el archivo especificado por argumento
             file_path = args.file
             if not os.path.exists(file_path):
@@ -215,16 +246,21 @@ if __name__ == "__main__":
                 sys.exit(1)
         
         # Procesar los datos
-        result = process_poliza_extra_contractual(data)
+        result = process_poliza_extra_contractual(data, campos=parse_fields(args.fields))
         
         # Imprimir resultado como JSON (único output a stdout)
         print(json.dumps(result, indent=4, ensure_ascii=False))
+
+        # Traza de decisiones a stderr solo si falló, hubo baja confianza o se pidió --debug
+        traza.volcar_si(result, args.debug)
         
     except Exception as e:
         # Errores a stderr para depuración
         print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
         print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
         
+        traza.volcar_si({"error": str(e)})
+
         # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
         print(json.dumps({"error": str(e)}))
         sys.exit(1)
\ No newline at end of file
@@ -1,11 +1,16 @@
 import json
 import re
 from datetime import datetime
-import unicodedata
 import sys
 import traceback
+from ocrDocument import OcrDocument, PAGINAS_ANCLA, PAGINAS_VALIDACION
+from ocrFields import ExtractorGraph, extractor, parse_fields
+from ocrConfidence import ConfidenceMap, Candidato, buscar_en_lineas
 import os
 import argparse
+from ocrNormalize import normalize_text
+from ocrTrace import traza
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
 
 # Diccionario para meses en español (abreviados y completos)
 MESES = {
@@ -15,20 +20,24 @@ MESES = {
     "julio": "07", "agosto": "08", "septiembre": "09", "octubre": "10", "noviembre": "11", "diciembre": "12"
 }
 
-# Función para normalizar texto
-def normalize_text(text):
-    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8').upper()
-
 class PolizaTodoRiesgoProcessor:
+    # Extractores y campos que producen (ver ocrFields.ExtractorGraph)
+    EXTRACTORES = ExtractorGraph([
+        extractor('extract_placa', ['placa']),
+        extractor('extract_fecha_vencimiento', ['polizaTodoRiesgoVencimiento']),
+    ])
+
     def __init__(self, ocr_data, placa_param=None):
         self.data = ocr_data
         self.content = ocr_data.get('analyzeResult', {}).get('content', '')
-        self.lines = self.content.split('\n')
+        self.document = OcrDocument(ocr_data.get('analyzeResult', {}))
+        self.lines = self.document.lines
         self.placa_param = placa_param.upper() if placa_param else None
         self.result = {
             "placa": False,
             "polizaTodoRiesgoVencimiento": None,
         }
+        self._confianza = None
         
         # Palabras clave para identificar contextos relevantes
         self.palabras_clave_poliza = [
@@ -41,21 +50,21 @@ class PolizaTodoRiesgoProcessor:
             "TERMINA", "VALIDEZ", "VALIDO HASTA", "VÁLIDO HASTA"
         ]
     
-    def find_line_index(self, keyword, normalize=True):
+    @property
+    def confianza(self):
+        """Confianza de las palabras del OCR (se construye solo si se necesita)"""
+        if self._confianza is None:
+            self._confianza = ConfidenceMap.from_analyze_result(self.data.get('analyzeResult', {}))
+        return self._confianza
+    
+    def find_line_index(self, keyword, normalize=True, paginas=None):
         """Encontrar el índice de la línea que contiene una palabra clave"""
-        keyword_norm = normalize_text(keyword) if normalize else keyword
-        for i, line in enumerate(self.lines):
-            line_norm = normalize_text(line) if normalize else line
-            if keyword_norm in line_norm:
-                return i
-        return -1
+        return self.document.find_line_index(keyword, normalize, paginas)
     
     def is_valid_poliza(self):
         """Verificar si el documento es una póliza todo riesgo válida"""
-        for keyword in self.palabras_clave_poliza:
-            if self.find_line_index(keyword) >= 0:
-                return True
-        return False
+        # El encabezado está en la primera página; el resto del documento no se revisa
+        return self.document.contains_any(self.palabras_clave_poliza, PAGINAS_VALIDACION)
     
     def extract_placa(self):
         """Extraer la placa del vehículo"""
@@ -73,21 +82,23 @@ class PolizaTodoRiesgoProcessor:
     
     def buscar_cualquier_placa(self):
         """Buscar cualquier patrón de placa en el documento"""
-        placa_idx = self.find_line_index("PLACA")
+        placa_idx = self.find_line_index("PLACA", paginas=PAGINAS_ANCLA)
         if placa_idx >= 0:
-            # Buscar en esta línea y las siguientes
-            for i in range(placa_idx, min(placa_idx + 5, len(self.lines))):
-                match = re.search(r'[A-Z]{3}\d{3}', self.lines[i])
-                if match:
-                    self.result["placa"] = match.group(0)
-                    return True
+            # Buscar en esta línea y las siguientes, prefiriendo lecturas confiables
+            candidato = self.confianza.primera_confiable(
+                buscar_en_lineas(
+                    self.lines, r'[A-Z]{3}\d{3}', range(placa_idx, min(placa_idx + 5, len(self.lines))), etiqueta='PLACA'
+                )
+            )
+            if candidato:
+                self.result["placa"] = candidato.valor.group(0)
+                return True
         
         # Si no encuentra con "PLACA", buscar patrón de placa en todas las líneas
-        for line in self.lines:
-            match = re.search(r'[A-Z]{3}\d{3}', line)
-            if match:
-                self.result["placa"] = match.group(0)
-                return True
+        candidato = self.confianza.primera_confiable(buscar_en_lineas(self.lines, r'[A-Z]{3}\d{3}'))
+        if candidato:
+            self.result["placa"] = candidato.valor.group(0)
+            return True
         
         return False
 
@@ -154,7 +165,7 @@ class PolizaTodoRiesgoProcessor:
             self.result["polizaTodoRiesgoVencimiento"] = segmented_date
             return True
         
-        fechas_encontradas = []
+        candidatos = []
         
         # 2. Buscar fechas cercanas a palabras clave de vigencia
         for keyword in self.palabras_clave_vigencia:
@@ -162,12 +173,15 @@ class PolizaTodoRiesgoProcessor:
             if venc_idx >= 0:
                 # Buscar en esta línea y las 5 siguientes
                 for i in range(venc_idx, min(venc_idx + 6, len(self.lines))):
-                    fechas_encontradas.extend(self.extract_dates_from_text(self.lines[i]))
+                    candidatos.extend(self.fechas_en_linea(i, keyword))
         
         # 3. Si no se encontraron fechas con contexto, buscar todas las fechas
-        if not fechas_encontradas:
-            for line in self.lines:
-                fechas_encontradas.extend(self.extract_dates_from_text(line))
+        if not candidatos:
+            for i in range(len(self.lines)):
+                candidatos.extend(self.fechas_en_linea(i))
+        
+        # Descartar en bloque las fechas de baja confianza
+        fechas_encontradas = [c.valor for c in self.confianza.filtrar(candidatos)]
         
         # 4. Seleccionar la fecha más apropiada
         if fechas_encontradas:
@@ -200,6 +214,14 @@ class PolizaTodoRiesgoProcessor:
 
     def extract_dates_from_text(self, text):
         """Extraer todas las fechas de un texto dado"""
+        return [fecha for _, _, fecha in self._buscar_fechas(text)]
+    
+    def fechas_en_linea(self, i, etiqueta=None):
+        """Fechas de la línea `i` como candidatos con su posición, para calificarlas por confianza"""
+        return [Candidato(i, inicio, fin, fecha, etiqueta) for inicio, fin, fecha in self._buscar_fechas(self.lines[i])]
+    
+    def _buscar_fechas(self, text):
+        """Fechas de un texto como (inicio, fin, "YYYY-MM-DD") en el orden de los patrones"""
         fechas = []
         
         # 1. Buscar fechas en formato DD-MMM-YYYY o DD-MMM.-YYYY (ej: 01-ENE-2023 o 01-ENE.-2023)
@@ -211,7 +233,7 @@ class PolizaTodoRiesgoProcessor:
                 month = MESES.get(month_text)
                 if month:
                     fecha_str = f"{year}-{month}-{int(day):02d}"
-                    fechas.append(fecha_str)
+                    fechas.append((match.start(), match.end(), fecha_str))
             except (ValueError, KeyError):
                 continue
         
@@ -225,7 +247,7 @@ class PolizaTodoRiesgoProcessor:
                 try:
                     date_str = match.group(0)
                     date_obj = datetime.strptime(date_str, format_str)
-                    fechas.append(date_obj.strftime("%Y-%m-%d"))
+                    fechas.append((match.start(), match.end(), date_obj.strftime("%Y-%m-%d")))
                 except ValueError:
                     continue
         
@@ -239,7 +261,7 @@ class PolizaTodoRiesgoProcessor:
                 try:
                     date_str = match.group(0)
                     date_obj = datetime.strptime(date_str, format_str)
-                    fechas.append(date_obj.strftime("%Y-%m-%d"))
+                    fechas.append((match.start(), match.end(), date_obj.strftime("%Y-%m-%d")))
                 except ValueError:
                     continue
         
@@ -252,27 +274,26 @@ class PolizaTodoRiesgoProcessor:
                 month = MESES.get(month_text)
                 if month:
                     fecha_str = f"{year}-{month}-{int(day):02d}"
-                    fechas.append(fecha_str)
+                    fechas.append((match.start(), match.end(), fecha_str))
             except (ValueError, KeyError):
                 continue
         
         return fechas
     
-    def process(self):
-        """Procesar todos los campos y devolver el resultado"""
+    def process(self, campos=None):
+        """Procesar los campos pedidos (todos por defecto) y devolver el resultado"""
         if not self.is_valid_poliza():
             return {"error": "No es una póliza todo riesgo válida"}
         
-        self.extract_placa()
-        self.extract_fecha_vencimiento()
+        self.EXTRACTORES.ejecutar(self, campos)
         
-        return self.result
+        return self.EXTRACTORES.seleccionar(self.result, campos)
 
 # Función principal para procesar el OCR
-def process_poliza_todo_riesgo(data, placa_param=None):
+def process_poliza_todo_riesgo(data, placa_param=None, campos=None):
     try:
         processor = PolizaTodoRiesgoProcessor(data, placa_param)
-        result = processor.process()
+        result = processor.process(campos)
         return result
     except Exception as e:
         return {"error": str(e), "trace": traceback.format_exc()}
@@ -282,14 +303,25 @@ if __name__ == "__main__":
     try:
         parser = argparse.ArgumentParser(description='Procesar datos OCR')
         parser.add_argument('--file', type=str, help='Ruta al archivo JSON con datos OCR')
+        agregar_argumentos(parser)
         parser.add_argument('--placa', type=str, help='Placa del vehículo (opcional)')
+        parser.add_argument('--fields', type=str, help='Campos a extraer separados por coma (opcional, por defecto todos)')
+        parser.add_argument('--debug', action='store_true', help='Volcar a stderr la traza de decisiones de los extractores')
         
         args = parser.parse_args()
         
         # Determinar qué archivo procesar
         file_path = None
         
-        if args.file:
+        if hay_entrada(args):
+            # JSON compacto por stdin o por un descriptor heredado, sin archivo temporal
+            try:
+                data = leer_entrada(args)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: La entrada no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en la entrada: {str(e)}"}))
+                sys.exit(1)
+        elif args.file:
             # Usar el archivo especificado por argumento
             file_path = args.file
             if not os.path.exists(file_path):
@@ -325,16 +357,21 @@ if __name__ == "__main__":
                 sys.exit(1)
         
         # Procesar los datos
-        result = process_poliza_todo_riesgo(data)
+        result = process_poliza_todo_riesgo(data, campos=parse_fields(args.fields))
         
         # Imprimir resultado como JSON (único output a stdout)
         print(json.dumps(result, indent=4, ensure_ascii=False))
+
+        # Traza de decisiones a stderr solo si falló, hubo baja confianza o se pidió --debug
+        traza.volcar_si(result, args.debug)
         
     except Exception as e:
         # Errores a stderr para depuración
         print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
         print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
         
+        traza.volcar_si({"error": str(e)})
+
         # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
         print(json.dumps({"error": str(e)}))
         sys.exit(1)
\ No newline at end of file
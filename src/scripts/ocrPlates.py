@@ -0,0 +1,234 @@
+import os
+import re
+import sys
+import json
+import glob
+import argparse
+import traceback
+
+# Token con forma de placa: 3 caracteres + 3 o 4, con un espacio o guion
+# opcional entre los grupos ("ABC123", "ABC 1234", "ABC-123"). Se busca en el
+# content original, sin distinguir mayúsculas, para que los offsets sean los
+# del analyzeResult. No cuentan los tokens pegados a una fecha ("15-ABR-1972")
+# o a un número con separadores de miles ("NIT 900.123.456").
+PATRON_TOKEN = re.compile(
+    r'(?<![A-Z0-9/\-])([A-Z0-9]{3})[ \-]?([A-Z0-9]{3,4})(?![A-Z0-9]|[.,/\-]\d)', re.ASCII | re.IGNORECASE
+)
+
+# Tokens con forma de placa que no son placas: un mes seguido del año en
+# fechas separadas por espacios ("31 MAR 2025", formato que aceptan SOAT y
+# RTM; una placa MAR123 sigue valiendo) y los prefijos de identificaciones y
+# teléfonos ("NIT 900 123 456", "SOS 1234")
+MESES = frozenset(('ENE', 'FEB', 'MAR', 'ABR', 'MAY', 'JUN', 'JUL', 'AGO', 'SEP', 'SET', 'OCT', 'NOV', 'DIC'))
+PREFIJOS = frozenset(('NIT', 'CEL', 'TEL', 'FAX', 'EXT', 'SOS'))
+
+# Confusiones típicas del OCR: dígito leído donde va una letra y al revés
+A_LETRA = str.maketrans({'0': 'O', '1': 'I', '2': 'Z', '4': 'A', '5': 'S', '6': 'G', '8': 'B'})
+A_DIGITO = str.maketrans({'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1', 'Z': '2', 'S': '5', 'G': '6', 'B': '8'})
+
+# Correcciones permitidas por token: con más, cualquier palabra de 6 letras
+# terminaría siendo una placa
+MAX_CORRECCIONES = 2
+
+def canonizar(texto):
+    """
+    Placa canónica (ABC123) de un texto con forma de placa y cuántos
+    caracteres hubo que corregir, o (None, 0) si no es una placa
+    """
+    compacto = re.sub(r'[\s\-]', '', texto.upper())
+    if len(compacto) not in (6, 7) or not compacto.isascii():
+        return None, 0
+    letras = compacto[:3].translate(A_LETRA)
+    digitos = compacto[3:].translate(A_DIGITO)
+    if not (letras.isalpha() and digitos.isdigit()):
+        return None, 0
+    placa = letras + digitos
+    correcciones = sum(1 for original, corregido in zip(compacto, placa) if original != corregido)
+    if correcciones > MAX_CORRECCIONES:
+        return None, 0
+    return placa, correcciones
+
+def _descartar(placa):
+    """True si el token canónico es una fecha o un prefijo de identificación, no una placa"""
+    letras = placa[:3]
+    return letras in PREFIJOS or (letras in MESES and len(placa) == 7)
+
+def menciones(content):
+    """[(placa, offset, texto leído)] de todos los tokens con forma de placa del content"""
+    encontradas = []
+    for match in PATRON_TOKEN.finditer(content):
+        placa, _ = canonizar(match.group(0))
+        if placa and not _descartar(placa):
+            encontradas.append((placa, match.start(), match.group(0)))
+    return encontradas
+
+class PlateIndex:
+    """
+    Índice invertido de placas de una flota de documentos. Cada documento se
+    tokeniza una sola vez; después "qué documentos mencionan la placa X" y
+    "qué placas menciona el documento Y" son accesos a diccionario, en lugar
+    de recorrer todas las líneas de todos los documentos por cada placa como
+    hace la verificación de `placa_param` de cada procesador.
+
+    Las menciones guardan el offset en el content y el texto leído; una
+    mención es exacta si el texto ya era la placa (sin correcciones de OCR).
+    """
+
+    def __init__(self):
+        # placa → {documento: [(offset, texto)]}
+        self.por_placa = {}
+        # documento → {placa: [(offset, texto)]}
+        self.por_documento = {}
+
+    def agregar(self, documento, ocr_data):
+        """Tokeniza un resultado de OCR y lo registra como `documento` (reemplaza uno anterior)"""
+        if documento in self.por_documento:
+            self.quitar(documento)
+        analyze_result = ocr_data.get('analyzeResult', ocr_data) if isinstance(ocr_data, dict) else {}
+        placas = {}
+        for placa, offset, texto in menciones(analyze_result.get('content', '') or ''):
+            placas.setdefault(placa, []).append((offset, texto))
+        self.por_documento[documento] = placas
+        for placa, ubicaciones in placas.items():
+            self.por_placa.setdefault(placa, {})[documento] = ubicaciones
+        return placas
+
+    def quitar(self, documento):
+        for placa in self.por_documento.pop(documento, {}):
+            documentos = self.por_placa.get(placa, {})
+            documentos.pop(documento, None)
+            if not documentos:
+                self.por_placa.pop(placa, None)
+
+    def __len__(self):
+        return len(self.por_documento)
+
+    def documentos_con(self, placa, exacta=False):
+        """{documento: [(offset, texto)]} de los documentos que mencionan la placa"""
+        placa, _ = canonizar(placa or '')
+        documentos = self.por_placa.get(placa, {})
+        if not exacta:
+            return documentos
+        return {
+            documento: exactas for documento, ubicaciones in documentos.items()
+            if (exactas := [(offset, texto) for offset, texto in ubicaciones if canonizar(texto)[1] == 0])
+        }
+
+    def placas_de(self, documento):
+        """{placa: [(offset, texto)]} de las placas que menciona el documento"""
+        return self.por_documento.get(documento, {})
+
+    def auditar(self, asignaciones):
+        """
+        Cruza {documento: placa esperada} (la del vehículo al que está
+        asociado) contra el índice: si el documento la menciona, con qué
+        lecturas, y qué otras placas menciona
+        """
+        resultado = {}
+        for documento, esperada in asignaciones.items():
+            placa, _ = canonizar(esperada or '')
+            placas = self.placas_de(documento)
+            ubicaciones = placas.get(placa, [])
+            resultado[documento] = {
+                'placa': placa or esperada,
+                'indexado': documento in self.por_documento,
+                'coincide': bool(ubicaciones),
+                'exacta': any(canonizar(texto)[1] == 0 for _, texto in ubicaciones),
+                'otras': sorted(otra for otra in placas if otra != placa),
+            }
+        return resultado
+
+    def a_dict(self):
+        return {
+            documento: {placa: [list(ubicacion) for ubicacion in ubicaciones] for placa, ubicaciones in placas.items()}
+            for documento, placas in self.por_documento.items()
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """Índice a partir de a_dict() (por ejemplo, guardado con --guardar)"""
+        indice = cls()
+        for documento, placas in datos.items():
+            indice.por_documento[documento] = {
+                placa: [tuple(ubicacion) for ubicacion in ubicaciones] for placa, ubicaciones in placas.items()
+            }
+            for placa, ubicaciones in indice.por_documento[documento].items():
+                indice.por_placa.setdefault(placa, {})[documento] = ubicaciones
+        return indice
+
+    @classmethod
+    def desde_directorio(cls, directorio):
+        """Índice de todos los JSON de OCR de un directorio; el documento es el nombre del archivo sin .json"""
+        indice = cls()
+        for ruta in sorted(glob.glob(os.path.join(directorio, '*.json'))):
+            with open(ruta, 'r', encoding='utf-8') as file:
+                indice.agregar(os.path.splitext(os.path.basename(ruta))[0], json.load(file))
+        return indice
+
+def _formatear(ubicaciones_por_clave):
+    return {
+        clave: [{'offset': offset, 'texto': texto} for offset, texto in ubicaciones]
+        for clave, ubicaciones in ubicaciones_por_clave.items()
+    }
+
+# Función principal para consultar el índice
+def process_plates_data(indice, placa=None, documento=None, asignaciones=None, exacta=False):
+    try:
+        result = {'documentos': len(indice), 'placas': len(indice.por_placa)}
+        if placa:
+            result['documentosConPlaca'] = _formatear(indice.documentos_con(placa, exacta))
+        if documento:
+            result['placasDelDocumento'] = _formatear(indice.placas_de(documento))
+        if asignaciones is not None:
+            result['auditoria'] = indice.auditar(asignaciones)
+        return result
+    except Exception as e:
+        return {"error": str(e), "trace": traceback.format_exc()}
+
+# Ejecución principal
+if __name__ == "__main__":
+    try:
+        parser = argparse.ArgumentParser(description='Índice invertido de placas para auditar documentos de la flota')
+        parser.add_argument('--dir', type=str, help='Directorio con JSON de OCR a indexar')
+        parser.add_argument('--indice', type=str, help='Índice guardado previamente con --guardar (en lugar de --dir)')
+        parser.add_argument('--guardar', type=str, help='Guardar el índice construido en esta ruta')
+        parser.add_argument('--placa', type=str, help='Documentos que mencionan esta placa')
+        parser.add_argument('--documento', type=str, help='Placas que menciona este documento (nombre sin .json)')
+        parser.add_argument('--asignaciones', type=str,
+                            help='JSON {documento: placa del vehículo} para auditar la flota completa')
+        parser.add_argument('--exacta', action='store_true', help='Con --placa, solo lecturas sin correcciones de OCR')
+
+        args = parser.parse_args()
+
+        if args.indice:
+            with open(args.indice, 'r', encoding='utf-8') as file:
+                indice = PlateIndex.desde_dict(json.load(file))
+        elif args.dir and os.path.isdir(args.dir):
+            indice = PlateIndex.desde_directorio(args.dir)
+        else:
+            print("ERROR: se requiere --dir (existente) o --indice", file=sys.stderr)
+            print(json.dumps({"error": "Se requiere --dir o --indice"}))
+            sys.exit(1)
+
+        if args.guardar:
+            with open(args.guardar, 'w', encoding='utf-8') as file:
+                json.dump(indice.a_dict(), file, ensure_ascii=False)
+
+        asignaciones = None
+        if args.asignaciones:
+            with open(args.asignaciones, 'r', encoding='utf-8') as file:
+                asignaciones = json.load(file)
+
+        result = process_plates_data(indice, args.placa, args.documento, asignaciones, args.exacta)
+
+        # Imprimir resultado como JSON (único output a stdout)
+        print(json.dumps(result, indent=4, ensure_ascii=False))
+
+    except Exception as e:
+        # Errores a stderr para depuración
+        print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
+        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
+
+        # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
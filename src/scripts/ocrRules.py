@@ -0,0 +1,599 @@
+import json
+import re
+import os
+import sys
+import glob
+import hashlib
+import tempfile
+import argparse
+import traceback
+import importlib
+from datetime import datetime
+from collections import namedtuple
+from ocrDocument import OcrDocument
+from ocrNormalize import normalize_text
+from ocrTrace import traza
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
+from ocrFields import ExtractorGraph, extractor, parse_fields
+from ocrConfidence import ConfidenceMap, Candidato
+from ocrWatchdog import ejecutar_con_presupuesto
+
+try:
+    import yaml
+except ImportError:  # Sin PyYAML solo se aceptan reglas en JSON
+    yaml = None
+
+# Cambiar esta versión invalida los planes compilados guardados en disco
+VERSION_COMPILADOR = 2
+
+DIRECTORIO_REGLAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reglas')
+DIRECTORIO_CACHE = os.environ.get('OCR_RULES_CACHE') or os.path.join(tempfile.gettempdir(), 'ocr_reglas')
+
+VALORES = ('texto', 'fecha')
+GRUPOS_FECHA = ('ymd', 'dmy', 'ymd_compacto', 'dy', 'd_mes_y')
+BUSQUEDAS = ('primera', 'todas')
+SELECCIONES = ('primera_confiable', 'futura_mas_cercana', 'futura_mas_lejana')
+COMPONENTES_FECHA = ('dia', 'mes', 'anio')
+
+# Procesadores escritos a mano equivalentes a cada conjunto de reglas (para --comparar):
+# módulo, clase y si el constructor recibe la placa
+PROCESADORES_MANUALES = {
+    'SOAT': ('ocrSOAT', 'SOATProcessor', True),
+    'TECNOMECANICA': ('ocrTECNOMECANICA', 'RTMProcessor', False),
+    'POLIZA_CONTRACTUAL': ('ocrPOLIZA_CONTRACTUAL', 'PolizaContractualProcessor', True),
+    'POLIZA_EXTRACONTRACTUAL': ('ocrPOLIZA_EXTRACONTRACTUAL', 'PolizaExtraContractualProcessor', True),
+    'POLIZA_TODO_RIESGO': ('ocrPOLIZA_TODO_RIESGO', 'PolizaTodoRiesgoProcessor', True),
+}
+
+# Patrón ya compilado del plan
+Patron = namedtuple('Patron', ['regex', 'valor', 'grupos', 'mes', 'validar', 'minusculas'])
+
+def leer_reglas(ruta):
+    """Lee un archivo de reglas JSON o YAML"""
+    with open(ruta, 'r', encoding='utf-8') as file:
+        if ruta.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ValueError(f"PyYAML no está instalado, no se puede leer {ruta}")
+            return yaml.safe_load(file)
+        return json.load(file)
+
+def ruta_reglas(categoria):
+    """Archivo de reglas de una categoría (JSON o YAML) dentro de DIRECTORIO_REGLAS"""
+    for extension in ('.json', '.yaml', '.yml'):
+        ruta = os.path.join(DIRECTORIO_REGLAS, categoria + extension)
+        if os.path.exists(ruta):
+            return ruta
+    raise ValueError(f"No hay reglas para la categoría {categoria}")
+
+def _error(categoria, mensaje):
+    return ValueError(f"Regla inválida en {categoria}: {mensaje}")
+
+def _compilar_patron(categoria, nombre, spec, meses):
+    """Lista de patrones (serializables) a los que se expande una definición"""
+    valor = spec.get('valor', 'texto')
+    if valor not in VALORES:
+        raise _error(categoria, f"patrón {nombre}: valor '{valor}' no soportado")
+    grupos = spec.get('grupos')
+    if valor == 'fecha' and grupos not in GRUPOS_FECHA:
+        raise _error(categoria, f"patrón {nombre}: grupos '{grupos}' no soportado")
+
+    flags = re.IGNORECASE if spec.get('ignorar_mayusculas') else 0
+    base = {
+        'flags': flags, 'valor': valor, 'grupos': grupos, 'mes': None,
+        'validar': spec.get('validar', True), 'minusculas': bool(spec.get('minusculas')),
+    }
+
+    # "por_cada_mes" genera un patrón por mes, en el orden del diccionario de meses
+    if spec.get('por_cada_mes'):
+        expandidos = [dict(base, regex=spec['regex'].replace('{mes}', mes), mes=numero) for mes, numero in meses.items()]
+    else:
+        expandidos = [dict(base, regex=spec['regex'])]
+
+    for patron in expandidos:
+        try:
+            re.compile(patron['regex'], flags)
+        except re.error as e:
+            raise _error(categoria, f"patrón {nombre}: {e}")
+    return expandidos
+
+def compilar(reglas, huella=None):
+    """
+    Convierte un conjunto de reglas en un plan: palabras clave normalizadas y
+    deduplicadas en una sola alternancia (el autómata que recorre el documento
+    una vez), patrones expandidos y pasos de cada campo ya resueltos. El plan
+    es un diccionario serializable en JSON para guardarlo en disco.
+    """
+    categoria = reglas.get('categoria') or '?'
+    meses = reglas.get('meses') or {}
+
+    patrones = {}
+    for nombre, spec in (reglas.get('patrones') or {}).items():
+        patrones[nombre] = _compilar_patron(categoria, nombre, spec, meses)
+    for nombre, miembros in (reglas.get('grupos_patrones') or {}).items():
+        faltantes = [miembro for miembro in miembros if miembro not in patrones]
+        if faltantes:
+            raise _error(categoria, f"grupo {nombre}: patrones desconocidos {faltantes}")
+        patrones[nombre] = [patron for miembro in miembros for patron in patrones[miembro]]
+
+    palabras = []
+    def registrar(lista):
+        normalizadas = [normalize_text(palabra) for palabra in lista]
+        for palabra in normalizadas:
+            if palabra not in palabras:
+                palabras.append(palabra)
+        return normalizadas
+
+    validacion = None
+    if reglas.get('validacion'):
+        validacion = {
+            'palabras': registrar(reglas['validacion'].get('palabras') or []),
+            'error': reglas['validacion'].get('error', f"No es un {categoria} válido"),
+            'paginas': reglas['validacion'].get('paginas'),
+        }
+
+    campos = {}
+    for campo, regla in (reglas.get('campos') or {}).items():
+        pasos = []
+        for paso in regla.get('pasos') or []:
+            tipo = paso.get('tipo', 'patrones')
+            compilado = {
+                'tipo': tipo,
+                'anclas': registrar(paso.get('anclas') or []),
+                'ventana': list(paso.get('ventana') or [0, 1]),
+                'paginas': paso.get('paginas'),
+                'continuar_si': paso.get('continuar_si', 'sin_resultado'),
+            }
+            if tipo == 'componentes':
+                componentes = paso.get('componentes') or {}
+                if set(componentes) != set(COMPONENTES_FECHA) or not compilado['anclas']:
+                    raise _error(categoria, f"campo {campo}: un paso de componentes necesita anclas y {COMPONENTES_FECHA}")
+                compilado['componentes'] = {
+                    componente: [dict(variante) for variante in componentes[componente]]
+                    for componente in COMPONENTES_FECHA
+                }
+            elif tipo == 'patrones':
+                nombres = paso.get('patrones') or []
+                desconocidos = [nombre for nombre in nombres if nombre not in patrones]
+                if desconocidos:
+                    raise _error(categoria, f"campo {campo}: patrones desconocidos {desconocidos}")
+                compilado['patrones'] = [patron for nombre in nombres for patron in patrones[nombre]]
+                compilado['busqueda'] = paso.get('busqueda', 'todas')
+                compilado['seleccion'] = paso.get('seleccion', 'primera_confiable')
+                if compilado['busqueda'] not in BUSQUEDAS or compilado['seleccion'] not in SELECCIONES:
+                    raise _error(categoria, f"campo {campo}: búsqueda o selección no soportada")
+            else:
+                raise _error(categoria, f"campo {campo}: tipo de paso '{tipo}' no soportado")
+            pasos.append(compilado)
+
+        campos[campo] = {'parametro': regla.get('parametro'), 'pasos': pasos}
+        if 'por_defecto' in regla:
+            campos[campo]['por_defecto'] = regla['por_defecto']
+
+    # Alternancia de todas las palabras clave, las más largas primero
+    union = '|'.join(re.escape(palabra) for palabra in sorted(palabras, key=len, reverse=True))
+
+    return {
+        'version': VERSION_COMPILADOR,
+        'huella': huella,
+        'categoria': categoria,
+        'validacion': validacion,
+        'resultado': reglas.get('resultado') or {campo: None for campo in campos},
+        'meses': meses,
+        'palabras': palabras,
+        'union': union,
+        'campos': campos,
+    }
+
+def cargar_plan(ruta):
+    """
+    Plan compilado de un archivo de reglas. Se guarda en DIRECTORIO_CACHE con
+    la huella del archivo y de la versión del compilador, así el siguiente
+    arranque lee el plan sin volver a validar y expandir las reglas. La caché
+    es JSON (no pickle) para no ejecutar nada leído de un directorio temporal.
+    """
+    with open(ruta, 'rb') as file:
+        contenido = file.read()
+    huella = hashlib.sha1(contenido + str(VERSION_COMPILADOR).encode()).hexdigest()
+    nombre = os.path.splitext(os.path.basename(ruta))[0]
+    ruta_cache = os.path.join(DIRECTORIO_CACHE, f"{nombre}-{huella[:16]}.json")
+
+    try:
+        with open(ruta_cache, 'r', encoding='utf-8') as file:
+            plan = json.load(file)
+        if plan.get('huella') == huella and plan.get('version') == VERSION_COMPILADOR:
+            return plan
+    except (OSError, ValueError):
+        pass
+
+    plan = compilar(leer_reglas(ruta), huella)
+    try:
+        os.makedirs(DIRECTORIO_CACHE, exist_ok=True)
+        temporal = f"{ruta_cache}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as file:
+            json.dump(plan, file, ensure_ascii=False)
+        os.replace(temporal, ruta_cache)
+    except OSError as e:
+        # Sin caché el plan igual sirve, solo se recompila en el próximo arranque
+        print(f"No se pudo guardar el plan compilado en {ruta_cache}: {e}", file=sys.stderr)
+    return plan
+
+class PlanCompilado:
+    """Plan con las expresiones regulares ya compiladas, listo para ejecutarse"""
+
+    def __init__(self, plan):
+        self.categoria = plan['categoria']
+        self.validacion = plan['validacion']
+        self.resultado = plan['resultado']
+        self.meses = plan['meses']
+        self.palabras = plan['palabras']
+        self.union = re.compile(plan['union']) if plan['palabras'] else None
+        self.campos = {}
+        for campo, regla in plan['campos'].items():
+            pasos = []
+            for paso in regla['pasos']:
+                paso = dict(paso)
+                if paso['tipo'] == 'patrones':
+                    paso['patrones'] = [self._patron(patron) for patron in paso['patrones']]
+                else:
+                    paso['componentes'] = {
+                        componente: [
+                            (re.compile(variante['regex']), re.compile(variante['anterior']) if variante.get('anterior') else None)
+                            for variante in variantes
+                        ]
+                        for componente, variantes in paso['componentes'].items()
+                    }
+                pasos.append(paso)
+            self.campos[campo] = dict(regla, pasos=pasos)
+        self.grafo = ExtractorGraph([extractor(campo, [campo]) for campo in self.campos])
+
+    @staticmethod
+    def _patron(patron):
+        return Patron(
+            re.compile(patron['regex'], patron['flags']), patron['valor'], patron['grupos'],
+            patron['mes'], patron['validar'], patron['minusculas'],
+        )
+
+_planes = {}
+
+def plan_categoria(categoria, ruta=None):
+    """Plan compilado de una categoría, cargado una sola vez por proceso"""
+    ruta = ruta or ruta_reglas(categoria)
+    if ruta not in _planes:
+        _planes[ruta] = PlanCompilado(cargar_plan(ruta))
+    return _planes[ruta]
+
+class EscanerPalabras:
+    """
+    Recorre las líneas normalizadas del documento una sola vez, en orden, y
+    anota la primera línea de cada palabra clave del plan. La alternancia de
+    todas las palabras descarta de un golpe las líneas que no contienen
+    ninguna; el recorrido avanza solo hasta donde haga falta.
+    """
+
+    def __init__(self, document, palabras, union):
+        self.document = document
+        self.union = union
+        self.pendientes = list(palabras)
+        self.primera = {}
+        self.cursor = 0
+
+    def _avanzar(self):
+        linea = self.document.normalized_line(self.cursor)
+        if self.union is not None and self.union.search(linea):
+            for palabra in [palabra for palabra in self.pendientes if palabra in linea]:
+                self.primera[palabra] = self.cursor
+                self.pendientes.remove(palabra)
+        self.cursor += 1
+
+    def primera_linea(self, palabra, fin=None):
+        """
+        Índice de la primera línea que contiene la palabra (normalizada) o -1;
+        con `fin` solo cuentan (y se recorren) las líneas anteriores a `fin`
+        """
+        fin = len(self.document.lines) if fin is None else fin
+        while palabra not in self.primera and self.cursor < fin:
+            self._avanzar()
+        idx = self.primera.get(palabra, -1)
+        return idx if idx < fin else -1
+
+    def alguna(self, palabras, fin=None):
+        """True si alguna de las palabras aparece antes de `fin`; se detiene en la primera encontrada"""
+        fin = len(self.document.lines) if fin is None else fin
+        while not any(palabra in self.primera for palabra in palabras) and self.cursor < fin:
+            self._avanzar()
+        return any(self.primera.get(palabra, fin) < fin for palabra in palabras)
+
+class RuleProcessor:
+    """Ejecuta el plan compilado de una categoría sobre un resultado de OCR"""
+
+    def __init__(self, ocr_data, plan, parametros=None):
+        self.data = ocr_data
+        self.plan = plan
+        self.parametros = parametros or {}
+        self.document = OcrDocument(ocr_data.get('analyzeResult', {}))
+        self.lines = self.document.lines
+        self.escaner = EscanerPalabras(self.document, plan.palabras, plan.union)
+        self.result = dict(plan.resultado)
+        self._evaluados = set()
+        self._confianza = None
+
+    @property
+    def confianza(self):
+        """Confianza de las palabras del OCR (se construye solo si se necesita)"""
+        if self._confianza is None:
+            self._confianza = ConfidenceMap.from_analyze_result(self.data.get('analyzeResult', {}))
+        return self._confianza
+
+    def is_valid(self):
+        validacion = self.plan.validacion
+        if validacion is None:
+            return True
+        # Como en los procesadores escritos a mano, `paginas` limita la búsqueda a las primeras páginas
+        return self.escaner.alguna(validacion['palabras'], self.document.fin_presupuesto(validacion.get('paginas')))
+
+    def process(self, campos=None):
+        """Procesar los campos pedidos (todos por defecto) y devolver el resultado"""
+        if not self.is_valid():
+            return {"error": self.plan.validacion['error']}
+
+        for campo in self.plan.grafo.plan(campos):
+            if campo not in self._evaluados:
+                ejecutar_con_presupuesto(self, campo, lambda: self._evaluar(campo))
+                self._evaluados.add(campo)
+
+        return ExtractorGraph.seleccionar(self.result, campos)
+
+    def _evaluar(self, campo):
+        regla = self.plan.campos[campo]
+
+        # Valor recibido por parámetro: si aparece en el documento es el resultado
+        parametro = regla.get('parametro')
+        if parametro and self.parametros.get(parametro['nombre']):
+            original = self.parametros[parametro['nombre']]
+            buscado = original.upper()
+            if any(buscado in self.document.normalized_line(i) for i in range(len(self.lines))):
+                self.result[campo] = original if parametro.get('resultado') == 'original' else buscado
+                return
+            if parametro.get('si_no_aparece') == 'terminar':
+                return
+
+        for paso in regla['pasos']:
+            hubo_candidatos, valor = self._ejecutar_paso(paso)
+            if valor is not None:
+                self.result[campo] = valor
+                return
+            if hubo_candidatos and paso['continuar_si'] == 'sin_candidatos':
+                break
+
+        if 'por_defecto' in regla:
+            self.result[campo] = regla['por_defecto']
+
+    def _lineas(self, paso, solo_primera_ancla=False):
+        """
+        (línea, ancla) del paso: ventanas alrededor de cada ancla encontrada
+        (en las primeras `paginas` páginas, si el paso las limita) o todo el
+        documento (con ancla None)
+        """
+        total = len(self.lines)
+        if not paso['anclas']:
+            for i in range(total):
+                yield i, None
+            return
+        inicio, fin = paso['ventana']
+        limite = self.document.fin_presupuesto(paso.get('paginas'))
+        for ancla in paso['anclas']:
+            idx = self.escaner.primera_linea(ancla, limite)
+            if idx < 0:
+                continue
+            for i in range(max(0, idx + inicio), min(idx + fin, total)):
+                yield i, ancla
+            if solo_primera_ancla:
+                return
+
+    def _ejecutar_paso(self, paso):
+        """(hubo_candidatos, valor) de un paso"""
+        if paso['tipo'] == 'componentes':
+            valor = self._fecha_por_componentes(paso)
+            return valor is not None, valor
+
+        candidatos = self._candidatos(paso)
+        if paso['seleccion'] == 'primera_confiable':
+            candidato = self.confianza.primera_confiable(candidatos)
+            return candidato is not None, candidato.valor if candidato else None
+
+        candidatos = list(candidatos)
+        if not candidatos:
+            return False, None
+        fechas = []
+        for candidato in self.confianza.filtrar(candidatos):
+            try:
+                fechas.append(datetime.strptime(candidato.valor, "%Y-%m-%d"))
+            except ValueError:
+                continue
+        if not fechas:
+            return True, None
+
+        fecha_actual = datetime.now()
+        futuras = [fecha for fecha in fechas if fecha > fecha_actual]
+        if futuras:
+            fecha = min(futuras) if paso['seleccion'] == 'futura_mas_cercana' else max(futuras)
+        else:
+            # Si no hay fechas futuras, tomar la más reciente
+            fecha = max(fechas)
+        return True, fecha.strftime("%Y-%m-%d")
+
+    def _candidatos(self, paso):
+        """Candidatos del paso en orden: por línea, por patrón y por posición"""
+        primera = paso['busqueda'] == 'primera'
+        for i, ancla in self._lineas(paso):
+            line = self.lines[i]
+            for patron in paso['patrones']:
+                texto = line.lower() if patron.minusculas else line
+                if primera:
+                    match = patron.regex.search(texto)
+                    matches = (match,) if match else ()
+                else:
+                    matches = patron.regex.finditer(texto)
+                for match in matches:
+                    valor = self._convertir(patron, match)
+                    if valor is not None:
+                        yield Candidato(i, match.start(), match.end(), valor, ancla)
+
+    def _convertir(self, patron, match):
+        """Valor de una coincidencia: el texto o la fecha como "YYYY-MM-DD" (None si no es válida)"""
+        if patron.valor == 'texto':
+            return match.group(0)
+
+        grupos = patron.grupos
+        try:
+            if grupos == 'ymd':
+                year, month, day = match.groups()[:3]
+            elif grupos == 'dmy':
+                day, month, year = match.groups()[:3]
+            elif grupos == 'ymd_compacto':
+                date_str = match.group(0)
+                year, month, day = date_str[:4], date_str[4:6], date_str[6:8]
+            elif grupos == 'dy':
+                day, year = match.groups()[:2]
+                month = patron.mes
+            else:  # d_mes_y
+                day, month_text, year = match.groups()[:3]
+                month = self.plan.meses.get(month_text.lower().replace('.', ''))
+                if not month:
+                    return None
+                if not patron.validar:
+                    return f"{year}-{month}-{int(day):02d}"
+            return datetime(int(year), int(month), int(day)).strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+
+    def _fecha_por_componentes(self, paso):
+        """Fecha armada con día, mes y año que aparecen en líneas separadas cerca del ancla"""
+        valores = {}
+        lineas = [i for i, _ in self._lineas(paso, solo_primera_ancla=True)]
+        for i in lineas:
+            line = self.lines[i].strip()
+            for componente, variantes in paso['componentes'].items():
+                if valores.get(componente):
+                    continue
+                for regex, anterior in variantes:
+                    if anterior is None:
+                        match = regex.search(line)
+                    elif regex.search(line) and i > 0:
+                        match = anterior.search(self.lines[i - 1].strip())
+                    else:
+                        match = None
+                    if match:
+                        valores[componente] = match.group(1)
+                        break
+
+        if all(valores.get(componente) for componente in COMPONENTES_FECHA):
+            try:
+                return datetime(int(valores['anio']), int(valores['mes']), int(valores['dia'])).strftime("%Y-%m-%d")
+            except ValueError:
+                pass
+        return None
+
+# Función principal para procesar el OCR con reglas
+def process_rules_data(data, categoria, parametros=None, campos=None, ruta=None):
+    try:
+        processor = RuleProcessor(data, plan_categoria(categoria, ruta), parametros)
+        result = processor.process(campos)
+        return result
+    except Exception as e:
+        return {"error": str(e), "trace": traceback.format_exc()}
+
+def comparar_documento(data, categoria, placa=None):
+    """(resultado del procesador escrito a mano, resultado de las reglas) para un JSON de OCR"""
+    modulo, clase, recibe_placa = PROCESADORES_MANUALES[categoria]
+    Processor = getattr(importlib.import_module(modulo), clase)
+    manual = Processor(data, placa) if recibe_placa else Processor(data)
+    reglas = RuleProcessor(data, plan_categoria(categoria), {'placa': placa} if recibe_placa else None)
+    return manual.process(), reglas.process()
+
+def comparar(directorio, categorias, placa=None):
+    """
+    Corre las reglas y el procesador escrito a mano de cada categoría sobre
+    los JSON de OCR de `directorio` y devuelve las diferencias encontradas
+    """
+    resumen = {}
+    rutas = sorted(glob.glob(os.path.join(directorio, '*.json')))
+    for categoria in categorias:
+        diferencias = []
+        for ruta in rutas:
+            with open(ruta, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            esperado, obtenido = comparar_documento(data, categoria, placa)
+            if esperado != obtenido:
+                diferencias.append({'archivo': os.path.basename(ruta), 'manual': esperado, 'reglas': obtenido})
+        resumen[categoria] = {'documentos': len(rutas), 'diferencias': len(diferencias), 'ejemplos': diferencias[:5]}
+    return resumen
+
+# Ejecución principal
+if __name__ == "__main__":
+    try:
+        parser = argparse.ArgumentParser(description='Procesar datos OCR con reglas declarativas')
+        parser.add_argument('--categoria', type=str, help='Categoría del documento (SOAT, TECNOMECANICA, ...)')
+        parser.add_argument('--reglas', type=str, help='Archivo de reglas JSON/YAML (por defecto reglas/<categoria>.json)')
+        parser.add_argument('--file', type=str, help='Ruta al archivo JSON con datos OCR')
+        agregar_argumentos(parser)
+        parser.add_argument('--placa', type=str, help='Placa del vehículo (opcional)')
+        parser.add_argument('--fields', type=str, help='Campos a extraer separados por coma (opcional, por defecto todos)')
+        parser.add_argument('--debug', action='store_true', help='Volcar a stderr la traza de decisiones de los extractores')
+        parser.add_argument('--compilar', action='store_true', help='Compilar y guardar en caché los planes de todas las reglas')
+        parser.add_argument('--comparar', type=str, metavar='DIRECTORIO',
+                            help='Comparar reglas y procesadores escritos a mano sobre los JSON de un directorio')
+
+        args = parser.parse_args()
+
+        if args.compilar:
+            rutas = sorted(glob.glob(os.path.join(DIRECTORIO_REGLAS, '*.*')))
+            result = {os.path.basename(ruta): cargar_plan(ruta)['huella'] for ruta in rutas}
+        elif args.comparar:
+            categorias = [args.categoria] if args.categoria else list(PROCESADORES_MANUALES)
+            result = comparar(args.comparar, categorias, args.placa)
+            print(json.dumps(result, indent=4, ensure_ascii=False, default=str))
+            sys.exit(1 if any(r['diferencias'] for r in result.values()) else 0)
+        else:
+            if not args.categoria or not (args.file or hay_entrada(args)):
+                print("ERROR: se requieren --categoria y --file (o --stdin / --fd)", file=sys.stderr)
+                print(json.dumps({"error": "Se requieren --categoria y --file (o --stdin / --fd)"}))
+                sys.exit(1)
+            if hay_entrada(args):
+                # JSON compacto por stdin o por un descriptor heredado, sin archivo temporal
+                try:
+                    data = leer_entrada(args)
+                except json.JSONDecodeError as e:
+                    print(f"ERROR: La entrada no contiene JSON válido: {str(e)}", file=sys.stderr)
+                    print(json.dumps({"error": f"JSON inválido en la entrada: {str(e)}"}))
+                    sys.exit(1)
+            elif not os.path.exists(args.file):
+                print(f"ERROR: El archivo {args.file} no existe", file=sys.stderr)
+                print(json.dumps({"error": f"Archivo no encontrado: {args.file}"}))
+                sys.exit(1)
+            else:
+                try:
+                    with open(args.file, 'r', encoding='utf-8') as file:
+                        data = json.load(file)
+                except json.JSONDecodeError as e:
+                    print(f"ERROR: El archivo no contiene JSON válido: {str(e)}", file=sys.stderr)
+                    print(json.dumps({"error": f"JSON inválido en archivo: {str(e)}"}))
+                    sys.exit(1)
+            result = process_rules_data(data, args.categoria, {'placa': args.placa}, parse_fields(args.fields), args.reglas)
+
+        # Imprimir resultado como JSON (único output a stdout)
+        print(json.dumps(result, indent=4, ensure_ascii=False))
+
+        # Traza de decisiones a stderr solo si falló, hubo baja confianza o se pidió --debug
+        traza.volcar_si(result, args.debug)
+
+    except Exception as e:
+        # Errores a stderr para depuración
+        print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
+        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
+
+        traza.volcar_si({"error": str(e)})
+
+        # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
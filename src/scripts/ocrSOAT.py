@@ -1,35 +1,46 @@
 import json
 import re
 from datetime import datetime
-import unicodedata
 import sys
 import os
 import argparse
 import traceback
-
-# Función para normalizar texto
-def normalize_text(text):
-    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8').upper()
+from ocrDocument import OcrDocument, PAGINAS_ANCLA, PAGINAS_VALIDACION
+from ocrFields import ExtractorGraph, extractor, parse_fields
+from ocrConfidence import ConfidenceMap, Candidato, buscar_en_lineas
+from ocrNormalize import normalize_text
+from ocrTrace import traza
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
 
 class SOATProcessor:
+    # Extractores y campos que producen (ver ocrFields.ExtractorGraph)
+    EXTRACTORES = ExtractorGraph([
+        extractor('extract_placa', ['placa']),
+        extractor('extract_fecha_vencimiento', ['soatVencimiento']),
+    ])
+
     def __init__(self, ocr_data, placa_param=None):
         self.data = ocr_data
         self.content = ocr_data.get('analyzeResult', {}).get('content', '')
-        self.lines = self.content.split('\n')
+        self.document = OcrDocument(ocr_data.get('analyzeResult', {}))
+        self.lines = self.document.lines
         self.placa_param = placa_param
         self.result = {
             "placa": None,
             "soatVencimiento": None,
         }
+        self._confianza = None
+
+    @property
+    def confianza(self):
+        """Confianza de las palabras del OCR (se construye solo si se necesita)"""
+        if self._confianza is None:
+            self._confianza = ConfidenceMap.from_analyze_result(self.data.get('analyzeResult', {}))
+        return self._confianza
     
-    def find_line_index(self, keyword, normalize=True):
+    def find_line_index(self, keyword, normalize=True, paginas=None):
         """Encontrar el índice de la línea que contiene una palabra clave"""
-        keyword_norm = normalize_text(keyword) if normalize else keyword
-        for i, line in enumerate(self.lines):
-            line_norm = normalize_text(line) if normalize else line
-            if keyword_norm in line_norm:
-                return i
-        return -1
+        return self.document.find_line_index(keyword, normalize, paginas)
     
     def is_valid_soat(self):
         """Verificar si el documento es un SOAT válido"""
@@ -37,10 +48,8 @@ class SOATProcessor:
         keywords = ["ASEGURADORA", "SOAT", "SEGURO OBLIGATORIO", "ACCIDENTES DE TRANSITO", 
                    "POLIZA", "PÓLIZA", "SEGURO", "COMPAÑÍA", "COMPANIA"]
         
-        for keyword in keywords:
-            if self.find_line_index(keyword) >= 0:
-                return True
-        return False
+        # El encabezado está en la primera página; el resto del documento no se revisa
+        return self.document.contains_any(keywords, PAGINAS_VALIDACION)
     
     def extract_placa(self):
         """Extraer la placa del vehículo"""
@@ -61,21 +70,23 @@ class SOATProcessor:
             return False
                 
         # Si no hay placa como parámetro, mantén el comportamiento anterior con regex
-        placa_idx = self.find_line_index("PLACA")
+        placa_idx = self.find_line_index("PLACA", paginas=PAGINAS_ANCLA)
         if placa_idx >= 0:
-            # Buscar en esta línea y las siguientes
-            for i in range(placa_idx, min(placa_idx + 5, len(self.lines))):
-                match = re.search(r'[A-Z]{3}\d{3}', self.lines[i])
-                if match:
-                    self.result["placa"] = match.group(0)
-                    return True
+            # Buscar en esta línea y las siguientes, prefiriendo lecturas confiables
+            candidato = self.confianza.primera_confiable(
+                buscar_en_lineas(
+                    self.lines, r'[A-Z]{3}\d{3}', range(placa_idx, min(placa_idx + 5, len(self.lines))), etiqueta='PLACA'
+                )
+            )
+            if candidato:
+                self.result["placa"] = candidato.valor.group(0)
+                return True
         
         # Si no encuentra con "PLACA", buscar patrón de placa en todas las líneas
-        for line in self.lines:
-            match = re.search(r'[A-Z]{3}\d{3}', line)
-            if match:
-                self.result["placa"] = match.group(0)
-                return True
+        candidato = self.confianza.primera_confiable(buscar_en_lineas(self.lines, r'[A-Z]{3}\d{3}'))
+        if candidato:
+            self.result["placa"] = candidato.valor.group(0)
+            return True
         
         return False
 
@@ -88,9 +99,11 @@ class SOATProcessor:
         ]
         
         # 1. Primero buscar líneas que contengan palabras clave de vencimiento
-        for keyword in vencimiento_keywords:
-            venc_idx = self.find_line_index(keyword)
-            if venc_idx >= 0:
+        def candidatos_con_contexto():
+            for keyword in vencimiento_keywords:
+                venc_idx = self.find_line_index(keyword)
+                if venc_idx < 0:
+                    continue
                 # Buscar una fecha en la misma línea o en las siguientes 3 líneas
                 for i in range(venc_idx, min(venc_idx + 4, len(self.lines))):
                     line = self.lines[i]
@@ -101,9 +114,7 @@ class SOATProcessor:
                     if match:
                         year, month, day = match.groups()
                         try:
-                            fecha = datetime(int(year), int(month), int(day))
-                            self.result["soatVencimiento"] = fecha.strftime("%Y-%m-%d")
-                            return True
+                            yield Candidato(i, match.start(), match.end(), datetime(int(year), int(month), int(day)), keyword)
                         except ValueError:
                             pass
                     
@@ -112,23 +123,26 @@ class SOATProcessor:
                     if match:
                         day, month, year = match.groups()
                         try:
-                            fecha = datetime(int(year), int(month), int(day))
-                            self.result["soatVencimiento"] = fecha.strftime("%Y-%m-%d")
-                            return True
+                            yield Candidato(i, match.start(), match.end(), datetime(int(year), int(month), int(day)), keyword)
                         except ValueError:
                             pass
         
+        # La primera fecha leída con confianza gana; si ninguna lo es, la primera encontrada
+        candidato = self.confianza.primera_confiable(candidatos_con_contexto())
+        if candidato:
+            self.result["soatVencimiento"] = candidato.valor.strftime("%Y-%m-%d")
+            return True
+        
         # 2. Si no se encontró con palabras clave, buscar todas las fechas potenciales
-        todas_fechas = []
+        candidatos = []
         
         # Buscar fechas en cualquier línea
-        for line in self.lines:
+        for i, line in enumerate(self.lines):
             # Formato YYYY-MM-DD o YYYY/MM/DD
             for match in re.finditer(r'(20\d{2})[-/\s](\d{1,2})[-/\s](\d{1,2})', line):
                 year, month, day = match.groups()
                 try:
-                    fecha = datetime(int(year), int(month), int(day))
-                    todas_fechas.append(fecha)
+                    candidatos.append(Candidato(i, match.start(), match.end(), datetime(int(year), int(month), int(day))))
                 except ValueError:
                     pass
             
@@ -136,11 +150,13 @@ class SOATProcessor:
             for match in re.finditer(r'(\d{1,2})[-/\s](\d{1,2})[-/\s](20\d{2})', line):
                 day, month, year = match.groups()
                 try:
-                    fecha = datetime(int(year), int(month), int(day))
-                    todas_fechas.append(fecha)
+                    candidatos.append(Candidato(i, match.start(), match.end(), datetime(int(year), int(month), int(day))))
                 except ValueError:
                     pass
         
+        # Descartar en bloque las fechas de baja confianza
+        todas_fechas = [c.valor for c in self.confianza.filtrar(candidatos)]
+        
         # Seleccionar la fecha futura más cercana como vencimiento
         if todas_fechas:
             fecha_actual = datetime.now()
@@ -158,21 +174,20 @@ class SOATProcessor:
             
         return False
     
-    def process(self):
-        """Procesar todos los campos y devolver el resultado"""
+    def process(self, campos=None):
+        """Procesar los campos pedidos (todos por defecto) y devolver el resultado"""
         if not self.is_valid_soat():
             return {"error": "No es un SOAT válido"}
         
-        self.extract_placa()
-        self.extract_fecha_vencimiento()
+        self.EXTRACTORES.ejecutar(self, campos)
         
-        return self.result
+        return self.EXTRACTORES.seleccionar(self.result, campos)
 
 # Función principal para procesar el OCR
-def process_soat_data(data, placa_param=None):
+def process_soat_data(data, placa_param=None, campos=None):
     try:
         processor = SOATProcessor(data, placa_param)
-        result = processor.process()
+        result = processor.process(campos)
         return result
     except Exception as e:
         import traceback
@@ -183,14 +198,25 @@ if __name__ == "__main__":
     try:
         parser = argparse.ArgumentParser(description='Procesar datos OCR')
         parser.add_argument('--file', type=str, help='Ruta al archivo JSON con datos OCR')
+        agregar_argumentos(parser)
         parser.add_argument('--placa', type=str, help='Placa del vehículo (opcional)')
+        parser.add_argument('--fields', type=str, help='Campos a extraer separados por coma (opcional, por defecto todos)')
+        parser.add_argument('--debug', action='store_true', help='Volcar a stderr la traza de decisiones de los extractores')
         
         args = parser.parse_args()
         
         # Determinar qué archivo procesar
         file_path = None
         
-        if args.file:
+        if hay_entrada(args):
+            # JSON compacto por stdin o por un descriptor heredado, sin archivo temporal
+            try:
+                data = leer_entrada(args)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: La entrada no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en la entrada: {str(e)}"}))
+                sys.exit(1)
+        elif args.file:
             # Usar el archivo especificado por argumento
             file_path = args.file
             if not os.path.exists(file_path):
@@ -226,16 +252,21 @@ if __name__ == "__main__":
                 sys.exit(1)
         
         # Procesar los datos
-        result = process_soat_data(data, args.placa)
+        result = process_soat_data(data, args.placa, parse_fields(args.fields))
         
         # Imprimir resultado como JSON (único output a stdout)
         print(json.dumps(result, indent=4, ensure_ascii=False))
+
+        # Traza de decisiones a stderr solo si falló, hubo baja confianza o se pidió --debug
+        traza.volcar_si(result, args.debug)
         
     except Exception as e:
         # Errores a stderr para depuración
         print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
         print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
         
+        traza.volcar_si({"error": str(e)})
+
         # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
         print(json.dumps({"error": str(e)}))
         sys.exit(1)
\ No newline at end of file
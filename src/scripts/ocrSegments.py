@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import argparse
+import traceback
+import importlib
+from ocrDocument import OcrDocument
+from ocrWordStore import WordStore
+from ocrClassifier import DocumentClassifier, PUNTAJE_MINIMO, SCRIPTS
+from ocrTrace import traza
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
+
+# Función de cada procesador y parámetros que recibe, en orden
+PROCESADORES = {
+    'SOAT': ('ocrSOAT', 'process_soat_data', ('placa',)),
+    'TECNOMECANICA': ('ocrTECNOMECANICA', 'process_rtm_data', ('placa',)),
+    'POLIZA_CONTRACTUAL': ('ocrPOLIZA_CONTRACTUAL', 'process_poliza_contractual', ('placa',)),
+    'POLIZA_EXTRACONTRACTUAL': ('ocrPOLIZA_EXTRACONTRACTUAL', 'process_poliza_extra_contractual', ('placa',)),
+    'POLIZA_TODO_RIESGO': ('ocrPOLIZA_TODO_RIESGO', 'process_poliza_todo_riesgo', ('placa',)),
+    'TARJETA_DE_OPERACION': ('ocrTARJETA_DE_OPERACION', 'process_tarjeta_operacion', ('placa',)),
+    'TARJETA_DE_PROPIEDAD': ('ocrTARJETA_DE_PROPIEDAD', 'process_ocr_data', ()),
+    'CEDULA': ('ocrCEDULA', 'process_cedula_data', ('numero_identificacion',)),
+    'LICENCIA': ('ocrLICENCIA', 'process_licencia_data', ('numero_identificacion', 'fecha_nacimiento')),
+    'CONTRATO': ('ocrCONTRATO', 'process_contrato_data', ('numero_identificacion',)),
+}
+
+def _desplazar(valor, base):
+    """Copia de un elemento del analyzeResult con sus span/spans corridos `base` posiciones"""
+    if isinstance(valor, list):
+        return [_desplazar(elemento, base) for elemento in valor]
+    if not isinstance(valor, dict):
+        return valor
+    copia = {}
+    for clave, elemento in valor.items():
+        if clave == 'span' and isinstance(elemento, dict):
+            copia[clave] = dict(elemento, offset=elemento.get('offset', 0) - base)
+        elif clave == 'spans' and isinstance(elemento, list):
+            copia[clave] = [dict(span, offset=span.get('offset', 0) - base) for span in elemento]
+        else:
+            copia[clave] = _desplazar(elemento, base)
+    return copia
+
+def _paginas_de(elemento):
+    """Números de página de un elemento con boundingRegions (párrafos, tablas, pares clave-valor)"""
+    return {region.get('pageNumber') for region in elemento.get('boundingRegions') or []}
+
+class Segmento:
+    """
+    Un documento dentro de un analyzeResult con varios: sus páginas, la
+    categoría reconocida y un analyzeResult propio (content recortado y
+    offsets corridos al inicio del segmento), con vistas perezosas de líneas
+    (OcrDocument) y palabras (WordStore).
+    """
+
+    def __init__(self, categoria, puntaje, paginas, analyze_result):
+        self.categoria = categoria
+        self.puntaje = puntaje
+        self.paginas = paginas
+        self.analyze_result = analyze_result
+        self._document = None
+        self._words = None
+
+    @property
+    def data(self):
+        """El segmento con la forma que esperan los procesadores"""
+        return {'analyzeResult': self.analyze_result}
+
+    @property
+    def document(self):
+        if self._document is None:
+            self._document = OcrDocument(self.analyze_result)
+        return self._document
+
+    @property
+    def content(self):
+        return self.document.content
+
+    @property
+    def lines(self):
+        return self.document.lines
+
+    @property
+    def words(self):
+        if self._words is None:
+            self._words = WordStore.from_analyze_result(self.analyze_result)
+        return self._words
+
+    def resumen(self):
+        return {
+            'categoria': self.categoria,
+            'script': SCRIPTS.get(self.categoria),
+            'paginas': self.paginas,
+            'puntaje': self.puntaje,
+        }
+
+class DocumentSegmenter:
+    """
+    Parte un analyzeResult en documentos. Cada página se clasifica con las
+    firmas de ocrClassifier; una página con categoría reconocida distinta a
+    la del segmento en curso abre un segmento nuevo, y las páginas sin
+    categoría clara (continuaciones, anexos) se quedan con el segmento en
+    curso. Sin páginas con spans el documento completo es un solo segmento.
+    """
+
+    def __init__(self, clasificador=None):
+        self.clasificador = clasificador or DocumentClassifier()
+
+    def _categoria_pagina(self, document, pagina):
+        texto = '\n'.join(document.normalized_line(i) for i in range(pagina.linea_inicio, pagina.linea_fin))
+        ranking = self.clasificador.puntuar(texto)
+        if ranking and ranking[0][1] >= PUNTAJE_MINIMO:
+            return ranking[0][0], ranking[0][1]
+        return None, 0
+
+    def grupos(self, document):
+        """[(categoría, puntaje, [Pagina])] en orden de documento"""
+        grupos = []
+        for pagina in document.pages:
+            categoria, puntaje = self._categoria_pagina(document, pagina)
+            if grupos and (categoria is None or categoria == grupos[-1][0]):
+                grupos[-1][2].append(pagina)
+                grupos[-1][1] = max(grupos[-1][1], puntaje)
+            elif grupos and grupos[-1][0] is None:
+                # Páginas iniciales sin categoría: pertenecen al primer documento reconocido
+                grupos[-1][0], grupos[-1][1] = categoria, puntaje
+                grupos[-1][2].append(pagina)
+            else:
+                grupos.append([categoria, puntaje, [pagina]])
+        return [tuple(grupo) for grupo in grupos]
+
+    def segmentar(self, ocr_data):
+        """Lista de Segmento del resultado de OCR"""
+        analyze_result = ocr_data.get('analyzeResult', ocr_data) if isinstance(ocr_data, dict) else {}
+        document = OcrDocument(analyze_result)
+
+        grupos = self.grupos(document)
+        if len(grupos) <= 1:
+            ranking = self.clasificador.puntuar(document.texto())
+            categoria, puntaje = (ranking[0][0], ranking[0][1]) if ranking and ranking[0][1] >= PUNTAJE_MINIMO else (None, 0)
+            paginas = [pagina.numero for pagina in document.pages]
+            return [Segmento(categoria, puntaje, paginas, analyze_result)]
+
+        pages = analyze_result.get('pages') or []
+        por_numero = {page.get('pageNumber', idx + 1): page for idx, page in enumerate(pages)}
+        segmentos = []
+        for categoria, puntaje, paginas in grupos:
+            inicio, fin = paginas[0].inicio, paginas[-1].fin
+            numeros = {pagina.numero for pagina in paginas}
+            recorte = {
+                clave: valor for clave, valor in analyze_result.items()
+                if not isinstance(valor, list) and clave != 'content'
+            }
+            recorte['content'] = document.content[inicio:fin]
+            recorte['pages'] = [_desplazar(por_numero[numero], inicio) for numero in sorted(numeros) if numero in por_numero]
+            # Párrafos, tablas, pares clave-valor...: los que caen en las páginas del segmento
+            for clave, valor in analyze_result.items():
+                if clave != 'pages' and isinstance(valor, list):
+                    recorte[clave] = [
+                        _desplazar(elemento, inicio) for elemento in valor
+                        if isinstance(elemento, dict) and _paginas_de(elemento) & numeros
+                    ]
+            segmentos.append(Segmento(categoria, puntaje, sorted(numeros), recorte))
+        return segmentos
+
+def procesar_segmento(segmento, parametros=None):
+    """Ejecuta el procesador de la categoría del segmento con los parámetros que acepta"""
+    if segmento.categoria not in PROCESADORES:
+        return {"error": "Segmento sin categoría reconocida"}
+    modulo, funcion, nombres = PROCESADORES[segmento.categoria]
+    procesar = getattr(importlib.import_module(modulo), funcion)
+    parametros = parametros or {}
+    return procesar(segmento.data, *[parametros.get(nombre) for nombre in nombres])
+
+# Función principal para segmentar y procesar un paquete de documentos
+def process_packet_data(data, parametros=None, procesar=True):
+    try:
+        segmentos = DocumentSegmenter().segmentar(data)
+        result = {'segmentos': []}
+        for segmento in segmentos:
+            resumen = segmento.resumen()
+            traza.registrar('segmentos.segmento', categoria=segmento.categoria, paginas=segmento.paginas)
+            if procesar:
+                resumen['resultado'] = procesar_segmento(segmento, parametros)
+            result['segmentos'].append(resumen)
+        return result
+    except Exception as e:
+        return {"error": str(e), "trace": traceback.format_exc()}
+
+# Ejecución principal
+if __name__ == "__main__":
+    try:
+        parser = argparse.ArgumentParser(description='Separar un OCR con varios documentos y procesar cada uno')
+        parser.add_argument('--file', type=str, help='Ruta al archivo JSON con datos OCR')
+        agregar_argumentos(parser)
+        parser.add_argument('--placa', type=str, help='Placa del vehículo (opcional)')
+        parser.add_argument('--numero_identificacion', type=str, help='Identificación del conductor (opcional)')
+        parser.add_argument('--fecha_nacimiento', type=str, help='Fecha de nacimiento del conductor (opcional)')
+        parser.add_argument('--solo-segmentar', action='store_true', help='Solo devolver los segmentos, sin procesarlos')
+        parser.add_argument('--debug', action='store_true', help='Volcar a stderr la traza de decisiones de los extractores')
+
+        args = parser.parse_args()
+
+        if hay_entrada(args):
+            # JSON compacto por stdin o por un descriptor heredado, sin archivo temporal
+            try:
+                data = leer_entrada(args)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: La entrada no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en la entrada: {str(e)}"}))
+                sys.exit(1)
+        elif not args.file or not os.path.exists(args.file):
+            print(f"ERROR: El archivo {args.file} no existe", file=sys.stderr)
+            print(json.dumps({"error": f"Archivo no encontrado: {args.file}"}))
+            sys.exit(1)
+        else:
+            try:
+                with open(args.file, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: El archivo no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en archivo: {str(e)}"}))
+                sys.exit(1)
+
+        parametros = {
+            'placa': args.placa,
+            'numero_identificacion': args.numero_identificacion,
+            'fecha_nacimiento': args.fecha_nacimiento,
+        }
+        result = process_packet_data(data, parametros, procesar=not args.solo_segmentar)
+
+        # Imprimir resultado como JSON (único output a stdout)
+        print(json.dumps(result, indent=4, ensure_ascii=False))
+
+        # Traza de decisiones a stderr solo si falló, hubo baja confianza o se pidió --debug
+        traza.volcar_si(result, args.debug)
+
+    except Exception as e:
+        # Errores a stderr para depuración
+        print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
+        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
+
+        traza.volcar_si({"error": str(e)})
+
+        # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
@@ -0,0 +1,208 @@
+import re
+from collections import namedtuple
+from ocrConfidence import ConfidenceMap, UMBRAL_CONFIANZA
+from ocrNormalize import normalize_text
+from ocrTrace import traza
+
+# Secciones estructuradas del analyzeResult que alimentan el índice
+SECCIONES = ('keyValuePairs', 'tables')
+
+def normalizar_clave(texto):
+    """Rótulo normalizado: sin tildes, en mayúsculas, sin signos ("No. de Motor:" → "NO DE MOTOR")"""
+    return ' '.join(re.sub(r'[^A-Z0-9]+', ' ', normalize_text(texto or '')).split())
+
+def _limpiar(texto):
+    return ' '.join((texto or '').split())
+
+def _spans(elemento):
+    """(inicios, fines) de los spans de un elemento del analyzeResult"""
+    spans = (elemento or {}).get('spans') or []
+    inicios = [span.get('offset', 0) for span in spans]
+    return inicios, [inicio + span.get('length', 0) for inicio, span in zip(inicios, spans)]
+
+class StructuredIndex:
+    """
+    Índice rótulo → valores construido una sola vez con los keyValuePairs y
+    las celdas de las tablas del analyzeResult. Los rótulos se normalizan al
+    construir y buscar, así cada consulta es un acceso a diccionario en lugar
+    de un barrido de líneas.
+
+    Cada rótulo guarda sus candidatos en orden de prioridad: primero los
+    pares clave-valor, después en las tablas la celda de la derecha y la de
+    abajo (rótulo en columna o en encabezado). Una celda "RÓTULO: valor"
+    también cuenta como par.
+
+    Cada valor guarda su confianza: la menor entre la del par clave-valor y
+    el promedio de las palabras que cubre (None si el OCR no trae ninguna).
+    """
+
+    def __init__(self, analyze_result):
+        self.valores = {}
+        self.confianzas = {}
+        self._mapa = ConfidenceMap(analyze_result)
+        for par in analyze_result.get('keyValuePairs') or []:
+            clave = (par.get('key') or {}).get('content')
+            valor = par.get('value') or {}
+            self._agregar(clave, valor.get('content'), valor, par.get('confidence'))
+        for tabla in analyze_result.get('tables') or []:
+            self._indexar_tabla(tabla)
+
+    @classmethod
+    def de(cls, ocr_data):
+        """Índice de un resultado de OCR, o None si no trae elementos estructurados"""
+        analyze_result = ocr_data.get('analyzeResult', ocr_data) if isinstance(ocr_data, dict) else {}
+        if not any(analyze_result.get(seccion) for seccion in SECCIONES):
+            return None
+        return cls(analyze_result)
+
+    def _confianza_palabras(self, elemento):
+        inicios, fines = _spans(elemento)
+        if not inicios:
+            return None
+        puntajes = [float(p) for p in self._mapa.score(inicios, fines) if p is not None and p == p]
+        return min(puntajes) if puntajes else None
+
+    def _agregar(self, clave, valor, elemento=None, confianza=None):
+        clave, valor = normalizar_clave(clave), _limpiar(valor)
+        if clave and valor:
+            candidatos = self.valores.setdefault(clave, [])
+            if valor not in candidatos:
+                candidatos.append(valor)
+            confianzas = [c for c in (confianza, self._confianza_palabras(elemento)) if c is not None]
+            if confianzas:
+                anterior = self.confianzas.get((clave, valor))
+                self.confianzas[(clave, valor)] = min(confianzas + ([anterior] if anterior is not None else []))
+
+    def _indexar_tabla(self, tabla):
+        celdas = {}
+        for celda in tabla.get('cells') or []:
+            celdas[(celda.get('rowIndex', 0), celda.get('columnIndex', 0))] = celda
+        for (fila, columna), celda in celdas.items():
+            contenido = celda.get('content') or ''
+            if ':' in contenido:
+                clave, valor = contenido.split(':', 1)
+                self._agregar(clave, valor, celda)
+            derecha = celdas.get((fila, columna + celda.get('columnSpan', 1)))
+            abajo = celdas.get((fila + celda.get('rowSpan', 1), columna))
+            if celda.get('kind') in ('columnHeader', 'rowHeader'):
+                # En un encabezado el valor está donde apunta el encabezado
+                vecinas = [abajo] if celda.get('kind') == 'columnHeader' else [derecha]
+            else:
+                vecinas = [derecha, abajo]
+            for vecina in vecinas:
+                if vecina is not None:
+                    self._agregar(contenido, vecina.get('content'), vecina)
+
+    def __len__(self):
+        return len(self.valores)
+
+    def candidatos(self, *alias):
+        """Valores de los rótulos `alias` (ya normalizados), en orden de alias y de prioridad"""
+        return [(clave, valor) for clave in alias for valor in self.valores.get(clave, ())]
+
+    def get(self, *alias):
+        """Primer valor de alguno de los rótulos, o None"""
+        candidatos = self.candidatos(*alias)
+        return candidatos[0][1] if candidatos else None
+
+    def confianza(self, clave, valor):
+        """Confianza del valor bajo el rótulo (None si el OCR no la reporta)"""
+        return self.confianzas.get((clave, valor))
+
+# Campo que se puede resolver desde el índice: rótulos que lo nombran,
+# validador del valor y rótulos genéricos ("MOTOR", "CLASE") que también
+# aparecen en otros contextos: esos solo completan el campo si el texto no
+# lo encontró, nunca lo reemplazan. El validador recibe el texto de la celda
+# y devuelve el valor ya formateado o None; si es un str se toma como método
+# del procesador.
+Campo = namedtuple('Campo', ['alias', 'validar', 'respaldo'])
+
+def texto(valor):
+    """Validador por defecto: cualquier texto no vacío"""
+    return valor or None
+
+def patron(expresion, reemplazos=()):
+    """Validador que extrae la primera coincidencia de `expresion` (tras los reemplazos, en mayúsculas)"""
+    compilado = re.compile(expresion)
+    def validar(valor):
+        valor = valor.upper()
+        for buscado, reemplazo in reemplazos:
+            valor = valor.replace(buscado, reemplazo)
+        match = compilado.search(valor)
+        return match.group(0) if match else None
+    return validar
+
+def campo(alias, validar=texto, respaldo=()):
+    return Campo(
+        tuple(normalizar_clave(rotulo) for rotulo in alias), validar,
+        tuple(normalizar_clave(rotulo) for rotulo in respaldo),
+    )
+
+class StructuredFields:
+    """
+    Camino rápido de un procesador: los campos que se pueden leer de los
+    pares clave-valor y tablas del OCR se resuelven con el índice antes de
+    ejecutar los extractores de texto. Los extractores cuyos campos quedaron
+    todos resueltos no corren; los demás corren como siempre y, al terminar,
+    los valores estructurados se reponen sobre lo que hayan escrito. Un
+    valor del índice solo se usa si pasa el validador del campo y su
+    confianza no está bajo `umbral`.
+
+    Sin keyValuePairs ni tablas no hay índice y el procesador se comporta
+    exactamente como antes. Hoy solo lo usa la tarjeta de propiedad: los
+    demás documentos (SOAT, pólizas, cédula, licencia) se analizan con
+    prebuilt-read, que no trae pares ni tablas, así que allí no tendría
+    efecto.
+    """
+
+    def __init__(self, campos, umbral=UMBRAL_CONFIANZA):
+        self.campos = dict(campos)
+        self.umbral = umbral
+
+    def resolver(self, processor, campos=None, respaldo=False):
+        """
+        Valores {campo: valor} que se pudieron resolver desde el índice del
+        procesador, con los rótulos propios o (`respaldo`) con los genéricos
+        """
+        indice = processor.__dict__.get('_estructura', False)
+        if indice is False:
+            indice = processor._estructura = StructuredIndex.de(processor.data)
+        if not indice:
+            return {}
+
+        resueltos = {}
+        for nombre, definicion in self.campos.items():
+            if campos is not None and nombre not in campos:
+                continue
+            validar = definicion.validar
+            if isinstance(validar, str):
+                validar = getattr(processor, validar)
+            for clave, valor in indice.candidatos(*(definicion.respaldo if respaldo else definicion.alias)):
+                confianza = indice.confianza(clave, valor)
+                if confianza is not None and confianza < self.umbral:
+                    traza.registrar('estructura.dudoso', campo=nombre, clave=clave, valor=valor, confianza=confianza)
+                    continue
+                resultado = validar(valor)
+                if resultado:
+                    resueltos[nombre] = resultado
+                    traza.registrar('estructura.resuelto', campo=nombre, clave=clave, valor=resultado)
+                    break
+                traza.registrar('estructura.descartado', campo=nombre, clave=clave, valor=valor)
+        return resueltos
+
+    def ejecutar(self, processor, extractores, campos=None):
+        """
+        Resuelve desde el índice y ejecuta con `extractores` (ExtractorGraph)
+        solo lo que falte. Los valores estructurados tienen prioridad; los de
+        rótulos genéricos solo llenan lo que el texto dejó vacío.
+        """
+        resueltos = self.resolver(processor, campos)
+        processor.result.update(resueltos)
+        extractores.marcar_resueltos(processor, resueltos)
+        extractores.ejecutar(processor, campos)
+        processor.result.update(resueltos)
+        for nombre, valor in self.resolver(processor, campos, respaldo=True).items():
+            if not processor.result.get(nombre):
+                processor.result[nombre] = valor
+                resueltos[nombre] = valor
+        return resueltos
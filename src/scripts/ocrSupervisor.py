@@ -0,0 +1,457 @@
+import os
+import sys
+import json
+import glob
+import time
+import itertools
+import argparse
+import threading
+import traceback
+import multiprocessing
+from collections import deque, Counter
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+from ocrConsumer import procesar_ocr, _inicializar_trabajador
+from ocrFields import parse_fields
+from ocrTrace import traza
+
+# Trabajadores por defecto: uno por núcleo
+TRABAJADORES = os.cpu_count() or 1
+
+# Categorías pesadas (documentos largos, muchos extractores): sin límite
+# propio acapararían todos los trabajadores en una ráfaga
+CATEGORIAS_PESADAS = ('CONTRATO', 'TARJETA_DE_PROPIEDAD')
+
+# Solicitudes en espera antes de rechazar nuevas (contrapresión) y plazo por solicitud
+MAX_COLA = 256
+PLAZO = 30.0
+
+# Reciclaje de trabajadores: tras tantas solicitudes o al superar esta memoria residente
+MAX_SOLICITUDES = 500
+MAX_RSS_MB = 512
+
+class ColaLlena(RuntimeError):
+    """La cola del supervisor está llena: el cliente debe reintentar más tarde"""
+
+def _rss_mb():
+    """Memoria residente actual del proceso en MB (pico de la vida del proceso si no hay /proc)"""
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _bucle_trabajador(conexion, procesador=procesar_ocr):
+    """
+    Proceso trabajador: carga los procesadores una vez y atiende solicitudes
+    de a una hasta recibir None. Cada respuesta lleva la memoria residente
+    para que el supervisor decida si reciclarlo.
+    """
+    _inicializar_trabajador()
+    while True:
+        try:
+            mensaje = conexion.recv()
+        except EOFError:
+            break
+        if mensaje is None:
+            break
+        id_solicitud, categoria, data, parametros, campos, motor = mensaje
+        try:
+            if isinstance(data, (str, bytes)):
+                data = json.loads(data)
+            resultado = procesador(data, categoria, parametros, campos, motor)
+        except Exception as e:
+            resultado = {"error": str(e), "trace": traceback.format_exc()}
+        finally:
+            traza.reiniciar()
+        conexion.send((id_solicitud, resultado, _rss_mb()))
+
+class _Solicitud:
+    __slots__ = ('id', 'categoria', 'data', 'parametros', 'campos', 'motor', 'plazo', 'llegada', 'inicio', 'futuro')
+
+    def __init__(self, id_solicitud, categoria, data, parametros, campos, motor, plazo):
+        self.id = id_solicitud
+        self.categoria = categoria
+        self.data = data
+        self.parametros = parametros
+        self.campos = campos
+        self.motor = motor
+        self.llegada = time.monotonic()
+        self.plazo = self.llegada + plazo
+        self.inicio = None
+        self.futuro = Future()
+
+class _Trabajador:
+    def __init__(self, contexto, procesador):
+        self.conexion, remota = contexto.Pipe()
+        self.proceso = contexto.Process(target=_bucle_trabajador, args=(remota, procesador), daemon=True)
+        self.proceso.start()
+        remota.close()
+        self.solicitud = None
+        self.atendidas = 0
+        self.rss = 0.0
+
+    def terminar(self, forzar=False):
+        try:
+            if forzar:
+                self.proceso.kill()
+            else:
+                self.conexion.send(None)
+        except (OSError, ValueError):
+            pass
+        self.proceso.join(timeout=None if forzar else 5)
+        if self.proceso.is_alive():
+            self.proceso.kill()
+            self.proceso.join()
+        self.conexion.close()
+
+class OcrSupervisor:
+    """
+    Pool de `trabajadores` procesos calientes (cargan los procesadores una
+    sola vez, como el pool de ocrConsumer) con un despachador propio:
+
+    - contrapresión: a lo sumo `max_cola` solicitudes esperando; las demás
+      se rechazan de inmediato con ColaLlena en lugar de acumular procesos
+      o memoria sin límite
+    - límites por categoría: CONTRATO y TARJETA_DE_PROPIEDAD no ocupan más
+      de la mitad de los trabajadores, así una ráfaga de documentos pesados
+      no frena a los livianos; una solicitud que espera por su límite no
+      bloquea a las de otras categorías que llegaron después
+    - plazos: una solicitud que vence esperando falla con TimeoutError sin
+      ejecutarse; si vence ejecutándose, el trabajador se mata y se
+      reemplaza
+    - reciclaje: cada trabajador se reemplaza tras `max_solicitudes` o si su
+      memoria residente supera `max_rss_mb`
+
+    Un solo hilo despacha y recibe resultados (multiprocessing.connection.wait
+    sobre los trabajadores ocupados), así el estado no necesita más que un lock
+    para las solicitudes que llegan desde otros hilos.
+
+    `procesador` es la función que ejecutan los trabajadores, con la firma de
+    procesar_ocr; debe poder importarse desde un proceso nuevo (spawn).
+    """
+
+    def __init__(self, trabajadores=TRABAJADORES, limites=None, max_cola=MAX_COLA, plazo=PLAZO,
+                 max_solicitudes=MAX_SOLICITUDES, max_rss_mb=MAX_RSS_MB, procesador=procesar_ocr):
+        self.trabajadores = max(1, trabajadores)
+        if limites is None:
+            limites = {categoria: max(1, self.trabajadores // 2) for categoria in CATEGORIAS_PESADAS}
+        self.limites = limites
+        self.max_cola = max_cola
+        self.plazo = plazo
+        self.max_solicitudes = max_solicitudes
+        self.max_rss_mb = max_rss_mb
+        self.procesador = procesador
+        self.estadisticas = Counter()
+
+        # spawn: los trabajadores no heredan el hilo despachador ni sus locks
+        self._contexto = multiprocessing.get_context('spawn')
+        self._lock = threading.Lock()
+        self._pendientes = deque()
+        self._en_curso = Counter()
+        self._ids = itertools.count(1)
+        self._pool = []
+        self._despertar, self._aviso = self._contexto.Pipe(duplex=False)
+        self._detenido = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        self._pool = [_Trabajador(self._contexto, self.procesador) for _ in range(self.trabajadores)]
+        self._hilo = threading.Thread(target=self._despachar, name='ocr-supervisor', daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        """Deja de despachar, falla lo que quedó en cola y termina los trabajadores"""
+        self._detenido.set()
+        self._avisar()
+        if self._hilo is not None:
+            self._hilo.join()
+        with self._lock:
+            pendientes, self._pendientes = list(self._pendientes), deque()
+        for solicitud in pendientes:
+            solicitud.futuro.set_exception(RuntimeError('Supervisor detenido'))
+        for trabajador in self._pool:
+            if trabajador.solicitud is not None:
+                trabajador.solicitud.futuro.set_exception(RuntimeError('Supervisor detenido'))
+            trabajador.terminar(forzar=trabajador.solicitud is not None)
+        self._pool = []
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
+
+    def _avisar(self):
+        try:
+            self._aviso.send(None)
+        except (OSError, ValueError):
+            pass
+
+    def enviar(self, categoria, data, parametros=None, campos=None, motor='script', plazo=None):
+        """
+        Encola una solicitud y devuelve su Future (resultado del procesador).
+        `data` puede ser el OCR ya decodificado o su JSON como texto (más
+        barato de enviar al trabajador). Lanza ColaLlena si no hay lugar.
+        """
+        solicitud = _Solicitud(
+            next(self._ids), categoria, data, parametros, campos, motor, self.plazo if plazo is None else plazo
+        )
+        with self._lock:
+            if len(self._pendientes) >= self.max_cola:
+                self.estadisticas['rechazadas'] += 1
+                raise ColaLlena(f"Cola llena ({self.max_cola} solicitudes en espera)")
+            self._pendientes.append(solicitud)
+        self._avisar()
+        return solicitud.futuro
+
+    def procesar(self, categoria, data, parametros=None, campos=None, motor='script', plazo=None):
+        """enviar() y esperar el resultado"""
+        return self.enviar(categoria, data, parametros, campos, motor, plazo).result()
+
+    def estado(self):
+        with self._lock:
+            en_cola = len(self._pendientes)
+        return {
+            'trabajadores': len(self._pool),
+            'ocupados': sum(1 for trabajador in self._pool if trabajador.solicitud is not None),
+            'enCola': en_cola,
+            'enCurso': dict(self._en_curso),
+            'limites': self.limites,
+            **self.estadisticas,
+        }
+
+    def _asignar(self, libres):
+        """Primera solicitud en orden de llegada cuya categoría tiene cupo, para cada trabajador libre"""
+        ahora = time.monotonic()
+        with self._lock:
+            restantes = deque()
+            while self._pendientes:
+                solicitud = self._pendientes.popleft()
+                if solicitud.plazo <= ahora:
+                    self.estadisticas['vencidasEnCola'] += 1
+                    solicitud.futuro.set_exception(TimeoutError('Plazo vencido esperando un trabajador'))
+                elif libres and self._en_curso[solicitud.categoria] < self.limites.get(solicitud.categoria, self.trabajadores):
+                    trabajador = libres.pop()
+                    solicitud.inicio = ahora
+                    trabajador.solicitud = solicitud
+                    self._en_curso[solicitud.categoria] += 1
+                    trabajador.conexion.send((
+                        solicitud.id, solicitud.categoria, solicitud.data,
+                        solicitud.parametros, solicitud.campos, solicitud.motor,
+                    ))
+                    solicitud.data = None
+                else:
+                    restantes.append(solicitud)
+            self._pendientes = restantes
+            proximo = min((solicitud.plazo for solicitud in restantes), default=None)
+        return proximo
+
+    def _liberar(self, trabajador):
+        solicitud, trabajador.solicitud = trabajador.solicitud, None
+        self._en_curso[solicitud.categoria] -= 1
+        if not self._en_curso[solicitud.categoria]:
+            del self._en_curso[solicitud.categoria]
+        return solicitud
+
+    def _reemplazar(self, trabajador, forzar=False):
+        trabajador.terminar(forzar)
+        self._pool[self._pool.index(trabajador)] = _Trabajador(self._contexto, self.procesador)
+        self.estadisticas['reciclados'] += 1
+
+    def _recibir(self, trabajador):
+        try:
+            _, resultado, trabajador.rss = trabajador.conexion.recv()
+        except (EOFError, OSError):
+            # El trabajador murió (por ejemplo, sin memoria): se reemplaza
+            solicitud = self._liberar(trabajador)
+            self.estadisticas['caidas'] += 1
+            solicitud.futuro.set_exception(RuntimeError('El trabajador terminó inesperadamente'))
+            self._reemplazar(trabajador, forzar=True)
+            return
+        solicitud = self._liberar(trabajador)
+        trabajador.atendidas += 1
+        self.estadisticas['atendidas'] += 1
+        solicitud.futuro.set_result(resultado)
+        if trabajador.atendidas >= self.max_solicitudes or trabajador.rss >= self.max_rss_mb:
+            self._reemplazar(trabajador)
+
+    def _despachar(self):
+        while not self._detenido.is_set():
+            libres = [trabajador for trabajador in self._pool if trabajador.solicitud is None]
+            proximo = self._asignar(libres)
+
+            ocupados = {trabajador.conexion: trabajador for trabajador in self._pool if trabajador.solicitud is not None}
+            plazos = [trabajador.solicitud.plazo for trabajador in ocupados.values()]
+            if proximo is not None:
+                plazos.append(proximo)
+            espera = max(0.0, min(plazos) - time.monotonic()) if plazos else None
+
+            for conexion in wait(list(ocupados) + [self._despertar], espera):
+                if conexion is self._despertar:
+                    while self._despertar.poll():
+                        self._despertar.recv()
+                else:
+                    self._recibir(ocupados[conexion])
+
+            # Plazos vencidos en ejecución: el trabajador se mata y se reemplaza
+            ahora = time.monotonic()
+            for trabajador in list(self._pool):
+                if trabajador.solicitud is not None and trabajador.solicitud.plazo <= ahora:
+                    solicitud = self._liberar(trabajador)
+                    self.estadisticas['vencidasEnEjecucion'] += 1
+                    solicitud.futuro.set_exception(TimeoutError('Plazo vencido procesando el documento'))
+                    self._reemplazar(trabajador, forzar=True)
+
+def _responder(salida, lock, respuesta):
+    with lock:
+        salida.write(json.dumps(respuesta, ensure_ascii=False) + '\n')
+        salida.flush()
+
+def servir_jsonl(supervisor, entrada=sys.stdin, salida=sys.stdout):
+    """
+    Atiende solicitudes en líneas JSON (un proceso de larga vida en lugar de
+    un Python por documento): {"id", "categoria", "data" o "archivo",
+    "parametros", "campos", "motor", "plazo"} → {"id", "resultado"} o
+    {"id", "error", "rechazada"}. Las respuestas salen en orden de término.
+    """
+    lock = threading.Lock()
+    futuros = []
+    for linea in entrada:
+        if not linea.strip():
+            continue
+        id_solicitud = None
+        try:
+            solicitud = json.loads(linea)
+            id_solicitud = solicitud.get('id')
+            data = solicitud.get('data')
+            if data is None:
+                with open(solicitud['archivo'], 'r', encoding='utf-8') as file:
+                    data = file.read()
+            futuro = supervisor.enviar(
+                solicitud['categoria'], data, solicitud.get('parametros'), solicitud.get('campos'),
+                solicitud.get('motor', 'script'), solicitud.get('plazo'),
+            )
+        except ColaLlena as e:
+            _responder(salida, lock, {'id': id_solicitud, 'error': str(e), 'rechazada': True})
+            continue
+        except (ValueError, KeyError, AttributeError, OSError) as e:
+            _responder(salida, lock, {'id': id_solicitud, 'error': f"Solicitud inválida: {str(e)}"})
+            continue
+
+        def responder(futuro, id_solicitud=id_solicitud):
+            try:
+                _responder(salida, lock, {'id': id_solicitud, 'resultado': futuro.result()})
+            except Exception as e:
+                _responder(salida, lock, {'id': id_solicitud, 'error': str(e) or type(e).__name__})
+        futuro.add_done_callback(responder)
+        futuros.append(futuro)
+    for futuro in futuros:
+        try:
+            futuro.result()
+        except Exception:
+            pass
+
+def _percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(p / 100 * len(valores)))] if valores else None
+
+def _benchmark(supervisor, directorio, repeticiones=1):
+    """Envía en ráfaga todos los JSON del directorio (categoría en el nombre) y mide latencias"""
+    from ocrCorpus import PATRON_TEMPORAL
+    from ocrSegments import PROCESADORES
+    archivos = []
+    for ruta in sorted(glob.glob(os.path.join(directorio, '*.json'))):
+        nombre = os.path.basename(ruta)
+        temporal = PATRON_TEMPORAL.match(nombre)
+        categoria = temporal.group(1) if temporal else next(
+            (categoria for categoria in sorted(PROCESADORES, key=len, reverse=True) if nombre.startswith(categoria)), None
+        )
+        if categoria:
+            with open(ruta, 'r', encoding='utf-8') as file:
+                archivos.append((categoria, file.read()))
+
+    inicio = time.monotonic()
+    envios = []
+    for _ in range(repeticiones):
+        for categoria, contenido in archivos:
+            try:
+                envios.append((time.monotonic(), supervisor.enviar(categoria, contenido)))
+            except ColaLlena:
+                pass
+    latencias = []
+    errores = 0
+    for enviado, futuro in envios:
+        try:
+            futuro.result()
+        except Exception:
+            errores += 1
+        latencias.append(time.monotonic() - enviado)
+    total = time.monotonic() - inicio
+    return {
+        'solicitudes': len(envios),
+        'errores': errores,
+        'segundos': round(total, 3),
+        'porSegundo': round(len(envios) / total, 1) if total else None,
+        'latenciaP50Ms': round(_percentil(latencias, 50) * 1000, 1) if latencias else None,
+        'latenciaP95Ms': round(_percentil(latencias, 95) * 1000, 1) if latencias else None,
+    }
+
+# Ejecución principal
+if __name__ == "__main__":
+    try:
+        parser = argparse.ArgumentParser(description='Supervisor de trabajadores de OCR con límites por categoría')
+        parser.add_argument('--trabajadores', type=int, default=TRABAJADORES, help='Procesos trabajadores (por defecto, núcleos)')
+        parser.add_argument('--limite', type=str, action='append', default=[], metavar='CATEGORIA=N',
+                            help='Máximo de solicitudes simultáneas de una categoría (se puede repetir)')
+        parser.add_argument('--max-cola', type=int, default=MAX_COLA, help='Solicitudes en espera antes de rechazar')
+        parser.add_argument('--plazo', type=float, default=PLAZO, help='Segundos por solicitud (espera + proceso)')
+        parser.add_argument('--max-solicitudes', type=int, default=MAX_SOLICITUDES, help='Reciclar trabajadores tras N solicitudes')
+        parser.add_argument('--max-rss-mb', type=float, default=MAX_RSS_MB, help='Reciclar trabajadores que superen esta memoria')
+        parser.add_argument('--categoria', type=str, help='Con --file, categoría del documento')
+        parser.add_argument('--file', type=str, help='Procesar un solo documento y salir')
+        parser.add_argument('--fields', type=str, help='Con --file, campos a extraer separados por coma')
+        parser.add_argument('--benchmark', type=str, metavar='DIRECTORIO', help='Ráfaga con los JSON del directorio')
+        parser.add_argument('--repeticiones', type=int, default=1, help='Con --benchmark, veces que se envía cada documento')
+
+        args = parser.parse_args()
+
+        limites = None
+        if args.limite:
+            limites = {}
+            for limite in args.limite:
+                categoria, _, valor = limite.partition('=')
+                limites[categoria] = int(valor)
+
+        supervisor = OcrSupervisor(
+            args.trabajadores, limites, args.max_cola, args.plazo, args.max_solicitudes, args.max_rss_mb
+        )
+        with supervisor:
+            if args.benchmark:
+                result = _benchmark(supervisor, args.benchmark, args.repeticiones)
+                result['supervisor'] = supervisor.estado()
+            elif args.file:
+                if not args.categoria or not os.path.exists(args.file):
+                    print(f"ERROR: se requieren --categoria y un --file existente", file=sys.stderr)
+                    print(json.dumps({"error": "Se requieren --categoria y un --file existente"}))
+                    sys.exit(1)
+                with open(args.file, 'r', encoding='utf-8') as file:
+                    result = supervisor.procesar(args.categoria, file.read(), campos=parse_fields(args.fields))
+            else:
+                # Modo servidor: líneas JSON por stdin, respuestas por stdout
+                servir_jsonl(supervisor)
+                sys.exit(0)
+
+        # Imprimir resultado como JSON (único output a stdout)
+        print(json.dumps(result, indent=4, ensure_ascii=False))
+
+    except Exception as e:
+        # Errores a stderr para depuración
+        print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
+        print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
+
+        # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
@@ -1,35 +1,47 @@
 import json
 import re
 from datetime import datetime
-import unicodedata
 import sys
 import os
 import argparse
 import traceback
-
-# Función para normalizar texto
-def normalize_text(text):
-    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8').upper()
+from ocrDocument import OcrDocument, PAGINAS_ANCLA, PAGINAS_VALIDACION
+from ocrFields import ExtractorGraph, extractor, parse_fields
+from ocrWatchdog import CAMPO_INTERRUMPIDOS
+from ocrConfidence import ConfidenceMap, Candidato, buscar_en_lineas
+from ocrNormalize import normalize_text
+from ocrTrace import traza
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
 
 class TarjetaOperacionProcessor:
+    # Extractores y campos que producen (ver ocrFields.ExtractorGraph)
+    EXTRACTORES = ExtractorGraph([
+        extractor('extract_placa', ['placa']),
+        extractor('extract_fecha_vencimiento', ['tarjetaDeOperacionVencimiento']),
+    ])
+
     def __init__(self, ocr_data, placa_param=None):
         self.data = ocr_data
         self.content = ocr_data.get('analyzeResult', {}).get('content', '')
-        self.lines = self.content.split('\n')
+        self.document = OcrDocument(ocr_data.get('analyzeResult', {}))
+        self.lines = self.document.lines
         self.placa_param = placa_param.upper() if placa_param else None
         self.result = {
             "placa": None,
             "tarjetaDeOperacionVencimiento": None,
         }
+        self._confianza = None
+
+    @property
+    def confianza(self):
+        """Confianza de las palabras del OCR (se construye solo si se necesita)"""
+        if self._confianza is None:
+            self._confianza = ConfidenceMap.from_analyze_result(self.data.get('analyzeResult', {}))
+        return self._confianza
     
-    def find_line_index(self, keyword, normalize=True):
+    def find_line_index(self, keyword, normalize=True, paginas=None):
         """Encontrar el índice de la línea que contiene una palabra clave"""
-        keyword_norm = normalize_text(keyword) if normalize else keyword
-        for i, line in enumerate(self.lines):
-            line_norm = normalize_text(line) if normalize else line
-            if keyword_norm in line_norm:
-                return i
-        return -1
+        return self.document.find_line_index(keyword, normalize, paginas)
     
     def is_valid_tarjeta_operacion(self):
         """Verificar si el documento es una Tarjeta de Operación válida"""
@@ -40,13 +52,13 @@ class TarjetaOperacionProcessor:
             "MINISTERIO DE TRANSPORTE", "EMPRESA DE TRANSPORTE"
         ]
         
-        for keyword in keywords:
-            if self.find_line_index(keyword) >= 0:
-                return True
+        # El encabezado está en la primera página; el resto del documento no se revisa
+        if self.document.contains_any(keywords, PAGINAS_VALIDACION):
+            return True
         
         # Verificar también en las primeras 10 líneas del documento
-        for i, line in enumerate(self.lines[:10]):
-            if "TARJETA DE OPERACI" in normalize_text(line):
+        for i in range(min(10, len(self.lines))):
+            if "TARJETA DE OPERACI" in self.document.normalized_line(i):
                 return True
         
         return False
@@ -73,21 +85,23 @@ class TarjetaOperacionProcessor:
     
     def buscar_cualquier_placa(self):
         """Buscar cualquier patrón de placa en el documento"""
-        placa_idx = self.find_line_index("PLACA")
+        placa_idx = self.find_line_index("PLACA", paginas=PAGINAS_ANCLA)
         if placa_idx >= 0:
-            # Buscar en esta línea y las siguientes
-            for i in range(placa_idx, min(placa_idx + 5, len(self.lines))):
-                match = re.search(r'[A-Z]{3}\d{3}', self.lines[i])
-                if match:
-                    self.result["placa"] = match.group(0)
-                    return True
+            # Buscar en esta línea y las siguientes, prefiriendo lecturas confiables
+            candidato = self.confianza.primera_confiable(
+                buscar_en_lineas(
+                    self.lines, r'[A-Z]{3}\d{3}', range(placa_idx, min(placa_idx + 5, len(self.lines))), etiqueta='PLACA'
+                )
+            )
+            if candidato:
+                self.result["placa"] = candidato.valor.group(0)
+                return True
         
         # Si no encuentra con "PLACA", buscar patrón de placa en todas las líneas
-        for line in self.lines:
-            match = re.search(r'[A-Z]{3}\d{3}', line)
-            if match:
-                self.result["placa"] = match.group(0)
-                return True
+        candidato = self.confianza.primera_confiable(buscar_en_lineas(self.lines, r'[A-Z]{3}\d{3}'))
+        if candidato:
+            self.result["placa"] = candidato.valor.group(0)
+            return True
         
         return False
 
@@ -99,8 +113,28 @@ class TarjetaOperacionProcessor:
             "VENCIMIENTO", "VIGENTE HASTA", "VIGENCIA", "TERMINA"
         ]
         
+        def fechas_en_linea(i, etiqueta=None):
+            """Fechas válidas de una línea como candidatos con su posición"""
+            line = self.lines[i]
+            
+            # Formato YYYY-MM-DD o YYYY/MM/DD
+            for match in re.finditer(r'(20\d{2})[-/](\d{1,2})[-/](\d{1,2})', line):
+                year, month, day = match.groups()
+                try:
+                    yield Candidato(i, match.start(), match.end(), datetime(int(year), int(month), int(day)), etiqueta)
+                except ValueError:
+                    pass
+            
+            # Formato DD-MM-YYYY o DD/MM/YYYY
+            for match in re.finditer(r'(\d{1,2})[-/](\d{1,2})[-/](20\d{2})', line):
+                day, month, year = match.groups()
+                try:
+                    yield Candidato(i, match.start(), match.end(), datetime(int(year), int(month), int(day)), etiqueta)
+                except ValueError:
+                    pass
+        
         # Lista para almacenar todas las fechas encontradas
-        fechas_encontradas = []
+        candidatos = []
         
         # 1. Primero buscar líneas que contengan palabras clave de vencimiento
         for keyword in vencimiento_keywords:
@@ -108,47 +142,15 @@ class TarjetaOperacionProcessor:
             if venc_idx >= 0:
                 # Buscar fechas en la misma línea o en las siguientes 3 líneas
                 for i in range(venc_idx, min(venc_idx + 4, len(self.lines))):
-                    line = self.lines[i]
-                    
-                    # Encontrar todas las fechas en la línea
-                    # Formato YYYY-MM-DD o YYYY/MM/DD
-                    for match in re.finditer(r'(20\d{2})[-/](\d{1,2})[-/](\d{1,2})', line):
-                        year, month, day = match.groups()
-                        try:
-                            fecha = datetime(int(year), int(month), int(day))
-                            fechas_encontradas.append(fecha)
-                        except ValueError:
-                            pass
-                    
-                    # Formato DD-MM-YYYY o DD/MM/YYYY
-                    for match in re.finditer(r'(\d{1,2})[-/](\d{1,2})[-/](20\d{2})', line):
-                        day, month, year = match.groups()
-                        try:
-                            fecha = datetime(int(year), int(month), int(day))
-                            fechas_encontradas.append(fecha)
-                        except ValueError:
-                            pass
+                    candidatos.extend(fechas_en_linea(i, keyword))
         
         # 2. Si no se encontraron fechas con palabras clave, buscar todas las fechas
-        if not fechas_encontradas:
-            for line in self.lines:
-                # Formato YYYY-MM-DD o YYYY/MM/DD
-                for match in re.finditer(r'(20\d{2})[-/](\d{1,2})[-/](\d{1,2})', line):
-                    year, month, day = match.groups()
-                    try:
-                        fecha = datetime(int(year), int(month), int(day))
-                        fechas_encontradas.append(fecha)
-                    except ValueError:
-                        pass
-                
-                # Formato DD-MM-YYYY o DD/MM/YYYY
-                for match in re.finditer(r'(\d{1,2})[-/](\d{1,2})[-/](20\d{2})', line):
-                    day, month, year = match.groups()
-                    try:
-                        fecha = datetime(int(year), int(month), int(day))
-                        fechas_encontradas.append(fecha)
-                    except ValueError:
-                        pass
+        if not candidatos:
+            for i in range(len(self.lines)):
+                candidatos.extend(fechas_en_linea(i))
+        
+        # Descartar en bloque las fechas de baja confianza
+        fechas_encontradas = [c.valor for c in self.confianza.filtrar(candidatos)]
         
         # 3. Procesar las fechas encontradas
         if fechas_encontradas:
@@ -174,25 +176,27 @@ class TarjetaOperacionProcessor:
             
         return False
 
-    def process(self):
-        """Procesar todos los campos y devolver el resultado"""
+    def process(self, campos=None):
+        """Procesar los campos pedidos (todos por defecto) y devolver el resultado"""
         if not self.is_valid_tarjeta_operacion():
             return {"error": "No es una Tarjeta de Operación válida"}
         
-        placa_encontrada = self.extract_placa()
-        self.extract_fecha_vencimiento()
+        placa_encontrada = self.EXTRACTORES.ejecutar(self, campos).get('extract_placa')
         
         # Adaptar el formato del resultado para coincidir con el esperado
-        return {
+        resultado = {
             "placa": self.result["placa"] if placa_encontrada else False,
             "tarjetaDeOperacionVencimiento": self.result["tarjetaDeOperacionVencimiento"] or "No encontrado",
         }
+        if CAMPO_INTERRUMPIDOS in self.result:
+            resultado[CAMPO_INTERRUMPIDOS] = self.result[CAMPO_INTERRUMPIDOS]
+        return self.EXTRACTORES.seleccionar(resultado, campos)
 
 # Función principal para procesar el OCR
-def process_tarjeta_operacion(data, placa_param=None):
+def process_tarjeta_operacion(data, placa_param=None, campos=None):
     try:
         processor = TarjetaOperacionProcessor(data, placa_param)
-        result = processor.process()
+        result = processor.process(campos)
         return result
     except Exception as e:
         import traceback
@@ -203,14 +207,25 @@ if __name__ == "__main__":
     try:
         parser = argparse.ArgumentParser(description='Procesar datos OCR')
         parser.add_argument('--file', type=str, help='Ruta al archivo JSON con datos OCR')
+        agregar_argumentos(parser)
         parser.add_argument('--placa', type=str, help='Placa del vehículo (opcional)')
+        parser.add_argument('--fields', type=str, help='Campos a extraer separados por coma (opcional, por defecto todos)')
+        parser.add_argument('--debug', action='store_true', help='Volcar a stderr la traza de decisiones de los extractores')
         
         args = parser.parse_args()
         
         # Determinar qué archivo procesar
         file_path = None
         
-        if args.file:
+        if hay_entrada(args):
+            # JSON compacto por stdin o por un descriptor heredado, sin archivo temporal
+            try:
+                data = leer_entrada(args)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: La entrada no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en la entrada: {str(e)}"}))
+                sys.exit(1)
+        elif args.file:
             # Usar el archivo especificado por argumento
             file_path = args.file
             if not os.path.exists(file_path):
@@ -246,16 +261,21 @@ if __name__ == "__main__":
                 sys.exit(1)
         
         # Procesar los datos
-        result = process_tarjeta_operacion(data)
+        result = process_tarjeta_operacion(data, campos=parse_fields(args.fields))
         
         # Imprimir resultado como JSON (único output a stdout)
         print(json.dumps(result, indent=4, ensure_ascii=False))
+
+        # Traza de decisiones a stderr solo si falló, hubo baja confianza o se pidió --debug
+        traza.volcar_si(result, args.debug)
         
     except Exception as e:
         # Errores a stderr para depuración
         print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
         print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
         
+        traza.volcar_si({"error": str(e)})
+
         # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
         print(json.dumps({"error": str(e)}))
         sys.exit(1)
\ No newline at end of file
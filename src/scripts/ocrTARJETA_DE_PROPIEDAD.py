@@ -1,45 +1,91 @@
 import json
 import re
-import unicodedata
 import sys
 import traceback
 import os
 import argparse
+from ocrDocument import OcrDocument, PAGINAS_VALIDACION
+from ocrFields import ExtractorGraph, extractor, parse_fields
+from ocrStructured import StructuredFields, campo, patron
+from ocrWordStore import WordStore
+from ocrNormalize import normalize_text
+from ocrTrace import traza
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
 
-# Función para normalizar texto
-def normalize_text(text):
-    return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8').upper()
+# VIN, chasis o serie en una celda: 17 caracteres, sin espacios y con O leída como 0
+VIN_ESTRUCTURADO = patron(r'\b[A-Z0-9]{17}\b', [(' ', ''), ('O', '0')])
+
+# Línea ("HILUX", "NPR 4.0") y clase ("CAMIONETA") en una celda: un valor corto,
+# no una frase ni un número suelto
+LINEA_ESTRUCTURADA = patron(r'^[A-Z0-9][A-Z0-9 .\-/]{0,29}$')
+CLASE_ESTRUCTURADA = patron(r'^[A-ZÁÉÍÓÚÑ ]{3,30}$')
 
 # Clase principal para procesar la tarjeta de propiedad
 class TarjetaPropiedadProcessor:
+    # Extractores y campos que producen (ver ocrFields.ExtractorGraph)
+    EXTRACTORES = ExtractorGraph([
+        extractor('extract_placa', ['placa']),
+        extractor('extract_marca', ['marca']),
+        extractor('extract_linea', ['linea']),
+        extractor('extract_modelo', ['modelo']),
+        extractor('extract_color', ['color']),
+        extractor('extract_clase_vehiculo', ['clase_vehiculo']),
+        extractor('extract_carroceria_combustible', ['tipo_carroceria', 'combustible']),
+        extractor('extract_motor', ['numero_motor']),
+        extractor('extract_vin_chasis', ['vin', 'numero_chasis', 'numero_serie']),
+        extractor('extract_propietario', ['propietario_nombre', 'propietario_identificacion']),
+        extractor('extract_fecha_matricula', ['fecha_matricula']),
+    ])
+
+    # Rótulos de la licencia de tránsito en pares clave-valor y tablas del OCR
+    # (ver ocrStructured): si el OCR los trae, estos campos no barren el texto.
+    # Los rótulos genéricos (tercer argumento) solo completan lo que el texto no encontró
+    ESTRUCTURADOS = StructuredFields({
+        'placa': campo(['PLACA', 'NUMERO DE PLACA', 'PLACA NO'], patron(r'[A-Z]{3}\d{3,4}', [(' ', ''), ('-', '')])),
+        'marca': campo(['MARCA']),
+        'linea': campo([], LINEA_ESTRUCTURADA, ['LÍNEA']),
+        'modelo': campo(['MODELO'], patron(r'\b(19|20)\d{2}\b')),
+        'color': campo(['COLOR']),
+        'clase_vehiculo': campo(['CLASE DE VEHÍCULO'], CLASE_ESTRUCTURADA, ['CLASE']),
+        'tipo_carroceria': campo(['TIPO CARROCERÍA', 'TIPO DE CARROCERÍA', 'CARROCERÍA']),
+        'combustible': campo(['COMBUSTIBLE', 'TIPO DE COMBUSTIBLE']),
+        'numero_motor': campo(['NÚMERO DE MOTOR', 'NO. MOTOR'], 'validar_motor_estructurado', ['MOTOR']),
+        'vin': campo(['VIN', 'NÚMERO DE VIN', 'NO. VIN'], VIN_ESTRUCTURADO),
+        'numero_chasis': campo(['NÚMERO DE CHASIS', 'NO. CHASIS'], VIN_ESTRUCTURADO, ['CHASIS']),
+        'numero_serie': campo(['NÚMERO DE SERIE', 'NO. SERIE'], VIN_ESTRUCTURADO, ['SERIE']),
+        'propietario_nombre': campo(['PROPIETARIO: APELLIDO(S) Y NOMBRE(S)', 'PROPIETARIO', 'APELLIDO(S) Y NOMBRE(S)']),
+        'propietario_identificacion': campo(['IDENTIFICACIÓN', 'IDENTIFICACIÓN DEL PROPIETARIO'], 'validar_identificacion_estructurada'),
+        'fecha_matricula': campo(['FECHA MATRÍCULA', 'FECHA DE MATRÍCULA'], 'validar_fecha_estructurada'),
+    })
+
     def __init__(self, ocr_data):
         self.data = ocr_data
         self.content = ocr_data.get('analyzeResult', {}).get('content', '')
-        self.lines = self.content.split('\n')
+        self.document = OcrDocument(ocr_data.get('analyzeResult', {}))
+        self.lines = self.document.lines
         
-        # Extraer también las palabras individuales si están disponibles
-        self.words = []
-        pages = ocr_data.get('analyzeResult', {}).get('pages', [])
-        for page in pages:
-            if 'words' in page:
-                self.words.extend(page['words'])
+        self._words = None
         
         self.result = {}
     
+    @property
+    def words(self):
+        """
+        Palabras individuales de todas las páginas en arreglos compactos. Es un
+        intermedio compartido: se construye la primera vez que un extractor lo
+        necesita, así pedir solo la placa no paga el costo de cargarlas.
+        """
+        if self._words is None:
+            self._words = WordStore.from_analyze_result(self.data.get('analyzeResult', {}))
+        return self._words
+    
     def find_word_by_content(self, keyword, normalize=True):
         """Encuentra una palabra por su contenido"""
-        keyword_norm = normalize_text(keyword) if normalize else keyword
-        for word in self.words:
-            content = word.get('content', '')
-            content_norm = normalize_text(content) if normalize else content
-            if keyword_norm in content_norm:
-                return word
-        return None
+        index = self.words.find(keyword, normalize)
+        return self.words[index] if index >= 0 else None
     
     def is_valid_document(self):
         """Verificar si es una tarjeta de propiedad válida"""
-        content_upper = self.content.upper()
-        
         # Palabras clave a buscar (sin tildes para mayor flexibilidad)
         keywords = [
             "REPUBLICA DE COLOMBIA",
@@ -49,12 +95,16 @@ class TarjetaPropiedadProcessor:
             "LICENCIA DE TRÁNSITO"
         ]
         
-        return any(keyword in content_upper for keyword in keywords)
+        # El encabezado está en la primera página; el resto del documento no se revisa
+        return self.document.cumple(
+            lambda content: any(keyword in content.upper() for keyword in keywords),
+            PAGINAS_VALIDACION, normalize=False
+        )
     
     def find_line_index(self, keyword):
         """Encontrar el índice de la línea que contiene una palabra clave"""
-        for i, line in enumerate(self.lines):
-            if keyword in normalize_text(line):
+        for i in range(len(self.lines)):
+            if keyword in self.document.normalized_line(i):
                 return i
         return -1
     
@@ -250,14 +300,14 @@ class TarjetaPropiedadProcessor:
             
             if tipo_word:
                 # Buscar la siguiente palabra (que debería ser el valor)
-                tipo_offset = tipo_word.get('spans', [{}])[0].get('offset', 0)
-                tipo_length = tipo_word.get('spans', [{}])[0].get('length', 0)
+                limite = tipo_word.offset + tipo_word.length
+                offsets = self.words.offsets
                 
                 # Encontrar la palabra que viene después por posición
-                for word in self.words:
-                    word_offset = word.get('spans', [{}])[0].get('offset', 0)
-                    if word_offset > tipo_offset + tipo_length and "TIPO" not in word.get('content', ''):
-                        content = word.get('content', '').strip().upper()
+                for i in range(len(self.words)):
+                    if offsets[i] > limite and "TIPO" not in self.words.content(i):
+                        word = self.words[i]
+                        content = word.content.strip().upper()
                         
                         # Verificar si contiene alguna de las palabras clave
                         for keyword, tipo in carroceria_tipos.items():
@@ -272,8 +322,8 @@ class TarjetaPropiedadProcessor:
         
         # Buscar explícitamente patrones específicos en las palabras
         if "tipo_carroceria" not in self.result:
-            for word in self.words:
-                content = word.get('content', '').upper()
+            for i in range(len(self.words)):
+                content = self.words.content(i).upper()
                 
                 # Buscar patrones específicos
                 if "DOBLE CABINA" in content:
@@ -293,9 +343,8 @@ class TarjetaPropiedadProcessor:
         combustible_word = self.find_word_by_content("COMBUSTIBLE")
         if combustible_word:
             # Obtener información de la palabra encontrada
-            span_info = combustible_word.get('span', {}) or combustible_word.get('spans', [{}])[0]
-            offset = span_info.get('offset', 0)
-            length = span_info.get('length', 0)
+            offset = combustible_word.offset
+            length = combustible_word.length
             
             # Lista de combustibles válidos para validar (más específica)
             combustibles_validos = {
@@ -316,27 +365,12 @@ class TarjetaPropiedadProcessor:
                 'ETANOL': 'ETANOL'
             }
             
-            # Buscar las siguientes palabras después de "COMBUSTIBLE"
-            next_words = []
-            for word in self.words:
-                word_span = word.get('span', {}) or word.get('spans', [{}])[0]
-                word_offset = word_span.get('offset', 0)
-                
-                # Si la palabra está después de "COMBUSTIBLE"
-                if word_offset > offset + length:
-                    content = word.get('content', '').strip().upper()
-                    next_words.append({
-                        'content': content,
-                        'offset': word_offset,
-                        'word': word
-                    })
-            
-            # Ordenar por offset para obtener las palabras en orden
-            next_words.sort(key=lambda x: x['offset'])
+            # Buscar las siguientes palabras después de "COMBUSTIBLE", en orden de offset
+            next_words = self.words.after(offset + length, limit=5)
             
             # Buscar combustible válido en las siguientes palabras
-            for next_word in next_words[:5]:  # Revisar hasta 5 palabras siguientes
-                content = next_word['content']
+            for i in next_words:  # Revisar hasta 5 palabras siguientes
+                content = self.words.content(i).strip().upper()
                 
                 # Verificar si es un combustible válido exacto o contiene uno
                 for combustible_key, combustible_value in combustibles_validos.items():
@@ -479,6 +513,11 @@ class TarjetaPropiedadProcessor:
         
         return True
 
+    def validar_motor_estructurado(self, valor):
+        """Número de motor de una celda o par clave-valor, con las reglas del texto"""
+        valor = valor.strip().upper()
+        return valor if self.validate_motor_number(valor) else None
+
     def extract_vin_chasis(self):
         """Extraer VIN, número de serie y chasis"""
         # Patrón para VIN (17 caracteres alfanuméricos)
@@ -674,6 +713,16 @@ class TarjetaPropiedadProcessor:
    
         return resultado
     
+    def validar_identificacion_estructurada(self, valor):
+        """Identificación del propietario ("NIT 900123456" o "CC 12345678") de una celda o par clave-valor"""
+        nit_match = re.search(r'NIT\.?\s*(\d+)', valor, re.IGNORECASE)
+        if nit_match:
+            return f"NIT {nit_match.group(1)}"
+        cc_match = re.search(r'C\.?C\.?\s*(\d+)', valor, re.IGNORECASE)
+        if cc_match:
+            return f"CC {cc_match.group(1)}"
+        return None
+
     def convert_fecha_format(self, fecha_str):
         """Convertir diferentes formatos de fecha a YYYY-MM-DD"""
         try:
@@ -727,6 +776,11 @@ class TarjetaPropiedadProcessor:
         except (ValueError, IndexError, AttributeError):
             return None
 
+
+    def validar_fecha_estructurada(self, valor):
+        """Fecha de matrícula de una celda o par clave-valor, en formato YYYY-MM-DD"""
+        match = re.search(r'\d{1,4}[/\-. ]\d{1,2}[/\-. ]\d{1,4}', valor)
+        return self.convert_fecha_format(match.group(0)) if match else None
     
     def extract_fecha_matricula(self):
         """Extraer fecha de matrícula"""
@@ -792,30 +846,21 @@ class TarjetaPropiedadProcessor:
         
         return False
 
-    def process(self):
-        """Procesar todos los campos y devolver el resultado"""
+    def process(self, campos=None):
+        """Procesar los campos pedidos (todos por defecto) y devolver el resultado"""
         if not self.is_valid_document():
             return {"error": "No es una tarjeta de propiedad válida"}
         
-        self.extract_placa()
-        self.extract_marca()
-        self.extract_linea()
-        self.extract_modelo()
-        self.extract_color()
-        self.extract_clase_vehiculo()
-        self.extract_carroceria_combustible()
-        self.extract_motor()
-        self.extract_vin_chasis()
-        self.extract_propietario()
-        self.extract_fecha_matricula()
-        
-        return self.result
+        # Primero los pares clave-valor y tablas del OCR; el texto solo para lo que falte
+        self.ESTRUCTURADOS.ejecutar(self, self.EXTRACTORES, campos)
+        
+        return self.EXTRACTORES.seleccionar(self.result, campos)
 
 # Función principal para procesar el OCR
-def process_ocr_data(data):
+def process_ocr_data(data, campos=None):
     try:
         processor = TarjetaPropiedadProcessor(data)
-        result = processor.process()
+        result = processor.process(campos)
         return result
     except Exception as e:
         return {"error": str(e)}
@@ -824,14 +869,25 @@ if __name__ == "__main__":
     try:
         parser = argparse.ArgumentParser(description='Procesar datos OCR')
         parser.add_argument('--file', type=str, help='Ruta al archivo JSON con datos OCR')
+        agregar_argumentos(parser)
         parser.add_argument('--placa', type=str, help='Placa del vehículo (opcional)')
+        parser.add_argument('--fields', type=str, help='Campos a extraer separados por coma (opcional, por defecto todos)')
+        parser.add_argument('--debug', action='store_true', help='Volcar a stderr la traza de decisiones de los extractores')
         
         args = parser.parse_args()
         
         # Determinar qué archivo procesar
         file_path = None
         
-        if args.file:
+        if hay_entrada(args):
+            # JSON compacto por stdin o por un descriptor heredado, sin archivo temporal
+            try:
+                data = leer_entrada(args)
+            except json.JSONDecodeError as e:
+                print(f"ERROR: La entrada no contiene JSON válido: {str(e)}", file=sys.stderr)
+                print(json.dumps({"error": f"JSON inválido en la entrada: {str(e)}"}))
+                sys.exit(1)
+        elif args.file:
             # Usar el archivo especificado por argumento
             file_path = args.file
             if not os.path.exists(file_path):
@@ -867,16 +923,21 @@ if __name__ == "__main__":
                 sys.exit(1)
         
         # Procesar los datos
-        result = process_ocr_data(data)
+        result = process_ocr_data(data, parse_fields(args.fields))
         
         # Imprimir resultado como JSON (único output a stdout)
         print(json.dumps(result, indent=4, ensure_ascii=False))
+
+        # Traza de decisiones a stderr solo si falló, hubo baja confianza o se pidió --debug
+        traza.volcar_si(result, args.debug)
         
     except Exception as e:
         # Errores a stderr para depuración
         print(f"ERROR inesperado: {str(e)}", file=sys.stderr)
         print(f"Traceback: {traceback.format_exc()}", file=sys.stderr)
         
+        traza.volcar_si({"error": str(e)})
+
         # Error en formato JSON a stdout para que el proceso JS pueda capturarlo
         print(json.dumps({"error": str(e)}))
         sys.exit(1)
\ No newline at end of file
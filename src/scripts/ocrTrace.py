@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import time
+from collections import deque
+
+# Decisiones que se conservan por documento (las más antiguas se descartan)
+CAPACIDAD_TRAZA = int(os.environ.get('OCR_TRACE_SIZE', '256'))
+
+# OCR_TRACE=1 vuelca la traza siempre (igual que --debug); OCR_TRACE_FILE la
+# agrega a un archivo en lugar de stderr
+TRAZA_SIEMPRE = os.environ.get('OCR_TRACE', '') not in ('', '0')
+ARCHIVO_TRAZA = os.environ.get('OCR_TRACE_FILE') or None
+
+# Campo del resultado con los extractores interrumpidos por tiempo (ver ocrWatchdog)
+CAMPO_INTERRUMPIDOS = 'extractoresInterrumpidos'
+
+class DecisionTrace:
+    """
+    Buffer circular con las decisiones de los extractores (candidatos
+    descartados, validaciones, búsquedas sin resultado). Registrar solo
+    agrega una tupla: el texto se arma al volcar, y se vuelca únicamente si
+    el documento falló, quedó con baja confianza o se pidió depuración. Así
+    stdout lleva solo el resultado y el camino normal no hace I/O.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD_TRAZA):
+        self.eventos = deque(maxlen=capacidad)
+        self.total = 0
+        self.baja_confianza = False
+
+    def registrar(self, evento, **datos):
+        """Anota una decisión: `evento` es una etiqueta fija y `datos` sus valores"""
+        self.eventos.append((time.perf_counter(), evento, datos))
+        self.total += 1
+
+    def marcar_baja_confianza(self, evento, **datos):
+        """Anota una decisión tomada con candidatos por debajo del umbral de confianza"""
+        self.baja_confianza = True
+        self.registrar(evento, **datos)
+
+    def reiniciar(self):
+        self.eventos.clear()
+        self.total = 0
+        self.baja_confianza = False
+
+    def __len__(self):
+        return len(self.eventos)
+
+    def registros(self):
+        """Eventos como diccionarios, con milisegundos desde el primero conservado"""
+        if not self.eventos:
+            return []
+        inicio = self.eventos[0][0]
+        return [
+            {'ms': round((instante - inicio) * 1000, 3), 'evento': evento, **datos}
+            for instante, evento, datos in self.eventos
+        ]
+
+    def motivo(self, result, debug=False):
+        """Por qué hay que volcar la traza de este resultado, o None"""
+        if debug or TRAZA_SIEMPRE:
+            return 'debug'
+        if not isinstance(result, dict) or 'error' in result:
+            return 'error'
+        if result.get(CAMPO_INTERRUMPIDOS):
+            return 'tiempo_agotado'
+        if self.baja_confianza:
+            return 'baja_confianza'
+        return None
+
+    def volcar(self, motivo, destino=None):
+        """Escribe la traza como líneas JSON en `destino` (ruta) o en stderr"""
+        destino = destino or ARCHIVO_TRAZA
+        lineas = [json.dumps({
+            'traza': motivo, 'eventos': len(self.eventos), 'descartados': self.total - len(self.eventos),
+        }, ensure_ascii=False)]
+        lineas += [json.dumps(registro, ensure_ascii=False, default=str) for registro in self.registros()]
+        texto = '\n'.join(lineas) + '\n'
+        if destino:
+            with open(destino, 'a', encoding='utf-8') as file:
+                file.write(texto)
+        else:
+            sys.stderr.write(texto)
+
+    def volcar_si(self, result, debug=False, destino=None):
+        """
+        Vuelca la traza si el resultado lo amerita y la deja vacía para el
+        siguiente documento. Devuelve el motivo del volcado o None.
+        """
+        motivo = self.motivo(result, debug)
+        if motivo:
+            try:
+                self.volcar(motivo, destino)
+            except OSError as e:
+                print(f"No se pudo escribir la traza: {e}", file=sys.stderr)
+        self.reiniciar()
+        return motivo
+
+# Traza del proceso: los scripts procesan un documento a la vez
+traza = DecisionTrace()
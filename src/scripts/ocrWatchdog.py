@@ -0,0 +1,329 @@
+import os
+import re
+import sys
+import ast
+import json
+import glob
+import time
+import signal
+import argparse
+import threading
+from contextlib import contextmanager
+from ocrTrace import traza, CAMPO_INTERRUMPIDOS
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+# Presupuesto de tiempo por extractor (ms). 0 desactiva el límite.
+PRESUPUESTO_EXTRACTOR_MS = int(os.environ.get('OCR_EXTRACTOR_TIMEOUT_MS', '2000'))
+
+# Veces que cada extractor agotó su presupuesto en este proceso
+TIEMPOS_AGOTADOS = {}
+
+class TiempoAgotado(BaseException):
+    """
+    El bloque superó su presupuesto de tiempo. Hereda de BaseException para
+    que los `except Exception` de los extractores no la atrapen y el corte
+    llegue hasta el watchdog.
+    """
+
+def puede_interrumpir():
+    """SIGALRM solo existe en POSIX y solo se atiende en el hilo principal"""
+    return hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+
+@contextmanager
+def presupuesto(milisegundos):
+    """
+    Interrumpe el bloque con TiempoAgotado si tarda más de `milisegundos`.
+    Usa SIGALRM: el motor de `re` revisa las señales mientras busca, así que
+    también corta una expresión atrapada en backtracking. Sin setitimer, fuera
+    del hilo principal o con otro temporizador activo el bloque corre sin
+    límite.
+    """
+    if not milisegundos or milisegundos <= 0 or not puede_interrumpir() or signal.getitimer(signal.ITIMER_REAL)[0] > 0:
+        yield
+        return
+
+    def alarma(signum, frame):
+        raise TiempoAgotado(f"Presupuesto de {milisegundos} ms agotado")
+
+    anterior = signal.signal(signal.SIGALRM, alarma)
+    signal.setitimer(signal.ITIMER_REAL, milisegundos / 1000)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, anterior)
+
+def registrar_tiempo_agotado(nombre, milisegundos):
+    """Cuenta el corte y lo reporta a stderr (stdout queda solo para el resultado)"""
+    TIEMPOS_AGOTADOS[nombre] = TIEMPOS_AGOTADOS.get(nombre, 0) + 1
+    traza.registrar('watchdog.tiempo_agotado', extractor=nombre, presupuesto_ms=milisegundos)
+    print(f"METRICA ocr_extractor_timeout extractor={nombre} presupuesto_ms={milisegundos}", file=sys.stderr)
+
+def ejecutar_con_presupuesto(processor, nombre, funcion, milisegundos=PRESUPUESTO_EXTRACTOR_MS):
+    """
+    Ejecuta `funcion()` con el presupuesto del extractor `nombre`. Si se
+    agota, registra la métrica, anota el extractor en
+    processor.result[CAMPO_INTERRUMPIDOS] y devuelve None para que el
+    procesador siga con los demás campos.
+    """
+    try:
+        with presupuesto(milisegundos):
+            return funcion()
+    except TiempoAgotado:
+        registrar_tiempo_agotado(f"{type(processor).__name__}.{nombre}", milisegundos)
+        result = getattr(processor, 'result', None)
+        if isinstance(result, dict):
+            result.setdefault(CAMPO_INTERRUMPIDOS, []).append(nombre)
+        return None
+
+# --- Auditoría de patrones (fuera de línea) ---
+
+# Tamaños de la entrada bombeada: el segundo es 4 veces el primero, así un
+# patrón lineal tarda ~4 veces más y uno cuadrático ~16
+TAMANOS_AUDITORIA = (200, 800)
+CRECIMIENTO_MAXIMO = 8
+TIEMPO_MINIMO_MS = 0.5
+PRESUPUESTO_AUDITORIA_MS = 1000
+
+FUNCIONES_RE = ('search', 'match', 'fullmatch', 'findall', 'finditer', 'sub', 'subn', 'split', 'compile')
+
+def _es_repeticion(op):
+    return op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, getattr(sre_parse, 'POSSESSIVE_REPEAT', None))
+
+def _repeticiones_anidadas(items, dentro=False):
+    """
+    True si un cuantificador sin tope contiene otro de longitud variable, como
+    (a+)+: el texto se puede repartir entre ambos de muchas formas. Uno de
+    longitud fija adentro, como (?:\\.\\d{3})*, no es ambiguo.
+    """
+    for op, av in items:
+        if _es_repeticion(op):
+            minimo, maximo, sub = av
+            if dentro and minimo != maximo:
+                return True
+            if _repeticiones_anidadas(sub, dentro or maximo is sre_parse.MAXREPEAT):
+                return True
+        elif op is sre_parse.SUBPATTERN:
+            if _repeticiones_anidadas(av[-1], dentro):
+                return True
+        elif op is sre_parse.BRANCH:
+            if any(_repeticiones_anidadas(alternativa, dentro) for alternativa in av[1]):
+                return True
+    return False
+
+def _caracter(op, av):
+    """Un carácter que cumple el elemento (aproximado)"""
+    if op is sre_parse.LITERAL:
+        return chr(av)
+    if op is sre_parse.NOT_LITERAL:
+        return 'x' if av != ord('x') else 'y'
+    if op is sre_parse.ANY:
+        return 'a'
+    if op is sre_parse.IN:
+        for sub_op, sub_av in av:
+            if sub_op is sre_parse.LITERAL:
+                return chr(sub_av)
+            if sub_op is sre_parse.RANGE:
+                return chr(sub_av[0])
+            if sub_op is sre_parse.CATEGORY:
+                return {
+                    sre_parse.CATEGORY_DIGIT: '0', sre_parse.CATEGORY_SPACE: ' ', sre_parse.CATEGORY_WORD: 'a',
+                }.get(sub_av, '-')
+        return '-'
+    return ''
+
+class _Corte(Exception):
+    """Fin de la muestra bombeada (se deja sin el resto del patrón para que falle)"""
+
+def _muestra(items, objetivo, veces, partes):
+    """Arma en `partes` un texto que cumple el patrón, con la repetición `objetivo` bombeada"""
+    for op, av in items:
+        if _es_repeticion(op):
+            minimo, maximo, sub = av
+            if id(av) == objetivo:
+                cuerpo = []
+                try:
+                    _muestra(sub, None, 1, cuerpo)
+                except _Corte:
+                    pass
+                partes.append(''.join(cuerpo) * veces)
+                raise _Corte()
+            for _ in range(max(minimo, 1) if maximo else 0):
+                _muestra(sub, objetivo, veces, partes)
+        elif op is sre_parse.SUBPATTERN:
+            _muestra(av[-1], objetivo, veces, partes)
+        elif op is sre_parse.BRANCH:
+            _muestra(av[1][0], objetivo, veces, partes)
+        else:
+            partes.append(_caracter(op, av))
+
+def _repeticiones_sin_tope(items):
+    """Cuantificadores sin tope del patrón (objetivos para bombear)"""
+    for op, av in items:
+        if _es_repeticion(op):
+            if av[1] is sre_parse.MAXREPEAT:
+                yield av
+            yield from _repeticiones_sin_tope(av[2])
+        elif op is sre_parse.SUBPATTERN:
+            yield from _repeticiones_sin_tope(av[-1])
+        elif op is sre_parse.BRANCH:
+            for alternativa in av[1]:
+                yield from _repeticiones_sin_tope(alternativa)
+
+def _entradas(parsed, veces):
+    """Entradas bombeadas para un tamaño: cada repetición sin tope, sola y repetida"""
+    for repeticion in _repeticiones_sin_tope(list(parsed)):
+        partes = []
+        try:
+            _muestra(list(parsed), id(repeticion), veces, partes)
+        except _Corte:
+            pass
+        texto = ''.join(partes)
+        yield texto
+        # Muchos puntos de inicio: el prefijo bombeado se repite a lo largo del texto
+        corto = []
+        try:
+            _muestra(list(parsed), id(repeticion), 2, corto)
+        except _Corte:
+            pass
+        yield ''.join(corto) * (veces // 2)
+
+def _medir(regex, texto):
+    """Mejor tiempo (ms) de re.search sobre el texto, o None si agotó el presupuesto"""
+    mejor = None
+    try:
+        with presupuesto(PRESUPUESTO_AUDITORIA_MS):
+            for _ in range(3):
+                inicio = time.perf_counter()
+                regex.search(texto)
+                transcurrido = (time.perf_counter() - inicio) * 1000
+                mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    except TiempoAgotado:
+        return None
+    return mejor
+
+def auditar_patron(patron, flags=0):
+    """
+    Motivos por los que un patrón puede tener tiempo superlineal: cuantificadores
+    anidados o crecimiento medido al bombear sus repeticiones sin tope.
+    """
+    try:
+        regex = re.compile(patron, flags)
+        parsed = sre_parse.parse(patron, flags)
+    except (re.error, TypeError) as e:
+        return [f"no compila: {e}"]
+
+    motivos = []
+    if _repeticiones_anidadas(list(parsed)):
+        motivos.append("cuantificador anidado (backtracking exponencial)")
+
+    pequeno, grande = TAMANOS_AUDITORIA
+    for texto_pequeno, texto_grande in zip(_entradas(parsed, pequeno), _entradas(parsed, grande)):
+        tiempo_pequeno = _medir(regex, texto_pequeno)
+        tiempo_grande = _medir(regex, texto_grande) if tiempo_pequeno is not None else None
+        if tiempo_grande is None:
+            motivos.append(f"agota {PRESUPUESTO_AUDITORIA_MS} ms con una entrada de {len(texto_grande)} caracteres")
+            break
+        crecimiento = tiempo_grande / tiempo_pequeno if tiempo_pequeno else 0
+        if tiempo_grande >= TIEMPO_MINIMO_MS and crecimiento > CRECIMIENTO_MAXIMO:
+            motivos.append(
+                f"crecimiento superlineal: x{crecimiento:.0f} al cuadruplicar la entrada "
+                f"({tiempo_grande:.1f} ms con {len(texto_grande)} caracteres)"
+            )
+            break
+    return motivos
+
+def _flags(nodo):
+    """Flags constantes de una llamada re.* (re.IGNORECASE, re.I | re.M...)"""
+    if isinstance(nodo, ast.Attribute) and isinstance(nodo.value, ast.Name) and nodo.value.id == 're':
+        return getattr(re, nodo.attr, 0)
+    if isinstance(nodo, ast.BinOp) and isinstance(nodo.op, ast.BitOr):
+        return _flags(nodo.left) | _flags(nodo.right)
+    return 0
+
+def patrones_de_archivo(ruta):
+    """
+    (línea, patrón, flags) de los literales usados como patrón en un script:
+    primer argumento de re.*, variables *pattern*/*patron* y sus listas
+    """
+    with open(ruta, 'r', encoding='utf-8') as file:
+        arbol = ast.parse(file.read(), ruta)
+
+    encontrados = []
+    def agregar(nodo, flags=0):
+        if isinstance(nodo, ast.Constant) and isinstance(nodo.value, str):
+            encontrados.append((nodo.lineno, nodo.value, flags))
+        elif isinstance(nodo, (ast.List, ast.Tuple)):
+            for elemento in nodo.elts:
+                agregar(elemento, flags)
+
+    for nodo in ast.walk(arbol):
+        if isinstance(nodo, ast.Call) and isinstance(nodo.func, ast.Attribute) \
+                and isinstance(nodo.func.value, ast.Name) and nodo.func.value.id == 're' \
+                and nodo.func.attr in FUNCIONES_RE and nodo.args:
+            flags = 0
+            posicion_flags = 3 if nodo.func.attr in ('sub', 'subn') else 2
+            if len(nodo.args) > posicion_flags:
+                flags = _flags(nodo.args[posicion_flags])
+            for keyword in nodo.keywords:
+                if keyword.arg == 'flags':
+                    flags = _flags(keyword.value)
+            agregar(nodo.args[0], flags)
+        elif isinstance(nodo, ast.Assign):
+            nombres = [t.id.lower() for t in nodo.targets if isinstance(t, ast.Name)]
+            if any('pattern' in nombre or 'patron' in nombre for nombre in nombres):
+                agregar(nodo.value)
+
+    # Un mismo literal puede aparecer como variable y como argumento
+    unicos = {}
+    for linea, patron, flags in encontrados:
+        clave = (patron, flags)
+        unicos[clave] = min(linea, unicos.get(clave, linea))
+    return sorted((linea, patron, flags) for (patron, flags), linea in unicos.items())
+
+def patrones_de_reglas(ruta):
+    """(campo, patrón, flags) de un archivo de reglas JSON (ver ocrRules)"""
+    with open(ruta, 'r', encoding='utf-8') as file:
+        reglas = json.load(file)
+    resultado = []
+    for nombre, spec in (reglas.get('patrones') or {}).items():
+        patron = spec.get('regex', '')
+        if spec.get('por_cada_mes'):
+            patron = patron.replace('{mes}', 'enero')
+        resultado.append((f"patrones.{nombre}", patron, re.IGNORECASE if spec.get('ignorar_mayusculas') else 0))
+    return resultado
+
+def auditar(rutas):
+    """Hallazgos de la auditoría sobre scripts .py y reglas .json"""
+    hallazgos = []
+    for ruta in rutas:
+        patrones = patrones_de_reglas(ruta) if ruta.endswith('.json') else patrones_de_archivo(ruta)
+        for ubicacion, patron, flags in patrones:
+            motivos = auditar_patron(patron, flags)
+            if motivos:
+                hallazgos.append({
+                    'archivo': os.path.basename(ruta),
+                    'ubicacion': ubicacion,
+                    'patron': patron,
+                    'motivos': motivos,
+                })
+    return hallazgos
+
+# Ejecución principal: auditoría de patrones
+if __name__ == "__main__":
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Auditar patrones de los extractores OCR en busca de tiempos superlineales')
+    parser.add_argument('rutas', nargs='*', help='Scripts .py o reglas .json (por defecto ocr*.py y reglas/*.json)')
+    parser.add_argument('--estricto', action='store_true', help='Salir con código 1 si hay hallazgos')
+    args = parser.parse_args()
+
+    rutas = args.rutas or sorted(
+        glob.glob(os.path.join(directorio, 'ocr*.py')) + glob.glob(os.path.join(directorio, 'reglas', '*.json'))
+    )
+    hallazgos = auditar(rutas)
+    print(json.dumps({'patrones_con_hallazgos': len(hallazgos), 'hallazgos': hallazgos}, indent=4, ensure_ascii=False))
+    sys.exit(1 if args.estricto and hallazgos else 0)
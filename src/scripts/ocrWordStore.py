@@ -0,0 +1,204 @@
+from array import array
+from bisect import bisect_right
+from ocrNormalize import normalize_text
+
+# Cantidad de coordenadas del polígono de una palabra (4 puntos x, y)
+COORDENADAS_POLIGONO = 8
+
+class Word:
+    """
+    Vista liviana de una palabra del WordStore. No copia datos: lee los
+    arreglos del store por índice. Conserva `get()` con las claves del JSON
+    de Azure ('content', 'confidence', 'spans', 'polygon') para el código que
+    todavía trata las palabras como diccionarios.
+    """
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    @property
+    def content(self):
+        return self.store.contents[self.store.content_ids[self.index]]
+
+    @property
+    def offset(self):
+        return self.store.offsets[self.index]
+
+    @property
+    def length(self):
+        return self.store.lengths[self.index]
+
+    @property
+    def confidence(self):
+        return self.store.confidences[self.index]
+
+    @property
+    def page(self):
+        return self.store.pages[self.index]
+
+    @property
+    def polygon(self):
+        inicio = self.index * COORDENADAS_POLIGONO
+        return list(self.store.polygons[inicio:inicio + COORDENADAS_POLIGONO])
+
+    def get(self, key, default=None):
+        if key == 'content':
+            return self.content
+        if key == 'confidence':
+            return self.confidence
+        if key == 'polygon':
+            return self.polygon
+        if key == 'spans':
+            return [{'offset': self.offset, 'length': self.length}]
+        if key == 'span':
+            return {'offset': self.offset, 'length': self.length}
+        return default
+
+    def __repr__(self):
+        return f"Word({self.content!r}, offset={self.offset}, page={self.page}, confidence={self.confidence:.3f})"
+
+class WordStore:
+    """
+    Palabras de todas las páginas de un analyzeResult guardadas en arreglos
+    paralelos (offset, longitud, confianza, página y polígono) más una tabla
+    de contenidos internados. Evita mantener un diccionario con `spans` y
+    `polygon` por cada palabra: en documentos de varias páginas la memoria
+    baja a una fracción y recorrer las palabras es más rápido.
+
+    Las palabras quedan en el mismo orden del JSON (página por página).
+    """
+
+    def __init__(self):
+        self.offsets = array('q')
+        self.lengths = array('l')
+        self.confidences = array('d')
+        self.pages = array('l')
+        self.polygons = array('f')
+        self.content_ids = array('l')
+        self.contents = []
+        self._content_index = {}
+        # Rango [inicio, fin) de índices de palabras por número de página
+        self.page_ranges = {}
+        self._normalized = None
+        self._offsets_sorted = None
+
+    @classmethod
+    def from_analyze_result(cls, analyze_result, max_pages=None):
+        """
+        Construye el store a partir de analyzeResult (o del JSON completo con
+        analyzeResult). Con `max_pages` solo se cargan las primeras páginas.
+        """
+        if 'analyzeResult' in analyze_result:
+            analyze_result = analyze_result.get('analyzeResult') or {}
+
+        store = cls()
+        pages = analyze_result.get('pages', []) or []
+        for page_idx, page in enumerate(pages[:max_pages]):
+            page_number = page.get('pageNumber', page_idx + 1)
+            inicio = len(store.offsets)
+            store.extend(page.get('words', []) or [], page_number)
+            store.page_ranges[page_number] = (inicio, len(store.offsets))
+
+        return store
+
+    def extend(self, words, page_number):
+        """Agrega las palabras de una página en formato JSON de Azure"""
+        spans = [word.get('span') or (word.get('spans') or [{}])[0] for word in words]
+        self.offsets.fromlist([span.get('offset', 0) for span in spans])
+        self.lengths.fromlist([span.get('length', 0) for span in spans])
+        self.confidences.fromlist([float(word.get('confidence', 0) or 0) for word in words])
+        self.pages.fromlist([page_number] * len(words))
+
+        for word in words:
+            polygon = word.get('polygon') or ()
+            if len(polygon) == COORDENADAS_POLIGONO:
+                self.polygons.fromlist(polygon)
+            else:
+                polygon = list(polygon[:COORDENADAS_POLIGONO])
+                self.polygons.fromlist(polygon + [0.0] * (COORDENADAS_POLIGONO - len(polygon)))
+
+        # Cada contenido distinto se guarda una sola vez; las palabras guardan su id
+        index = self._content_index
+        nuevos = len(index)
+        self.content_ids.fromlist([index.setdefault(word.get('content', ''), len(index)) for word in words])
+        self.contents.extend(list(index)[nuevos:])
+
+        self._normalized = None
+        self._offsets_sorted = None
+
+    def append(self, word, page_number):
+        """Agrega una palabra en formato JSON de Azure"""
+        self.extend([word], page_number)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return Word(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield Word(self, index)
+
+    def content(self, index):
+        """Texto de la palabra en la posición `index`"""
+        return self.contents[self.content_ids[index]]
+
+    def page_range(self, page_number):
+        """Índices de las palabras de una página (range vacío si no existe)"""
+        inicio, fin = self.page_ranges.get(page_number, (0, 0))
+        return range(inicio, fin)
+
+    def first_page(self):
+        """Número de la primera página o None si no hay páginas"""
+        return next(iter(self.page_ranges), None)
+
+    def normalized_contents(self):
+        """Contenidos normalizados, calculados una sola vez por contenido único"""
+        if self._normalized is None:
+            self._normalized = [normalize_text(content) for content in self.contents]
+        return self._normalized
+
+    def find(self, keyword, normalize=True, indices=None):
+        """
+        Índice de la primera palabra que contiene `keyword` o -1. La comparación
+        se resuelve una vez por contenido único y luego se recorren solo ids.
+        """
+        if normalize:
+            keyword = normalize_text(keyword)
+            contents = self.normalized_contents()
+        else:
+            contents = self.contents
+
+        matching = {cid for cid, content in enumerate(contents) if keyword in content}
+        if not matching:
+            return -1
+
+        content_ids = self.content_ids
+        for index in (indices if indices is not None else range(len(self))):
+            if content_ids[index] in matching:
+                return index
+        return -1
+
+    def after(self, offset, limit=None):
+        """
+        Índices de las palabras que empiezan después de `offset`, ordenados por
+        offset (en empate se respeta el orden del documento)
+        """
+        if self._offsets_sorted is None:
+            offsets = self.offsets
+            self._offsets_sorted = all(offsets[i] <= offsets[i + 1] for i in range(len(offsets) - 1))
+
+        if self._offsets_sorted:
+            inicio = bisect_right(self.offsets, offset)
+            fin = len(self) if limit is None else min(len(self), inicio + limit)
+            return range(inicio, fin)
+
+        indices = sorted((i for i in range(len(self)) if self.offsets[i] > offset), key=self.offsets.__getitem__)
+        return indices if limit is None else indices[:limit]
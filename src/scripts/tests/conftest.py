@@ -0,0 +1,46 @@
+import os
+import sys
+import gzip
+import json
+import pytest
+
+# Los scripts se importan por nombre (como los ejecuta Node desde src/scripts)
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPTS not in sys.path:
+    sys.path.insert(0, SCRIPTS)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def cargar_ocr(nombre):
+    """analyzeResult de un documento de fixtures/ocr (JSON comprimido)"""
+    with gzip.open(os.path.join(FIXTURES, 'ocr', f'{nombre}.json.gz'), 'rt', encoding='utf-8') as file:
+        return json.load(file)
+
+def analyze_result(lineas, paginas=None):
+    """
+    analyzeResult mínimo a partir de líneas de palabras [(texto, confianza)]:
+    content con las líneas separadas por '\\n' y cada palabra con su span.
+    `paginas` indica cuántas líneas van en cada página (una sola por defecto).
+    """
+    paginas = paginas or [len(lineas)]
+    content, pages, linea = '', [], 0
+    for numero, cantidad in enumerate(paginas, start=1):
+        inicio_pagina, words = len(content), []
+        for palabras in lineas[linea:linea + cantidad]:
+            for k, (texto, confianza) in enumerate(palabras):
+                if k:
+                    content += ' '
+                words.append({'content': texto, 'confidence': confianza, 'span': {'offset': len(content), 'length': len(texto)}})
+                content += texto
+            content += '\n'
+        linea += cantidad
+        pages.append({'pageNumber': numero, 'spans': [{'offset': inicio_pagina, 'length': len(content) - inicio_pagina}], 'words': words})
+    return {'analyzeResult': {'content': content.rstrip('\n'), 'pages': pages}}
+
+@pytest.fixture(autouse=True)
+def _traza_limpia():
+    """Cada prueba empieza sin decisiones registradas de la anterior"""
+    from ocrTrace import traza
+    traza.reiniciar()
+    yield
+    traza.reiniciar()
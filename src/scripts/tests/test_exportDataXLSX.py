@@ -0,0 +1,283 @@
+import csv
+import io
+import os
+import json
+import zipfile
+import threading
+import pytest
+import exportDataXLSX
+from exportDataXLSX import (
+    explotar_detalles, exportar, exportar_fragmentado, export_generico, planear_fragmentos, construir_fila,
+    PlanAplanado, DETALLES_LIQUIDACION, COLUMNAS_LIQUIDACION,
+)
+
+def liquidacion(numero, periodo_end='2025-03-31', sede='VILLANUEVA', hijos=True):
+    """Liquidación mínima con un registro en cada tabla de detalle"""
+    return {
+        'id': f'liq-{numero}',
+        'periodo_start': periodo_end[:8] + '01' if periodo_end else '',
+        'periodo_end': periodo_end,
+        'salario_devengado': '1423500',
+        'auxilio_transporte': '200000',
+        'salud': '56940',
+        'pension': '56940',
+        'total_anticipos': '100000',
+        'dias_laborados': 30,
+        'conductor': {
+            'id': f'c{numero}', 'nombre': 'Juan', 'apellido': 'Pérez',
+            'numero_identificacion': str(1000000 + numero), 'sede_trabajo': sede,
+        },
+        'anticipos': [{'fecha': '2025-03-10', 'concepto': 'Anticipo', 'valor': '100000'}] if hijos else [],
+        'bonificaciones': [{'name': 'Bono', 'values': [{'mes': 'Mar', 'quantity': 2}], 'value': 30000}] if hijos else [],
+        'recargos': [{'empresa': {'nombre': 'Emp'}, 'valor': 12000, 'pag_cliente': False, 'mes': 'Mar'}] if hijos else [],
+        'mantenimientos': [{'values': '[{"mes": "Mar", "quantity": 1}]', 'value': 10000}] if hijos else [],
+    }
+
+def _datos_ida_y_vuelta():
+    """Dos periodos, con un salario base nulo y días laborados ilegibles"""
+    datos = [liquidacion(1), liquidacion(2), liquidacion(3, '2025-04-30')]
+    datos[0]['conductor']['salario_base'] = '1423500'
+    datos[1]['conductor']['salario_base'] = None
+    datos[2]['dias_laborados'] = 'x'
+    return datos
+
+# Filas esperadas en el orden de exportación: periodos en orden alfabético
+ESPERADAS = [
+    ('ABRIL 2025', construir_fila(_datos_ida_y_vuelta()[2], 0)),
+    ('MARZO 2025', construir_fila(_datos_ida_y_vuelta()[0], 0)),
+    ('MARZO 2025', construir_fila(_datos_ida_y_vuelta()[1], 1)),
+]
+
+def test_csv_ida_y_vuelta(tmp_path):
+    ruta = exportar(_datos_ida_y_vuelta(), str(tmp_path / 'liq.csv'), 'csv')
+    with open(ruta, newline='', encoding='utf-8-sig') as file:
+        filas = list(csv.reader(file))
+    assert filas[0] == ['Periodo'] + COLUMNAS_LIQUIDACION
+    assert filas[1:] == [
+        [periodo] + ['' if fila[col] is None else str(fila[col]) for col in COLUMNAS_LIQUIDACION]
+        for periodo, fila in ESPERADAS
+    ]
+
+@pytest.mark.parametrize('formato', ['parquet', 'arrow'])
+def test_columnar_ida_y_vuelta(tmp_path, formato):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    ruta = exportar(_datos_ida_y_vuelta(), str(tmp_path / f'liq.{formato}'), formato)
+    tabla = pq.read_table(ruta) if formato == 'parquet' else pa.ipc.open_file(ruta).read_all()
+    assert tabla.column_names == ['Periodo'] + COLUMNAS_LIQUIDACION
+    assert tabla.schema.field('Salario Devengado').type == pa.float64()
+    assert tabla.schema.field('Días Laborados').type == pa.int32()
+    columnas = tabla.to_pydict()
+    assert columnas['Periodo'] == [periodo for periodo, _ in ESPERADAS]
+    assert columnas['Conductor'] == [fila['Conductor'] for _, fila in ESPERADAS]
+    assert columnas['Total a Pagar Básico'] == [fila['Total a Pagar Básico'] for _, fila in ESPERADAS]
+    assert columnas['Indice'] == [1, 1, 2]
+    # Los valores que no se pueden convertir quedan nulos, no en cero
+    assert columnas['Salario Base'] == [0.0, 1423500.0, None]
+    assert columnas['Días Laborados'] == [None, 30, 30]
+
+def test_ods_ida_y_vuelta(tmp_path):
+    pytest.importorskip('odf')
+    pd = pytest.importorskip('pandas')
+    ruta = exportar(_datos_ida_y_vuelta(), str(tmp_path / 'liq.ods'), 'ods', detalles=True)
+    hojas = pd.read_excel(ruta, sheet_name=None, engine='odf')
+    assert list(hojas)[:2] == ['ABRIL 2025', 'MARZO 2025']
+    assert [titulo for titulo, _ in DETALLES_LIQUIDACION.values()] == list(hojas)[2:]
+    marzo = hojas['MARZO 2025']
+    assert list(marzo.columns) == COLUMNAS_LIQUIDACION
+    assert marzo['Conductor'].tolist() == ['Juan Pérez', 'Juan Pérez']
+    assert marzo['Total a Pagar Básico'].tolist() == [fila['Total a Pagar Básico'] for _, fila in ESPERADAS[1:]]
+    assert marzo['Salario Base'].isna().tolist() == [False, True]
+    assert len(hojas[DETALLES_LIQUIDACION['anticipos'][0]]) == 3
+
+VEHICULOS = [
+    {'placa': 'ABC123', 'modelo': 2020, 'propietario': {'nombre': 'Ana', 'contacto': {'tel': '310'}},
+     'soat': {}, 'documentos': [{'nombre': 'SOAT', 'valor': 'vigente'}], 'tags': ['a', 'b']},
+    {'placa': 'XYZ987', 'modelo': 2018, 'propietario': {'nombre': 'Luis'}, 'kilometraje': 1500.5},
+]
+
+def test_plan_aplanado_rutas_anidadas_y_listas():
+    plan = PlanAplanado.inferir(VEHICULOS)
+    assert plan.columnas == [
+        'placa', 'modelo', 'propietario_nombre', 'propietario_contacto_tel', 'documentos', 'tags', 'kilometraje',
+    ]
+    assert plan.aplicar(VEHICULOS[0]) == ['ABC123', 2020, 'Ana', '310', 'SOAT: vigente', 'a, b', None]
+    # Registros disparejos: lo que falta queda nulo
+    assert plan.aplicar(VEHICULOS[1]) == ['XYZ987', 2018, 'Luis', None, None, None, 1500.5]
+    assert plan.aplicar('no es un registro') == [None] * len(plan.columnas)
+
+def test_plan_aplanado_claves_fuera_de_la_muestra_y_diccionarios():
+    plan = PlanAplanado.inferir(VEHICULOS, muestra=1)
+    assert 'kilometraje' not in plan.columnas
+    # Un diccionario donde la muestra tenía un valor simple se serializa; uno vacío no
+    fila = plan.aplicar({'placa': {'vieja': 'ABC12'}, 'tags': [], 'propietario': {}})
+    assert fila[:3] == ['{"vieja": "ABC12"}', None, None]
+    assert plan.aplicar({'placa': {}})[0] is None
+
+def test_plan_aplanado_colision_de_nombres():
+    plan = PlanAplanado.inferir([{'a_b': 1, 'a': {'b': 2}, 'a_b_2': 3}])
+    assert plan.columnas == ['a_b', 'a_b_2', 'a_b_2_2']
+    assert plan.aplicar({'a_b': 1, 'a': {'b': 2}, 'a_b_2': 3}) == [1, 2, 3]
+
+def test_export_generico_csv(tmp_path):
+    ruta = exportar(VEHICULOS, str(tmp_path / 'vehiculos.csv'), 'csv')
+    with open(ruta, newline='', encoding='utf-8-sig') as file:
+        filas = list(csv.reader(file))
+    assert filas[0] == PlanAplanado.inferir(VEHICULOS).columnas
+    assert filas[1:] == [
+        ['ABC123', '2020', 'Ana', '310', 'SOAT: vigente', 'a, b', ''],
+        ['XYZ987', '2018', 'Luis', '', '', '', '1500.5'],
+    ]
+
+def test_export_generico_parquet_infiere_tipos(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    datos = VEHICULOS + [{'placa': 'QWE456', 'modelo': 'sin dato'}]
+    # Con el texto dentro de la muestra la columna sería string
+    mixta = pq.read_table(export_generico(datos, str(tmp_path / 'mixta.parquet'), 'parquet'))
+    assert mixta.schema.field('modelo').type == pa.string()
+    tabla = pq.read_table(export_generico(datos, str(tmp_path / 'v.parquet'), 'parquet', muestra=2))
+    assert tabla.schema.field('modelo').type == pa.int64()
+    assert tabla.schema.field('kilometraje').type == pa.float64()
+    columnas = tabla.to_pydict()
+    # El valor que no encaja en el tipo inferido queda nulo
+    assert columnas['modelo'] == [2020, 2018, None]
+    assert columnas['propietario_nombre'] == ['Ana', 'Luis', None]
+
+def test_explotar_detalles_replica_la_clave():
+    datos = [liquidacion(1), liquidacion(2, hijos=False), liquidacion(3, '2025-04-30')]
+    detalles = explotar_detalles(datos)
+    assert list(detalles) == list(DETALLES_LIQUIDACION)
+    bonificaciones = detalles['bonificaciones']
+    assert bonificaciones['Liquidación'] == ['liq-1', 'liq-3']
+    assert bonificaciones['Periodo'] == ['MARZO 2025', 'ABRIL 2025']
+    assert bonificaciones['Conductor'] == ['Juan Pérez', 'Juan Pérez']
+    assert bonificaciones['Cantidad'] == [2, 2]
+    assert bonificaciones['Valor Total'] == [60000, 60000]
+    # `values` también llega como texto JSON
+    assert detalles['mantenimientos']['Valor Total'] == [10000, 10000]
+
+@pytest.mark.parametrize('formato,extension', [('csv', '.csv'), ('parquet', '.parquet'), ('arrow', '.arrow')])
+def test_detalles_de_una_tabla_se_entregan_en_un_zip(tmp_path, formato, extension):
+    if formato != 'csv':
+        pytest.importorskip('pyarrow')
+    ruta = exportar([liquidacion(1), liquidacion(2)], str(tmp_path / f'liq{extension}'), formato, detalles=True)
+    assert ruta == str(tmp_path / 'liq.zip')
+    # En el directorio solo queda el zip
+    assert os.listdir(tmp_path) == ['liq.zip']
+    with zipfile.ZipFile(ruta) as archivo_zip:
+        nombres = archivo_zip.namelist()
+        assert nombres == [f'liq{extension}'] + [f'liq_{tabla}{extension}' for tabla in DETALLES_LIQUIDACION]
+        if formato == 'csv':
+            texto = archivo_zip.read('liq_anticipos.csv').decode('utf-8-sig')
+            filas = list(csv.reader(io.StringIO(texto)))
+            assert filas[0][:4] == ['Liquidación', 'Periodo', 'Conductor', 'Identificación']
+            assert len(filas) == 3
+
+def test_detalles_en_xlsx_son_hojas(tmp_path):
+    from openpyxl import load_workbook
+    ruta = exportar([liquidacion(1)], str(tmp_path / 'liq.xlsx'), 'xlsx', detalles=True)
+    assert os.listdir(tmp_path) == ['liq.xlsx']
+    hojas = load_workbook(ruta, read_only=True).sheetnames
+    assert [titulo for titulo, _ in DETALLES_LIQUIDACION.values()] == hojas[-len(DETALLES_LIQUIDACION):]
+
+def test_detalles_que_fallan_no_dejan_archivos(tmp_path, monkeypatch):
+    def falla(*args, **kwargs):
+        raise RuntimeError('disco lleno')
+    monkeypatch.setattr(exportDataXLSX, 'explotar_detalles', falla)
+    with pytest.raises(RuntimeError):
+        exportar([liquidacion(1)], str(tmp_path / 'liq.csv'), 'csv', detalles=True)
+    assert os.listdir(tmp_path) == []
+
+def test_planear_fragmentos_no_parte_los_periodos():
+    datos = [liquidacion(i, '2025-01-31') for i in range(3)] + [liquidacion(i, '2025-02-28') for i in range(2)]
+    fragmentos = planear_fragmentos(datos, 'periodo', max_filas=4)
+    assert [(nombre, len(registros)) for nombre, registros in fragmentos] == [('ENERO 2025', 3), ('FEBRERO 2025', 2)]
+    # Dos periodos pequeños comparten fragmento
+    assert [nombre for nombre, _ in planear_fragmentos(datos, 'periodo', max_filas=5)] == ['ENERO 2025 a FEBRERO 2025']
+
+def test_planear_fragmentos_divide_un_grupo_que_excede_el_limite():
+    datos = [liquidacion(i, sede='YOPAL') for i in range(5)]
+    fragmentos = planear_fragmentos(datos, 'sede', max_filas=2)
+    assert [(nombre, len(registros)) for nombre, registros in fragmentos] == [
+        ('YOPAL parte 1', 2), ('YOPAL parte 2', 2), ('YOPAL parte 3', 1),
+    ]
+    assert sum((registros for _, registros in fragmentos), []) == datos
+
+def test_planear_fragmentos_por_bytes():
+    datos = [liquidacion(i) for i in range(10)]
+    por_registro = len(json.dumps(datos, ensure_ascii=False)) // len(datos)
+    fragmentos = planear_fragmentos(datos, 'ninguna', max_bytes=por_registro * 3)
+    assert [len(registros) for _, registros in fragmentos] == [3, 3, 3, 1]
+
+def test_exportacion_fragmentada_en_zip(tmp_path):
+    datos = [liquidacion(i, '2025-01-31') for i in range(3)] + [liquidacion(i, '2025-02-28') for i in range(3)]
+    ruta = exportar_fragmentado(datos, str(tmp_path / 'liq.csv'), 'csv', max_filas=3, trabajadores=1, detalles=True)
+    assert ruta == str(tmp_path / 'liq.zip')
+    assert os.listdir(tmp_path) == ['liq.zip']
+    with zipfile.ZipFile(ruta) as archivo_zip:
+        nombres = sorted(archivo_zip.namelist())
+        principales = [nombre for nombre in nombres if not any(nombre.endswith(f'_{tabla}.csv') for tabla in DETALLES_LIQUIDACION)]
+        assert principales == ['liq_01_ENERO_2025.csv', 'liq_02_FEBRERO_2025.csv']
+        assert len(nombres) == 2 * (1 + len(DETALLES_LIQUIDACION))
+
+def test_exportacion_pequena_no_se_fragmenta(tmp_path):
+    ruta = exportar_fragmentado([liquidacion(1)], str(tmp_path / 'liq.csv'), 'csv', max_filas=10)
+    assert ruta == str(tmp_path / 'liq.csv')
+
+def test_zip_por_descriptor(tmp_path):
+    datos = [liquidacion(i, '2025-01-31') for i in range(2)] + [liquidacion(i, '2025-02-28') for i in range(2)]
+    # Un pipe, como el que hereda el proceso de Node: no se puede hacer seek
+    lectura, fd = os.pipe()
+    recibido = io.BytesIO()
+    lector = threading.Thread(target=lambda: recibido.write(os.fdopen(lectura, 'rb').read()))
+    lector.start()
+    try:
+        ruta = exportar_fragmentado(datos, str(tmp_path / 'liq.csv'), 'csv', max_filas=2, trabajadores=1, zip_fd=fd)
+    finally:
+        lector.join(timeout=30)
+    assert ruta == f'fd:{fd}'
+    # El descriptor queda cerrado (el lector recibió EOF) y en el directorio no queda nada
+    assert not lector.is_alive()
+    with pytest.raises(OSError):
+        os.fstat(fd)
+    assert os.listdir(tmp_path) == []
+    with zipfile.ZipFile(recibido) as archivo_zip:
+        assert sorted(archivo_zip.namelist()) == ['liq_01_ENERO_2025.csv', 'liq_02_FEBRERO_2025.csv']
+        assert archivo_zip.testzip() is None
+
+def _leer_progreso(monkeypatch, exportar_con_progreso, filas_por_avance=2):
+    """Registros JSON que una exportación escribe en el extremo de escritura de un pipe"""
+    lectura, escritura = os.pipe()
+    reportador = exportDataXLSX.ReportadorProgreso(escritura, intervalo=0)
+    monkeypatch.setattr(exportDataXLSX, 'progreso', reportador)
+    monkeypatch.setattr(exportDataXLSX, 'FILAS_POR_AVANCE', filas_por_avance)
+    llamadas = []
+    avance = reportador.avance
+    monkeypatch.setattr(reportador, 'avance', lambda *args, **kwargs: llamadas.append(args) or avance(*args, **kwargs))
+    exportar_con_progreso()
+    reportador.salida.close()
+    with os.fdopen(lectura, encoding='utf-8') as file:
+        return [json.loads(linea) for linea in file], llamadas
+
+@pytest.mark.parametrize('formato', ['xlsx', 'csv', 'ods'])
+def test_progreso_por_descriptor(tmp_path, monkeypatch, formato):
+    datos = [liquidacion(i) for i in range(5)]
+    ruta = str(tmp_path / f'liq.{formato}')
+    registros, llamadas = _leer_progreso(monkeypatch, lambda: exportar(datos, ruta, formato))
+    assert registros[0] == {'etapa': 'procesando', 'filas': 0, 'total': 5, 'porcentaje': 0}
+    assert registros[-1]['etapa'] == 'completado'
+    assert registros[-1]['porcentaje'] == 100.0
+    filas = [registro['filas'] for registro in registros]
+    assert filas == sorted(filas)
+    # Un aviso cada dos filas y uno con el resto, no uno por fila
+    assert [args[0] for args in llamadas] == [2, 2, 1]
+    if formato == 'csv':
+        assert registros[-1]['bytes'] == os.path.getsize(ruta)
+
+def test_progreso_por_descriptor_generico(tmp_path, monkeypatch):
+    ruta = str(tmp_path / 'vehiculos.csv')
+    registros, llamadas = _leer_progreso(monkeypatch, lambda: exportar(VEHICULOS * 3, ruta, 'csv'), filas_por_avance=4)
+    assert [args[0] for args in llamadas] == [4, 2]
+    assert [registro['filas'] for registro in registros] == [0, 4, 6, 6]
+    assert {registro.get('hoja') for registro in registros[1:]} == {'Datos'}
@@ -0,0 +1,52 @@
+import os
+import pytest
+from conftest import analyze_result, cargar_ocr, FIXTURES
+from ocrClassifier import DocumentClassifier, classify_ocr_data, SCRIPTS, PUNTAJE_MINIMO
+
+DOCUMENTOS = sorted(nombre[:-len('.json.gz')] for nombre in os.listdir(os.path.join(FIXTURES, 'ocr')))
+
+def _documento(*lineas, paginas=None):
+    return analyze_result([[(palabra, 0.9) for palabra in linea.split()] for linea in lineas], paginas)
+
+@pytest.mark.parametrize('nombre', DOCUMENTOS)
+def test_clasifica_los_documentos_de_fixtures(nombre):
+    categoria = nombre.rsplit('_', 1)[0]
+    resultado = classify_ocr_data(cargar_ocr(nombre))
+    assert (resultado['categoria'], resultado['script']) == (categoria, SCRIPTS[categoria])
+    # La categoría reconocida gana con margen sobre la siguiente
+    primera, segunda = resultado['ranking'][:2]
+    assert primera['puntaje'] >= 2 * segunda['puntaje']
+    assert sum(item['proporcion'] for item in resultado['ranking']) == pytest.approx(1, abs=0.01)
+
+@pytest.mark.parametrize('lineas,categoria', [
+    (['REPUBLICA DE COLOMBIA', 'IDENTIFICACION PERSONAL', 'CEDULA DE CIUDADANIA', 'FECHA DE NACIMIENTO'], 'CEDULA'),
+    (['LICENCIA DE CONDUCCION', 'CATEGORIA C2', 'RESTRICCIONES'], 'LICENCIA'),
+    (['CONTRATO INDIVIDUAL DE TRABAJO', 'TERMINO INDEFINIDO', 'SALARIO'], 'CONTRATO'),
+    (['LICENCIA DE TRÁNSITO', 'Número de motor', 'Cilindrada'], 'TARJETA_DE_PROPIEDAD'),
+])
+def test_clasifica_documentos_sin_fixture(lineas, categoria):
+    assert classify_ocr_data(_documento(*lineas))['categoria'] == categoria
+
+def test_documento_desconocido_no_tiene_categoria():
+    resultado = classify_ocr_data(_documento('FACTURA DE VENTA', 'SEGURO', 'POLIZA'))
+    assert resultado['ranking'][0]['puntaje'] < PUNTAJE_MINIMO
+    assert (resultado['categoria'], resultado['script']) == (None, None)
+    assert classify_ocr_data(_documento('Hoja en blanco'))['ranking'] == []
+
+def test_solo_se_leen_las_primeras_paginas():
+    data = _documento('Anexo', 'Condiciones generales', 'SEGURO OBLIGATORIO SOAT', paginas=[1, 1, 1])
+    assert classify_ocr_data(data)['categoria'] is None
+    assert classify_ocr_data(data, paginas=None)['categoria'] == 'SOAT'
+
+def test_palabras_contenidas_y_completas():
+    clasificador = DocumentClassifier()
+    # La palabra larga acredita a las que contiene como palabras completas
+    assert clasificador.encontradas('CONTRATO INDIVIDUAL DE TRABAJO') == {'CONTRATO INDIVIDUAL DE TRABAJO', 'CONTRATO'}
+    # Y no cuenta las que aparecen dentro de otra palabra
+    assert 'RTM' not in clasificador.encontradas('CERTIFICADO NO. XRTMZ')
+    assert 'EXTRACONTRACTUAL' in clasificador.encontradas('RC EXTRACONTRACTUAL')
+    assert 'CONTRACTUAL' not in clasificador.encontradas('EXTRACONTRACTUAL')
+
+def test_empates_en_orden_de_declaracion():
+    clasificador = DocumentClassifier({'B': {'UNO': 2}, 'A': {'DOS': 2}})
+    assert [categoria for categoria, _, _ in clasificador.puntuar('DOS UNO')] == ['B', 'A']
@@ -0,0 +1,117 @@
+from conftest import analyze_result
+from ocrCompleteness import evaluar, parse_fecha, process_completeness_data
+
+CEDULA = {
+    'numero_identificacion': '1.188.666.755',
+    'nombre': 'JUAN CARLOS',
+    'apellido': 'PEREZ GOMEZ',
+    'fecha_nacimiento': '14-MAR-1990',
+    'genero': 'M',
+    'tipo_sangre': '0+',
+}
+
+def _cedula(confianza_nombre=0.95):
+    return analyze_result([
+        [('NUMERO', 0.9), ('1.188.666.755', 0.97)],
+        [('APELLIDOS', 0.9), ('PEREZ', 0.96), ('GOMEZ', 0.94)],
+        [('NOMBRES', 0.9), ('JUAN', confianza_nombre), ('CARLOS', confianza_nombre)],
+        [('FECHA', 0.9), ('DE', 0.9), ('NACIMIENTO', 0.9), ('14-MAR-1990', 0.92)],
+        [('G.S.', 0.9), ('RH', 0.9), ('0+', 0.88), ('SEXO', 0.9), ('M', 0.91)],
+    ])
+
+def test_parse_fecha_formatos():
+    assert parse_fecha('14-MAR-1990').isoformat() == '1990-03-14'
+    assert parse_fecha('05/11/2024').isoformat() == '2024-11-05'
+    assert parse_fecha('2024-11-05').isoformat() == '2024-11-05'
+    assert parse_fecha('31/02/2024') is None
+    assert parse_fecha('sin fecha') is None
+
+def test_cedula_completa_es_suficiente():
+    evaluacion = evaluar('CEDULA', CEDULA, _cedula())
+    assert evaluacion['suficiente']
+    assert evaluacion['faltantes'] == []
+    assert evaluacion['datos'] == {
+        'numero_identificacion': '1188666755',
+        'nombre': 'JUAN CARLOS',
+        'apellido': 'PEREZ GOMEZ',
+        'fecha_nacimiento': '1990-03-14',
+        'genero': 'M',
+        'tipo_sangre': 'O+',
+    }
+    assert evaluacion['campos']['nombre']['confianza'] == 0.95
+
+def test_valor_que_no_aparece_en_el_texto_no_se_acepta():
+    # Un valor por defecto o calculado por el procesador no respalda el campo
+    evaluacion = evaluar('CEDULA', {**CEDULA, 'apellido': 'RODRIGUEZ'}, _cedula())
+    campo = evaluacion['campos']['apellido']
+    assert (campo['completo'], campo['respaldado'], campo['aceptado']) == (True, False, False)
+    assert not evaluacion['suficiente']
+    assert evaluacion['criticosFaltantes'] == ['apellido']
+
+def test_confianza_bajo_el_umbral_pide_el_campo():
+    evaluacion = evaluar('CEDULA', CEDULA, _cedula(confianza_nombre=0.4))
+    assert evaluacion['campos']['nombre']['confianza'] == 0.4
+    assert evaluacion['criticosFaltantes'] == ['nombre']
+    assert 'nombre' not in evaluacion['datos']
+    # El umbral es configurable
+    assert evaluar('CEDULA', CEDULA, _cedula(confianza_nombre=0.4), umbral=0.3)['suficiente']
+
+def test_faltante_no_critico_sigue_siendo_suficiente():
+    evaluacion = evaluar('CEDULA', {**CEDULA, 'tipo_sangre': 'Z+', 'genero': None}, _cedula())
+    assert evaluacion['suficiente']
+    assert evaluacion['faltantes'] == ['genero', 'tipo_sangre']
+    assert evaluacion['criticosFaltantes'] == []
+
+def test_resultado_con_error_no_es_suficiente():
+    evaluacion = evaluar('CEDULA', {'error': 'sin texto'}, _cedula())
+    assert not evaluacion['suficiente']
+    assert evaluacion['datos'] == {}
+    assert len(evaluacion['faltantes']) == len(CEDULA)
+
+def _licencia(confianza_expedicion):
+    return analyze_result([
+        [('LICENCIA', 0.9), ('DE', 0.9), ('CONDUCCION', 0.9), ('1188666755', 0.95)],
+        [('FECHA', 0.9), ('EXPEDICION', 0.9), ('05/11/2020', confianza_expedicion)],
+        [('C2', 0.93), ('05/11/2023', 0.9)],
+    ])
+
+LICENCIA = {
+    'validation': True,
+    'fecha_expedicion_licencia': '2020-11-05',
+    'licencia': [{'categoria': 'C2', 'vigencia_hasta': '05/11/2023'}],
+}
+
+def test_licencia_valida_la_identificacion_del_conductor():
+    parametros = {'numero_identificacion': '1188666755'}
+    evaluacion = evaluar('LICENCIA', LICENCIA, _licencia(0.95), parametros)
+    assert evaluacion['suficiente']
+    assert evaluacion['datos']['categorias'] == [{'categoria': 'C2', 'vigencia_hasta': '2023-11-05'}]
+    # Sin validación el número no sale del documento
+    evaluacion = evaluar('LICENCIA', {**LICENCIA, 'validation': False}, _licencia(0.95), parametros)
+    assert evaluacion['criticosFaltantes'] == ['numero_identificacion']
+
+def test_categorias_dependen_de_la_fecha_de_expedicion():
+    evaluacion = evaluar('LICENCIA', LICENCIA, _licencia(0.3), {'numero_identificacion': '1188666755'})
+    campos = evaluacion['campos']
+    # Las categorías están respaldadas, pero sus vigencias salen de una fecha dudosa
+    assert campos['categorias']['respaldado'] and not campos['categorias']['aceptado']
+    assert evaluacion['criticosFaltantes'] == ['fecha_expedicion', 'categorias']
+
+def test_contrato_sede_fuera_del_modelo():
+    data = analyze_result([
+        [('CEDULA', 0.9), ('1188666755', 0.95)],
+        [('FECHA', 0.9), ('INGRESO', 0.9), ('01/02/2024', 0.94)],
+        [('TERMINO', 0.9), ('INDEFINIDO', 0.92)],
+        [('SEDE', 0.9), ('BOGOTA', 0.93)],
+    ])
+    resultado = {
+        'validation': True, 'fecha_ingreso': '01/02/2024',
+        'termino_contrato': 'INDEFINIDO', 'sede_trabajo': 'BOGOTA',
+    }
+    evaluacion = evaluar('CONTRATO', resultado, data, {'numero_identificacion': '1188666755'})
+    assert evaluacion['campos']['sede_trabajo']['valor'] is None
+    assert evaluacion['criticosFaltantes'] == ['sede_trabajo']
+    assert evaluacion['faltantes'] == ['sede_trabajo', 'fecha_terminacion']
+
+def test_categoria_sin_esquema():
+    assert process_completeness_data(_cedula(), 'SOAT') == {'error': 'Categoría sin esquema de completitud: SOAT'}
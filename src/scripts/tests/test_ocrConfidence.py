@@ -0,0 +1,89 @@
+import pytest
+from conftest import cargar_ocr, analyze_result
+from ocrConfidence import ConfidenceMap, Candidato, buscar_en_lineas
+from ocrConsumer import procesar_ocr
+
+FECHA = r'\d{4}-\d{2}-\d{2}'
+
+def _mapa(lineas):
+    data = analyze_result(lineas)
+    return ConfidenceMap(data), data['analyzeResult']['content'].split('\n')
+
+def test_score_estadisticas():
+    mapa, lines = _mapa([[('VENCE', 0.9), ('2024-05-06', 0.4), ('hoy', 0.8)]])
+    candidato = next(buscar_en_lineas(lines, r'2024-05-06 hoy'))
+    inicios, fines = mapa.spans([candidato])
+    assert mapa.score(inicios, fines, 'min')[0] == pytest.approx(0.4)
+    assert mapa.score(inicios, fines, 'mean')[0] == pytest.approx(0.6)
+    assert mapa.score(inicios, fines, 'median')[0] == pytest.approx(0.6)
+    with pytest.raises(ValueError):
+        mapa.score(inicios, fines, 'max')
+
+def test_candidato_sin_palabras_se_acepta():
+    mapa = ConfidenceMap({'analyzeResult': {'content': 'VENCE 2024-05-06', 'pages': [{'pageNumber': 1, 'words': []}]}})
+    assert mapa.es_confiable(Candidato(0, 6, 16, None))
+
+def test_primera_confiable_sin_etiqueta_salta_lecturas_dudosas():
+    mapa, lines = _mapa([[('ABC123', 0.3)], [('texto', 0.9)], [('XYZ987', 0.9)]])
+    candidato = mapa.primera_confiable(buscar_en_lineas(lines, r'[A-Z]{3}\d{3}'))
+    assert candidato.valor.group(0) == 'XYZ987'
+
+def test_primera_confiable_no_salta_a_otra_linea_de_la_ventana():
+    # La fecha junto a la etiqueta es dudosa; la de la línea siguiente (expedición) no la reemplaza
+    mapa, lines = _mapa([
+        [('FECHA', 0.9), ('VENCIMIENTO', 0.9)],
+        [('2024-05-06', 0.42)],
+        [('Expedicion', 0.9), ('2023-05-06', 0.62)],
+    ])
+    candidato = mapa.primera_confiable(buscar_en_lineas(lines, FECHA, range(0, 3), etiqueta='VENCIMIENTO'))
+    assert candidato.valor.group(0) == '2024-05-06'
+
+def test_primera_confiable_desempata_en_la_misma_linea():
+    mapa, lines = _mapa([[('VENCE', 0.9), ('2024-05-06', 0.3), ('2024-06-05', 0.9)], [('2023-01-01', 0.9)]])
+    candidato = mapa.primera_confiable(buscar_en_lineas(lines, FECHA, range(0, 2), etiqueta='VENCE'))
+    assert candidato.valor.group(0) == '2024-06-05'
+
+def test_primera_confiable_pasa_a_la_etiqueta_siguiente():
+    mapa, lines = _mapa([
+        [('VENCE', 0.9), ('2024-05-06', 0.3)],
+        [('Expedicion', 0.9), ('2023-05-06', 0.9)],
+        [('HASTA', 0.9), ('2024-05-07', 0.9)],
+    ])
+    candidatos = list(buscar_en_lineas(lines, FECHA, range(0, 2), etiqueta='VENCE'))
+    candidatos += list(buscar_en_lineas(lines, FECHA, range(2, 3), etiqueta='HASTA'))
+    assert mapa.primera_confiable(candidatos).valor.group(0) == '2024-05-07'
+
+def test_filtrar_conserva_candidatos_con_etiqueta():
+    mapa, lines = _mapa([[('DESDE', 0.9), ('2025-03-26', 0.8), ('HASTA', 0.9), ('2026-03-26', 0.4)], [('2024-01-01', 0.2)]])
+    etiquetados = list(buscar_en_lineas(lines, FECHA, range(0, 1), etiqueta='VIGENCIA'))
+    assert mapa.filtrar(etiquetados) == etiquetados
+    sueltos = list(buscar_en_lineas(lines, FECHA))
+    assert [c.valor.group(0) for c in mapa.filtrar(sueltos)] == ['2025-03-26']
+
+# Documentos en los que filtrar por confianza dentro de la ventana de la etiqueta
+# cambiaba el vencimiento por la fecha de expedición; salida anterior a ocrConfidence
+BASE = [
+    ('SOAT_06', 'SOAT', 'ZXC765', {'placa': 'ZXC765', 'soatVencimiento': '2024-05-06'}),
+    ('SOAT_08', 'SOAT', 'ABC987', {'placa': 'ABC987', 'soatVencimiento': '2023-02-17'}),
+    ('POLIZA_CONTRACTUAL_04', 'POLIZA_CONTRACTUAL', 'QWE456',
+     {'placa': 'QWE456', 'polizaContractualVencimiento': '2026-03-26'}),
+    ('POLIZA_CONTRACTUAL_08', 'POLIZA_CONTRACTUAL', 'TMX123',
+     {'placa': 'TMX123', 'polizaContractualVencimiento': '2025-08-19'}),
+    ('POLIZA_EXTRACONTRACTUAL_03', 'POLIZA_EXTRACONTRACTUAL', 'TMX123',
+     {'placa': 'TMX123', 'poliza_extra_contractual_vencimiento': '2027-01-02'}),
+    ('POLIZA_EXTRACONTRACTUAL_06', 'POLIZA_EXTRACONTRACTUAL', 'ZXC765',
+     {'placa': 'ZXC765', 'poliza_extra_contractual_vencimiento': '2027-01-06'}),
+    ('POLIZA_TODO_RIESGO_01', 'POLIZA_TODO_RIESGO', 'JHG234',
+     {'placa': 'JHG234', 'polizaTodoRiesgoVencimiento': '2023-05-07'}),
+    ('POLIZA_TODO_RIESGO_03', 'POLIZA_TODO_RIESGO', 'ZXC765',
+     {'placa': 'ZXC765', 'polizaTodoRiesgoVencimiento': '2023-09-26'}),
+]
+
+@pytest.mark.parametrize('motor', ['script', 'reglas'])
+@pytest.mark.parametrize('con_placa', [True, False])
+@pytest.mark.parametrize('nombre,categoria,placa,esperado', BASE, ids=[fila[0] for fila in BASE])
+def test_vencimiento_igual_a_la_base(nombre, categoria, placa, esperado, con_placa, motor):
+    parametros = {'placa': placa if con_placa else None}
+    result = procesar_ocr(cargar_ocr(nombre), categoria, parametros, motor=motor)
+    result.pop('ms', None)
+    assert result == esperado
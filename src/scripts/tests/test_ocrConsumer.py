@@ -0,0 +1,61 @@
+import json
+import pytest
+from conftest import cargar_ocr
+from ocrConsumer import OcrConsumer, ColaLista, ColaStream, MemoriaRedis, clave_ocr, clave_resultado
+
+COLA = 'ocr:trabajos'
+
+def _sembrar(cliente, cantidad, stream=False):
+    contenido = json.dumps(cargar_ocr('SOAT_06'))
+    trabajos = []
+    for numero in range(cantidad):
+        trabajo = {'id': f'soat-{numero}', 'sessionId': f's{numero}', 'categoria': 'SOAT', 'parametros': {'placa': 'ZXC765'}}
+        cliente.set(clave_ocr(trabajo), contenido)
+        if stream:
+            cliente.xadd(COLA, {'trabajo': json.dumps(trabajo)})
+        else:
+            cliente.lpush(COLA, json.dumps(trabajo))
+        trabajos.append(trabajo)
+    return trabajos
+
+def _lote_que_falla(consumidor, monkeypatch):
+    """El consumidor toma un lote y muere antes de escribir los resultados"""
+    def falla(tareas):
+        raise RuntimeError('proceso terminado')
+    monkeypatch.setattr(consumidor, '_procesar', falla)
+    with pytest.raises(RuntimeError):
+        consumidor.ejecutar_lote()
+
+def test_lista_devuelve_a_la_cola_los_trabajos_en_curso(monkeypatch):
+    cliente = MemoriaRedis()
+    trabajos = _sembrar(cliente, 3)
+    cola = ColaLista(cliente, COLA, consumidor='ocr-1')
+    _lote_que_falla(OcrConsumer(cliente, cola, lote=2, bloqueo_ms=0), monkeypatch)
+    assert len(cliente.lrange(cola.procesando, 0, -1)) == 2
+
+    # Al reiniciar con el mismo nombre no se pierde ningún trabajo
+    with OcrConsumer(cliente, ColaLista(cliente, COLA, consumidor='ocr-1'), lote=2, bloqueo_ms=0) as consumidor:
+        estadisticas = consumidor.ejecutar(hasta_vaciar=True)
+    assert estadisticas['trabajos'] == 3
+    assert cliente.lrange(cola.procesando, 0, -1) == []
+    for trabajo in trabajos:
+        assert json.loads(cliente.get(clave_resultado(trabajo)))['soatVencimiento'] == '2024-05-06'
+
+def test_stream_reclama_trabajos_abandonados(monkeypatch):
+    cliente = MemoriaRedis()
+    trabajos = _sembrar(cliente, 3, stream=True)
+    _lote_que_falla(OcrConsumer(cliente, ColaStream(cliente, COLA, consumidor='a'), lote=2, bloqueo_ms=0), monkeypatch)
+    assert cliente.xpending_count(COLA, 'ocr-consumidores') == 2
+
+    with OcrConsumer(cliente, ColaStream(cliente, COLA, consumidor='b', reclamo_ms=0), lote=2, bloqueo_ms=0) as consumidor:
+        estadisticas = consumidor.ejecutar(hasta_vaciar=True)
+    assert estadisticas['trabajos'] == 3
+    assert cliente.xpending_count(COLA, 'ocr-consumidores') == 0
+    assert all(cliente.get(clave_resultado(trabajo)) for trabajo in trabajos)
+
+def test_stream_no_reclama_trabajos_recientes(monkeypatch):
+    cliente = MemoriaRedis()
+    _sembrar(cliente, 2, stream=True)
+    _lote_que_falla(OcrConsumer(cliente, ColaStream(cliente, COLA, consumidor='a'), lote=2, bloqueo_ms=0), monkeypatch)
+    # Dentro del plazo de reclamo el trabajo sigue siendo del otro consumidor
+    assert ColaStream(cliente, COLA, consumidor='b', reclamo_ms=60000).tomar(lote=2, bloqueo_ms=0) == []
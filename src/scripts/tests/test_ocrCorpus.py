@@ -0,0 +1,89 @@
+import os
+import json
+import pytest
+from conftest import cargar_ocr, FIXTURES
+import ocrCorpus
+from ocrCorpus import PackedCorpus, cargar, empaquetar, fuentes_directorio, huella_documento, referencia
+from ocrSOAT import process_soat_data
+
+DOCUMENTOS = sorted(nombre[:-len('.json.gz')] for nombre in os.listdir(os.path.join(FIXTURES, 'ocr')))
+
+def _fuentes():
+    return [(nombre, cargar_ocr(nombre), nombre.rsplit('_', 1)[0]) for nombre in DOCUMENTOS]
+
+@pytest.fixture(params=[6, 0], ids=['zlib', 'sin_comprimir'])
+def corpus(request, tmp_path):
+    ruta = str(tmp_path / 'corpus.pack')
+    assert empaquetar(_fuentes(), ruta, nivel=request.param) == len(DOCUMENTOS)
+    with PackedCorpus(ruta) as corpus:
+        yield corpus
+
+def test_ida_y_vuelta(corpus):
+    assert len(corpus) == len(DOCUMENTOS)
+    assert corpus.ids() == DOCUMENTOS
+    assert corpus.ids('SOAT') == ['SOAT_06', 'SOAT_08']
+    for nombre in DOCUMENTOS:
+        original = cargar_ocr(nombre)
+        # Solo se guarda el analyzeResult: el resto del envoltorio (status...) no lo usan los procesadores
+        assert corpus.ocr_data(nombre) == {'analyzeResult': original['analyzeResult']}
+        info = corpus.info(nombre)
+        assert info['hash'] == huella_documento(original)
+        assert info['paginas'] == len(original['analyzeResult']['pages'])
+        assert info['categoria'] == nombre.rsplit('_', 1)[0]
+    assert 'SOAT_06' in corpus and 'SOAT_99' not in corpus
+
+def test_content_por_tramos(corpus):
+    # Con tildes: los offsets son bytes UTF-8, no caracteres
+    content = cargar_ocr('TECNOMECANICA_02')['analyzeResult']['content']
+    crudo = content.encode('utf-8')
+    assert corpus.content('TECNOMECANICA_02') == content
+    assert corpus.content('TECNOMECANICA_02', 10, 50) == crudo[10:50].decode('utf-8', errors='ignore')
+    # El tramo no se sale del documento aunque `fin` pase del final
+    assert corpus.content('TECNOMECANICA_02', len(crudo) - 5, len(crudo) + 100) == crudo[-5:].decode('utf-8')
+    # Cortar a mitad de un carácter multibyte lo descarta en lugar de fallar
+    multibyte = next(i for i, byte in enumerate(crudo) if byte >= 0x80)
+    assert corpus.content('TECNOMECANICA_02', 0, multibyte + 1) == crudo[:multibyte].decode('utf-8')
+
+def test_documento_sin_content(tmp_path):
+    ruta = str(tmp_path / 'corpus.pack')
+    empaquetar([('vacio', {'analyzeResult': {'pages': []}}, None)], ruta)
+    with PackedCorpus(ruta) as corpus:
+        assert corpus.content('vacio') == ''
+        assert corpus.ocr_data('vacio') == {'analyzeResult': {'pages': [], 'content': ''}}
+
+def test_referencias_y_procesadores(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocrCorpus, '_abiertos', {})
+    ruta = str(tmp_path / 'corpus.pack')
+    empaquetar(_fuentes(), ruta)
+    fuente = referencia(ruta, 'SOAT_06')
+    assert fuente == f'{ruta}::SOAT_06'
+    assert process_soat_data(cargar(fuente)) == process_soat_data(cargar_ocr('SOAT_06'))
+    # Cada proceso abre el corpus una sola vez
+    assert ocrCorpus.abrir(ruta) is ocrCorpus.abrir(ruta)
+    ocrCorpus.abrir(ruta).close()
+
+def test_fuentes_directorio(tmp_path):
+    for nombre in ('tempOcrData_SOAT.json', 'SOAT_08.json'):
+        (tmp_path / nombre).write_text(json.dumps(cargar_ocr('SOAT_08'), indent=2), encoding='utf-8')
+    assert [(id, categoria) for id, _, categoria in fuentes_directorio(str(tmp_path))] == [
+        ('SOAT_08', None), ('tempOcrData_SOAT', 'SOAT'),
+    ]
+    assert [categoria for _, _, categoria in fuentes_directorio(str(tmp_path), clasificar=True)] == ['SOAT', 'SOAT']
+
+@pytest.mark.parametrize('contenido,mensaje', [
+    (b'', 'no es un corpus empaquetado'),
+    (b'{"analyzeResult": {}}' + b' ' * 20, 'no es un corpus empaquetado'),
+])
+def test_archivo_que_no_es_corpus(tmp_path, contenido, mensaje):
+    ruta = tmp_path / 'otro.pack'
+    ruta.write_bytes(contenido)
+    with pytest.raises(ValueError, match=mensaje):
+        PackedCorpus(str(ruta))
+
+def test_version_no_soportada(tmp_path, monkeypatch):
+    ruta = str(tmp_path / 'corpus.pack')
+    monkeypatch.setattr(ocrCorpus, 'VERSION_CORPUS', ocrCorpus.VERSION_CORPUS + 1)
+    empaquetar(_fuentes()[:1], ruta)
+    monkeypatch.undo()
+    with pytest.raises(ValueError, match='Versión de corpus no soportada'):
+        PackedCorpus(ruta)
@@ -0,0 +1,50 @@
+import pytest
+from conftest import analyze_result
+from ocrDocument import OcrDocument
+
+def _documento():
+    """Tres páginas de dos líneas; PLACA solo aparece en la tercera"""
+    lineas = [
+        [('Póliza', 0.9), ('de', 0.9), ('seguro', 0.9)],
+        [('Tomador', 0.9)],
+        [('Vigencia', 0.9), ('desde', 0.9)],
+        [('Cláusulas', 0.9)],
+        [('Placa', 0.9), ('ABC123', 0.9)],
+        [('Firma', 0.9)],
+    ]
+    return OcrDocument(analyze_result(lineas, paginas=[2, 2, 2]))
+
+def test_paginas_en_rangos_de_lineas():
+    document = _documento()
+    assert [(p.numero, p.linea_inicio, p.linea_fin) for p in document.pages] == [(1, 0, 2), (2, 2, 4), (3, 4, 6)]
+    assert document.fin_presupuesto(1) == 2
+    assert document.fin_presupuesto(3) is None
+    assert document.pagina_de_linea(4) == 3
+
+def test_presupuesto_limita_la_busqueda():
+    document = _documento()
+    assert document.find_line_index('PLACA', paginas=2) == -1
+    # Las líneas fuera del presupuesto no se normalizan
+    assert document._normalized[4:] == [None, None]
+    assert document.find_line_index('PLACA', paginas=2, continuar=True) == 4
+    assert document.find_line_index('PLACA') == 4
+    assert document.find_line_index('VIGENCIA', paginas=2) == 2
+
+def test_validacion_solo_en_la_primera_pagina():
+    document = _documento()
+    assert document.contains_any(['POLIZA', 'SOAT'])
+    assert not document.contains_any(['FIRMA'])
+    assert document.contains_any(['FIRMA'], continuar=True)
+    assert not document.cumple(lambda texto: 'ABC123' in texto)
+    assert document.cumple(lambda texto: 'ABC123' in texto, continuar=True)
+    assert document.cumple(lambda texto: 'Tomador' in texto, normalize=False)
+
+@pytest.mark.parametrize('pages', [None, [{'pageNumber': 1}]])
+def test_sin_spans_se_recorre_todo(pages):
+    # Sin páginas utilizables no hay presupuesto posible
+    data = analyze_result([[('Encabezado', 0.9)], [('Placa', 0.9)]])
+    data['analyzeResult']['pages'] = pages
+    document = OcrDocument(data)
+    assert document.pages == []
+    assert document.find_line_index('PLACA', paginas=1) == 1
+    assert document.contains_any(['PLACA'])
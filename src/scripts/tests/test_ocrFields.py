@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+from conftest import cargar_ocr, SCRIPTS
+from ocrFields import ExtractorGraph, extractor, parse_fields
+from ocrSOAT import SOATProcessor, process_soat_data
+
+GRAFO = ExtractorGraph([
+    extractor('extract_numero', ['numero']),
+    extractor('extract_nombre', ['nombre', 'apellido'], depende=['extract_numero']),
+    extractor('extract_fecha', ['fecha']),
+])
+
+class Procesador:
+    """Procesador mínimo que anota qué extractores corrieron"""
+
+    def __init__(self):
+        self.result = {'numero': None, 'nombre': None, 'apellido': None, 'fecha': None}
+        self.llamadas = []
+
+    def extract_numero(self):
+        self.llamadas.append('extract_numero')
+        self.result['numero'] = '123'
+
+    def extract_nombre(self):
+        self.llamadas.append('extract_nombre')
+        self.result['nombre'], self.result['apellido'] = 'ANA', 'PEREZ'
+
+    def extract_fecha(self):
+        self.llamadas.append('extract_fecha')
+        self.result['fecha'] = '2025-01-01'
+
+def test_parse_fields():
+    assert parse_fields('placa, soatVencimiento,') == ['placa', 'soatVencimiento']
+    assert parse_fields('') is None
+    assert parse_fields(' , ') is None
+
+def test_plan_con_dependencias_en_orden_de_declaracion():
+    assert GRAFO.plan() == ['extract_numero', 'extract_nombre', 'extract_fecha']
+    assert GRAFO.plan(['apellido']) == ['extract_numero', 'extract_nombre']
+    assert GRAFO.plan(['fecha', 'numero']) == ['extract_numero', 'extract_fecha']
+    assert GRAFO.campos == ['numero', 'nombre', 'apellido', 'fecha']
+
+def test_campos_desconocidos_y_dependencias_sin_declarar():
+    with pytest.raises(ValueError, match='Campos desconocidos: placa'):
+        GRAFO.plan(['placa'])
+    with pytest.raises(ValueError, match='debe declararse antes'):
+        ExtractorGraph([extractor('b', ['b'], depende=['a']), extractor('a', ['a'])])
+
+def test_cada_extractor_corre_una_vez():
+    processor = Procesador()
+    GRAFO.ejecutar(processor, ['nombre'])
+    assert processor.llamadas == ['extract_numero', 'extract_nombre']
+    # Pedir más campos después reutiliza lo ya calculado
+    GRAFO.ejecutar(processor)
+    assert processor.llamadas == ['extract_numero', 'extract_nombre', 'extract_fecha']
+    assert GRAFO.seleccionar(processor.result, ['apellido']) == {'apellido': 'PEREZ'}
+
+def test_marcar_resueltos_no_salta_dependencias():
+    processor = Procesador()
+    GRAFO.marcar_resueltos(processor, {'numero', 'nombre', 'apellido'})
+    GRAFO.ejecutar(processor)
+    # extract_numero es dependencia de otro extractor: corre igual
+    assert processor.llamadas == ['extract_numero', 'extract_fecha']
+
+def test_fields_en_un_procesador():
+    data = cargar_ocr('SOAT_06')
+    completo = process_soat_data(data)
+    processor = SOATProcessor(data)
+    assert processor.process(['placa']) == {'placa': completo['placa']}
+    assert list(processor._extractores) == ['extract_placa']
+    assert 'Campos desconocidos: placa2' in process_soat_data(data, campos=['placa2'])['error']
+
+def test_fields_por_linea_de_comandos(tmp_path):
+    ruta = tmp_path / 'soat.json'
+    ruta.write_text(json.dumps(cargar_ocr('SOAT_06')), encoding='utf-8')
+    salida = subprocess.run(
+        [sys.executable, os.path.join(SCRIPTS, 'ocrSOAT.py'), '--file', str(ruta), '--fields', 'soatVencimiento'],
+        capture_output=True, text=True, timeout=60,
+    )
+    assert salida.returncode == 0, salida.stderr
+    assert json.loads(salida.stdout) == {'soatVencimiento': process_soat_data(cargar_ocr('SOAT_06'))['soatVencimiento']}
@@ -0,0 +1,92 @@
+import os
+import json
+from datetime import date
+import pytest
+from conftest import cargar_ocr, FIXTURES
+import ocrFleet
+from ocrFleet import FleetScanner, escanear_documento, parse_vencimiento, scan_fleet, tabla_vencimientos
+
+DOCUMENTOS = sorted(nombre[:-len('.json.gz')] for nombre in os.listdir(os.path.join(FIXTURES, 'ocr')))
+
+@pytest.fixture
+def flota(tmp_path):
+    """Directorio con los OCR de fixtures como JSON, igual que los guarda el backend"""
+    directorio = tmp_path / 'ocr'
+    directorio.mkdir()
+    for nombre in DOCUMENTOS:
+        (directorio / f'{nombre}.json').write_text(json.dumps(cargar_ocr(nombre)), encoding='utf-8')
+    return sorted(str(ruta) for ruta in directorio.iterdir())
+
+def entrada(archivo, placa, campo, vencimiento):
+    return {'archivo': archivo, 'categoria': None, 'placa': placa, 'campo': campo, 'vencimiento': vencimiento}
+
+def test_parse_vencimiento():
+    assert parse_vencimiento('2025-03-31') == date(2025, 3, 31)
+    assert parse_vencimiento(' 31/03/2025 ') == date(2025, 3, 31)
+    assert parse_vencimiento('31 MAR 2025') is None
+    assert parse_vencimiento(None) is None
+
+def test_escanear_clasifica_y_extrae_la_placa(flota):
+    for ruta in flota:
+        resultado = escanear_documento(ruta)
+        categoria = os.path.basename(ruta).rsplit('_', 1)[0]
+        assert resultado['categoria'] == categoria
+        assert resultado['campo'] == ocrFleet.VENCIMIENTOS[categoria]
+        assert resultado['placa'] and parse_vencimiento(resultado['vencimiento'])
+
+def test_categoria_sin_vencimiento_y_archivo_invalido(flota, tmp_path):
+    assert escanear_documento(flota[0], categoria='CEDULA')['omitido'] == 'Categoría sin vencimiento'
+    ruta = tmp_path / 'roto.json'
+    ruta.write_text('{"analyzeResult":', encoding='utf-8')
+    assert 'error' in escanear_documento(str(ruta))
+
+def test_tabla_por_vehiculo():
+    entradas = [
+        entrada('soat_viejo.json', 'ABC123', 'soatVencimiento', '2024-01-10'),
+        entrada('soat_nuevo.json', 'ABC123', 'soatVencimiento', '2025-01-10'),
+        entrada('rtm.json', 'ABC123', 'tecnomecanicaVencimiento', '2024-06-20'),
+        entrada('soat.json', 'XYZ789', 'soatVencimiento', '2024-05-01'),
+        entrada('sin_placa.json', None, 'soatVencimiento', '2025-01-01'),
+        entrada('sin_fecha.json', 'QWE456', 'soatVencimiento', None),
+        None,
+    ]
+    filas, por_vencer = tabla_vencimientos(entradas, hoy=date(2024, 6, 1), dias_aviso=30)
+    assert [(fila['placa'], fila['proximoVencimiento'], fila['diasRestantes']) for fila in filas] == [
+        ('XYZ789', 'soatVencimiento', -31),
+        ('ABC123', 'tecnomecanicaVencimiento', 19),
+        ('SIN_PLACA', 'soatVencimiento', 214),
+    ]
+    # Cuenta la última renovación, no el SOAT anterior
+    assert filas[1]['soatVencimiento'] == '2025-01-10'
+    assert [(item['placa'], item['vencido'], item['archivo']) for item in por_vencer] == [
+        ('XYZ789', True, 'soat.json'), ('ABC123', False, 'rtm.json'),
+    ]
+
+def test_cache_incremental(flota, tmp_path):
+    cache = str(tmp_path / 'flota.cache')
+    primera = scan_fleet(flota, cache=cache, trabajadores=1, hoy=date(2024, 6, 1))
+    assert (primera['procesados'], primera['reutilizados']) == (len(flota), 0)
+    assert primera['errores'] == []
+
+    segunda = scan_fleet(flota, cache=cache, trabajadores=1, hoy=date(2024, 6, 1))
+    assert (segunda['procesados'], segunda['reutilizados']) == (0, len(flota))
+    assert segunda['tabla'] == primera['tabla']
+
+    # Un documento modificado y uno con otra placa en el manifiesto se vuelven a procesar
+    with open(flota[0], 'a', encoding='utf-8') as file:
+        file.write(' ')
+    manifiesto = {os.path.basename(flota[1]): {'placa': 'AAA111'}}
+    tercera = FleetScanner(cache, trabajadores=1)
+    entradas = tercera.escanear(flota, manifiesto)
+    assert (tercera.procesados, tercera.reutilizados) == (2, len(flota) - 2)
+    assert entradas[1]['placa'] == 'AAA111'
+
+def test_cache_de_otra_version_se_descarta(flota, tmp_path, monkeypatch):
+    cache = str(tmp_path / 'flota.cache')
+    scan_fleet(flota[:2], cache=cache, trabajadores=1)
+    monkeypatch.setattr(ocrFleet, 'VERSION_ESCANER', ocrFleet.VERSION_ESCANER + 1)
+    assert scan_fleet(flota[:2], cache=cache, trabajadores=1)['procesados'] == 2
+
+def test_trabajadores_dan_el_mismo_resultado(flota):
+    serie = FleetScanner(trabajadores=1).escanear(flota)
+    assert FleetScanner(trabajadores=2).escanear(flota) == serie
@@ -0,0 +1,98 @@
+import io
+import os
+import sys
+import json
+import argparse
+import threading
+import subprocess
+import pytest
+from conftest import cargar_ocr, SCRIPTS
+from ocrInput import agregar_argumentos, hay_entrada, leer_entrada
+from ocrTECNOMECANICA import process_rtm_data
+
+def argumentos(*argv):
+    parser = argparse.ArgumentParser()
+    agregar_argumentos(parser)
+    return parser.parse_args(argv)
+
+def por_descriptor(contenido):
+    """Descriptor de lectura de un pipe que otro hilo llena, como lo haría el proceso padre"""
+    lectura, escritura = os.pipe()
+    def escribir():
+        with os.fdopen(escritura, 'wb') as file:
+            file.write(contenido)
+    hilo = threading.Thread(target=escribir)
+    hilo.start()
+    return lectura, hilo
+
+def test_hay_entrada():
+    assert not hay_entrada(argumentos())
+    assert hay_entrada(argumentos('--stdin'))
+    assert hay_entrada(argumentos('--fd', '0'))
+    assert not hay_entrada(argparse.Namespace())
+
+def test_stdin_en_bytes_sin_depender_de_la_consola(monkeypatch):
+    data = cargar_ocr('TECNOMECANICA_02')
+    # Una consola en latin-1 no debe cambiar cómo se leen las tildes
+    stdin = io.TextIOWrapper(io.BytesIO(json.dumps(data, ensure_ascii=False).encode('utf-8')), encoding='latin-1')
+    monkeypatch.setattr(sys, 'stdin', stdin)
+    assert leer_entrada(argumentos('--stdin')) == data
+
+def test_descriptor_grande():
+    data = cargar_ocr('TECNOMECANICA_02')
+    # Varias veces el tamaño del buffer del pipe
+    contenido = json.dumps([data] * 20, separators=(',', ':')).encode('utf-8')
+    assert len(contenido) > 1 << 16
+    lectura, hilo = por_descriptor(contenido)
+    assert leer_entrada(argumentos('--fd', str(lectura))) == [data] * 20
+    hilo.join()
+    # El descriptor queda cerrado
+    with pytest.raises(OSError):
+        os.fstat(lectura)
+
+@pytest.mark.parametrize('contenido', [b'', b' \n\t'])
+def test_entrada_vacia(monkeypatch, contenido):
+    monkeypatch.setattr(sys, 'stdin', io.TextIOWrapper(io.BytesIO(contenido)))
+    with pytest.raises(json.JSONDecodeError, match='No se recibió JSON por stdin'):
+        leer_entrada(argumentos('--stdin'))
+    lectura, hilo = por_descriptor(contenido)
+    with pytest.raises(json.JSONDecodeError, match=f'No se recibió JSON por el descriptor {lectura}'):
+        leer_entrada(argumentos('--fd', str(lectura)))
+    hilo.join()
+
+def test_json_invalido():
+    lectura, hilo = por_descriptor(b'{"analyzeResult": ')
+    with pytest.raises(json.JSONDecodeError):
+        leer_entrada(argumentos('--fd', str(lectura)))
+    hilo.join()
+
+def _ejecutar(*argv, **kwargs):
+    return subprocess.run(
+        [sys.executable, os.path.join(SCRIPTS, 'ocrTECNOMECANICA.py'), *argv],
+        capture_output=True, timeout=60, **kwargs,
+    )
+
+def test_por_linea_de_comandos():
+    data = cargar_ocr('TECNOMECANICA_02')
+    esperado = process_rtm_data(cargar_ocr('TECNOMECANICA_02'))
+    contenido = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    salida = _ejecutar('--stdin', input=contenido)
+    assert salida.returncode == 0, salida.stderr
+    assert json.loads(salida.stdout) == esperado
+
+    lectura, hilo = por_descriptor(contenido)
+    try:
+        salida = _ejecutar('--fd', str(lectura), pass_fds=[lectura])
+    finally:
+        os.close(lectura)
+        hilo.join()
+    assert salida.returncode == 0, salida.stderr
+    assert json.loads(salida.stdout) == esperado
+
+@pytest.mark.parametrize('contenido', [b'', b'no es json'])
+def test_error_por_linea_de_comandos(contenido):
+    salida = _ejecutar('--stdin', input=contenido)
+    assert salida.returncode == 1
+    assert json.loads(salida.stdout)['error'].startswith('JSON inválido en la entrada')
+    assert b'ERROR: La entrada no contiene JSON' in salida.stderr
@@ -0,0 +1,116 @@
+import os
+import json
+import shutil
+import pytest
+from conftest import cargar_ocr, SCRIPTS
+import ocrManifest
+import ocrRules
+from ocrManifest import ReprocessManifest, dependencias_locales, huella_procesador, parametros_de, process_manifest
+from ocrSOAT import process_soat_data
+
+NOMBRES = ['SOAT_06', 'SOAT_08', 'TECNOMECANICA_02']
+
+def _limpiar_huellas():
+    for funcion in (ocrManifest._fuente, ocrManifest.huella_procesador, ocrManifest.huella_modulos):
+        funcion.cache_clear()
+
+@pytest.fixture
+def scripts(tmp_path, monkeypatch):
+    """Copia de los scripts y reglas para poder editar el código de los procesadores"""
+    directorio = tmp_path / 'scripts'
+    directorio.mkdir()
+    for nombre in os.listdir(SCRIPTS):
+        if nombre.endswith('.py'):
+            shutil.copy(os.path.join(SCRIPTS, nombre), directorio)
+    shutil.copytree(ocrRules.DIRECTORIO_REGLAS, directorio / 'reglas')
+    monkeypatch.setattr(ocrManifest, 'DIRECTORIO_SCRIPTS', str(directorio))
+    monkeypatch.setattr(ocrRules, 'DIRECTORIO_REGLAS', str(directorio / 'reglas'))
+    _limpiar_huellas()
+    yield directorio
+    _limpiar_huellas()
+
+@pytest.fixture
+def documentos(tmp_path):
+    directorio = tmp_path / 'ocr'
+    directorio.mkdir()
+    for nombre in NOMBRES:
+        (directorio / f'{nombre}.json').write_text(json.dumps(cargar_ocr(nombre)), encoding='utf-8')
+    return [str(directorio / f'{nombre}.json') for nombre in NOMBRES]
+
+def editar(ruta, linea='# cambio\n'):
+    with open(ruta, 'a', encoding='utf-8') as file:
+        file.write(linea)
+    _limpiar_huellas()
+
+def test_dependencias_y_parametros():
+    dependencias = dependencias_locales('ocrSOAT')
+    assert {'ocrSOAT', 'ocrDocument', 'ocrFields'} <= set(dependencias)
+    assert dependencias == sorted(dependencias)
+    assert 'ocrTECNOMECANICA' not in dependencias
+    # Solo cuentan los parámetros que recibe el procesador
+    assert parametros_de('SOAT', {'placa': 'ABC123', 'fecha_nacimiento': '1990-01-01'}) == {'placa': 'ABC123'}
+    assert parametros_de('TARJETA_DE_PROPIEDAD', {'placa': 'ABC123'}) == {}
+
+def test_registrar_y_reprocesar(tmp_path, documentos, scripts):
+    ruta = str(tmp_path / 'manifiesto.json')
+    result = process_manifest(ruta, documentos, trabajadores=1)
+    assert (result['recalculadas'], result['sinCategoria'], result['errores']) == (3, [], [])
+    manifiesto = ReprocessManifest(ruta)
+    resultados = {os.path.basename(e['archivo']): e for e in manifiesto.entradas.values()}
+    assert resultados['SOAT_06.json']['resultado'] == process_soat_data(cargar_ocr('SOAT_06'))
+    assert resultados['TECNOMECANICA_02.json']['categoria'] == 'TECNOMECANICA'
+
+    # Nada cambió: todo vigente
+    result = process_manifest(ruta, documentos, trabajadores=1)
+    assert (result['recalculadas'], result['vigentes']) == (0, 3)
+
+def test_cambiar_un_procesador_invalida_solo_su_categoria(tmp_path, documentos, scripts):
+    ruta = str(tmp_path / 'manifiesto.json')
+    process_manifest(ruta, documentos, trabajadores=1)
+    antes = huella_procesador('TECNOMECANICA')
+
+    editar(scripts / 'ocrSOAT.py')
+    assert huella_procesador('TECNOMECANICA') == antes
+    assert ReprocessManifest(ruta).pendientes() == {
+        ReprocessManifest.clave(documentos[0], 'SOAT', {'placa': None}): 'procesador',
+        ReprocessManifest.clave(documentos[1], 'SOAT', {'placa': None}): 'procesador',
+    }
+    result = process_manifest(ruta, trabajadores=1)
+    # El resultado no cambió: se recalculó pero no figura en cambiados
+    assert (result['recalculadas'], result['vigentes'], result['cambiados']) == (2, 1, [])
+
+    # Un módulo compartido invalida todas las categorías
+    editar(scripts / 'ocrDocument.py')
+    assert set(ReprocessManifest(ruta).pendientes().values()) == {'procesador'}
+    assert len(ReprocessManifest(ruta).pendientes()) == 3
+
+def test_cambiar_las_reglas_invalida_el_motor_de_reglas(tmp_path, documentos, scripts):
+    ruta = str(tmp_path / 'manifiesto.json')
+    process_manifest(ruta, documentos[:1], categoria='SOAT', motor='reglas', trabajadores=1)
+    editar(scripts / 'ocrSOAT.py')
+    assert ReprocessManifest(ruta).pendientes() == {}
+    editar(scripts / 'reglas' / 'SOAT.json', '\n')
+    assert list(ReprocessManifest(ruta).pendientes().values()) == ['procesador']
+
+def test_cambios_de_entrada(tmp_path, documentos, scripts):
+    ruta = str(tmp_path / 'manifiesto.json')
+    process_manifest(ruta, documentos, trabajadores=1)
+
+    # Otra fecha de modificación con el mismo contenido no recalcula
+    os.utime(documentos[0], ns=(0, 0))
+    assert ReprocessManifest(ruta).pendientes() == {}
+
+    with open(documentos[1], 'a', encoding='utf-8') as file:
+        file.write(' ')
+    os.remove(documentos[2])
+    result = process_manifest(ruta, trabajadores=1, simular=True)
+    assert result['pendientes'] == {'entrada': 1, 'eliminada': 1}
+    assert result['recalcular'] == [documentos[1]]
+    result = process_manifest(ruta, trabajadores=1)
+    assert result['eliminadas'] == [documentos[2]]
+    assert len(ReprocessManifest(ruta).entradas) == 2
+
+def test_manifiesto_de_otra_version_empieza_vacio(tmp_path):
+    ruta = tmp_path / 'manifiesto.json'
+    ruta.write_text(json.dumps({'version': ocrManifest.VERSION_MANIFIESTO + 1, 'entradas': {'x': {}}}), encoding='utf-8')
+    assert ReprocessManifest(str(ruta)).entradas == {}
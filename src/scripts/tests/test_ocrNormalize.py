@@ -0,0 +1,40 @@
+import os
+import pytest
+from conftest import cargar_ocr, FIXTURES
+from ocrNormalize import (
+    normalize_text, normalize_text_unicode, _normalize_no_ascii,
+    _caracteres_tabla, _lineas_sinteticas,
+)
+
+DOCUMENTOS = sorted(nombre[:-len('.json.gz')] for nombre in os.listdir(os.path.join(FIXTURES, 'ocr')))
+
+def test_cada_caracter_de_la_tabla_igual_al_original():
+    diferentes = [c for c in _caracteres_tabla() if normalize_text(c) != normalize_text_unicode(c)]
+    assert diferentes == []
+
+def test_corpus_sintetico_igual_al_original():
+    lineas = _lineas_sinteticas(2000)
+    assert [normalize_text(linea) for linea in lineas] == [normalize_text_unicode(linea) for linea in lineas]
+
+@pytest.mark.parametrize('nombre', DOCUMENTOS)
+def test_lineas_de_documentos_iguales_al_original(nombre):
+    lineas = cargar_ocr(nombre)['analyzeResult']['content'].split('\n')
+    assert [normalize_text(linea) for linea in lineas] == [normalize_text_unicode(linea) for linea in lineas]
+
+@pytest.mark.parametrize('texto', [
+    'Vigencia Desde', 'Fecha de Expedición', 'NÚMERO DE PÓLIZA', 'Señor(a)',
+    'Año — “Modelo”', 'ﬁn de vigencia', 'Ｐｌａｃａ', 'Москва ABC123', 'ñ', '€ 1.234',
+])
+def test_casos_fuera_de_la_tabla_y_combinables(texto):
+    # Ligaduras, ancho completo, otros alfabetos y marcas sueltas toman el camino original
+    assert normalize_text(texto) == normalize_text_unicode(texto)
+
+def test_lineas_no_ascii_se_recuerdan():
+    _normalize_no_ascii.cache_clear()
+    for _ in range(3):
+        assert normalize_text('Cédula de Ciudadanía') == 'CEDULA DE CIUDADANIA'
+    informacion = _normalize_no_ascii.cache_info()
+    assert (informacion.misses, informacion.hits) == (1, 2)
+    # Las líneas ASCII no ocupan la memoria
+    normalize_text('PLACA ABC123')
+    assert _normalize_no_ascii.cache_info().currsize == 1
@@ -0,0 +1,73 @@
+import json
+import time
+import asyncio
+import pytest
+from conftest import cargar_ocr
+from ocrOrchestrator import OcrOrchestrator, ServidorSimulado, SondeoAdaptativo, process_orchestration
+from ocrSupervisor import OcrSupervisor
+
+@pytest.fixture(scope='module')
+def supervisor():
+    with OcrSupervisor(trabajadores=1) as supervisor:
+        yield supervisor
+
+def _documento(nombre, categoria='SOAT'):
+    return {
+        'nombre': nombre, 'contenido': json.dumps(cargar_ocr('SOAT_06')).encode('utf-8'),
+        'tipo': 'application/json', 'categoria': categoria, 'parametros': {'placa': 'ZXC765'},
+    }
+
+def _ejecutar(servidor, documentos, supervisor, **opciones):
+    async def ejecutar():
+        sondeo = SondeoAdaptativo(inicial=opciones.pop('inicial', 0.3), minimo=0.05, maximo=0.1)
+        async with OcrOrchestrator(servidor.endpoint, 'simulada', sondeo=sondeo, supervisor=supervisor,
+                                   **opciones) as orquestador:
+            inicio = time.monotonic()
+            salidas = await orquestador.ejecutar(documentos)
+            return salidas, time.monotonic() - inicio
+    return asyncio.run(ejecutar())
+
+def test_documentos_concurrentes_tardan_lo_del_mas_lento(supervisor):
+    with ServidorSimulado(latencia=0.6, variacion=0) as servidor:
+        salidas, total = _ejecutar(servidor, [_documento(f'd{i}') for i in range(5)], supervisor, en_vuelo=5)
+    assert [salida['resultado']['soatVencimiento'] for salida in salidas] == ['2024-05-06'] * 5
+    assert 0.6 <= total < 1.5
+
+def test_en_vuelo_limita_los_documentos_en_el_servicio(supervisor):
+    with ServidorSimulado(latencia=0.4, variacion=0) as servidor:
+        salidas, total = _ejecutar(servidor, [_documento(f'd{i}') for i in range(4)], supervisor, en_vuelo=2)
+    assert all('error' not in salida for salida in salidas)
+    # Dos tandas de dos documentos
+    assert total >= 0.8
+
+def test_429_espera_retry_after_y_reintenta(supervisor):
+    with ServidorSimulado(latencia=0.1, variacion=0, rechazos=2, retry_after='0.25') as servidor:
+        (salida,), total = _ejecutar(servidor, [_documento('d')], supervisor)
+        assert servidor.envios == 3
+    assert salida['resultado']['soatVencimiento'] == '2024-05-06'
+    assert total >= 0.5
+
+def test_estado_final_fallido(supervisor):
+    with ServidorSimulado(latencia=0.1, variacion=0, estado_final='failed') as servidor:
+        (salida,), _ = _ejecutar(servidor, [_documento('d')], supervisor)
+    assert salida['error'] == 'OCR no completado exitosamente. Estado final: failed'
+    assert 'resultado' not in salida
+
+def test_tiempo_maximo_agotado(supervisor):
+    with ServidorSimulado(latencia=5, variacion=0) as servidor:
+        (salida,), total = _ejecutar(servidor, [_documento('d')], supervisor, tiempo_maximo=0.5, inicial=0.1)
+    assert salida['error'].startswith('Tiempo de espera agotado')
+    assert total < 1.0
+
+def test_plazo_del_procesador_vencido_es_un_error_del_documento(supervisor):
+    with ServidorSimulado(latencia=0.1, variacion=0) as servidor:
+        (salida,), _ = _ejecutar(servidor, [_documento('d')], supervisor, plazo_proceso=0)
+    assert salida['resultado'] == {'error': 'Plazo vencido esperando un trabajador'}
+
+def test_errores_del_procesador_se_cuentan():
+    documentos = [_documento('soat'), dict(_documento('sin_categoria'), categoria=None,
+                                           contenido=b'{"analyzeResult": {"content": "nada", "pages": []}}')]
+    with ServidorSimulado(latencia=0.1, variacion=0) as servidor:
+        result = process_orchestration(documentos, servidor.endpoint, 'simulada')
+    assert result['documentos']['sin_categoria']['resultado']['error'] == 'Categoría sin procesador: None'
+    assert result['errores'] == 1
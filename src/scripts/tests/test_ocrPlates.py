@@ -0,0 +1,39 @@
+from ocrPlates import PlateIndex, canonizar, menciones
+
+def _placas(content):
+    return [placa for placa, _, _ in menciones(content)]
+
+def test_canonizar_corrige_confusiones_de_ocr():
+    assert canonizar('ABC-123') == ('ABC123', 0)
+    assert canonizar('A8C 12O') == ('ABC120', 2)
+    assert canonizar('ABCDEF') == (None, 0)
+
+def test_placa_real_en_el_texto():
+    content = 'PLACA: ZXC 765\nVEHICULO CAMIONETA'
+    assert menciones(content) == [('ZXC765', 7, 'ZXC 765')]
+
+def test_fechas_con_espacios_no_son_placas():
+    content = 'VIGENCIA DESDE 31 MAR 2025 HASTA 30 mar 2026\nEXPEDICION 15-ABR-1972'
+    assert _placas(content) == []
+
+def test_nit_y_telefonos_no_son_placas():
+    content = 'ASEGURADORA NIT 900 123 456\nLINEA SOS 1234, CEL 300 1234567, TEL 601 2345'
+    assert _placas(content) == []
+
+def test_placa_que_empieza_como_un_mes_sigue_valiendo():
+    assert _placas('PLACA MAR123 VENCE 31 MAR 2025') == ['MAR123']
+
+def test_indice_y_auditoria():
+    indice = PlateIndex()
+    indice.agregar('soat', {'analyzeResult': {'content': 'PLACA ZXC765 NIT 900 123 456'}})
+    indice.agregar('poliza', {'analyzeResult': {'content': 'Placa: ZXC-7G5 / otro ABC123'}})
+    assert sorted(indice.documentos_con('zxc765')) == ['poliza', 'soat']
+    assert list(indice.documentos_con('ZXC765', exacta=True)) == ['soat']
+    auditoria = indice.auditar({'soat': 'ZXC765', 'poliza': 'QWE456'})
+    assert auditoria['soat'] == {'placa': 'ZXC765', 'indexado': True, 'coincide': True, 'exacta': True, 'otras': []}
+    assert auditoria['poliza']['coincide'] is False
+    assert auditoria['poliza']['otras'] == ['ABC123', 'ZXC765']
+    # Reindexar un documento reemplaza sus menciones
+    indice.agregar('poliza', {'analyzeResult': {'content': 'sin placas'}})
+    assert 'ABC123' not in indice.por_placa
+    assert PlateIndex.desde_dict(indice.a_dict()).por_placa == indice.por_placa
@@ -0,0 +1,43 @@
+import os
+import pytest
+from conftest import analyze_result, cargar_ocr, FIXTURES
+from ocrRules import comparar_documento, PROCESADORES_MANUALES
+
+DOCUMENTOS = sorted(nombre[:-len('.json.gz')] for nombre in os.listdir(os.path.join(FIXTURES, 'ocr')))
+
+def _categoria(nombre):
+    return nombre.rsplit('_', 1)[0]
+
+def test_hay_documentos_de_cada_categoria():
+    assert sorted({_categoria(nombre) for nombre in DOCUMENTOS}) == sorted(PROCESADORES_MANUALES)
+
+@pytest.mark.parametrize('categoria', list(PROCESADORES_MANUALES))
+@pytest.mark.parametrize('nombre', DOCUMENTOS)
+def test_reglas_iguales_al_procesador(nombre, categoria):
+    # Cada categoría corre sobre todos los documentos: los de otra categoría
+    # deben fallar la validación de la misma forma en ambos caminos
+    manual, reglas = comparar_documento(cargar_ocr(nombre), categoria)
+    assert reglas == manual
+    if categoria == _categoria(nombre):
+        assert 'error' not in manual
+
+@pytest.mark.parametrize('nombre', [nombre for nombre in DOCUMENTOS if _categoria(nombre) != 'TECNOMECANICA'])
+def test_reglas_iguales_con_placa(nombre):
+    categoria = _categoria(nombre)
+    placa = comparar_documento(cargar_ocr(nombre), categoria)[0]['placa']
+    for parametro in (placa, 'ZZZ999'):
+        manual, reglas = comparar_documento(cargar_ocr(nombre), categoria, parametro)
+        assert reglas == manual
+
+def test_presupuesto_de_paginas_igual_al_procesador():
+    # Encabezado y PLACA fuera de las páginas que revisan la validación y las anclas
+    data = analyze_result([
+        [('Anexo', 0.9), ('ABC111', 0.9)], [('Condiciones', 0.9)], [('SOAT', 0.9)], [('Placa', 0.9)], [('QWE456', 0.9)],
+    ], paginas=[1, 1, 1, 2])
+    manual, reglas = comparar_documento(data, 'SOAT')
+    assert reglas == manual == {'error': 'No es un SOAT válido'}
+    data['analyzeResult']['content'] = data['analyzeResult']['content'].replace('Anexo', 'SOAT.', 1)
+    manual, reglas = comparar_documento(data, 'SOAT')
+    # El ancla está en la cuarta página: se toma la primera placa del documento
+    assert reglas == manual
+    assert manual['placa'] == 'ABC111'
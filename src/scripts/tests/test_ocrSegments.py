@@ -0,0 +1,75 @@
+import pytest
+from conftest import analyze_result, cargar_ocr
+from ocrSegments import DocumentSegmenter, _desplazar, process_packet_data, procesar_segmento
+from ocrSOAT import process_soat_data
+from ocrTECNOMECANICA import process_rtm_data
+
+NOMBRES = ['SOAT_06', 'TECNOMECANICA_02', 'POLIZA_TODO_RIESGO_01']
+
+def paquete(nombres):
+    """Varios resultados de OCR en un solo analyzeResult, como un PDF escaneado con varios documentos"""
+    content, pages, paragraphs = '', [], []
+    for nombre in nombres:
+        analyze = cargar_ocr(nombre)['analyzeResult']
+        if content:
+            content += '\n'
+        base = len(content)
+        content += analyze['content']
+        for page in analyze['pages']:
+            page = _desplazar(page, -base)
+            page['pageNumber'] = len(pages) + 1
+            pages.append(page)
+            # Un párrafo por página para seguir los elementos con boundingRegions
+            span = page['spans'][0]
+            paragraphs.append({'content': nombre, 'spans': [span], 'boundingRegions': [{'pageNumber': page['pageNumber']}]})
+    return {'analyzeResult': {'modelId': 'prebuilt-read', 'content': content, 'pages': pages, 'paragraphs': paragraphs}}
+
+def test_desplazar_copia_span_y_spans():
+    elemento = {'span': {'offset': 10, 'length': 3}, 'words': [{'spans': [{'offset': 12, 'length': 1}]}], 'x': 1}
+    assert _desplazar(elemento, 10) == {'span': {'offset': 0, 'length': 3}, 'words': [{'spans': [{'offset': 2, 'length': 1}]}], 'x': 1}
+    # El original no cambia
+    assert elemento['span']['offset'] == 10
+
+def test_segmentos_con_offsets_del_documento_original():
+    segmentos = DocumentSegmenter().segmentar(paquete(NOMBRES))
+    assert [segmento.categoria for segmento in segmentos] == ['SOAT', 'TECNOMECANICA', 'POLIZA_TODO_RIESGO']
+    for nombre, segmento in zip(NOMBRES, segmentos):
+        original = cargar_ocr(nombre)['analyzeResult']
+        # Los spans de página incluyen el salto de línea que separa los documentos del paquete
+        assert segmento.content.rstrip('\n') == original['content']
+        assert len(segmento.analyze_result['pages']) == len(original['pages'])
+        # Las palabras apuntan a su texto en el content recortado
+        assert len(segmento.words) == sum(len(page['words']) for page in original['pages'])
+        assert all(segmento.content[word.offset:word.offset + word.length] == word.content for word in segmento.words)
+        assert [page['spans'] for page in segmento.analyze_result['pages']] == [page['spans'] for page in original['pages']]
+        assert {p['content'] for p in segmento.analyze_result['paragraphs']} == {nombre}
+
+def test_cada_segmento_procesa_igual_que_su_documento():
+    segmentos = DocumentSegmenter().segmentar(paquete(NOMBRES[:2]))
+    assert procesar_segmento(segmentos[0], {'placa': None}) == process_soat_data(cargar_ocr('SOAT_06'))
+    assert procesar_segmento(segmentos[1]) == process_rtm_data(cargar_ocr('TECNOMECANICA_02'))
+    assert segmentos[1].paginas == [4, 5]
+
+def test_un_solo_documento_no_se_recorta():
+    data = cargar_ocr('SOAT_08')
+    [segmento] = DocumentSegmenter().segmentar(data)
+    assert segmento.analyze_result is data['analyzeResult']
+    assert segmento.categoria == 'SOAT'
+
+def test_paginas_sin_categoria_van_con_el_documento_reconocido():
+    data = analyze_result([
+        [('Anexo', 0.9)],
+        [('SEGURO', 0.9), ('OBLIGATORIO', 0.9), ('SOAT', 0.9)],
+        [('Condiciones', 0.9), ('generales', 0.9)],
+        [('LICENCIA', 0.9), ('DE', 0.9), ('CONDUCCION', 0.9)],
+    ], paginas=[1, 1, 1, 1])
+    resultado = process_packet_data(data, procesar=False)
+    assert [(s['categoria'], s['paginas']) for s in resultado['segmentos']] == [('SOAT', [1, 2, 3]), ('LICENCIA', [4])]
+
+@pytest.mark.parametrize('procesar', [False, True])
+def test_segmento_sin_categoria(procesar):
+    resultado = process_packet_data(analyze_result([[('Hoja', 0.9)]]), procesar=procesar)
+    [segmento] = resultado['segmentos']
+    assert segmento['categoria'] is None
+    if procesar:
+        assert segmento['resultado'] == {'error': 'Segmento sin categoría reconocida'}
@@ -0,0 +1,106 @@
+from conftest import analyze_result
+from ocrFields import ExtractorGraph, extractor
+from ocrStructured import StructuredFields, StructuredIndex, campo, patron, normalizar_clave
+
+def _documento(palabras, pares=(), tablas=()):
+    """
+    analyzeResult de una línea por palabra con pares clave-valor
+    [(rótulo, índice de la palabra del valor, confianza del par)]
+    """
+    data = analyze_result([[palabra] for palabra in palabras])
+    words = data['analyzeResult']['pages'][0]['words']
+    data['analyzeResult']['keyValuePairs'] = [
+        {'key': {'content': rotulo}, 'confidence': confianza,
+         'value': {'content': words[i]['content'], 'spans': [words[i]['span']]}}
+        for rotulo, i, confianza in pares
+    ]
+    data['analyzeResult']['tables'] = list(tablas)
+    return data
+
+class Procesador:
+    """Procesador mínimo: cada extractor copia del texto el valor de su campo"""
+    EXTRACTORES = ExtractorGraph([
+        extractor('extract_motor', ['numero_motor']),
+        extractor('extract_clase', ['clase_vehiculo']),
+    ])
+    ESTRUCTURADOS = StructuredFields({
+        'numero_motor': campo(['NÚMERO DE MOTOR'], patron(r'^[A-Z0-9]{6,15}$'), ['MOTOR']),
+        'clase_vehiculo': campo(['CLASE DE VEHÍCULO'], patron(r'^[A-Z ]{3,30}$'), ['CLASE']),
+    })
+
+    def __init__(self, data, texto):
+        self.data = data
+        self.texto = texto
+        self.result = {}
+        self.corridos = []
+
+    def extract_motor(self):
+        self.corridos.append('motor')
+        if self.texto.get('numero_motor'):
+            self.result['numero_motor'] = self.texto['numero_motor']
+
+    def extract_clase(self):
+        self.corridos.append('clase')
+        if self.texto.get('clase_vehiculo'):
+            self.result['clase_vehiculo'] = self.texto['clase_vehiculo']
+
+    def process(self):
+        self.ESTRUCTURADOS.ejecutar(self, self.EXTRACTORES)
+        return self.result
+
+def test_normalizar_clave():
+    assert normalizar_clave('No. de Motor:') == 'NO DE MOTOR'
+    assert normalizar_clave('Clase de Vehículo') == 'CLASE DE VEHICULO'
+
+def test_rotulo_propio_resuelve_y_evita_el_extractor():
+    data = _documento([('2GD1234567', 0.95)], [('Número de motor', 0, 0.9)])
+    procesador = Procesador(data, {'numero_motor': 'TEXTO', 'clase_vehiculo': 'CAMIONETA'})
+    assert procesador.process() == {'numero_motor': '2GD1234567', 'clase_vehiculo': 'CAMIONETA'}
+    assert procesador.corridos == ['clase']
+
+def test_valor_con_confianza_baja_no_se_usa():
+    # Confianza del par baja
+    data = _documento([('2GD1234567', 0.95)], [('Número de motor', 0, 0.2)])
+    assert Procesador(data, {'numero_motor': 'TEXTO1'}).process()['numero_motor'] == 'TEXTO1'
+    # Palabras del valor con confianza baja
+    data = _documento([('2GD1234567', 0.3)], [('Número de motor', 0, 0.9)])
+    assert Procesador(data, {'numero_motor': 'TEXTO1'}).process()['numero_motor'] == 'TEXTO1'
+
+def test_valor_que_no_pasa_el_validador_no_se_usa():
+    data = _documento([('CAMIONETA 4X4 DOBLE CABINA 2019', 0.95)], [('Clase de vehículo', 0, 0.9)])
+    procesador = Procesador(data, {'clase_vehiculo': 'CAMIONETA'})
+    assert procesador.process()['clase_vehiculo'] == 'CAMIONETA'
+    assert 'clase' in procesador.corridos
+
+def test_rotulo_generico_solo_completa_lo_que_falta():
+    data = _documento([('2GD1234567', 0.95), ('PARTICULAR', 0.95)], [('Motor', 0, 0.9), ('Clase', 1, 0.9)])
+    # El texto encontró la clase: "CLASE: PARTICULAR" (clase de servicio) no la reemplaza
+    resultado = Procesador(data, {'clase_vehiculo': 'CAMIONETA'}).process()
+    assert resultado == {'numero_motor': '2GD1234567', 'clase_vehiculo': 'CAMIONETA'}
+    # Sin valor en el texto, el rótulo genérico sí lo completa
+    assert Procesador(data, {}).process()['clase_vehiculo'] == 'PARTICULAR'
+
+def test_tablas_encabezado_y_celda_vecina():
+    celdas = [
+        {'rowIndex': 0, 'columnIndex': 0, 'kind': 'columnHeader', 'content': 'MARCA'},
+        {'rowIndex': 0, 'columnIndex': 1, 'kind': 'columnHeader', 'content': 'MODELO'},
+        {'rowIndex': 1, 'columnIndex': 0, 'content': 'TOYOTA'},
+        {'rowIndex': 1, 'columnIndex': 1, 'content': '2019'},
+        {'rowIndex': 2, 'columnIndex': 0, 'content': 'COLOR'},
+        {'rowIndex': 2, 'columnIndex': 1, 'content': 'BLANCO'},
+        {'rowIndex': 3, 'columnIndex': 0, 'content': 'PLACA: ZXC 765'},
+    ]
+    indice = StructuredIndex.de({'analyzeResult': {'content': '', 'tables': [{'cells': celdas}]}})
+    assert indice.get('MARCA') == 'TOYOTA'
+    assert indice.get('MODELO') == '2019'
+    assert indice.get('COLOR') == 'BLANCO'
+    assert indice.get('PLACA') == 'ZXC 765'
+    # Sin palabras ni confianza del par, la confianza es desconocida
+    assert indice.confianza('MARCA', 'TOYOTA') is None
+
+def test_sin_pares_ni_tablas_no_hay_indice():
+    data = analyze_result([[('MOTOR', 0.9), ('2GD1234567', 0.9)]])
+    assert StructuredIndex.de(data) is None
+    procesador = Procesador(data, {'numero_motor': 'TEXTO'})
+    assert procesador.process() == {'numero_motor': 'TEXTO'}
+    assert procesador.corridos == ['motor', 'clase']
@@ -0,0 +1,75 @@
+import os
+import time
+import pytest
+from ocrSupervisor import OcrSupervisor, ColaLlena
+
+def simulado(data, categoria, parametros=None, campos=None, motor='script'):
+    """Procesador de prueba: duerme `dormir` segundos o termina el proceso si `morir`"""
+    if data.get('morir'):
+        os._exit(1)
+    time.sleep(data.get('dormir', 0))
+    return {'categoria': categoria, 'pid': os.getpid()}
+
+def _supervisor(**opciones):
+    return OcrSupervisor(procesador=simulado, **{'trabajadores': 1, **opciones})
+
+def _esperar_ocupados(supervisor, ocupados):
+    limite = time.monotonic() + 10
+    while supervisor.estado()['ocupados'] < ocupados:
+        assert time.monotonic() < limite
+        time.sleep(0.01)
+
+def test_cola_llena_rechaza_de_inmediato():
+    with _supervisor(max_cola=1) as supervisor:
+        en_curso = supervisor.enviar('SOAT', {'dormir': 0.5})
+        _esperar_ocupados(supervisor, 1)
+        en_cola = supervisor.enviar('SOAT', {})
+        with pytest.raises(ColaLlena):
+            supervisor.enviar('SOAT', {})
+        assert supervisor.estado()['rechazadas'] == 1
+        assert en_curso.result()['categoria'] == 'SOAT'
+        assert en_cola.result()['categoria'] == 'SOAT'
+
+def test_limite_por_categoria_no_frena_a_las_livianas():
+    with _supervisor(trabajadores=2, limites={'CONTRATO': 1}) as supervisor:
+        supervisor.procesar('SOAT', {})
+        supervisor.procesar('SOAT', {})
+        inicio = time.monotonic()
+        contratos = [supervisor.enviar('CONTRATO', {'dormir': 0.6}) for _ in range(2)]
+        soat = supervisor.enviar('SOAT', {})
+        soat.result()
+        # El segundo contrato espera su cupo; el SOAT que llegó después usa el otro trabajador
+        assert time.monotonic() - inicio < 0.5
+        assert supervisor.estado()['enCurso'] == {'CONTRATO': 1}
+        for contrato in contratos:
+            contrato.result()
+        assert time.monotonic() - inicio >= 1.2
+
+def test_plazo_vencido_en_cola_y_en_ejecucion():
+    with _supervisor() as supervisor:
+        pid = supervisor.procesar('SOAT', {})['pid']
+        lenta = supervisor.enviar('SOAT', {'dormir': 5}, plazo=0.5)
+        _esperar_ocupados(supervisor, 1)
+        en_cola = supervisor.enviar('SOAT', {}, plazo=0.2)
+        with pytest.raises(TimeoutError, match='esperando un trabajador'):
+            en_cola.result()
+        with pytest.raises(TimeoutError, match='procesando el documento'):
+            lenta.result()
+        # El trabajador atascado se mató y se reemplazó
+        assert supervisor.procesar('SOAT', {})['pid'] != pid
+        estado = supervisor.estado()
+        assert (estado['vencidasEnCola'], estado['vencidasEnEjecucion'], estado['reciclados']) == (1, 1, 1)
+
+def test_recicla_tras_max_solicitudes():
+    with _supervisor(max_solicitudes=2) as supervisor:
+        pids = [supervisor.procesar('SOAT', {})['pid'] for _ in range(3)]
+        assert pids[0] == pids[1] != pids[2]
+        assert supervisor.estado()['reciclados'] == 1
+
+def test_reemplaza_un_trabajador_caido():
+    with _supervisor() as supervisor:
+        with pytest.raises(RuntimeError, match='terminó inesperadamente'):
+            supervisor.procesar('SOAT', {'morir': True})
+        assert supervisor.procesar('SOAT', {})['categoria'] == 'SOAT'
+        estado = supervisor.estado()
+        assert (estado['caidas'], estado['trabajadores']) == (1, 1)
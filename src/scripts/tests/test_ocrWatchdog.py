@@ -0,0 +1,97 @@
+import re
+import json
+import time
+import threading
+import pytest
+import ocrWatchdog
+from ocrTrace import traza, CAMPO_INTERRUMPIDOS
+from ocrWatchdog import (
+    presupuesto, ejecutar_con_presupuesto, TiempoAgotado,
+    auditar_patron, patrones_de_archivo, patrones_de_reglas,
+)
+
+pytestmark = pytest.mark.skipif(not ocrWatchdog.puede_interrumpir(), reason='el watchdog necesita SIGALRM')
+
+# Backtracking exponencial: con 40 'a' no termina en horas
+CATASTROFICO = re.compile(r'(a+)+$')
+TEXTO_CATASTROFICO = 'a' * 40 + 'b'
+
+class Procesador:
+    def __init__(self):
+        self.result = {'placa': None}
+
+def test_presupuesto_corta_una_regex_atrapada():
+    inicio = time.monotonic()
+    with pytest.raises(TiempoAgotado):
+        with presupuesto(50):
+            CATASTROFICO.search(TEXTO_CATASTROFICO)
+    assert time.monotonic() - inicio < 5
+
+def test_extractor_que_agota_el_presupuesto_no_detiene_el_procesador(monkeypatch):
+    monkeypatch.setattr(ocrWatchdog, 'TIEMPOS_AGOTADOS', {})
+    processor = Procesador()
+
+    def extractor():
+        # Un `except Exception` del extractor no debe tragarse el corte
+        try:
+            CATASTROFICO.search(TEXTO_CATASTROFICO)
+        except Exception:
+            return 'atrapado'
+
+    assert ejecutar_con_presupuesto(processor, 'extract_placa', extractor, 50) is None
+    assert processor.result[CAMPO_INTERRUMPIDOS] == ['extract_placa']
+    assert ocrWatchdog.TIEMPOS_AGOTADOS == {'Procesador.extract_placa': 1}
+    assert traza.registros()[-1]['evento'] == 'watchdog.tiempo_agotado'
+    # Dentro del presupuesto el valor pasa tal cual
+    assert ejecutar_con_presupuesto(processor, 'extract_fecha', lambda: '2025-01-01', 50) == '2025-01-01'
+
+def test_sin_limite_fuera_del_hilo_principal_o_con_otro_temporizador():
+    resultado = []
+    def en_hilo():
+        with presupuesto(1):
+            time.sleep(0.05)
+        resultado.append('terminó')
+    hilo = threading.Thread(target=en_hilo)
+    hilo.start()
+    hilo.join()
+    assert resultado == ['terminó']
+
+    # Un presupuesto anidado no reemplaza al de afuera
+    with presupuesto(2000):
+        with presupuesto(1):
+            time.sleep(0.05)
+
+def test_auditoria_de_patrones():
+    assert auditar_patron(r'(a+)+$')[0] == 'cuantificador anidado (backtracking exponencial)'
+    assert auditar_patron(r'[A-Z]{3}\d{3}') == []
+    assert auditar_patron(r'\d{1,3}(?:\.\d{3})*') == []
+    assert auditar_patron(r'(abc').pop().startswith('no compila')
+
+def test_patrones_de_scripts_y_reglas(tmp_path):
+    script = tmp_path / 'ocrPrueba.py'
+    script.write_text(
+        "import re\n"
+        "placa_pattern = r'[A-Z]{3}\\d{3}'\n"
+        "PATRONES_FECHA = [r'(\\d{2})/(\\d{2})', r'\\d{8}']\n"
+        "m = re.search(r'vence\\s+(\\S+)', texto, re.I | re.M)\n"
+        "n = re.sub(r'\\s+', ' ', texto, flags=re.IGNORECASE)\n"
+        "o = re.search(placa_pattern, texto)\n",
+        encoding='utf-8',
+    )
+    assert patrones_de_archivo(str(script)) == [
+        (2, r'[A-Z]{3}\d{3}', 0),
+        (3, r'(\d{2})/(\d{2})', 0),
+        (3, r'\d{8}', 0),
+        (4, r'vence\s+(\S+)', re.I | re.M),
+        (5, r'\s+', re.IGNORECASE),
+    ]
+
+    reglas = tmp_path / 'PRUEBA.json'
+    reglas.write_text(json.dumps({'patrones': {
+        'placa': {'regex': '[A-Z]{3}\\d{3}'},
+        'mes': {'regex': '(\\d{1,2}) de {mes}', 'por_cada_mes': True, 'ignorar_mayusculas': True},
+    }}), encoding='utf-8')
+    assert patrones_de_reglas(str(reglas)) == [
+        ('patrones.placa', r'[A-Z]{3}\d{3}', 0),
+        ('patrones.mes', r'(\d{1,2}) de enero', re.IGNORECASE),
+    ]
@@ -0,0 +1,55 @@
+from conftest import analyze_result, cargar_ocr
+from ocrWordStore import WordStore
+
+def _store():
+    return WordStore.from_analyze_result(analyze_result([
+        [('Número', 0.9), ('placa', 0.8), ('ABC123', 0.95)],
+        [('Marca', 0.9), ('Chevrolet', 0.7)],
+        [('Placa', 0.6), ('XYZ789', 0.85)],
+    ], paginas=[2, 1]))
+
+def test_palabras_por_pagina_como_el_json():
+    store = _store()
+    assert len(store) == 7
+    assert store.page_ranges == {1: (0, 5), 2: (5, 7)}
+    assert [word.content for word in store] == ['Número', 'placa', 'ABC123', 'Marca', 'Chevrolet', 'Placa', 'XYZ789']
+    palabra = store[-1]
+    assert (palabra.page, palabra.confidence) == (2, 0.85)
+    assert palabra.get('span') == {'offset': palabra.offset, 'length': 6}
+    # Los contenidos repetidos se guardan una sola vez
+    assert len(WordStore.from_analyze_result(analyze_result([[('PLACA', 0.9)], [('PLACA', 0.8)]])).contents) == 1
+
+def test_find_normaliza_y_respeta_los_indices():
+    store = _store()
+    assert store.find('NUMERO') == 0
+    assert store.find('PLACA') == 1
+    assert store.find('PLACA', normalize=False) == -1
+    assert store.find('Placa', normalize=False) == 5
+    assert store.find('PLACA', indices=store.page_range(2)) == 5
+    assert store.find('SOAT') == -1
+    assert store.find('PLACA', indices=store.page_range(3)) == -1
+
+def test_after_ordena_por_offset():
+    store = _store()
+    marca = store[3]
+    assert [store.content(i) for i in store.after(marca.offset)] == ['Chevrolet', 'Placa', 'XYZ789']
+    assert [store.content(i) for i in store.after(marca.offset, limit=2)] == ['Chevrolet', 'Placa']
+    assert list(store.after(store[-1].offset)) == []
+
+def test_after_con_palabras_fuera_de_orden():
+    data = analyze_result([[('uno', 0.9), ('dos', 0.9), ('tres', 0.9)]])
+    words = data['analyzeResult']['pages'][0]['words']
+    words[0], words[2] = words[2], words[0]
+    store = WordStore.from_analyze_result(data)
+    assert [store.content(i) for i in store.after(-1)] == ['uno', 'dos', 'tres']
+    assert [store.content(i) for i in store.after(-1, limit=1)] == ['uno']
+
+def test_max_pages_y_documento_real():
+    data = cargar_ocr('POLIZA_CONTRACTUAL_04')
+    completo = WordStore.from_analyze_result(data)
+    primera = WordStore.from_analyze_result(data, max_pages=1)
+    assert list(primera.page_ranges) == [completo.first_page()]
+    assert len(primera) == len(completo.page_range(completo.first_page()))
+    # Cada palabra apunta a su texto en el content
+    content = data['analyzeResult']['content']
+    assert all(content[word.offset:word.offset + word.length] == word.content for word in completo)
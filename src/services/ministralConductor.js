@@ -106,11 +106,16 @@ class MinistralConductorService {
   /**
    * Generar user prompt
    */
-  _generarUserPrompt(ocrData, categoria, conductorExistente = null) {
+  _generarUserPrompt(ocrData, categoria, conductorExistente = null, campos = null) {
     const ocrText = typeof ocrData === 'string' ? ocrData : JSON.stringify(ocrData);
     const specificPrompt = this.getSpecificPrompt(categoria);
 
-    return `Analiza el siguiente texto OCR de un documento ${categoria} y extrae la información estructurada.\n\n${specificPrompt}\n\nTexto OCR:\n${ocrText}`;
+    // Los demás campos ya los extrajeron los procesadores por reglas
+    const soloCampos = campos && campos.length
+      ? `\n\nSOLO necesito estos campos: ${campos.join(', ')}. Responde el JSON únicamente con ellos.`
+      : '';
+
+    return `Analiza el siguiente texto OCR de un documento ${categoria} y extrae la información estructurada.\n\n${specificPrompt}${soloCampos}\n\nTexto OCR:\n${ocrText}`;
   }
 
   /**
@@ -230,18 +235,18 @@ class MinistralConductorService {
   /**
    * Procesar datos OCR de conductor usando Ministral-3B (MÉTODO PRINCIPAL)
    */
-  async procesarDatosConductor(ocrData, categoria, conductorExistente = null) {
+  async procesarDatosConductor(ocrData, categoria, conductorExistente = null, campos = null) {
     try {
       const ocrDataTruncated = this._truncateOcrDataAggressively(ocrData, categoria);
 
       const systemPrompt = this._generarSystemPrompt();
-      const userPrompt = this._generarUserPrompt(ocrDataTruncated, categoria, conductorExistente);
+      const userPrompt = this._generarUserPrompt(ocrDataTruncated, categoria, conductorExistente, campos);
 
       const promptSize = systemPrompt.length + userPrompt.length;
 
       if (promptSize > 15000) {
         const ocrDataMinimal = this._getMinimalOcrData(ocrData, categoria);
-        const minimalUserPrompt = this._generarUserPrompt(ocrDataMinimal, categoria, conductorExistente);
+        const minimalUserPrompt = this._generarUserPrompt(ocrDataMinimal, categoria, conductorExistente, campos);
         return this._callMinistralAPI(systemPrompt, minimalUserPrompt, categoria);
       }
 
@@ -616,9 +621,9 @@ Responde ÚNICAMENTE con el JSON, sin texto adicional.`;
 }
 
 // Función auxiliar para usar el servicio
-async function procesarDatosOCRConMinistral(ocrData, categoria, conductorExistente = null) {
+async function procesarDatosOCRConMinistral(ocrData, categoria, conductorExistente = null, campos = null) {
   const service = new MinistralConductorService();
-  return await service.procesarDatosConductor(ocrData, categoria, conductorExistente);
+  return await service.procesarDatosConductor(ocrData, categoria, conductorExistente, campos);
 }
 
 function normalizarTipoSangre(tipoSangre) {